@@ -3,8 +3,8 @@
 # (c) 2023 Vanderbilt University. This program is released under a GNU General Public License v3.0 http://www.gnu.org/licenses/gpl-3.0
 # Author: Steve Baskauf
 
-script_version = '1.0.1'
-version_modified = '2023-11-06'
+script_version = '1.0.2'
+version_modified = '2026-10-18'
 
 # -----------------------------------------
 # Version 0.4 change notes: 
@@ -63,6 +63,21 @@ version_modified = '2023-11-06'
 # -----------------------------------------
 # Version 1.0.1 change notes: 2023-11-06
 # - correct bug when truncating long labels would result in a trailing space, which when followed by another space would be converted to a single space by the API
+# -----------------------------------------
+# Version 1.0.2 change notes: 2026-10-18
+# - Structured data writes are spaced by the adaptive rate controller in vb_rate.py, which is shared with VanderBot. It honors
+#   Retry-After, never goes faster than the Commons limit of one write every 1.25 s, and raises vb_rate.PostFailed instead of
+#   calling exit() when the server stays lagged.
+# - Logging in is done by vb_session.py, which is shared with VanderBot. The session cookies are saved between runs so that
+#   the next run doesn't need to log in again, and writes rejected with a badtoken error are sent again with a new token.
+# - Added the metrics setting. While the script is running, the works processed and skipped, uploads and structured data
+#   writes, API errors by error code, retries, current maxlag backoff, and estimated time remaining are served in the
+#   Prometheus text format by a local HTTP server or written to a file (see vb_metrics.py, shared with VanderBot).
+# - The Sparqler class was moved to vb_sparql.py, which is shared with VanderBot and the other scripts that query SPARQL
+#   endpoints. Queries reuse open connections to the Query Service instead of making a new one for each query.
+# - Added the sparql_cache_days setting. Query results are saved in ~/.vanderbot/sparql_cache.sqlite and reused for that
+#   many days (default 7; 0 for no cache), so the inception year is queried once per work instead of twice and a run that
+#   is restarted doesn't repeat the queries for works that were processed before.
 
 # Generic Commons API reference: https://commons.wikimedia.org/w/api.php
 
@@ -89,7 +104,12 @@ import pandas as pd
 import urllib.parse
 import webbrowser
 import boto3 # AWS Python SDK
-from typing import List, Dict, Tuple, Optional, Any
+from typing import List, Dict, Tuple, Any
+sys.path.append(str(Path(__file__).resolve().parent.parent / 'vanderbot')) # the vb_ modules are in the vanderbot directory of this repository
+import vb_rate # controls the rate of writes to the API
+import vb_session # logs in to the API
+import vb_metrics # shows the progress of a run while it is in progress
+import vb_sparql # sends SPARQL queries through a shared connection pool
 
 # ----------------
 # Global variables
@@ -97,6 +117,13 @@ from typing import List, Dict, Tuple, Optional, Any
 
 ERROR_LOG = ''
 
+# Rate controller for writes to the Commons API. Shared by all writes so that they never go faster than the Commons limit.
+RATE_CONTROLLER = vb_rate.RateController(min_interval=vb_rate.policy_min_interval('https://commons.wikimedia.org/w/api.php'))
+
+# Progress of the run: works processed and skipped, writes, and API errors (see vb_metrics.py). The writes are counted by
+# the upload functions called in the loop through the images of each work.
+METRICS = vb_metrics.Metrics('commonstool', RATE_CONTROLLER)
+
 # Support command line arguments
 
 arg_vals = sys.argv[1:]
@@ -142,6 +169,12 @@ with open(config_path, 'r') as file:
 # you need to change the user-agent string in the configuration file to something else!
 USER_AGENT = config_values['user_agent_string_template'].replace('%s', script_version)
 
+# Results of the queries to the Wikidata Query Service are saved in a SQLite database (see vb_sparql.py) so that they
+# aren't repeated later in the run or when the script is run again for works that were processed before.
+SPARQL_CACHE = None
+if config_values.get('sparql_cache_days', 7) > 0:
+    SPARQL_CACHE = vb_sparql.QueryCache(ttl=config_values.get('sparql_cache_days', 7) * 24 * 3600)
+
 # ------------------------
 # Utility functions
 # ------------------------
@@ -223,145 +256,6 @@ def convert_to_smart_quotes(string: str) -> str:
         string = string.replace('"', '\u201d', 1) # will replace the second instance
     return string
 
-# ------------------------
-# SPARQL query class
-# ------------------------
-
-# This is a condensed version of the more full-featured script at 
-# https://github.com/HeardLibrary/digital-scholarship/blob/master/code/wikidata/sparqler.py
-# It includes only the method for the query form.
-
-class Sparqler:
-    """Build SPARQL queries of various sorts
-
-    Parameters
-    -----------
-    useragent : str
-        Required if using the Wikidata Query Service, otherwise optional.
-        Use the form: appname/v.v (URL; mailto:email@domain.com)
-        See https://meta.wikimedia.org/wiki/User-Agent_policy
-    endpoint: URL
-        Defaults to Wikidata Query Service if not provided.
-    method: str
-        Possible values are "post" (default) or "get". Use "get" if read-only query endpoint.
-        Must be "post" for update endpoint.
-    sleep: float
-        Number of seconds to wait between queries. Defaults to 0.1
-        
-    Required modules:
-    -------------
-    requests, datetime, time
-    """
-    def __init__(self, method: str = 'post', endpoint: str ='https://query.wikidata.org/sparql', useragent: Optional[str] = None, sleep: float = 0.1):
-        # attributes for all methods
-        self.http_method = method
-        self.endpoint = endpoint
-        if useragent is None:
-            if self.endpoint == 'https://query.wikidata.org/sparql':
-                print('You must provide a value for the useragent argument when using the Wikidata Query Service.')
-                print()
-                raise KeyboardInterrupt # Use keyboard interrupt instead of sys.exit() because it works in Jupyter notebooks
-        self.sleep = sleep
-
-        self.requestheader = {}
-        if useragent:
-            self.requestheader['User-Agent'] = useragent
-        
-        if self.http_method == 'post':
-            self.requestheader['Content-Type'] = 'application/x-www-form-urlencoded'
-
-    def query(self, query_string: str, form: str = 'select', verbose: bool = False, **kwargs):
-        """Send a SPARQL query to the endpoint.
-        
-        Parameters
-        ----------
-        form : str
-            The SPARQL query form.
-            Possible values are: "select" (default), "ask", "construct", and "describe".
-        mediatype: str
-            The response media type (MIME type) of the query results.
-            Some possible values for "select" and "ask" are: "application/sparql-results+json" (default) and "application/sparql-results+xml".
-            Some possible values for "construct" and "describe" are: "text/turtle" (default) and "application/rdf+xml".
-            See https://docs.aws.amazon.com/neptune/latest/userguide/sparql-media-type-support.html#sparql-serialization-formats-neptune-output
-            for response serializations supported by Neptune.
-        verbose: bool
-            Prints status when True. Defaults to False.
-        default: list of str
-            The graphs to be merged to form the default graph. List items must be URIs in string form.
-            If omitted, no graphs will be specified and default graph composition will be controlled by FROM clauses
-            in the query itself. 
-            See https://www.w3.org/TR/sparql11-query/#namedGraphs and https://www.w3.org/TR/sparql11-protocol/#dataset
-            for details.
-        named: list of str
-            Graphs that may be specified by IRI in a query. List items must be URIs in string form.
-            If omitted, named graphs will be specified by FROM NAMED clauses in the query itself.
-            
-        Returns
-        -------
-        If the form is "select" and mediatype is "application/json", a list of dictionaries containing the data.
-        If the form is "ask" and mediatype is "application/json", a boolean is returned.
-        If the mediatype is "application/json" and an error occurs, None is returned.
-        For other forms and mediatypes, the raw output is returned.
-
-        Notes
-        -----
-        To get UTF-8 text in the SPARQL queries to work properly, send URL-encoded text rather than raw text.
-        That is done automatically by the requests module for GET. I guess it also does it for POST when the
-        data are sent as a dict with the urlencoded header. 
-        See SPARQL 1.1 protocol notes at https://www.w3.org/TR/sparql11-protocol/#query-operation        
-        """
-        query_form = form
-        if 'mediatype' in kwargs:
-            media_type = kwargs['mediatype']
-        else:
-            if query_form == 'construct' or query_form == 'describe':
-            #if query_form == 'construct':
-                media_type = 'text/turtle'
-            else:
-                media_type = 'application/sparql-results+json' # default for SELECT and ASK query forms
-        self.requestheader['Accept'] = media_type
-            
-        # Build the payload dictionary (query and graph data) to be sent to the endpoint
-        payload = {'query' : query_string}
-        if 'default' in kwargs:
-            payload['default-graph-uri'] = kwargs['default']
-        
-        if 'named' in kwargs:
-            payload['named-graph-uri'] = kwargs['named']
-
-        if verbose:
-            print('querying SPARQL endpoint')
-
-        start_time = datetime.now()
-        if self.http_method == 'post':
-            response = requests.post(self.endpoint, data=payload, headers=self.requestheader)
-        else:
-            response = requests.get(self.endpoint, params=payload, headers=self.requestheader)
-        elapsed_time = (datetime.now() - start_time).total_seconds()
-        self.response = response.text
-        sleep(self.sleep) # Throttle as a courtesy to avoid hitting the endpoint too fast.
-
-        if verbose:
-            print('done retrieving data in', int(elapsed_time), 's')
-
-        if query_form == 'construct' or query_form == 'describe':
-            return response.text
-        else:
-            if media_type != 'application/sparql-results+json':
-                return response.text
-            else:
-                try:
-                    data = response.json()
-                except:
-                    return None # Returns no value if an error. 
-
-                if query_form == 'select':
-                    # Extract the values from the response JSON
-                    results = data['results']['bindings']
-                else:
-                    results = data['boolean'] # True or False result from ASK query 
-                return results           
-
 # ------------------------
 # SPARQL query-based functions
 # ------------------------
@@ -397,7 +291,7 @@ def query_artwork_creator_name(qid: str) -> Tuple[bool, str]:
     #print(query_string)
 
     error = False
-    wdqs = Sparqler(useragent=USER_AGENT)
+    wdqs = vb_sparql.Sparqler(useragent=USER_AGENT, cache=SPARQL_CACHE)
     data = wdqs.query(query_string)
 
     if data is None:
@@ -454,7 +348,7 @@ def query_item_description(qid: str, language: str) -> str:
     #print(query_string)
     
     error = False
-    wdqs = Sparqler(useragent=USER_AGENT)
+    wdqs = vb_sparql.Sparqler(useragent=USER_AGENT, cache=SPARQL_CACHE)
     data = wdqs.query(query_string)
     
     # Check for errors or no results
@@ -493,7 +387,7 @@ def query_item_labels(qid: str, pref_lang: str) -> Tuple[str, str, str]:
     '''
     #print(query_string)
 
-    wdqs = Sparqler(useragent=USER_AGENT)
+    wdqs = vb_sparql.Sparqler(useragent=USER_AGENT, cache=SPARQL_CACHE)
     data = wdqs.query(query_string)
     
     # Check for errors or no results
@@ -552,7 +446,7 @@ def query_inception_year(qid: str) -> str:
     '''
     #print(query_string)
 
-    wdqs = Sparqler(useragent=USER_AGENT)
+    wdqs = vb_sparql.Sparqler(useragent=USER_AGENT, cache=SPARQL_CACHE)
     data = wdqs.query(query_string)
 
     if data is None:
@@ -590,7 +484,7 @@ def query_inventory_number(qid: str, collection_qid: str) -> str:
     #print(query_string)
 
     error = False
-    wdqs = Sparqler(useragent=USER_AGENT)
+    wdqs = vb_sparql.Sparqler(useragent=USER_AGENT, cache=SPARQL_CACHE)
     data = wdqs.query(query_string)
     if data is None:
         return 'Query error'
@@ -754,7 +648,7 @@ def generate_commons_filename(label: str, local_filename: str, filename_institut
 # Wikimedia login in/authentication object
 # ------------------------
 
-class Wikimedia_api_login:
+class Wikimedia_api_login(vb_session.WikibaseSession):
     """Log in to a Wikimedia API to instantiate a Requests session and generate a CSRF token.
 
     Parameters
@@ -762,9 +656,16 @@ class Wikimedia_api_login:
     config_values : dict
         Dictionary of configuration values from the configuration YAML file.
 
+    Note
+    ----
+    The login is a vb_session.WikibaseSession that uses the shared RATE_CONTROLLER for its writes. The session cookies
+    are saved between runs, so a run started soon after another one doesn't need to log in again, and a new CSRF token
+    is got when a write is rejected with a badtoken error. The endpoint and csrftoken attributes are kept for the code
+    that used them before.
+
     Required modules
     ----------------
-    requests, Path object from pathlib
+    requests, Path object from pathlib, vb_session
     """
     def __init__(self, config_values: dict):
         if config_values['credentials_path_relative_to_home_directory']:
@@ -774,54 +675,17 @@ class Wikimedia_api_login:
             full_credentials_path = config_values['credentials_path']
         
         # Retrieve credentials from local file.
-        with open(full_credentials_path, 'rt') as file_object:
-            line_list = file_object.read().split('\n')
-        root_url = line_list[0].split('=')[1]
-        username = line_list[1].split('=')[1]
-        password = line_list[2].split('=')[1]
-
-        resource_url = '/w/api.php' # default API resource URL for all Wikimedia APIs
-        endpoint_url = root_url + resource_url
-        self.endpoint = endpoint_url
-
-        # Instantiate a Requests session
-        session = requests.Session()
-        # Set default User-Agent header so you don't have to send it with every request
-        session.headers.update({'User-Agent': USER_AGENT})
-        self.session = session
-
-        # Go through the sequence of steps needed to get get the CSRF token
-
-        # Get the login token
-        parameters = {
-            'action':'query',
-            'meta':'tokens',
-            'type':'login',
-            'format':'json'
-        }
-        r = session.get(url=endpoint_url, params=parameters)
-        data = r.json()
-        login_token = data['query']['tokens']['logintoken']
-        
-        # Perform the session login
-        parameters = {
-            'action':'login',
-            'lgname':username,
-            'lgpassword':password,
-            'lgtoken':login_token,
-            'format':'json'
-        }
-        r = session.post(endpoint_url, data=parameters)
+        root_url, username, password = vb_session.retrieve_credentials(full_credentials_path)
 
-        # Generate the CSRF token
-        parameters = {
-            "action": "query",
-            "meta": "tokens",
-            "format": "json"
-        }
-        r = session.get(url=endpoint_url, params=parameters)
-        data = r.json()
-        self.csrftoken = data['query']['tokens']['csrftoken']
+        # Log in, or reuse the cookies of an earlier run if they are still logged in. The default API resource URL for all
+        # Wikimedia APIs is /w/api.php
+        super().__init__(root_url, username, password, USER_AGENT, rate_controller=RATE_CONTROLLER)
+        self.endpoint = self.api_url
+
+    @property
+    def csrftoken(self) -> str:
+        """The current CSRF token."""
+        return self.csrf_token
 
 # ------------------------
 # Data upload functions
@@ -938,20 +802,28 @@ def upload_file_to_commons(image_filename: str, commons_filename: str, directory
         'comment': 'Uploaded media file and metadata via API'
     }
     file_path = directory_path + image_filename
-    file_dict = {'file':(image_filename, open(file_path, 'rb'), 'multipart/form-data')}
-    #print(parameters)
-    #print(file_dict)
 
     print('uploading', commons_filename) # This line is important for large TIFF files that will take a while to upload
-    response = commons_login.session.post('https://commons.wikimedia.org/w/api.php', files=file_dict, data = parameters)
-    # Trap for errors. Note: as far as I can tell, no sort of error code or HTTP header gets sent identifying the 
-    # cause of the error. So at this point, just report an error by returning an empty dictionary.
-    #print(response.text)
-    try:
-        data = response.json()
-    except:
-        data = {}
-    #print(json.dumps(data, indent=2))
+    # If the CSRF token is rejected (e.g. because the session expired during a long run), get a new one and upload again.
+    for attempt in range(2):
+        with open(file_path, 'rb') as file_object:
+            file_dict = {'file':(image_filename, file_object, 'multipart/form-data')}
+            #print(parameters)
+            #print(file_dict)
+            response = commons_login.session.post('https://commons.wikimedia.org/w/api.php', files=file_dict, data = parameters)
+        # Trap for errors. Note: as far as I can tell, no sort of error code or HTTP header gets sent identifying the 
+        # cause of the error. So at this point, just report an error by returning an empty dictionary.
+        #print(response.text)
+        try:
+            data = response.json()
+        except:
+            data = {}
+        #print(json.dumps(data, indent=2))
+        if attempt > 0 or not vb_session.is_bad_token(data):
+            break
+        print('CSRF token was rejected. Getting a new one.')
+        parameters['token'] = commons_login.refresh_csrf_token(parameters['token'])
+    METRICS.write(data)
 
     return(data)
 
@@ -1061,68 +933,17 @@ def wbeditentity_upload(commons_login, maxlag: int, mid: str, caption: str, capt
 
     #print(json.dumps(parameter_dictionary, indent = 2))
 
-    response = attempt_post('https://commons.wikimedia.org/w/api.php', parameter_dictionary, commons_login.session)
+    # The write is delayed as needed by the shared rate controller, which also retries with increasing delays if the
+    # server is lagged, and is sent again with a new CSRF token if the token is rejected. Raises vb_rate.PostFailed if
+    # the write can't be made.
+    post_stats = {}
+    response = commons_login.post(parameter_dictionary, post_stats)
     #response  = {'success': 1} # use instead of the line above to test but not upload
+    METRICS.write(response, post_stats)
 
     return response
 
 
-# This function attempts to post and handles maxlag errors
-# Code reused from VanderBot https://github.com/HeardLibrary/linked-data/blob/master/vanderbot/vanderbot.py
-def attempt_post(api_url: str, parameters: Dict, session: requests.Session) -> Dict:
-    """Post to a Wikimedia API while respecting maxlag errors.
-    
-    Parameters
-    ----------
-    api_url : str
-        Wikimedia API endpoint URL.
-    parameters : Dict
-        Parameters to be passed to the API.
-    session : requests.Session object
-        Session of the commons_login object.
-    """
-    starting_delay = 5
-    max_retries = 10
-    delay_limit = 300
-    retry = 0
-    # maximum number of times to retry lagged server = maxRetries
-    while retry <= max_retries:
-        if retry > 0:
-            print('retry:', retry)
-        r = session.post(api_url, data = parameters)
-        #print(r.text)
-        data = r.json()
-        try:
-            # check if response is a maxlag error
-            # see https://www.mediawiki.org/wiki/Manual:Maxlag_parameter
-            if data['error']['code'] == 'maxlag':
-                print('Lag of ', data['error']['lag'], ' seconds.')
-                # recommended delay is basically useless
-                # recommended_delay = int(r.headers['Retry-After'])
-                #if recommended_delay < 5:
-                    # recommendation is to wait at least 5 seconds if server is lagged
-                #    recommended_delay = 5
-                recommended_delay = starting_delay*2**retry # double the delay with each retry 
-                if recommended_delay > delay_limit:
-                    recommended_delay = delay_limit
-                if retry != max_retries:
-                    print('Waiting ', recommended_delay , ' seconds.')
-                    print()
-                    sleep(recommended_delay)
-                retry += 1
-
-                # after this, go out of if and try code blocks
-            else:
-                # an error code is returned, but it's not maxlag
-                return data
-        except:
-            # if the response doesn't have an error key, it was successful, so return
-            return data
-        # here's where execution goes after the delay
-    # here's where execution goes after maxRetries tries
-    print('Failed after ' + str(max_retries) + ' retries.')
-    exit() # just abort the script
-    
 # ---------------------------
 # Major processes functions
 # ---------------------------
@@ -1618,6 +1439,13 @@ if config_values['perform_commons_upload']:
         print('Authenticating')
         commons_login = Wikimedia_api_login(config_values)
 
+# Metrics are served by a local HTTP server if the metrics setting is a port number, or written to the file it names
+metrics_exporter = None
+if config_values.get('metrics', '') != '':
+    metrics_exporter = vb_metrics.MetricsExporter(METRICS, str(config_values['metrics']))
+    print('Progress metrics at', metrics_exporter.url())
+METRICS.add_rows(len(works_metadata))
+
 print('Beginning uploads')
 print()
 
@@ -1641,6 +1469,7 @@ for index, work in works_metadata.iterrows():
     if index in existing_images.qid.values:
         if config_values['verbose']:
             print('already done')
+        METRICS.row(skipped=True)
         continue
     
     # Skip over works that don't (yet) have a designated primary image
@@ -1648,10 +1477,12 @@ for index, work in works_metadata.iterrows():
     if len(images_subframe) == 0: # skip any works whose image can't be found in the images data
         if config_values['verbose']:
             print('no image data')
+        METRICS.row(skipped=True)
         continue
     if not 'primary' in images_subframe['rank'].tolist():
         if config_values['verbose']:
             print('no primary value')
+        METRICS.row(skipped=True)
         continue
 
     images_to_upload = []
@@ -1674,12 +1505,14 @@ for index, work in works_metadata.iterrows():
         if ip_status == '':
             if config_values['verbose']:
                 print('copyright not evaluated')
+            METRICS.row(skipped=True)
             continue
 
         # Screen for public domain works. 
         if not ip_status in pd_categories:
             if config_values['verbose']:
                 print('not public domain')
+            METRICS.row(skipped=True)
             continue
 
         # Handle the special case where the status was determined to be "assessed to be out of copyright" but the
@@ -1691,6 +1524,7 @@ for index, work in works_metadata.iterrows():
                     if int(test_inception_year[0]) > config_values['copyright_cutoff_date']:
                         if config_values['verbose']:
                             print('insufficient evidence out of copyright')
+                        METRICS.row(skipped=True)
                         continue  # skip this work if it has an inception date and it's after 1926
             else:
                 if config_values['verbose']:
@@ -1728,6 +1562,7 @@ for index, work in works_metadata.iterrows():
         
         # If any of the images fail any of the size criteria, skip doing this work.
         if not all_good:
+            METRICS.row(skipped=True)
             continue
         
     work_label, work_description, label_language = query_item_labels(index, config_values['default_language'])
@@ -1995,6 +1830,7 @@ for index, work in works_metadata.iterrows():
         upload_iiif_manifest_to_s3(canvases_list, work_metadata, config_values)
 
     artwork_items_uploaded += 1
+    METRICS.row()
     
     if config_values['max_items_to_upload'] > 0: # Remove limit if zero or negative value.
         if artwork_items_uploaded >= config_values['max_items_to_upload']:
@@ -2009,4 +1845,10 @@ if ERROR_LOG == '':
 else:
     print(ERROR_LOG)
 LOG_OBJECT.close()
+if metrics_exporter is not None:
+    metrics_exporter.close() # a metrics file is left with the final values
+if SPARQL_CACHE is not None:
+    cache_stats = SPARQL_CACHE.stats()
+    print('Saved query results used:', cache_stats['hits'], 'of', cache_stats['hits'] + cache_stats['misses'], 'queries')
+    SPARQL_CACHE.close()
 print('done')
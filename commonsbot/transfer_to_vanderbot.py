@@ -6,8 +6,8 @@
 # (c) 2022 Vanderbilt University. This program is released under a GNU General Public License v3.0 http://www.gnu.org/licenses/gpl-3.0
 # Author: Steve Baskauf
 
-version = '0.4'
-created = '2023-11-05'
+version = '0.5'
+created = '2026-10-18'
 
 # -----------------------------------------
 # Version 0.2 change notes: 
@@ -19,6 +19,10 @@ created = '2023-11-05'
 # Version 0.4 change notes: 
 # - enable specifying the configuration file location as a command line option
 # -----------------------------------------
+# Version 0.5 change notes: 
+# - The files can be Parquet (.parquet) or Arrow IPC/Feather (.arrow, .feather) files as well as CSVs, depending on the
+#   file name extension. These formats require the pyarrow package. VanderBot reads and writes the same formats.
+# -----------------------------------------
 
 import pandas as pd
 import datetime
@@ -46,6 +50,29 @@ if config_values['working_directory_path'] != '':
 public_domain_categories = config_values['public_domain_categories']
 
 # Function definitions
+PARQUET_EXTENSIONS = ['.parquet', '.pq']
+ARROW_EXTENSIONS = ['.arrow', '.feather', '.ipc']
+
+def read_table(path, columns=None):
+    """Read a CSV, Parquet, or Arrow IPC file into a DataFrame of strings, with empty strings for missing values."""
+    extension = os.path.splitext(path)[1].lower()
+    if extension in PARQUET_EXTENSIONS:
+        return pd.read_parquet(path, columns=columns, memory_map=True).fillna('').astype(str)
+    elif extension in ARROW_EXTENSIONS:
+        import pyarrow.feather # only needed for this format
+        return pyarrow.feather.read_table(path, columns=columns, memory_map=True).to_pandas().fillna('').astype(str)
+    return pd.read_csv(path, na_filter=False, dtype = str, usecols=columns)
+
+def write_table(dataframe, path):
+    """Write a DataFrame to a CSV, Parquet, or Arrow IPC file, depending on the file name extension."""
+    extension = os.path.splitext(path)[1].lower()
+    if extension in PARQUET_EXTENSIONS:
+        dataframe.to_parquet(path, index = False)
+    elif extension in ARROW_EXTENSIONS:
+        dataframe.reset_index(drop = True).to_feather(path)
+    else:
+        dataframe.to_csv(path, index = False)
+
 def generate_utc_date():
     whole_time_string_z = datetime.datetime.utcnow().isoformat() # form: 2019-12-05T15:35:04.959311
     date_z = whole_time_string_z.split('T')[0] # form 2019-12-05
@@ -58,14 +85,14 @@ today = generate_utc_date()
 # For the column header setup, see the sample file and config.json used to generate csv-metadata.json files.
 # In the example, the image, copyright_status, and iiif_manifest related columns are blank, since they will be filled in by this script
 # if they don't already exist
-works_metadata = pd.read_csv(config_values['vanderbot_upload_file'], na_filter=False, dtype = str) # Don't make the Q IDs the index!
+works_metadata = read_table(config_values['vanderbot_upload_file']) # Don't make the Q IDs the index!
 
 # This file is the output of commonsbot containing the Commons upload records
-existing_images = pd.read_csv(config_values['existing_uploads_file'], na_filter=False, dtype = str) # Don't make the Q IDs the index
+existing_images = read_table(config_values['existing_uploads_file']) # Don't make the Q IDs the index
 
 # This file contains metadata about the artwork. The only data used by this script is a column that contains an evaluation of the 
 # copyright status, the result of an idiosynctratic script to determine copyright status of Vanderbilt gallery works.
-works_ip_status = pd.read_csv(config_values['artwork_items_metadata_file'], na_filter=False, dtype = str)
+works_ip_status = read_table(config_values['artwork_items_metadata_file'], ['qid', 'status']) # only these columns are used
 works_ip_status.set_index('qid', inplace=True) # use the Q ID as the index
 
 # Transfer data to metadata file used by VanderBot for upload
@@ -135,7 +162,7 @@ for index, work in existing_images.iterrows():
                         except:
                             pass
 
-# Write the updated dataframe to CSV
-works_metadata.to_csv(config_values['vanderbot_upload_file'], index = False)
+# Write the updated dataframe to the file in the same format
+write_table(works_metadata, config_values['vanderbot_upload_file'])
 print('done')
 print()
@@ -1,5 +1,7 @@
 from pathlib import Path
-import requests
+import sys
+sys.path.append(str(Path(__file__).resolve().parent.parent / 'vanderbot')) # vb_sparql.py is in the vanderbot directory of this repository
+import vb_sparql # shared connection pool for SPARQL queries
 from time import sleep
 import json
 import csv
@@ -114,7 +116,7 @@ def searchLabelsAtWikidata(string, class_list):
 
     return_value = []
     # r = requests.get(endpointUrl, params={'query' : query}, headers=requestHeaderDictionary)
-    r = requests.post(endpoint, data=query.encode('utf-8'), headers=generate_header_dictionary(accept_media_type))
+    r = vb_sparql.post(endpoint, data=query.encode('utf-8'), headers=generate_header_dictionary(accept_media_type))
     data = r.json()
     results = data['results']['bindings']
     for result in results:
@@ -142,7 +144,7 @@ def retrieve_gallery_classes():
 
     return_value = []
     print('sending query')
-    r = requests.post(endpoint, data=query.encode('utf-8'), headers=generate_header_dictionary(accept_media_type))
+    r = vb_sparql.post(endpoint, data=query.encode('utf-8'), headers=generate_header_dictionary(accept_media_type))
     print('results returned')
     data = r.json()
     results = data['results']['bindings']
@@ -290,7 +292,7 @@ FILTER(lang(?label)='en')
     #print('searching for ', name)
     results = []
     # r = requests.get(wikidataEndpointUrl, params={'query' : query}, headers=requestHeaderDictionary)
-    r = requests.post(endpoint, data=query.encode('utf-8'), headers=requestheader)
+    r = vb_sparql.post(endpoint, data=query.encode('utf-8'), headers=requestheader)
     try:
         data = r.json()
         statements = data['results']['bindings']
@@ -442,7 +444,7 @@ def searchWikidataDescription(qId):
         optional {wd:'''+ qId + ''' wdt:P496 ?orcid.}
       }'''
     #print(query)
-    r = requests.post(endpoint, data=query.encode('utf-8'), headers=requestheader)
+    r = vb_sparql.post(endpoint, data=query.encode('utf-8'), headers=requestheader)
     try:
         data = r.json()
         statements = data['results']['bindings']
@@ -22,6 +22,9 @@
 # -----------------------------------------
 # Version 1.5 change notes (2020-09-08):
 # - no changes
+# -----------------------------------------
+# Version 1.6 change notes (2026-10-18):
+# - SPARQL queries are sent through the shared connection pool of vb_sparql.py, which keeps connections open between queries.
 
 import requests   # best library to manage HTTP transactions
 from bs4 import BeautifulSoup # web-scraping library
@@ -33,6 +36,10 @@ from fuzzywuzzy import fuzz # fuzzy logic matching
 from fuzzywuzzy import process
 import xml.etree.ElementTree as et # library to traverse XML tree
 import urllib
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parent.parent / 'vanderbot')) # vb_sparql.py is in the vanderbot directory of this repository
+import vb_sparql # shared connection pool for SPARQL queries
 import datetime
 import string
 
@@ -237,7 +244,7 @@ select distinct ?item where {
     results = []
     acceptMediaType = 'application/json'
     # r = requests.get(wikidataEndpointUrl, params={'query' : query}, headers = generateHeaderDictionary(acceptMediaType))
-    r = requests.post(wikidataEndpointUrl, data=query.encode('utf-8'), headers = generateHeaderDictionary(acceptMediaType))
+    r = vb_sparql.post(wikidataEndpointUrl, data=query.encode('utf-8'), headers = generateHeaderDictionary(acceptMediaType))
     try:
         data = r.json()
         statements = data['results']['bindings']
@@ -317,7 +324,7 @@ class Query:
     # send a generic query and return a list of Q IDs
     def generic_query(self, query):
         # r = requests.get(self.endpoint, params={'query' : query}, headers=self.requestheader)
-        r = requests.post(self.endpoint, data=query.encode('utf-8'), headers=self.requestheader)
+        r = vb_sparql.post(self.endpoint, data=query.encode('utf-8'), headers=self.requestheader)
         results_list = []
         try:
         #if 1==1: # replace try: to let errors occur, also comment out the except: clause
@@ -357,7 +364,7 @@ select distinct ?object where {
     }'''
         #print(query)
         # r = requests.get(self.endpoint, params={'query' : query}, headers=self.requestheader)
-        r = requests.post(self.endpoint, data=query.encode('utf-8'), headers=self.requestheader)
+        r = vb_sparql.post(self.endpoint, data=query.encode('utf-8'), headers=self.requestheader)
         results_list = []
         try:
         #if 1==1: # replace try: to let errors occur, also comment out the except: clause
@@ -423,7 +430,7 @@ select distinct ?id ?string where {'''
 
         results_list = []
         # r = requests.get(self.endpoint, params={'query' : query}, headers=self.requestheader)
-        r = requests.post(self.endpoint, data=query.encode('utf-8'), headers=self.requestheader)
+        r = vb_sparql.post(self.endpoint, data=query.encode('utf-8'), headers=self.requestheader)
         data = r.json()
         results = data['results']['bindings']
         for result in results:
@@ -482,7 +489,7 @@ select distinct ?id ?statement '''
 
         results_list = []
         # r = requests.get(self.endpoint, params={'query' : query}, headers=self.requestheader)
-        r = requests.post(self.endpoint, data=query.encode('utf-8'), headers=self.requestheader)
+        r = vb_sparql.post(self.endpoint, data=query.encode('utf-8'), headers=self.requestheader)
         data = r.json()
         results = data['results']['bindings']
         # NOTE: There may be more than one reference per statement.
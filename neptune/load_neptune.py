@@ -2,8 +2,8 @@
 # (c) 2024 Vanderbilt University, except Sparqler class: (c) Steven J. Baskauf (same license)
 # This program is released under a GNU General Public License v3.0 http://www.gnu.org/licenses/gpl-3.0
 # Author: Steve Baskauf
-# Date: 2024-02-28
-# Version: 0.1.1
+# Date: 2026-10-18
+# Version: 0.1.4
 
 # -----------------------------------------
 # Version 0.1.0 change notes (2024-02-27):
@@ -31,6 +31,12 @@
 # -----------------------------------------
 # Version 0.1.3 change notes (2024-04-12):
 # Add support for updating metadata without loading graph data (trigger_text == 'metadata')
+# -----------------------------------------
+# Version 0.1.4 change notes (2026-10-18):
+# - All requests go through one urllib3 pool of connections (http_pool) instead of making a new pool for every request,
+#   so a run that loads many graphs doesn't open a new connection to Neptune for each update. The requests themselves
+#   are sent as before: only the "query" or "update" parameter, no automatic retries of updates, and the responses
+#   are printed to the log.
 
 # ----------------
 # Configuration
@@ -60,6 +66,7 @@ reader_endpoint_url = 'https://sparql.vanderbilt.edu/sparql'
 s3_bucket_name = 'triplestore-upload'
 utc_offset = '-05:00'
 graph_file_associations_df_fields = ['sd:name', 'sd:graph', 'filename', 'elapsed_time', 'graph_load_status']
+http_pool = urllib3.PoolManager() # keeps connections open between requests; reused by later invocations of a warm lambda
 
 # ----------------
 # Function definitions
@@ -67,14 +74,10 @@ graph_file_associations_df_fields = ['sd:name', 'sd:graph', 'filename', 'elapsed
 
 def get_request(url: str, headers: Optional[Dict] = None, params: Optional[Dict] = None) -> Union[str, None]:
     """Performs an HTTP GET from a URL and returns the response body as UTF-8 text, or None if not status 200."""
-    if headers is None:
-        http = urllib3.PoolManager()
-    else:
-        http = urllib3.PoolManager(headers=headers)
     if params is None:
-        response = http.request('GET', url)
+        response = http_pool.request('GET', url, headers=headers)
     else:
-        response = http.request('GET', url, fields=params)
+        response = http_pool.request('GET', url, fields=params, headers=headers)
     if response.status == 200:
         response_body = response.data.decode('utf-8')
     else:
@@ -250,7 +253,7 @@ class Sparqler:
             print('querying SPARQL endpoint')
 
         start_time = datetime.datetime.now()
-        http = urllib3.PoolManager(headers=self.requestheader)
+        http = http_pool
         if self.http_method == 'post':
             #response = requests.post(self.endpoint, data=payload, headers=self.requestheader)
 
@@ -282,7 +285,7 @@ class Sparqler:
             response = http.request('POST', self.endpoint, body=payload, headers=self.requestheader)
         else:
             #response = requests.get(self.endpoint, params=payload, headers=self.requestheader)
-            response = http.request('GET', self.endpoint, fields=payload_dict)
+            response = http.request('GET', self.endpoint, fields=payload_dict, headers=self.requestheader)
         elapsed_time = (datetime.datetime.now() - start_time).total_seconds()
         #self.response = response.text
         self.response = response.data.decode('utf-8')
@@ -385,7 +388,7 @@ class Sparqler:
         if verbose:
             print('  beginning update')
             
-        http = urllib3.PoolManager(headers=self.requestheader)
+        http = http_pool
 
         start_time = datetime.datetime.now()
         response = http.request('POST', self.endpoint, body=payload, headers=self.requestheader)
@@ -5,11 +5,11 @@
 # for background on this script. It's hacked from that one.
 
 import json
-import requests
 import csv
 from pathlib import Path
-from time import sleep
 import sys
+sys.path.append(str(Path(__file__).resolve().parent.parent / 'vanderbot')) # vb_session.py is in the vanderbot directory of this repository
+import vb_session # logs in to the API and controls the rate of writes
 
 # -----------------------------------------------------------------
 # function definitions
@@ -24,39 +24,6 @@ def retrieveCredentials(path):
     credentials = [endpointUrl, username, password, userAgent]
     return credentials
 
-def getLoginToken(apiUrl):    
-    parameters = {
-        'action':'query',
-        'meta':'tokens',
-        'type':'login',
-        'format':'json'
-    }
-    r = session.get(url=apiUrl, params=parameters)
-    data = r.json()
-    return data['query']['tokens']['logintoken']
-
-def logIn(apiUrl, token, username, password):
-    parameters = {
-        'action':'login',
-        'lgname':username,
-        'lgpassword':password,
-        'lgtoken':token,
-        'format':'json'
-    }
-    r = session.post(apiUrl, data=parameters)
-    data = r.json()
-    return data
-
-def getCsrfToken(apiUrl):
-    parameters = {
-        "action": "query",
-        "meta": "tokens",
-        "format": "json"
-    }
-    r = session.get(url=apiUrl, params=parameters)
-    data = r.json()
-    return data["query"]["tokens"]["csrftoken"]
-
 # read a CSV into a list of dictionaries
 def readDict(filename):
     fileObject = open(filename, 'r', newline='', encoding='utf-8')
@@ -204,46 +171,10 @@ def createReferenceSnak(referenceDict, rowData):
 
 # This function attempts to post and handles maxlag errors
 def attemptPost(apiUrl, parameters):
-    maxRetries = 10
-    baseDelay = 5 # Wikidata recommends a delay of at least 5 seconds
-    delayLimit = 300
-    retry = 0
-    # maximum number of times to retry lagged server = maxRetries
-    while retry <= maxRetries:
-        if retry > 0:
-            print('retry:', retry)
-        r = session.post(apiUrl, data = parameters)
-        data = r.json()
-        try:
-            # check if response is a maxlag error
-            # see https://www.mediawiki.org/wiki/Manual:Maxlag_parameter
-            if data['error']['code'] == 'maxlag':
-                print('Lag of ', data['error']['lag'], ' seconds.')
-                # recommended delay is basically useless
-                # recommendedDelay = int(r.headers['Retry-After'])
-                #if recommendedDelay < 5:
-                    # recommendation is to wait at least 5 seconds if server is lagged
-                #    recommendedDelay = 5
-                recommendedDelay = baseDelay*2**retry # double the delay with each retry 
-                if recommendedDelay > delayLimit:
-                    recommendedDelay = delayLimit
-                if retry != maxRetries:
-                    print('Waiting ', recommendedDelay , ' seconds.')
-                    print()
-                    sleep(recommendedDelay)
-                retry += 1
-
-                # after this, go out of if and try code blocks
-            else:
-                # an error code is returned, but it's not maxlag
-                return data
-        except:
-            # if the response doesn't have an error key, it was successful, so return
-            return data
-        # here's where execution goes after the delay
-    # here's where execution goes after maxRetries tries
-    print('Failed after ' + str(maxRetries) + ' retries.')
-    exit() # just abort the script
+    # The session's rate controller (see vb_rate.py) keeps writes at least 1.25 s apart for Wikidata, waits and retries
+    # with increasing delays if the server is lagged, and raises vb_rate.PostFailed if the write still can't be made.
+    # If the CSRF token is rejected, the session gets a new one (logging in again if necessary) and sends the write again.
+    return wikibaseSession.post(parameters)
 
 # ----------------------------------------------------------------
 # authentication
@@ -271,15 +202,11 @@ user = credentials[1]
 pwd = credentials[2]
 userAgentHeader = credentials[3]
 
+# Log in, or reuse the cookies saved by an earlier run if they are still logged in (see vb_session.py).
 # Instantiate session outside of any function so that it's globally accessible.
-session = requests.Session()
-# Set default User-Agent header so you don't have to send it with every request
-session.headers.update({'User-Agent': userAgentHeader})
-
-
-loginToken = getLoginToken(endpointUrl)
-data = logIn(endpointUrl, loginToken, user, pwd)
-csrfToken = getCsrfToken(endpointUrl)
+wikibaseSession = vb_session.WikibaseSession(credentials[0], user, pwd, userAgentHeader, resource_url=resourceUrl)
+session = wikibaseSession.session
+csrfToken = wikibaseSession.csrf_token
 
 # -------------------------------------------
 # Beginning of script to process the tables
@@ -433,7 +360,4 @@ for table in tables:
                                     for writeRowNumber in range(0, len(tableData)):
                                         writer.writerow(tableData[writeRowNumber])
                                 
-                                # The limit for bots without a bot flag seems to be 50 writes per minute. That's 1.2 s between writes.
-                                # To be safe and avoid getting blocked, use 1.25 s.
-                                sleep(1.25)
     print()
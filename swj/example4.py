@@ -1,12 +1,21 @@
 # (c) 2020 Vanderbilt University.  Author: Steve Baskauf (2020-11-28)
 # This program is released under a GNU General Public License v3.0 http://www.gnu.org/licenses/gpl-3.0
 
-import requests
+# 2026-10-18: The updates are sent with vb_sparql.py (imported from the vanderbot directory of this repository). The nine
+# updates for the value nodes don't depend on each other, so several of them are sent to Fuseki at the same time instead
+# of one after the other. The truthy statement update is sent after they are all done, since it uses their triples.
+
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parent.parent / 'vanderbot')) # vb_sparql.py is in the vanderbot directory of this repository
+import vb_sparql # sends SPARQL updates through a shared connection pool
 
 # port 3030 is used by a local installation of Apache Jena Fuseki
 dataset_name = 'data'
 graph_iri = 'http://bluffton'
 endpoint = 'http://localhost:3030/' + dataset_name + '/update'
+concurrency = 4 # number of updates sent to Fuseki at the same time
+fuseki = vb_sparql.AsyncSparqler(endpoint=endpoint, concurrency=concurrency)
 
 namespaces = '''
 prefix rdfs: <http://www.w3.org/2000/01/rdf-schema#>
@@ -41,6 +50,7 @@ value_types = [
 property_types = ['statement', 'qualifier', 'reference']
 
 # Insert the missing value statements using values from value nodes
+updates = []
 for value_type in value_types:
     for property_type in property_types:
         query = '''
@@ -59,9 +69,10 @@ for value_type in value_types:
           }
           '''
         #print(query) 
-        print('updating', property_type, value_type['string'])
-        response = requests.post(endpoint, headers={'Content-Type': 'application/sparql-update'}, data = namespaces + query)
-    print('update complete')
+        updates.append(namespaces + query)
+print('updating', len(updates), 'statement, qualifier, and reference value types')
+vb_sparql.run_updates(fuseki, updates, mediatype='text/plain')
+print('update complete')
 
 # Insert the missing "truthy" statements from statement value statements
 query = '''
@@ -77,5 +88,5 @@ WHERE {
   '''
 #print(query)
 print ('updating truthy statements')
-response = requests.post(endpoint, headers={'Content-Type': 'application/sparql-update'}, data = namespaces + query)
+fuseki.sparqler.update(namespaces + query, mediatype='text/plain')
 print('done')
@@ -7,8 +7,8 @@
 # The input JSON is the same as that which is used for input by convert_json_to_metadata_schema.py and its format
 # is described at https://github.com/HeardLibrary/linked-data/blob/master/vanderbot/convert-config.md
 
-version = '1.2.0'
-created = '2023-01-11'
+version = '1.2.1'
+created = '2026-10-18'
 
 # Note: if the single value of an existing property changes to another single value, the script will replace the data
 # to be the current value without any comment. If this is not the desired behavior, the data should be checked for changes
@@ -24,21 +24,34 @@ created = '2023-01-11'
 # will be tried if config.yaml fails.
 # - Outfiles can have an OPTIONAL "ignore" column list. Column names on that list will be included
 # in the output JSON as columns with "suppressOutput" value of true.
+# -----------------------------------------
+# Version 1.2.1 change notes (2026-10-18)
+# - Existing tables and the item source CSV are read into columns of shared strings (vb_table.py, which must be in the same
+# directory as this script) instead of a list of dictionaries, which reduces the memory needed for large tables.
+# - Output and source files can be Parquet (.parquet) or Arrow IPC (.arrow, .feather) files instead of CSVs if pyarrow is
+# installed. Only the qid column of the item source file is read.
+# - Queries are sent through the shared connection pool of vb_sparql.py (which must be in the same directory as this
+# script), which keeps the connection to the Query Service open between queries. The results are extracted as they
+# arrive instead of loading the whole response into memory first.
+# - The Q IDs are sent in chunks (values_chunk_size). A chunk whose query times out or fails with a 5xx status is split in
+# half and sent again, and the chunk size that worked is remembered for the next run. Previously a timeout crashed the script.
 
 from pathlib import Path
-import requests
 from time import sleep
 import json
 import yaml
 import csv
 import os
 import sys # Read CLI arguments
+import vb_sparql # shared connection pool for SPARQL queries; must be in the same directory as this script
+import vb_table # holds CSV tables in memory as columns; must be in the same directory as this script
 
 # ----------------
 # Configuration settings
 # ----------------
 
 sparql_sleep = 0.1 # number of seconds to wait between queries to SPARQL endpoint
+values_chunk_size = 1000 # maximum number of Q IDs in the VALUES clause of a single query
 home = str(Path.home()) # gets path to home directory; supposed to work for both Win and Mac
 endpoint = 'https://query.wikidata.org/sparql'
 accept_media_type = 'application/json'
@@ -101,17 +114,15 @@ def read_plain_text(filename):
         text = file_object.read()
         return text
 
-# read from a CSV file into a list of dictionaries
-def read_dict(filename):
-    with open(filename, 'r', newline='', encoding='utf-8') as file_object:
-        dict_object = csv.DictReader(file_object)
-        array = []
-        for row in dict_object:
-            array.append(row)
-    return array
+# read from a CSV file into a table whose rows can be used like dictionaries
+def read_dict(filename, columns=None):
+    return vb_table.read_table(filename, columns)
 
-# write a list of dictionaries to a CSV file
+# write a list of dictionaries to a CSV file (or a Parquet or Arrow file, depending on the file name extension)
 def write_dicts_to_csv(table, filename, fieldnames):
+    if vb_table.table_format(filename) != vb_table.CSV_FORMAT:
+        vb_table.write_table(filename, vb_table.from_dicts(fieldnames, table), fieldnames)
+        return
     with open(filename, 'w', newline='', encoding='utf-8') as csv_file_object:
         writer = csv.DictWriter(csv_file_object, fieldnames=fieldnames)
         writer.writeheader()
@@ -352,7 +363,10 @@ def process_file(manage_descriptions, label_description_language_list, output_fi
     query += '''
       VALUES ?qid
     {
-    ''' + item_qids + '''
+    '''
+    # The Q IDs are sent in chunks (see below), so the query is built in two parts that go before and after them
+    query_head = query
+    query = '''
     }
     '''
     # made label and description optional since some don't have in English
@@ -371,33 +385,19 @@ def process_file(manage_descriptions, label_description_language_list, output_fi
     query += graph_pattern + '''
     }
     order by ?qid'''
+    query_tail = query
 
-    #print(query)
-
-    # ----------------
-    # send request to Wikidata Query Service
-    # ----------------
-
-    print('querying SPARQL endpoint to acquire item metadata')
-    response = requests.post(endpoint, data=query.encode('utf-8'), headers=requestheader)
-    # If there is an error message, the conversion to JSON will fail and the error message will be printed. There will then be an error because "data" isn't defined
-    try:
-        data = response.json()
-    except:
-        print(response.text)
+    def build_query(qid_chunk):
+        return query_head + '\n'.join(qid_chunk) + query_tail
 
-    # extract the values from the response JSON
-    results = data['results']['bindings']
-
-    print('done retrieving data')
-    #print(json.dumps(results, indent=2))
+    #print(build_query(item_qids))
 
     # ----------------
     # extract results
     # ----------------
 
-    metadata_list = []
-    for result in results:
+    # Converts one query result into a row of the table
+    def result_to_row(result):
         row_dict = {}
         row_dict['qid'] = extract_qnumber(result['qid']['value'])
 
@@ -528,8 +528,29 @@ def process_file(manage_descriptions, label_description_language_list, output_fi
                     else:
                         row_dict[property['variable'] + '_' + qualifier['variable']] = ''
 
-        metadata_list.append(row_dict)
+        return row_dict
+
+    # ----------------
+    # send request to Wikidata Query Service
+    # ----------------
+
+    # The results are extracted one at a time as they arrive, so a response never has to be in memory all at once.
+    def send_query(query):
+        return [result_to_row(result) for result in vb_sparql.iter_results(endpoint, query.encode('utf-8'), requestheader)]
+
+    # A query with thousands of Q IDs in the VALUES clause can time out, so the Q IDs are sent in chunks. A chunk whose
+    # query times out or fails with a 5xx status is split in half and sent again. The chunk size that worked is
+    # remembered for the next run (see vb_sparql.run_values_query()).
+    print('querying SPARQL endpoint to acquire item metadata')
+    try:
+        metadata_list = vb_sparql.run_values_query(item_qids, build_query, send_query, chunk_size=values_chunk_size, sleep_time=sparql_sleep, 
+            template='acquire_wikidata_metadata ' + output_file_name + ' ' + endpoint)
+    except vb_sparql.SparqlError as error:
+        print('Could not retrieve data:', error)
+        print('data not written to file', output_file_name)
+        return
 
+    print('done retrieving data')
     #print(json.dumps(metadata_list, indent=2))
 
     # ----------------
@@ -708,32 +729,26 @@ if item_source_csv == '':
 
     # send request to Wikidata Query Service
     print('querying SPARQL endpoint to acquire item QIDs')
-    response = requests.post(endpoint, data=item_query.encode('utf-8'), headers=requestheader)
-    #print(response.text)
-    data = response.json()
+    # Create VALUES list for items from the results as they arrive
+    item_qids = []
+    try:
+        for item in vb_sparql.iter_results(endpoint, item_query.encode('utf-8'), requestheader):
+            item_qids.append('wd:' + extract_qnumber(item['qid']['value']))
+    except vb_sparql.SparqlError as error:
+        print('Could not retrieve item QIDs:', error)
+        sys.exit(1)
     print('results returned')
-
-    # extract the values from the response JSON
-    items = data['results']['bindings']
-    #print(items)
-    
-    # Create VALUES list for items
-    item_qids = ''
-    for item in items:
-        item_qids += 'wd:' + extract_qnumber(item['qid']['value']) + '\n'
 else:
     # Load item data from csv
     print('loading item data from file')
     filename = data_path + item_source_csv
-    items = read_dict(filename)
+    items = read_dict(filename, ['qid'])
     print('done loading')
 
     # Create VALUES list for items
-    item_qids = ''
+    item_qids = []
     for item in items:
-        item_qids += 'wd:' + item['qid'] + '\n'
-# remove trailing newline
-item_qids = item_qids[:len(item_qids)-1]
+        item_qids.append('wd:' + item['qid'])
 print()
 
 #print(item_qids)
@@ -0,0 +1,295 @@
+# benchmark_label_index.py
+# (c) 2026 Vanderbilt University. This program is released under a GNU General Public License v3.0 http://www.gnu.org/licenses/gpl-3.0
+# Author: Steve Baskauf
+
+# Benchmark for the setup that vanderbot.py does before writing: loading the schema and the table, downloading the
+# existing labels, descriptions, and aliases from the Query Service, indexing them by Q ID, and matching them to the rows
+# of the table. A synthetic metadata description file, table, and canned query results are generated in a temporary
+# directory, and the queries are answered by a local HTTP server with the canned results, so no network access is
+# needed. The downloads are made by searchLabelsDescriptionsAtWikidata() in vanderbot.py, so they are chunked and sent
+# as they would be in a real run. The time for each phase and the end-to-end time are reported, with matching as one of
+# the phases. The original nested loop matching is timed on a subset of the rows (it scales with rows x results, so it's
+# impractical on a full table) and its output is compared with the indexed output for that subset.
+
+version = '1.1.0'
+created = '2026-10-18'
+
+import sys # Read CLI arguments
+import os
+import csv
+import json
+import random
+import re
+import shutil
+import tempfile
+import threading
+import time
+import urllib.parse
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import vanderbot # must be in the same directory as this script
+import vb_labels # must be in the same directory as this script
+import vb_schema # must be in the same directory as this script
+import vb_sparql # must be in the same directory as this script
+import vb_table # must be in the same directory as this script
+
+# ----------------
+# Configuration section
+# ----------------
+
+# Set default values
+number_rows = 100000
+number_languages = 3
+legacy_rows = 2000 # number of rows to use for timing the original nested loop; set to 0 to skip
+random_seed = 42
+
+arg_vals = sys.argv[1:]
+# see https://www.gnu.org/prep/standards/html_node/_002d_002dversion.html
+if '--version' in arg_vals or '-V' in arg_vals: # provide version information according to GNU standards
+    print('Label index benchmark', version)
+    print('Copyright ©', created[:4], 'Vanderbilt University')
+    print('License GNU GPL version 3.0 <http://www.gnu.org/licenses/gpl-3.0>')
+    print('This is free software: you are free to change and redistribute it.')
+    print('There is NO WARRANTY, to the extent permitted by law.')
+    print('Author: Steve Baskauf')
+    print('Revision date:', created)
+    sys.exit()
+
+if '--help' in arg_vals or '-H' in arg_vals: # provide help information according to GNU standards
+    print('Options: --rows (-R) number of table rows, --lang (-L) number of languages, --legacy (-G) rows for the nested loop comparison')
+    print('Report bugs to: steve.baskauf@vanderbilt.edu')
+    sys.exit()
+
+# Code from https://realpython.com/python-command-line-arguments/#a-few-methods-for-parsing-python-command-line-arguments
+opts = [opt for opt in arg_vals if opt.startswith('-')]
+args = [arg for arg in arg_vals if not arg.startswith('-')]
+
+if '--rows' in opts: #  number of rows in the synthetic table
+    number_rows = int(args[opts.index('--rows')])
+if '-R' in opts:
+    number_rows = int(args[opts.index('-R')])
+
+if '--lang' in opts: #  number of languages to process
+    number_languages = int(args[opts.index('--lang')])
+if '-L' in opts:
+    number_languages = int(args[opts.index('-L')])
+
+if '--legacy' in opts: #  number of rows used to time the original nested loop
+    legacy_rows = int(args[opts.index('--legacy')])
+if '-G' in opts:
+    legacy_rows = int(args[opts.index('-G')])
+
+subject_column = 'qid'
+table_file_name = 'benchmark_table.csv'
+metadata_file_name = 'benchmark-csv-metadata.json'
+string_types = ['label', 'description', 'alias']
+predicates = {'rdfs:label': 'label', 'schema:description': 'description', 'skos:altLabel': 'alias'}
+
+# ----------------
+# Function definitions
+# ----------------
+
+def generate_table(number_rows):
+    """Generate table rows, about a tenth of which are for items that don't yet exist (empty Q ID)."""
+    table_data = []
+    for row_number in range(number_rows):
+        if random.random() < 0.1:
+            table_data.append({subject_column: ''})
+        else:
+            table_data.append({subject_column: 'Q' + str(1000000 + row_number)})
+    return table_data
+
+def generate_metadata(languages):
+    """Generate a metadata description file with label, description, and alias columns for each language."""
+    about_url = 'http://www.wikidata.org/entity/{' + subject_column + '}'
+    columns = [{'titles': subject_column, 'name': subject_column, 'datatype': 'string', 'suppressOutput': True}]
+    for language in languages:
+        columns.append({'titles': 'label_' + language, 'name': 'label_' + language, 'datatype': 'string', 'aboutUrl': about_url, 'propertyUrl': 'rdfs:label', 'lang': language})
+        columns.append({'titles': 'description_' + language, 'name': 'description_' + language, 'datatype': 'string', 'aboutUrl': about_url, 'propertyUrl': 'schema:description', 'lang': language})
+        # The alias column must be named exactly "alias" and have output suppressed (see vb_schema.py)
+        columns.append({'titles': 'alias_' + language, 'name': 'alias', 'datatype': 'string', 'aboutUrl': about_url, 'propertyUrl': 'skos:altLabel', 'lang': language, 'suppressOutput': True})
+    return {
+        '@type': 'TableGroup',
+        '@context': 'http://www.w3.org/ns/csvw',
+        'tables': [{'url': table_file_name, 'tableSchema': {'columns': columns}}]
+        }
+
+def write_table(table_data, languages):
+    """Write the table as a CSV with empty label, description, and alias columns."""
+    fieldnames = [subject_column]
+    for language in languages:
+        fieldnames += ['label_' + language, 'description_' + language, 'alias_' + language]
+    with open(table_file_name, 'wt', newline='', encoding='utf-8') as file_object:
+        writer = csv.DictWriter(file_object, fieldnames=fieldnames, restval='')
+        writer.writeheader()
+        writer.writerows(table_data)
+
+def generate_query_results(table_data, string_type, language):
+    """Generate results in the form returned by searchLabelsDescriptionsAtWikidata() for the items in the table.
+
+    About 5% of items are missing from the results. Aliases have from 0 to 3 values per item. Results are shuffled
+    as they would be when returned from the Query Service.
+    """
+    results = []
+    for row in table_data:
+        if row[subject_column] == '' or random.random() < 0.05:
+            continue
+        if string_type == 'alias':
+            number_strings = random.randint(0, 3)
+        else:
+            number_strings = 1
+        for string_number in range(number_strings):
+            results.append({'qId': row[subject_column], 'string': string_type + ' ' + str(string_number) + ' ' + row[subject_column] + '@' + language})
+    random.shuffle(results)
+    return results
+
+class CannedQueryHandler(BaseHTTPRequestHandler):
+    """Answer the label, description, and alias queries of searchLabelsDescriptionsAtWikidata() from canned_index."""
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0))).decode('utf-8')
+        query = urllib.parse.parse_qs(body)['query'][0]
+        string_type = [predicates[predicate] for predicate in predicates if '?id ' + predicate + ' ' in query][0]
+        language = re.search(r'lang\(\?string\)="([^"]*)"', query).group(1)
+        index = canned_index[(string_type, language)]
+        bindings = []
+        for qid in re.findall(r'wd:(Q[0-9]+)', query):
+            for string in index.get(qid, []):
+                bindings.append({'id': {'type': 'uri', 'value': 'http://www.wikidata.org/entity/' + qid}, 'string': {'type': 'literal', 'xml:lang': language, 'value': string}})
+        content = json.dumps({'head': {'vars': ['id', 'string']}, 'results': {'bindings': bindings}}).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/sparql-results+json')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        pass # don't print a line for every query
+
+def legacy_first_match(table_data, query_results):
+    """Original label and description matching code from vanderbot.py"""
+    temp_labels = []
+    for entity_index in range(0, len(table_data)):
+        found = False
+        if table_data[entity_index][subject_column] != '':
+            for wiki_label in query_results:
+                if table_data[entity_index][subject_column] == wiki_label['qId']:
+                    found = True
+                    temp_labels.append(wiki_label['string'])
+                    break
+        if not found:
+            temp_labels.append('')
+    return temp_labels
+
+def legacy_all_matches(table_data, query_results):
+    """Original alias matching code from vanderbot.py"""
+    language_aliases = []
+    for entity_index in range(0, len(table_data)):
+        person_alias_list = []
+        if table_data[entity_index][subject_column] != '':
+            for wiki_label in query_results:
+                if table_data[entity_index][subject_column] == wiki_label['qId']:
+                    person_alias_list.append(wiki_label['string'])
+        language_aliases.append(person_alias_list)
+    return language_aliases
+
+# ----------------
+# Main routine
+# ----------------
+
+random.seed(random_seed)
+languages = ['en', 'es', 'fr', 'de', 'nl', 'it', 'ja', 'zh'][:number_languages]
+
+print('Generating table with', number_rows, 'rows and canned query results for', len(languages), 'languages')
+table_data = generate_table(number_rows)
+canned_results = {}
+canned_index = {}
+for language in languages:
+    for string_type in string_types:
+        canned_results[(string_type, language)] = generate_query_results(table_data, string_type, language)
+        canned_index[(string_type, language)] = vb_labels.index_by_qid(canned_results[(string_type, language)])
+
+working_directory = tempfile.mkdtemp(prefix='label-index-benchmark-')
+os.chdir(working_directory) # the table URL in the metadata description is relative to the working directory
+with open(metadata_file_name, 'wt', encoding='utf-8') as file_object:
+    json.dump(generate_metadata(languages), file_object, indent=2)
+write_table(table_data, languages)
+server = ThreadingHTTPServer(('127.0.0.1', 0), CannedQueryHandler)
+threading.Thread(target=server.serve_forever, daemon=True).start()
+
+# The settings that run() would give vanderbot.py. The chunk sizes are saved in the working directory rather than
+# with those of real runs.
+vanderbot.endpoint = 'http://127.0.0.1:' + str(server.server_address[1]) + '/sparql'
+vanderbot.DOMAIN_NAME = 'http://www.wikidata.org'
+vanderbot.values_chunk_size = vanderbot.DEFAULT_CONFIG['values_chunk_size']
+vanderbot.sparql_workers = vanderbot.DEFAULT_CONFIG['sparql_workers']
+vanderbot.sparqlSleep = 0
+vb_sparql.chunk_size_memory = vb_sparql.ChunkSizeMemory(os.path.join(working_directory, 'values_chunk_sizes.json'))
+
+phases = {'schema': 0.0, 'table': 0.0, 'download': 0.0, 'index': 0.0, 'match': 0.0}
+total_start_time = time.perf_counter()
+start_time = time.perf_counter()
+table_plan = vb_schema.load_plans(metadata_file_name, True)[0]
+phases['schema'] = time.perf_counter() - start_time
+
+start_time = time.perf_counter()
+table = vb_table.read_table(table_file_name)
+qIds = [row[subject_column] for row in table if row[subject_column] != '']
+phases['table'] = time.perf_counter() - start_time
+
+columns = [('alias', column[1]) for column in table_plan.alias_columns]
+columns += [('label', column[1]) for column in table_plan.label_columns]
+columns += [('description', column[1]) for column in table_plan.description_columns]
+downloaded = {}
+for string_type, language in columns:
+    start_time = time.perf_counter()
+    query_results = vanderbot.searchLabelsDescriptionsAtWikidata(qIds, string_type, language)
+    download_elapsed = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    index = vb_labels.index_by_qid(query_results)
+    index_elapsed = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    aligned = vb_labels.align_with_rows(table, subject_column, index, string_type != 'alias')
+    match_elapsed = time.perf_counter() - start_time
+
+    phases['download'] += download_elapsed
+    phases['index'] += index_elapsed
+    phases['match'] += match_elapsed
+    downloaded[(string_type, language)] = query_results
+    print(string_type, language, len(query_results), 'results', 'download:', round(download_elapsed, 4), 's', 'index:', round(index_elapsed, 4), 's', 'match:', round(match_elapsed, 4), 's')
+total_elapsed = time.perf_counter() - total_start_time
+
+server.shutdown()
+for (string_type, language), query_results in downloaded.items(): # checked after the timing, since it's slow
+    if sorted(map(json.dumps, query_results)) != sorted(map(json.dumps, canned_results[(string_type, language)])):
+        print('ERROR: downloaded results differ from the canned results for', string_type, language)
+os.chdir(os.path.dirname(os.path.abspath(__file__)))
+shutil.rmtree(working_directory)
+
+print('End-to-end setup time:', round(total_elapsed, 3), 's')
+print('  phases (s):', ', '.join([phase + ' ' + str(round(seconds, 3)) for phase, seconds in phases.items()]))
+print('  matching with the index:', round(phases['match'], 3), 's (' + str(round(100 * phases['match'] / total_elapsed, 1)) + '% of the setup)')
+
+if legacy_rows > 0:
+    # Use a subset of the rows and only the results for those rows so that the comparison is like-for-like
+    subset = table_data[:legacy_rows]
+    subset_ids = set([row[subject_column] for row in subset])
+    print()
+    print('Nested loop comparison on', len(subset), 'rows')
+    for string_type in string_types:
+        query_results = [result for result in canned_results[(string_type, languages[0])] if result['qId'] in subset_ids]
+
+        start_time = time.perf_counter()
+        if string_type == 'alias':
+            legacy = legacy_all_matches(subset, query_results)
+        else:
+            legacy = legacy_first_match(subset, query_results)
+        legacy_elapsed = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        indexed = vb_labels.align_with_rows(subset, subject_column, vb_labels.index_by_qid(query_results), string_type != 'alias')
+        indexed_elapsed = time.perf_counter() - start_time
+
+        if legacy != indexed:
+            print('ERROR: indexed output differs from nested loop output for', string_type)
+        print(string_type, 'nested loop:', round(legacy_elapsed, 4), 's', 'indexed:', round(indexed_elapsed, 4), 's')
@@ -0,0 +1,325 @@
+# benchmark_vanderbot.py
+# (c) 2026 Vanderbilt University. This program is released under a GNU General Public License v3.0 http://www.gnu.org/licenses/gpl-3.0
+# Author: Steve Baskauf
+
+# End-to-end throughput benchmark for vanderbot.py. For each table size, a synthetic CSV table and metadata description
+# file are generated in a temporary directory, a local stand-in for the Wikibase API (mock_wikibase.py) is started, and
+# vanderbot.py is run against it as it would be run from the command line. Optionally, vanderdeletebot.py is then run to
+# delete one of the statements that were written.
+#
+# Most of the rows are for new items. A fraction of the rows (--existing option) are for items that already exist in the
+# stand-in Wikibase, so that the path for adding statements to existing items is also exercised.
+#
+# Since the scripts being timed are run as separate processes, the time spent in each phase is worked out from the
+# requests received by the stand-in server:
+#   startup - from launching the script to its first API request (imports, reading the credentials)
+#   login - getting the login and CSRF tokens, or checking the session cookies saved by the previous script
+#   prepare - from login to the first write (reading the schema and the table, Query Service checks)
+#   write - from the first write to the end of the last write
+#   finish - from the end of the last write to the end of the script (saving the table)
+# POST latency is the time the server took to answer each write, which includes any latency injected with --latency.
+# Client time is the time between the end of one write and the start of the next one, i.e. the time the script spends
+# on each row when it isn't waiting for the API.
+#
+# NOTE: vanderbot.py is run with --apisleep 0, which removes the rate limit for Wikibase instances other than Wikidata
+# and Commons. Never do that with a real Wikibase unless you control it.
+
+version = '1.0.0'
+created = '2026-10-18'
+
+import sys # Read CLI arguments
+import os
+import csv
+import json
+import time
+import random
+import shutil
+import tempfile
+import subprocess
+import mock_wikibase # must be in the same directory as this script
+
+# ----------------
+# Configuration section
+# ----------------
+
+# Set default values
+table_sizes = [1000, 10000, 100000]
+existing_fraction = 0.1 # fraction of rows for items that already exist
+latency = 0.0 # seconds added by the server to each API request
+jitter = 0.0 # maximum random seconds added to the latency
+maxlag_rate = 0.0 # fraction of writes that fail with a maxlag error
+delete_string = 'false' # true runs vanderdeletebot.py after vanderbot.py
+output_path = '' # file to which the results are written as JSON
+keep_string = 'false' # true keeps the temporary directories with the tables and logs
+random_seed = 42
+
+arg_vals = sys.argv[1:]
+# see https://www.gnu.org/prep/standards/html_node/_002d_002dversion.html
+if '--version' in arg_vals or '-V' in arg_vals: # provide version information according to GNU standards
+    print('VanderBot throughput benchmark', version)
+    print('Copyright ©', created[:4], 'Vanderbilt University')
+    print('License GNU GPL version 3.0 <http://www.gnu.org/licenses/gpl-3.0>')
+    print('This is free software: you are free to change and redistribute it.')
+    print('There is NO WARRANTY, to the extent permitted by law.')
+    print('Author: Steve Baskauf')
+    print('Revision date:', created)
+    sys.exit()
+
+if '--help' in arg_vals or '-H' in arg_vals: # provide help information according to GNU standards
+    print('Options: --rows (-R) comma-separated table sizes, --existing (-X) fraction of rows for existing items,')
+    print('--latency (-L) seconds added to each API request, --jitter (-J) maximum random seconds added,')
+    print('--maxlag (-M) fraction of writes failing with maxlag, --delete (-D) true to also time vanderdeletebot.py,')
+    print('--output (-O) JSON file for the results, --keep (-K) true to keep the working directories')
+    print('Report bugs to: steve.baskauf@vanderbilt.edu')
+    sys.exit()
+
+# Code from https://realpython.com/python-command-line-arguments/#a-few-methods-for-parsing-python-command-line-arguments
+opts = [opt for opt in arg_vals if opt.startswith('-')]
+args = [arg for arg in arg_vals if not arg.startswith('-')]
+
+if '--rows' in opts: # comma-separated list of table sizes
+    table_sizes = [int(size) for size in args[opts.index('--rows')].split(',')]
+if '-R' in opts:
+    table_sizes = [int(size) for size in args[opts.index('-R')].split(',')]
+
+if '--existing' in opts: # fraction of rows for items that already exist
+    existing_fraction = float(args[opts.index('--existing')])
+if '-X' in opts:
+    existing_fraction = float(args[opts.index('-X')])
+
+if '--latency' in opts: # seconds added by the server to each API request
+    latency = float(args[opts.index('--latency')])
+if '-L' in opts:
+    latency = float(args[opts.index('-L')])
+
+if '--jitter' in opts: # maximum random seconds added to the latency
+    jitter = float(args[opts.index('--jitter')])
+if '-J' in opts:
+    jitter = float(args[opts.index('-J')])
+
+if '--maxlag' in opts: # fraction of writes that fail with a maxlag error
+    maxlag_rate = float(args[opts.index('--maxlag')])
+if '-M' in opts:
+    maxlag_rate = float(args[opts.index('-M')])
+
+if '--delete' in opts: # also time vanderdeletebot.py
+    delete_string = args[opts.index('--delete')]
+if '-D' in opts:
+    delete_string = args[opts.index('-D')]
+
+if '--output' in opts: # file to which the results are written as JSON
+    output_path = args[opts.index('--output')]
+if '-O' in opts:
+    output_path = args[opts.index('-O')]
+
+if '--keep' in opts: # keep the working directories
+    keep_string = args[opts.index('--keep')]
+if '-K' in opts:
+    keep_string = args[opts.index('-K')]
+
+script_directory = os.path.dirname(os.path.abspath(__file__))
+table_file_name = 'benchmark-items.csv'
+metadata_file_name = 'csv-metadata.json'
+credentials_file_name = 'wikibase_credentials.txt'
+
+# ----------------
+# Function definitions
+# ----------------
+
+def statement_columns(base_name, property_id, value_url, references):
+    """Generate the csv-metadata.json column descriptions for a statement, in the form made by acquire_wikidata_metadata.py.
+
+    references is a list of (reference property name, property ID, kind), where kind is 'url' or 'date'.
+    """
+    entity = 'http://www.wikidata.org/entity/'
+    columns = [
+        {'titles': base_name + '_uuid', 'name': base_name + '_uuid', 'datatype': 'string', 'aboutUrl': entity + '{qid}', 'propertyUrl': 'http://www.wikidata.org/prop/' + property_id, 'valueUrl': entity + 'statement/{qid}-{' + base_name + '_uuid}'}
+        ]
+    value_column = {'titles': base_name, 'name': base_name, 'datatype': 'string', 'aboutUrl': entity + 'statement/{qid}-{' + base_name + '_uuid}', 'propertyUrl': 'http://www.wikidata.org/prop/statement/' + property_id}
+    if value_url:
+        value_column['valueUrl'] = entity + '{' + base_name + '}'
+    columns.append(value_column)
+    if len(references) > 0:
+        hash_column = base_name + '_ref1_hash'
+        columns.append({'titles': hash_column, 'name': hash_column, 'datatype': 'string', 'aboutUrl': entity + 'statement/{qid}-{' + base_name + '_uuid}', 'propertyUrl': 'prov:wasDerivedFrom', 'valueUrl': 'http://www.wikidata.org/reference/{' + hash_column + '}'})
+        for reference_name, reference_property, kind in references:
+            column_name = base_name + '_ref1_' + reference_name
+            if kind == 'url':
+                columns.append({'titles': column_name, 'name': column_name, 'datatype': 'string', 'aboutUrl': 'http://www.wikidata.org/reference/{' + hash_column + '}', 'propertyUrl': 'http://www.wikidata.org/prop/reference/' + reference_property, 'valueUrl': '{+' + column_name + '}'})
+            else:
+                columns.append({'titles': column_name + '_nodeId', 'name': column_name + '_nodeId', 'datatype': 'string', 'aboutUrl': 'http://www.wikidata.org/reference/{' + hash_column + '}', 'propertyUrl': 'http://www.wikidata.org/prop/reference/value/' + reference_property, 'valueUrl': 'http://example.com/.well-known/genid/{' + column_name + '_nodeId}'})
+                columns.append({'titles': column_name + '_val', 'name': column_name + '_val', 'datatype': 'dateTime', 'aboutUrl': 'http://example.com/.well-known/genid/{' + column_name + '_nodeId}', 'propertyUrl': 'http://wikiba.se/ontology#timeValue'})
+                columns.append({'titles': column_name + '_prec', 'name': column_name + '_prec', 'datatype': 'integer', 'aboutUrl': 'http://example.com/.well-known/genid/{' + column_name + '_nodeId}', 'propertyUrl': 'http://wikiba.se/ontology#timePrecision'})
+    return columns
+
+def generate_metadata():
+    """Generate a metadata description file for a table of people with a label, description, and three statements."""
+    columns = [
+        {'titles': 'qid', 'name': 'qid', 'datatype': 'string', 'suppressOutput': True},
+        {'titles': 'label_en', 'name': 'label_en', 'datatype': 'string', 'aboutUrl': 'http://www.wikidata.org/entity/{qid}', 'propertyUrl': 'rdfs:label', 'lang': 'en'},
+        {'titles': 'description_en', 'name': 'description_en', 'datatype': 'string', 'aboutUrl': 'http://www.wikidata.org/entity/{qid}', 'propertyUrl': 'schema:description', 'lang': 'en'}
+        ]
+    columns += statement_columns('instance_of', 'P31', True, [])
+    columns += statement_columns('orcid', 'P496', False, [('retrieved', 'P813', 'date')])
+    columns += statement_columns('employer', 'P108', True, [('reference_url', 'P854', 'url'), ('retrieved', 'P813', 'date')])
+    return {
+        '@type': 'TableGroup',
+        '@context': 'http://www.w3.org/ns/csvw',
+        'tables': [{'url': table_file_name, 'tableSchema': {'columns': columns}}]
+        }
+
+def generate_table(number_rows, existing_ids):
+    """Generate the rows of the table. Rows for existing items are given the Q IDs in existing_ids."""
+    rows = []
+    for row_number in range(number_rows):
+        row = {
+            'qid': '',
+            'label_en': 'Benchmark Person ' + str(row_number),
+            'description_en': 'synthetic person ' + str(row_number) + ' for the VanderBot benchmark',
+            'instance_of': 'Q5',
+            'orcid': '0000-0002-' + str(1000 + row_number // 10000 % 9000) + '-' + str(1000 + row_number % 9000),
+            'orcid_ref1_retrieved_val': '2026-10-18',
+            'employer': random.choice(['Q29052', 'Q49088', 'Q13371']),
+            'employer_ref1_reference_url': 'https://example.org/people/' + str(row_number),
+            'employer_ref1_retrieved_val': '2026-10-18'
+            }
+        if row_number < len(existing_ids):
+            row['qid'] = existing_ids[row_number]
+        rows.append(row)
+    random.shuffle(rows)
+    return rows
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a list of numbers."""
+    if len(values) == 0:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(0, min(len(ordered) - 1, int(round(fraction * len(ordered))) - 1))]
+
+def analyze(log, launch_time, exit_time, write_actions):
+    """Work out the phase times and latencies from the server's request log for one script run."""
+    requests = [entry for entry in log if launch_time <= entry['start'] <= exit_time]
+    writes = [entry for entry in requests if entry['action'] in write_actions]
+    login = [entry for entry in requests if entry['action'] in ['query', 'login']]
+    sparql = [entry for entry in requests if entry['action'] == 'sparql']
+    results = {'requests': len(requests), 'writes': len(writes), 'sparql_queries': len(sparql), 'sparql_time': round(sum([entry['duration'] for entry in sparql]), 3)}
+    if len(requests) == 0:
+        return results
+    first_request = requests[0]['start']
+    login_end = max([entry['start'] + entry['duration'] for entry in login]) if len(login) > 0 else first_request
+    if len(writes) > 0:
+        first_write = writes[0]['start']
+        last_write_end = writes[-1]['start'] + writes[-1]['duration']
+    else:
+        first_write = last_write_end = login_end
+    results['phases'] = {
+        'startup': round(first_request - launch_time, 3),
+        'login': round(login_end - first_request, 3),
+        'prepare': round(first_write - login_end, 3),
+        'write': round(last_write_end - first_write, 3),
+        'finish': round(exit_time - last_write_end, 3)
+        }
+    latencies = [entry['duration'] for entry in writes]
+    gaps = [writes[index]['start'] - (writes[index - 1]['start'] + writes[index - 1]['duration']) for index in range(1, len(writes))]
+    results['post_latency'] = {'p50': round(percentile(latencies, 0.5) * 1000, 2), 'p99': round(percentile(latencies, 0.99) * 1000, 2)}
+    results['client_time'] = {'p50': round(percentile(gaps, 0.5) * 1000, 2), 'p99': round(percentile(gaps, 0.99) * 1000, 2)}
+    results['maxlag_errors'] = len([entry for entry in writes if entry['error'] == 'maxlag'])
+    return results
+
+def run_script(arguments, working_directory):
+    """Run a script from this directory as a separate process and return the times it started and ended and its exit code."""
+    # The benchmark directory is used as the home directory, so that the session cookies of the stand-in server are saved
+    # there instead of with the user's own (see vb_session.py)
+    environment = dict(os.environ, HOME=working_directory, USERPROFILE=working_directory)
+    launch_time = time.monotonic()
+    completed = subprocess.run([sys.executable, os.path.join(script_directory, arguments[0])] + arguments[1:], cwd=working_directory, env=environment, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    exit_time = time.monotonic()
+    if completed.returncode != 0:
+        print(completed.stderr.decode('utf-8', errors='replace'))
+    return launch_time, exit_time, completed.returncode
+
+def print_results(label, results):
+    print(label)
+    if results['exit_code'] != 0:
+        print('  WARNING: the script stopped with exit code', results['exit_code'])
+    print('  total', results['total_time'], 's,', results['rows_per_second'], 'rows/s,', results['writes'], 'writes,', results['requests'], 'requests')
+    if 'phases' in results:
+        print('  phases (s):', ', '.join([phase + ' ' + str(seconds) for phase, seconds in results['phases'].items()]))
+        print('  POST latency (ms): p50', results['post_latency']['p50'], 'p99', results['post_latency']['p99'])
+        print('  client time between writes (ms): p50', results['client_time']['p50'], 'p99', results['client_time']['p99'])
+    if results.get('maxlag_errors', 0) > 0:
+        print('  maxlag errors:', results['maxlag_errors'])
+    print('  Query Service:', results['sparql_queries'], 'queries,', results['sparql_time'], 's')
+
+def benchmark(number_rows):
+    """Run the benchmark for one table size and return the results as a dictionary."""
+    working_directory = tempfile.mkdtemp(prefix='vanderbot-benchmark-')
+    wikibase = mock_wikibase.MockWikibase(latency=latency, jitter=jitter, maxlag_rate=maxlag_rate, seed=random_seed)
+    server = mock_wikibase.start_server(wikibase)
+    base_url = 'http://127.0.0.1:' + str(server.server_address[1])
+
+    existing_ids = [wikibase.add_entity('item', {'en': 'Benchmark Person ' + str(row_number)}) for row_number in range(int(number_rows * existing_fraction))]
+    table_data = generate_table(number_rows, existing_ids)
+    fieldnames = []
+    for column in generate_metadata()['tables'][0]['tableSchema']['columns']:
+        fieldnames.append(column['name'])
+    with open(os.path.join(working_directory, table_file_name), 'w', newline='', encoding='utf-8') as file_object:
+        writer = csv.DictWriter(file_object, fieldnames=fieldnames, restval='')
+        writer.writeheader()
+        writer.writerows(table_data)
+    with open(os.path.join(working_directory, metadata_file_name), 'w', encoding='utf-8') as file_object:
+        json.dump(generate_metadata(), file_object, indent=2)
+    with open(os.path.join(working_directory, credentials_file_name), 'w', encoding='utf-8') as file_object:
+        file_object.write('endpointUrl=' + base_url + '\nusername=Benchmark@bot\npassword=not-a-real-password\n')
+
+    run_results = {'rows': number_rows, 'existing_rows': len(existing_ids), 'directory': working_directory}
+    print('Running vanderbot.py on', number_rows, 'rows in', working_directory)
+    launch_time, exit_time, return_code = run_script(['vanderbot.py', '--path', 'working', '--credentials', credentials_file_name, '--json', metadata_file_name, '--endpoint', base_url + mock_wikibase.SPARQL_PATH, '--apisleep', '0', '--terse', 'true', '--log', 'vanderbot_log.txt'], working_directory)
+    results = analyze(wikibase.log, launch_time, exit_time, ['wbeditentity', 'wbsetreference'])
+    results['exit_code'] = return_code
+    results['total_time'] = round(exit_time - launch_time, 3)
+    results['rows_per_second'] = round(number_rows / (exit_time - launch_time), 1)
+
+    # Check that every row was written
+    with open(os.path.join(working_directory, table_file_name), 'r', newline='', encoding='utf-8') as file_object:
+        written = list(csv.DictReader(file_object))
+    results['rows_written'] = len([row for row in written if row['qid'] != '' and row['instance_of_uuid'] != '' and row['employer_ref1_hash'] != ''])
+    run_results['vanderbot'] = results
+    print_results('vanderbot.py', results)
+    if results['rows_written'] != number_rows:
+        print('  WARNING: only', results['rows_written'], 'of', number_rows, 'rows were completely written')
+
+    if delete_string == 'true':
+        with open(os.path.join(working_directory, 'deletions.csv'), 'w', newline='', encoding='utf-8') as file_object:
+            writer = csv.writer(file_object)
+            writer.writerow(['qid', 'instance_of_uuid'])
+            for row in written:
+                writer.writerow([row['qid'], row['instance_of_uuid']])
+        launch_time, exit_time, return_code = run_script(['vanderdeletebot.py', '--path', 'working', '--credentials', credentials_file_name, '--file', 'deletions.csv', '--name', 'instance_of_uuid', '--apisleep', '0', '--log', 'vanderdeletebot_log.txt'], working_directory)
+        results = analyze(wikibase.log, launch_time, exit_time, ['wbremoveclaims'])
+        results['exit_code'] = return_code
+        results['total_time'] = round(exit_time - launch_time, 3)
+        results['rows_per_second'] = round(number_rows / (exit_time - launch_time), 1)
+        run_results['vanderdeletebot'] = results
+        print_results('vanderdeletebot.py', results)
+
+    server.shutdown()
+    server.server_close()
+    if keep_string != 'true':
+        shutil.rmtree(working_directory)
+    print()
+    return run_results
+
+# ----------------
+# Main routine
+# ----------------
+
+random.seed(random_seed)
+all_results = []
+for number_rows in table_sizes:
+    all_results.append(benchmark(number_rows))
+
+if output_path != '':
+    with open(output_path, 'w', encoding='utf-8') as file_object:
+        json.dump({'version': version, 'latency': latency, 'jitter': jitter, 'maxlag_rate': maxlag_rate, 'existing_fraction': existing_fraction, 'results': all_results}, file_object, indent=2)
+    print('Results written to', output_path)
@@ -0,0 +1,67 @@
+# convert_table.py, a script for converting VanderBot tables between CSV, Parquet, and Arrow IPC (Feather) files.
+# (c) 2026 Vanderbilt University. This program is released under a GNU General Public License v3.0 http://www.gnu.org/licenses/gpl-3.0
+# Author: Steve Baskauf
+# For more information, see https://github.com/HeardLibrary/linked-data/tree/master/vanderbot
+
+# Large tables load much faster from Parquet or Arrow files, but those can't be edited in a spreadsheet. This script
+# exports a table to CSV for editing and converts the edited CSV back. The format of each file is determined by the
+# file name extension: .parquet or .pq for Parquet, .arrow, .feather, or .ipc for Arrow IPC, anything else for CSV.
+# Parquet and Arrow files require the pyarrow package.
+#
+# Usage: python convert_table.py --input works.parquet --output works.csv
+# Use --columns with a comma-separated list of column headers to copy only some of the columns.
+
+version = '1.0.0'
+created = '2026-10-18'
+
+import sys # Read CLI arguments
+import vb_table # reads and writes tables in each format; must be in the same directory as this script
+
+input_path = ''
+output_path = ''
+columns = None
+
+arg_vals = sys.argv[1:]
+# see https://www.gnu.org/prep/standards/html_node/_002d_002dversion.html
+if '--version' in arg_vals or '-V' in arg_vals: # provide version information according to GNU standards
+    print('Convert table', version)
+    print('Copyright ©', created[:4], 'Vanderbilt University')
+    print('License GNU GPL version 3.0 <http://www.gnu.org/licenses/gpl-3.0>')
+    print('This is free software: you are free to change and redistribute it.')
+    print('There is NO WARRANTY, to the extent permitted by law.')
+    print('Author: Steve Baskauf')
+    print('Revision date:', created)
+    sys.exit()
+
+if '--help' in arg_vals or '-H' in arg_vals: # provide help information according to GNU standards
+    print('Usage: python convert_table.py --input FILE --output FILE [--columns HEADER,HEADER,...]')
+    print('For help, see the documentation page at https://github.com/HeardLibrary/linked-data/blob/master/vanderbot/README.md')
+    print('Report bugs to: steve.baskauf@vanderbilt.edu')
+    sys.exit()
+
+# Code from https://realpython.com/python-command-line-arguments/#a-few-methods-for-parsing-python-command-line-arguments
+opts = [opt for opt in arg_vals if opt.startswith('-')]
+args = [arg for arg in arg_vals if not arg.startswith('-')]
+
+if '--input' in opts: # table to be converted
+    input_path = args[opts.index('--input')]
+if '-I' in opts:
+    input_path = args[opts.index('-I')]
+
+if '--output' in opts: # converted table; an existing file is replaced
+    output_path = args[opts.index('--output')]
+if '-O' in opts:
+    output_path = args[opts.index('-O')]
+
+if '--columns' in opts: # copy only these columns
+    columns = args[opts.index('--columns')].split(',')
+if '-C' in opts:
+    columns = args[opts.index('-C')].split(',')
+
+if input_path == '' or output_path == '':
+    print('Both an --input and an --output file must be given.')
+    sys.exit()
+
+table = vb_table.read_table(input_path, columns)
+vb_table.write_table(output_path, table)
+print('Wrote', len(table), 'rows and', len(table.fieldnames), 'columns to', output_path)
@@ -7,13 +7,23 @@
 # file. You can then determine the frequency of use of properties in those items, or the frequency of use of values 
 # for a particular property used in those items.
 
-version = '1.0.2'
-created = '2021-09-13'
+version = '1.0.3'
+created = '2026-10-18'
+
+# -----------------------------------------
+# Version 1.0.3 change notes (2026-10-18):
+# - Queries are sent through the shared connection pool of vb_sparql.py, which must be in the same directory as this
+#   script. The results are read as they arrive instead of loading the whole response into memory first.
+# - The labels are matched to the entities with a dictionary lookup instead of a scan of all of the labels for each entity.
+# - When the items are screened by a list of Q IDs from a CSV file, the Q IDs are sent in chunks (values_chunk_size) and
+#   the counts of the chunks are added. A chunk whose query times out or fails with a 5xx status is split in half and
+#   sent again (see vb_sparql.run_values_query()), and the chunk size that worked is remembered for the next run.
+#   The label queries are chunked the same way. Previously a timeout printed a message and gave no results.
 
 # Some utility functions are from 
 # https://github.com/HeardLibrary/digital-scholarship/blob/2cabda778b585e367527f4dd024b6a7e82613e18/code/wikidata/template.ipynb
 
-import requests
+import vb_sparql # shared connection pool for SPARQL queries; must be in the same directory as this script
 import json
 import csv
 import sys # Read CLI arguments
@@ -32,6 +42,7 @@ default_graph_pattern = '?qid wdt:P195 wd:Q18563658.' # items in the Fine Arts g
 # property and their frequency of use in those items.
 test_property = ''
 only_qualifiers = False
+values_chunk_size = 500 # maximum number of Q IDs or IRIs in the VALUES clause of a single query
 
 arg_vals = sys.argv[1:]
 # see https://www.gnu.org/prep/standards/html_node/_002d_002dversion.html
@@ -147,38 +158,24 @@ def generate_header_dictionary(accept_media_type,user_agent_header):
 request_header = generate_header_dictionary(accept_media_type,user_agent_header)
 # The query is a valid SPARQL query string
 
-# Sends a query to the query service endpoint. 
+# Sends a query to the query service endpoint and yields the results one at a time as they arrive, so that large
+# results don't have to be loaded into memory. If there is an error, the message is printed and vb_sparql.SparqlError
+# (or vb_sparql.QueryTimeout) is raised, even if some results were already yielded.
 def send_sparql_query(query_string, request_header):
-    response = requests.post(endpoint, data=query_string.encode('utf-8'), headers=request_header)
-    #print(response.text) # uncomment to view the raw response, e.g. if you are getting an error
-    success = True
     try:
-        data = response.json()
-    except:
-        if 'TimeoutException' in response.text:
-            print('The query timed out.')
-            success = False
-        else:
-            print('Did not find TimeoutException in response')
-            success = False
-
-    if success:
-        try:
-            # Extract the values from the response JSON
-            results = data['results']['bindings']
-        except:
-            print('Could not extract results. Response from server was:')
-            print(data)
-            success = False
-    
-    if success:
-        # You can delete the print statement if the queries are short. However, for large/long queries,
-        # it's good to let the user know what's going on.
-        print('done retrieving data')
-        #print(json.dumps(results, indent=2))
-    else:
-        results = []
-    return(results)
+        for result in vb_sparql.iter_results(endpoint, query_string.encode('utf-8'), request_header):
+            yield result
+    except vb_sparql.QueryTimeout:
+        print('The query timed out.')
+        raise
+    except vb_sparql.SparqlError as error:
+        print('Could not extract results. Response from server was:')
+        print(error)
+        raise
+
+    # You can delete the print statement if the queries are short. However, for large/long queries,
+    # it's good to let the user know what's going on.
+    print('done retrieving data')
 
 # ----------------
 # Utility code
@@ -308,54 +305,77 @@ def build_label_query(screen):
     
     return query
 
+# Sends a query and returns the list of all of its results. Used for the chunks of queries with a VALUES list.
+def send_chunk_query(query_string):
+    return list(send_sparql_query(query_string, request_header))
+
 def perform_query(test_property, screen, find_qualifiers):
-    # Create the query string to retrieve the entity IDs (or value strings) that meet the screening criteria
-    query_string = build_id_query(test_property, screen, find_qualifiers)
-    # print(query_string)
+    if test_property == '':
+        query_kind = 'properties'
+    elif find_qualifiers:
+        query_kind = 'qualifiers'
+    else:
+        query_kind = 'values'
 
     # You can delete the print statements if the queries are short. However, for large/long queries,
     # it's good to let the user know what's going on.
     print('querying SPARQL endpoint to acquire entity counts')
 
     # Retrieve the list of entities (properties or values) meeting the screening criteria
-    results = send_sparql_query(query_string, request_header)
-    if results == []:
+    # Extract IRIs or string values and their counts from the results
+    # If the entity values are IRIs, do a second step to get their labels. Otherwise the values are strings.
+    counts = {}
+    try:
+        # Screening of Q IDs done by a list: the Q IDs are sent in chunks. Since each chunk counts distinct items
+        # and no item is in more than one chunk, the counts for an entity in the chunks are added.
+        if screen[0] == 'w':
+            qids = list(dict.fromkeys(screen.split('\n'))) # remove duplicate Q IDs, which would be counted twice
+            results = vb_sparql.run_values_query(qids, lambda chunk: build_id_query(test_property, '\n'.join(chunk), find_qualifiers), 
+                send_chunk_query, chunk_size=values_chunk_size, template='count_entities ' + query_kind + ' ' + endpoint)
+        # Screening of Q IDs done by a graph pattern
+        else:
+            # Create the query string to retrieve the entity IDs (or value strings) that meet the screening criteria
+            query_string = build_id_query(test_property, screen, find_qualifiers)
+            # print(query_string)
+            results = send_sparql_query(query_string, request_header)
+        for result in results:
+            value = result['entity']['value']
+            counts[value] = counts.get(value, 0) + int(result['count']['value'])
+    except vb_sparql.SparqlError: # the error was printed by send_sparql_query()
+        counts = {}
+    if counts == {}:
         print('No results')
         return
-    #print(json.dumps(results, indent=2))
 
-    # Extract IRIs or string values and their counts from the results
-    # If the entity values are IRIs, do a second step to get their labels. Otherwise the values are strings.
     interim_results = []
     all_iris = True
-    for result in results:
-        value = result['entity']['value']
+    for value, count in counts.items():
         if value[0:4] != 'http':  # detect non-IRI strings
             all_iris = False
-        count = result['count']['value']
-        interim_results.append({'value': value, 'count': count})
+        interim_results.append({'value': value, 'count': str(count)})
 
     if all_iris:
-        # Create a query string to get the labels for IRIs of properties or item values.
-        values = create_id_values_list(interim_results)
-        query_string = build_label_query(values)
-        # print(query_string)
-
+        # Get the labels for IRIs of properties or item values, with the IRIs in the VALUES clause of the query
         print('querying SPARQL endpoint to acquire labels')
-        results = send_sparql_query(query_string, request_header)
-        #print(json.dumps(results, indent=2))
+        # Index the labels by IRI, keeping the first label found for each IRI
+        labels = {}
+        try:
+            results = vb_sparql.run_values_query(interim_results, lambda chunk: build_label_query(create_id_values_list(chunk)), 
+                send_chunk_query, chunk_size=values_chunk_size, template='count_entities labels ' + endpoint)
+            for result in results:
+                if result['entity']['value'] not in labels:
+                    labels[result['entity']['value']] = result['label']['value']
+        except vb_sparql.SparqlError: # the error was printed by send_sparql_query()
+            labels = {}
 
-        # Extract labels from the results and match them to their IDs and counts.
+        # Match the labels to their IDs and counts.
         output_list = []
         for interim_result in interim_results:
-            for result in results:
+            if interim_result['value'] in labels:
                 final_result = {}
-                if result['entity']['value'] == interim_result['value']:
-                    final_result['value'] = extract_local_name(interim_result['value'])
-                    final_result['label'] = result['label']['value']
-                    final_result['count'] = extract_local_name(interim_result['count'])
-                    break
-            if final_result != {}:
+                final_result['value'] = extract_local_name(interim_result['value'])
+                final_result['label'] = labels[interim_result['value']]
+                final_result['count'] = extract_local_name(interim_result['count'])
                 output_list.append(final_result)
     else:
         output_list = list(interim_results)
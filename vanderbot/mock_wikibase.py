@@ -0,0 +1,541 @@
+# Local stand-in for a Wikibase API.  mock_wikibase.py
+# (c) 2026 Vanderbilt University. This program is released under a GNU General Public License v3.0 http://www.gnu.org/licenses/gpl-3.0
+# Author: Steve Baskauf
+# For more information, see https://github.com/HeardLibrary/linked-data/tree/master/vanderbot
+
+# This script runs a small HTTP server on the local computer that answers the part of the MediaWiki action API used by
+# vanderbot.py, vanderdeletebot.py, vanderpropertybot.py, and commonstool.py, so that they can be tested and timed without
+# writing to a real Wikibase. Entities are kept in memory only and are lost when the server stops.
+#
+# Supported actions: query (meta=tokens and meta=userinfo), login, wbeditentity, wbsetreference, wbremoveclaims,
+# wbremovereferences, wbgetentities, and wbgetclaims. The entity JSON in the responses has the same form as the JSON from
+# a real Wikibase: statement GUIDs are generated when they aren't supplied, and snaks, references, and qualifiers are
+# given hashes. A login starts a session that is identified by a cookie, as on a real Wikibase, and writes must include
+# the CSRF token of the session. Sessions can be ended with expire_sessions() and their tokens changed with
+# rotate_tokens() to test how clients recover. A SPARQL endpoint is also provided, but it always returns an empty
+# result, as a new Wikibase with nothing in its Query Service would.
+#
+# A fixed latency (plus random jitter) can be added to every API request. Writes that include a maxlag parameter can be
+# made to fail with a maxlag error for a given fraction of requests, and any request can be made to fail with HTTP 429.
+# Both include a Retry-After header, as Wikimedia servers do.
+#
+# To use, put the server's URL in the credentials file read by the script being tested, e.g.
+# endpointUrl=http://localhost:8181
+# and (for vanderbot.py) give the SPARQL endpoint with --endpoint http://localhost:8181/sparql
+# The server can also be started from another script with start_server(). See benchmark_vanderbot.py for an example.
+
+version = '1.0.0'
+created = '2026-10-18'
+
+import sys
+import json
+import uuid
+import time
+import random
+import hashlib
+import threading
+import urllib.parse
+import http.cookies
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import List, Dict, Tuple, Optional, Any
+
+API_PATH = '/w/api.php'
+SPARQL_PATH = '/sparql'
+LOGIN_TOKEN = 'c0ffee0000000000000000000000000000000000+\\'
+ANONYMOUS_TOKEN = '+\\' # CSRF token given to clients that aren't logged in
+SESSION_COOKIE = 'mockwikibase_session'
+WRITE_ACTIONS = ['wbeditentity', 'wbsetreference', 'wbremoveclaims', 'wbremovereferences']
+MAX_GET_IDS = 50 # wbgetentities limit for users without the apihighlimits right
+
+# Datatypes of snaks, by the type of their datavalue. Used when a submitted snak doesn't give its datatype.
+DATATYPES = {
+    'wikibase-entityid': 'wikibase-item',
+    'string': 'string',
+    'time': 'time',
+    'quantity': 'quantity',
+    'globecoordinate': 'globe-coordinate',
+    'monolingualtext': 'monolingualtext'
+    }
+
+def snak_hash(snaks: Any) -> str:
+    """Generate a hash for a snak or set of snaks in the same form (40 hexadecimal digits) as the Wikibase hashes."""
+    return hashlib.sha1(json.dumps(snaks, sort_keys=True).encode('utf-8')).hexdigest()
+
+def api_error(code: str, info: str) -> Dict:
+    """Build the response to a request that failed."""
+    return {'error': {'code': code, 'info': info, '*': 'See ' + API_PATH + ' for API usage.'}}
+
+class MockWikibase:
+    """In-memory Wikibase that answers API requests.
+
+    Parameters
+    ----------
+    latency : float
+        Seconds added to every API request.
+    jitter : float
+        Up to this many seconds (uniformly distributed) are added to the latency of each request.
+    maxlag_rate : float
+        Fraction of writes with a maxlag parameter that fail with a maxlag error.
+    throttle_rate : float
+        Fraction of API requests that fail with HTTP 429 (too many requests).
+    lag : float
+        Lag in seconds reported in maxlag errors.
+    retry_after : int
+        Value of the Retry-After header sent with maxlag errors and 429 responses.
+    seed : int
+        Seed for the random number generator, so that the injected errors are repeatable.
+
+    Note
+    ----
+    Every API request is recorded in the log attribute as a dictionary with the action, the start time
+    (time.monotonic()), the number of seconds taken to answer, the HTTP status, and the error code ('' if there was no
+    error). A SPARQL query is recorded with the action 'sparql'.
+    """
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, maxlag_rate: float = 0.0, throttle_rate: float = 0.0, lag: float = 6.0, retry_after: int = 1, seed: Optional[int] = None):
+        self.latency = latency
+        self.jitter = jitter
+        self.maxlag_rate = maxlag_rate
+        self.throttle_rate = throttle_rate
+        self.lag = lag
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.entities = {}
+        self.next_number = {'item': 1, 'property': 1}
+        self.revision = 0
+        self.sessions = {} # user name and CSRF token of each logged-in session, keyed by session cookie value
+        self.log = []
+
+    def new_id(self, entity_type: str) -> str:
+        """Assign the next Q or P ID."""
+        prefix = 'P' if entity_type == 'property' else 'Q'
+        number = self.next_number[entity_type]
+        self.next_number[entity_type] += 1
+        return prefix + str(number)
+
+    def add_entity(self, entity_type: str = 'item', labels: Optional[Dict[str, str]] = None) -> str:
+        """Create an entity directly (without a request), e.g. to set up existing items for a test. Returns its ID."""
+        with self.lock:
+            entity = self.empty_entity(self.new_id(entity_type), entity_type)
+            for language, value in (labels or {}).items():
+                entity['labels'][language] = {'language': language, 'value': value}
+            self.entities[entity['id']] = entity
+            self.revision += 1
+            entity['lastrevid'] = self.revision
+        return entity['id']
+
+    def empty_entity(self, entity_id: str, entity_type: str) -> Dict:
+        entity = {'type': entity_type, 'id': entity_id, 'labels': {}, 'descriptions': {}, 'aliases': {}, 'claims': {}, 'lastrevid': 0}
+        if entity_type == 'item':
+            entity['sitelinks'] = {}
+        return entity
+
+    def find_statement(self, guid: str) -> Tuple[Optional[Dict], Optional[Dict]]:
+        """Return the entity containing a statement and the statement, or (None, None) if there is no such statement."""
+        entity = self.entities.get(guid.split('$')[0].upper())
+        if entity is None:
+            return None, None
+        for statements in entity['claims'].values():
+            for statement in statements:
+                if statement['id'].lower() == guid.lower():
+                    return entity, statement
+        return entity, None
+
+    # ----------------
+    # Normalization of submitted JSON into the form returned by Wikibase
+    # ----------------
+
+    def normalize_snak(self, snak: Dict) -> Dict:
+        snak = dict(snak)
+        if 'datatype' not in snak and 'datavalue' in snak:
+            snak['datatype'] = DATATYPES.get(snak['datavalue'].get('type'), 'string')
+        snak.pop('hash', None)
+        snak['hash'] = snak_hash(snak)
+        return snak
+
+    def normalize_snaks(self, snaks: Any) -> Tuple[Dict[str, List[Dict]], List[str]]:
+        """Accept snaks either grouped by property or as a list, and return them grouped by property with their order."""
+        if isinstance(snaks, list):
+            grouped = {}
+            for snak in snaks:
+                grouped.setdefault(snak['property'], []).append(snak)
+            snaks = grouped
+        normalized = {}
+        for property_id, property_snaks in snaks.items():
+            normalized[property_id] = [self.normalize_snak(snak) for snak in property_snaks]
+        return normalized, list(normalized.keys())
+
+    def normalize_reference(self, reference: Dict) -> Dict:
+        snaks, order = self.normalize_snaks(reference['snaks'])
+        return {'hash': snak_hash(snaks), 'snaks': snaks, 'snaks-order': order}
+
+    def normalize_statement(self, statement: Dict, entity_id: str) -> Dict:
+        normalized = {
+            'mainsnak': self.normalize_snak(statement['mainsnak']),
+            'type': 'statement',
+            'id': statement.get('id') or entity_id + '$' + str(uuid.uuid4()).upper(),
+            'rank': statement.get('rank', 'normal')
+            }
+        if statement.get('qualifiers'):
+            normalized['qualifiers'], normalized['qualifiers-order'] = self.normalize_snaks(statement['qualifiers'])
+        if statement.get('references'):
+            normalized['references'] = [self.normalize_reference(reference) for reference in statement['references']]
+        return normalized
+
+    # ----------------
+    # Actions
+    # ----------------
+
+    def new_token(self) -> str:
+        """Generate a CSRF token in the same form as the MediaWiki tokens."""
+        return uuid.uuid4().hex + '+\\'
+
+    def expire_sessions(self) -> None:
+        """End all sessions, as the server does when a session times out. Clients must log in again."""
+        with self.lock:
+            self.sessions.clear()
+
+    def rotate_tokens(self) -> None:
+        """Give every session a new CSRF token, so that writes with the old token fail with a badtoken error."""
+        with self.lock:
+            for session in self.sessions.values():
+                session['csrftoken'] = self.new_token()
+
+    def query(self, parameters: Dict[str, str], session_id: str = '') -> Dict:
+        session = self.sessions.get(session_id)
+        meta = parameters.get('meta', '').split('|')
+        if not set(meta) <= {'tokens', 'userinfo'}:
+            return api_error('badvalue', 'Only meta=tokens and meta=userinfo are supported by this test server.')
+        query = {}
+        if 'userinfo' in meta:
+            if session is None:
+                query['userinfo'] = {'id': 0, 'name': '127.0.0.1', 'anon': ''}
+            else:
+                query['userinfo'] = {'id': 1, 'name': session['user']}
+        if 'tokens' in meta:
+            if parameters.get('type') == 'login':
+                query['tokens'] = {'logintoken': LOGIN_TOKEN}
+            elif session is None:
+                query['tokens'] = {'csrftoken': ANONYMOUS_TOKEN}
+            else:
+                query['tokens'] = {'csrftoken': session['csrftoken']}
+        return {'batchcomplete': '', 'query': query}
+
+    def login(self, parameters: Dict[str, str]) -> Tuple[Dict, str]:
+        """Log in. Returns the response data and the value of the cookie of the new session ('' if the login failed)."""
+        if parameters.get('lgtoken') != LOGIN_TOKEN:
+            return {'login': {'result': 'Failed', 'reason': 'Unable to continue login. Your session most likely timed out.'}}, ''
+        username = parameters.get('lgname', '').split('@')[0]
+        session_id = uuid.uuid4().hex
+        self.sessions[session_id] = {'user': username, 'csrftoken': self.new_token()}
+        return {'login': {'result': 'Success', 'lguserid': 1, 'lgusername': username}}, session_id
+
+    def wbeditentity(self, parameters: Dict[str, str]) -> Dict:
+        try:
+            data = json.loads(parameters.get('data', '{}'))
+        except ValueError:
+            return api_error('invalid-json', 'Could not parse JSON.')
+        if 'new' in parameters:
+            if parameters['new'] not in ['item', 'property']:
+                return api_error('badvalue', 'Unrecognized value for parameter "new": ' + parameters['new'] + '.')
+            entity = self.empty_entity(self.new_id(parameters['new']), parameters['new'])
+            if parameters['new'] == 'property':
+                if data.get('datatype') is None:
+                    return api_error('param-missing', 'No datatype given.')
+                entity['datatype'] = data['datatype']
+        elif 'id' in parameters:
+            if parameters['id'].upper() not in self.entities:
+                return api_error('no-such-entity', 'Could not find an entity with the ID "' + parameters['id'] + '".')
+            # The edit is made to a copy, which replaces the entity only if the whole edit succeeds
+            entity = json.loads(json.dumps(self.entities[parameters['id'].upper()]))
+        else:
+            return api_error('param-missing', 'Either provide the item "id" or pass "new" to create a new item.')
+
+        for key in ['labels', 'descriptions']:
+            for language, term in data.get(key, {}).items():
+                if term.get('value', '') == '' or 'remove' in term:
+                    entity[key].pop(language, None)
+                else:
+                    entity[key][language] = {'language': term.get('language', language), 'value': term['value']}
+        for language, terms in data.get('aliases', {}).items():
+            entity['aliases'][language] = [{'language': term.get('language', language), 'value': term['value']} for term in terms]
+
+        claims = data.get('claims', [])
+        if isinstance(claims, dict): # claims may also be grouped by property
+            claims = [claim for property_claims in claims.values() for claim in property_claims]
+        for claim in claims:
+            if 'remove' in claim:
+                matches = [(property_id, statement) for property_id, statements in entity['claims'].items() for statement in statements if statement['id'].lower() == claim.get('id', '').lower()]
+                if len(matches) == 0:
+                    return api_error('invalid-guid', 'Invalid claim GUID: ' + claim.get('id', ''))
+                entity['claims'][matches[0][0]].remove(matches[0][1])
+                continue
+            if 'id' in claim and claim['id'].split('$')[0].upper() != entity['id']:
+                return api_error('invalid-guid', 'Statement GUID can not be parsed or does not match the entity: ' + claim['id'])
+            statement = self.normalize_statement(claim, entity['id'])
+            property_statements = entity['claims'].setdefault(statement['mainsnak']['property'], [])
+            for index, existing in enumerate(property_statements):
+                if existing['id'].lower() == statement['id'].lower(): # a statement sent with the GUID of an existing one replaces it
+                    property_statements[index] = statement
+                    break
+            else:
+                property_statements.append(statement)
+        for property_id in [property_id for property_id, statements in entity['claims'].items() if len(statements) == 0]:
+            del entity['claims'][property_id]
+
+        self.revision += 1
+        entity['lastrevid'] = self.revision
+        self.entities[entity['id']] = entity
+        return {'entity': json.loads(json.dumps(entity)), 'success': 1}
+
+    def wbsetreference(self, parameters: Dict[str, str]) -> Dict:
+        entity, statement = self.find_statement(parameters.get('statement', ''))
+        if statement is None:
+            return api_error('no-such-claim', 'Could not find the statement.')
+        try:
+            snaks = json.loads(parameters.get('snaks', '{}'))
+        except ValueError:
+            return api_error('invalid-json', 'Could not parse JSON.')
+        reference = self.normalize_reference({'snaks': snaks})
+        references = statement.setdefault('references', [])
+        if parameters.get('reference'):
+            hashes = [existing['hash'] for existing in references]
+            if parameters['reference'] not in hashes:
+                return api_error('no-such-reference', 'The statement does not have a reference with the given hash.')
+            references[hashes.index(parameters['reference'])] = reference
+        else:
+            references.append(reference)
+        self.revision += 1
+        entity['lastrevid'] = self.revision
+        return {'pageinfo': {'lastrevid': self.revision}, 'success': 1, 'reference': reference}
+
+    def wbremoveclaims(self, parameters: Dict[str, str]) -> Dict:
+        guids = parameters.get('claim', '').split('|')
+        found = []
+        for guid in guids:
+            entity, statement = self.find_statement(guid)
+            if statement is None:
+                return api_error('invalid-guid', 'Invalid claim GUID: ' + guid)
+            found.append((entity, statement))
+        for entity, statement in found:
+            entity['claims'][statement['mainsnak']['property']].remove(statement)
+            if len(entity['claims'][statement['mainsnak']['property']]) == 0:
+                del entity['claims'][statement['mainsnak']['property']]
+            self.revision += 1
+            entity['lastrevid'] = self.revision
+        return {'pageinfo': {'lastrevid': self.revision}, 'success': 1, 'claims': guids}
+
+    def wbremovereferences(self, parameters: Dict[str, str]) -> Dict:
+        entity, statement = self.find_statement(parameters.get('statement', ''))
+        if statement is None:
+            return api_error('no-such-claim', 'Could not find the statement.')
+        hashes = parameters.get('references', '').split('|')
+        existing_hashes = [reference['hash'] for reference in statement.get('references', [])]
+        for reference_hash in hashes:
+            if reference_hash not in existing_hashes:
+                return api_error('no-such-reference', 'The statement does not have a reference with the given hash.')
+        statement['references'] = [reference for reference in statement['references'] if reference['hash'] not in hashes]
+        if len(statement['references']) == 0:
+            del statement['references']
+        self.revision += 1
+        entity['lastrevid'] = self.revision
+        return {'pageinfo': {'lastrevid': self.revision}, 'success': 1}
+
+    def wbgetentities(self, parameters: Dict[str, str]) -> Dict:
+        ids = [entity_id for entity_id in parameters.get('ids', '').split('|') if entity_id != '']
+        if len(ids) > MAX_GET_IDS:
+            return api_error('toomanyvalues', 'Too many values supplied for parameter "ids". The limit is ' + str(MAX_GET_IDS) + '.')
+        entities = {}
+        for entity_id in ids:
+            if entity_id.upper() in self.entities:
+                entities[entity_id] = json.loads(json.dumps(self.entities[entity_id.upper()]))
+            else:
+                entities[entity_id] = {'id': entity_id, 'missing': ''}
+        return {'entities': entities, 'success': 1}
+
+    def wbgetclaims(self, parameters: Dict[str, str]) -> Dict:
+        entity = self.entities.get(parameters.get('entity', '').upper())
+        if entity is None:
+            return api_error('no-such-entity', 'Could not find an entity with the ID "' + parameters.get('entity', '') + '".')
+        return {'claims': json.loads(json.dumps(entity['claims']))}
+
+    def handle(self, parameters: Dict[str, str], session_id: str = '') -> Tuple[int, Dict[str, str], Dict]:
+        """Answer an API request. Returns the HTTP status, extra response headers, and the response data.
+
+        session_id is the value of the session cookie sent with the request, if any.
+        """
+        delay = self.latency
+        if self.jitter > 0:
+            delay += self.random.uniform(0, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+
+        action = parameters.get('action', '')
+        with self.lock:
+            if self.throttle_rate > 0 and self.random.random() < self.throttle_rate:
+                return 429, {'Retry-After': str(self.retry_after)}, api_error('ratelimited', 'You have exceeded your rate limit. Please wait some time and try again.')
+            if action in WRITE_ACTIONS and 'maxlag' in parameters and self.maxlag_rate > 0 and self.random.random() < self.maxlag_rate:
+                response = api_error('maxlag', 'Waiting for a database server: ' + str(self.lag) + ' seconds lagged.')
+                response['error']['host'] = 'db1'
+                response['error']['lag'] = self.lag
+                response['error']['type'] = 'db'
+                return 200, {'Retry-After': str(self.retry_after), 'X-Database-Lag': str(self.lag)}, response
+            if action in WRITE_ACTIONS:
+                session = self.sessions.get(session_id)
+                if session is None or parameters.get('token') != session['csrftoken']:
+                    return 200, {}, api_error('badtoken', 'Invalid CSRF token.')
+            if action == 'query':
+                return 200, {}, self.query(parameters, session_id)
+            if action == 'login':
+                data, session_id = self.login(parameters)
+                if session_id == '':
+                    return 200, {}, data
+                return 200, {'Set-Cookie': SESSION_COOKIE + '=' + session_id + '; path=/; HttpOnly'}, data
+            if action in WRITE_ACTIONS + ['wbgetentities', 'wbgetclaims']:
+                return 200, {}, getattr(self, action)(parameters)
+        return 200, {}, api_error('badvalue', 'Unrecognized value for parameter "action": ' + action + '.')
+
+class RequestHandler(BaseHTTPRequestHandler):
+    """Passes requests to the MockWikibase object attached to the server."""
+    protocol_version = 'HTTP/1.1' # keep connections alive as the real API does
+    disable_nagle_algorithm = True # otherwise the headers and body are sent in separate packets that the client waits 40 ms to acknowledge
+
+    def send_json(self, status: int, headers: Dict[str, str], data: Dict, content_type: str = 'application/json; charset=utf-8') -> None:
+        body = json.dumps(data).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def respond(self, parameters: Dict[str, str]) -> None:
+        wikibase = self.server.wikibase
+        start_time = time.monotonic()
+        path = urllib.parse.urlsplit(self.path).path
+        error_code = ''
+        if path == SPARQL_PATH:
+            action = 'sparql'
+            status = 200
+            self.send_json(status, {}, {'head': {'vars': []}, 'results': {'bindings': []}}, 'application/sparql-results+json')
+        elif path == API_PATH:
+            action = parameters.get('action', '')
+            cookies = http.cookies.SimpleCookie(self.headers.get('Cookie', ''))
+            session_id = cookies[SESSION_COOKIE].value if SESSION_COOKIE in cookies else ''
+            status, headers, data = wikibase.handle(parameters, session_id)
+            self.send_json(status, headers, data)
+            if 'error' in data:
+                error_code = data['error']['code']
+        else:
+            action = 'notfound'
+            status = 404
+            self.send_json(status, {}, {'error': 'Not found: ' + path})
+        with wikibase.lock:
+            wikibase.log.append({'action': action, 'start': start_time, 'duration': time.monotonic() - start_time, 'status': status, 'error': error_code})
+
+    def do_GET(self):
+        query = urllib.parse.urlsplit(self.path).query
+        self.respond(dict(urllib.parse.parse_qsl(query, keep_blank_values=True)))
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        body = self.rfile.read(length).decode('utf-8')
+        parameters = dict(urllib.parse.parse_qsl(urllib.parse.urlsplit(self.path).query, keep_blank_values=True))
+        if self.headers.get('Content-Type', '').startswith('application/x-www-form-urlencoded'):
+            parameters.update(urllib.parse.parse_qsl(body, keep_blank_values=True))
+        self.respond(parameters)
+
+    def log_message(self, format, *args):
+        pass # requests are recorded in the MockWikibase log instead of printed
+
+def start_server(wikibase: MockWikibase, port: int = 0, host: str = '127.0.0.1') -> ThreadingHTTPServer:
+    """Start the server in a background thread and return it. With port 0, a free port is chosen.
+
+    The base URL of the server is 'http://' + host + ':' + str(server.server_address[1]). Call server.shutdown() to stop it.
+    """
+    server = ThreadingHTTPServer((host, port), RequestHandler)
+    server.daemon_threads = True
+    server.wikibase = wikibase
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+# ----------------
+# Run as a script
+# ----------------
+
+if __name__ == '__main__':
+    port = 8181
+    latency = 0.0
+    jitter = 0.0
+    maxlag_rate = 0.0
+    throttle_rate = 0.0
+    retry_after = 1
+
+    arg_vals = sys.argv[1:]
+    # see https://www.gnu.org/prep/standards/html_node/_002d_002dversion.html
+    if '--version' in arg_vals or '-V' in arg_vals: # provide version information according to GNU standards
+        print('Mock Wikibase', version)
+        print('Copyright ©', created[:4], 'Vanderbilt University')
+        print('License GNU GPL version 3.0 <http://www.gnu.org/licenses/gpl-3.0>')
+        print('This is free software: you are free to change and redistribute it.')
+        print('There is NO WARRANTY, to the extent permitted by law.')
+        print('Author: Steve Baskauf')
+        print('Revision date:', created)
+        sys.exit()
+
+    if '--help' in arg_vals or '-H' in arg_vals: # provide help information according to GNU standards
+        print('Options: --port (-O) port number, --latency (-L) seconds added to each request, --jitter (-J) maximum random seconds added,')
+        print('--maxlag (-M) fraction of writes failing with maxlag, --throttle (-T) fraction of requests failing with HTTP 429,')
+        print('--retry (-R) Retry-After seconds')
+        print('Report bugs to: steve.baskauf@vanderbilt.edu')
+        sys.exit()
+
+    # Code from https://realpython.com/python-command-line-arguments/#a-few-methods-for-parsing-python-command-line-arguments
+    opts = [opt for opt in arg_vals if opt.startswith('-')]
+    args = [arg for arg in arg_vals if not arg.startswith('-')]
+
+    if '--port' in opts: # port on which the server listens
+        port = int(args[opts.index('--port')])
+    if '-O' in opts:
+        port = int(args[opts.index('-O')])
+
+    if '--latency' in opts: # seconds added to every API request
+        latency = float(args[opts.index('--latency')])
+    if '-L' in opts:
+        latency = float(args[opts.index('-L')])
+
+    if '--jitter' in opts: # maximum random seconds added to the latency
+        jitter = float(args[opts.index('--jitter')])
+    if '-J' in opts:
+        jitter = float(args[opts.index('-J')])
+
+    if '--maxlag' in opts: # fraction of writes that fail with a maxlag error
+        maxlag_rate = float(args[opts.index('--maxlag')])
+    if '-M' in opts:
+        maxlag_rate = float(args[opts.index('-M')])
+
+    if '--throttle' in opts: # fraction of requests that fail with HTTP 429
+        throttle_rate = float(args[opts.index('--throttle')])
+    if '-T' in opts:
+        throttle_rate = float(args[opts.index('-T')])
+
+    if '--retry' in opts: # value of the Retry-After header
+        retry_after = int(args[opts.index('--retry')])
+    if '-R' in opts:
+        retry_after = int(args[opts.index('-R')])
+
+    wikibase = MockWikibase(latency=latency, jitter=jitter, maxlag_rate=maxlag_rate, throttle_rate=throttle_rate, retry_after=retry_after)
+    server = ThreadingHTTPServer(('127.0.0.1', port), RequestHandler)
+    server.wikibase = wikibase
+    print('Mock Wikibase API at http://127.0.0.1:' + str(port) + API_PATH)
+    print('SPARQL endpoint at http://127.0.0.1:' + str(port) + SPARQL_PATH)
+    print('Put endpointUrl=http://127.0.0.1:' + str(port) + ' in the credentials file. Press Ctrl-C to stop.')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    server.server_close()
+    print()
+    print(len(wikibase.entities), 'entities created,', len(wikibase.log), 'requests answered')
@@ -0,0 +1,23 @@
+# Checks of the write rate controller in vb_rate.py. Run with: python -m unittest test_vb_rate (or pytest) from this directory.
+
+import unittest
+import vb_rate # must be in the same directory as this script
+
+class RecoveryTest(unittest.TestCase):
+    def test_rate_recovers_after_backoff(self):
+        controller = vb_rate.RateController(min_interval=0.0, start_interval=0.0, max_rate=vb_rate.UNTHROTTLED_MAX_RATE)
+        full_rate = controller.rate
+        self.assertEqual(controller.backoff(retry_after=0.0), 0.0) # the server's Retry-After is used for the first pause
+        self.assertEqual(controller.rate, full_rate / 2)
+        for write in range(15): # about one write in 20 gets a maxlag error at 5% maxlag
+            controller.success()
+        self.assertEqual(controller.rate, full_rate)
+
+    def test_rate_cut_once_per_write(self):
+        controller = vb_rate.RateController(min_interval=0.0, start_interval=0.0, max_rate=100.0, base_delay=5.0)
+        pauses = [controller.backoff(retry_after=1.0) for retry in range(3)]
+        self.assertEqual(controller.rate, 50.0)
+        self.assertEqual(pauses, [1.0, 5.0, 10.0])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,6 @@
 # VanderBot, a script for writing CSV data to a Wikibase API.  vanderbot.py
-version = '1.9.5'
-created = '2023-02-08'
+version = '1.9.8'
+created = '2026-10-18'
 
 # (c) 2023 Vanderbilt University. This program is released under a GNU General Public License v3.0 http://www.gnu.org/licenses/gpl-3.0
 # Author: Steve Baskauf
@@ -141,36 +141,140 @@ created = '2023-02-08'
 # Version 1.9.7 change notes (2023-11-06)
 # Minor bug fix: Write error message to log when value doesn't appear in API response. This is a rare case that can happen when the Commons API
 #       changes a file name from the putitive name that was uploaded (e.g. removing double spaces).
+# ----------------------------------------
+# Version 1.9.8 change notes (2026-10-18)
+# Existing labels, descriptions, and aliases retrieved from the Query Service are indexed by Q ID once per language
+#       (see vb_labels.py) instead of being searched linearly for every row. Setup time for large tables is now linear.
+# The Q IDs in the queries for existing labels, descriptions, and aliases are sent in chunks (--chunk option, default 500)
+#       by a small pool of workers (--workers option, default 2). A chunk whose query times out is split in half and retried.
+#       The --sleep value is now converted to a number and is the minimum time between the start of consecutive queries.
+# Duplicate label/description screening for new items is done with a few batched SELECT queries before the first write
+#       instead of with one or two ASK queries per language for each new row.
+# Changes to the table are appended to a journal file (CSV file name + .journal) that is flushed to disk after each row instead
+#       of rewriting the entire CSV. The journal is merged into the CSV periodically and at exit. If the script crashes, the
+#       journal is merged into the CSV automatically the next time the script is run.
+# The csv-metadata.json file is compiled once into a plan with one descriptor per property holding its qualifiers and references
+#       (see vb_schema.py) instead of rescanning all of the columns for every property. The plan is cached next to the
+#       metadata file (same name with .plan added) and reused until the metadata file changes.
+# Statement GUIDs for new statements on existing items are generated by the script and sent with the claims. They are saved
+#       in the journal before writing, so the new statements are found in the response by GUID, and a rerun after a crash
+#       resends the same GUIDs instead of creating duplicate statements.
+# Added --batchrefs option. When "true", new references for statements that already exist are sent in the main wbeditentity edit
+#       for each item (by resubmitting the current statement with its GUID and the added references), instead of one wbsetreference
+#       call per reference after all of the rows are processed.
+# Writes to the API are spaced by an adaptive rate controller (see vb_rate.py) that is also used by vanderdeletebot.py and
+#       commonstool.py. It honors Retry-After, never goes faster than api_sleep for Wikidata and Commons, and raises an
+#       exception instead of calling exit() when the server stays lagged. --apisleep now accepts decimal values.
+# After each write, the statements in the response are indexed once by GUID and by property and value, and the references of a
+#       statement by their property/value pairs (see vb_claims.py). Table values are converted once into the same form, so new
+#       statements and references are found by lookup instead of by looping through every statement and reference snak.
+# All of the values in a table are normalized column by column before any queries or writes (see vb_normalize.py): whitespace
+#       is removed, blank node abbreviations, value node IDs and commons URLs are generated, and dates are converted using
+#       precompiled regular expressions instead of strptime(). Bad dates in all rows are reported before writing starts, and
+#       the normalized table is saved once instead of after each converted row.
+# Tables are held in memory as lists of column values with one copy of each distinct string (see vb_table.py) instead of
+#       a dictionary for every row, which greatly reduces the memory used by large tables. The CSV output is unchanged.
+# Tables MAY be Parquet (.parquet) or Arrow IPC (.arrow, .feather) files instead of CSVs; the format is chosen by the file
+#       name in the url of the metadata description file. These formats require the pyarrow package and load much faster.
+#       convert_table.py converts tables between formats, e.g. to CSV for editing.
+# Added --live (-I) option. With --live true, the current JSON of all existing items is retrieved from the API with
+#       wbgetentities (50 IDs per request, a few requests at a time) before writing. Statements, references, and qualifiers
+#       already in an item are recognized and their identifiers saved in the table, and only what is missing is sent in one
+#       edit per item. Existing labels, descriptions, and aliases are also taken from this JSON instead of the Query Service.
+#       This makes refreshing the table with acquire_wikidata_metadata.py before each upload unnecessary.
+# Added --tables (-N) option for Wikibase instances other than Wikidata and Commons: the maximum number of tables in the
+#       metadata description file that are written at the same time (default 1). The queries for the next table are now
+#       made while the previous table is being written. All tables share one session, CSRF token, and rate controller, and
+#       each table keeps its own journal and error log. Fixed the property ID of quantity and globe-coordinate reference
+#       snaks and the type check of quantity and globe-coordinate qualifiers, which used variables left over from other loops.
+# The script can be imported without side effects. Command line arguments are converted by parse_arguments() into a
+#       dictionary of settings (see DEFAULT_CONFIG) that is passed to run(), which does the upload and returns the error
+#       log. Logging in is done by a WikibaseSession (see vb_session.py) that can be passed to run() for several uploads,
+#       so that a long-running program logs in once. requests is imported only when a session is made.
+# The session cookies are saved in ~/.vanderbot/sessions/ and reused by the next run if they are still logged in, which
+#       is checked with one request instead of logging in again. Writes rejected with a badtoken error are sent again
+#       with a new CSRF token. The same sessions are used by vanderdeletebot.py, vanderpropertybot.py, and commonstool.py.
+# Added --logformat (-F) and --logresponses (-R) options. With --logformat json, the log file has one compact JSON line
+#       per event (writes with their row, Q ID, statement GUIDs, latency, retries, and error code; errors; other messages),
+#       written by a background thread (see vb_log.py). API responses are only included with --logresponses true or a
+#       number of characters. The error summary at the end is built from the recorded errors in either format.
+# Added --profile (-O) and --cprofile (-X) options. With --profile FILE, the time spent in each phase of the upload (schema
+#       parsing, label/description prefetch, duplicate check, row normalization, JSON building, POST, reconciliation of
+#       the response, checkpoint writes, and sleeping to stay under the rate limit) is printed as a table at the end and
+#       saved in FILE as JSON (see vb_profile.py). With --cprofile true, the cProfile statistics of the phases limited by
+#       the CPU are also saved, one .prof file per phase.
+# Added --metrics (-Q) option. While the upload is running, the rows processed, rows per second, writes, skipped rows,
+#       API errors by error code, retries, current maxlag backoff, and estimated time remaining are served in the
+#       Prometheus text format at http://127.0.0.1:PORT/metrics if the value is a port number, or written every 5 seconds
+#       to the file given as the value, e.g. for the textfile collector of the node exporter (see vb_metrics.py).
+# Queries to the Query Service are sent through a shared pool of open connections (see vb_sparql.py) instead of making a
+#       new connection for each query. Requests that get no connection or a 429, 502, or 503 response are retried with
+#       increasing pauses. vb_sparql.py replaces the copies of the Sparqler class and the SPARQL requests in the other
+#       scripts of the repository.
+# A chunk of Q IDs whose query fails with a 5xx status is also split in half and retried, not only one that times out. The
+#       chunk size that worked for each kind of query is saved in ~/.vanderbot/values_chunk_sizes.json, so the next run
+#       starts with it instead of timing out again on the first chunks.
 
 import json
-import requests
-import csv
 from pathlib import Path
 import time
-from time import sleep
 import sys
 import uuid
-import re
-from datetime import datetime
 import urllib.parse
-from typing import List, Dict, Tuple, Optional, Any
+from typing import List, Dict, Optional, Any
+import atexit
+import contextlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import vb_table # holds the CSV table in memory as columns; must be in the same directory as this script
+import vb_journal # saves changes to the table between writes to the CSV; must be in the same directory as this script
+import vb_schema # compiles the metadata description file into a plan for each table; must be in the same directory as this script
+import vb_log # records writes and errors, optionally as JSON lines; must be in the same directory as this script
+import vb_profile # times the phases of an upload (--profile); must be in the same directory as this script
+import vb_metrics # shows the progress of an upload while it is running (--metrics); must be in the same directory as this script
+import vb_session # logs in to the API and controls the rate of writes; must be in the same directory as this script
+import vb_sparql # sends SPARQL queries through a shared connection pool; must be in the same directory as this script
+import vb_labels # helper functions for matching existing labels, descriptions, and aliases to table rows; must be in the same directory as this script
+import vb_claims # indexes the statements and references in API responses; must be in the same directory as this script
+import vb_normalize # converts dates, node IDs, blank nodes, and commons URLs in the table before writing; must be in the same directory as this script
 
 # Change the following lines to hard-code different defaults if not running from the command line.
 
-# Set script-wide variable values. Assign default values, then override if passed in as command line arguments
-log_path = '' # path to log file, default to none
-log_object = sys.stdout # log output defaults to the console screen
-allow_label_description_changes = False # labels and descriptions in the local CSV file that differ from existing Wikidata items are not automatically written
-endpoint = 'https://query.wikidata.org/sparql' # default to the Wikidata Query Service endpoint
-sparqlSleep = 0.1 # delay time between calls to SPARQL endpoint
-json_metadata_description_file = 'csv-metadata.json' # "Generating RDF from Tabular Data on the Web" metadata description file (mapping schema)
+# Default settings for an upload. parse_arguments() changes them according to the command line arguments. A program that
+# imports this script passes a dictionary of settings to run() instead; any settings that it leaves out have these values.
+DEFAULT_CONFIG = {
+    'log_path': '', # path to log file, default to none (output to the console screen)
+    'log_format': 'text', # "text" for the log of previous versions, "json" for one compact JSON line per event (see vb_log.py)
+    'log_response_length': None, # characters of each API response in the log; -1 for all, None for all in text logs and none in JSON logs
+    'allow_label_description_changes': False, # labels and descriptions in the local CSV file that differ from existing Wikidata items are not automatically written
+    'endpoint': 'https://query.wikidata.org/sparql', # default to the Wikidata Query Service endpoint
+    'sparql_sleep': 0.1, # delay time between calls to SPARQL endpoint
+    'values_chunk_size': 500, # maximum number of Q IDs in the VALUES clause of a single query for existing labels, descriptions, and aliases
+    'sparql_workers': 2, # maximum number of queries for existing labels, descriptions, and aliases in progress at the same time
+    'journal_compact_interval': 1000, # number of saved row changes after which the journal is merged into the CSV file
+    'json_metadata_description_file': 'csv-metadata.json', # "Generating RDF from Tabular Data on the Web" metadata description file (mapping schema)
+    'credentials_path': '', # path of the API credentials file; empty for credentials_filename in the home directory
+    'terse': False, # True suppresses display of progress output. False dispays information about the current line being processed
+    'duplicate_check': True, # True allows checking for duplicate labels and descriptions when creating new items. False suppresses checking
+    'batch_references': False, # True adds new references for existing statements to the main edit for each item. False writes them one at a time afterwards
+    'live_mode': False, # True compares the table with the current JSON of existing items from the API and writes only what is missing
+    'entity_workers': 3, # maximum number of wbgetentities requests in progress at the same time in live mode
+    'table_workers': 1, # maximum number of tables written at the same time; more than one only for Wikibase instances other than Wikidata and Commons
+    'calendar_model': 'Q1985727', # Default to Wikidata gregorian calendar
+    'globe_value': 'Q2', # the Earth; globe to be used for globe-coordinate datatypes
+    'api_sleep': None, # minimum number of seconds between writes; None for the default (see vb_session.make_rate_controller())
+    'profile_path': '', # path of a JSON file for the time spent in each phase of the upload; empty for no timing
+    'cpu_profile': False, # True also runs cProfile for the phases limited by the CPU and saves their statistics next to the profile_path file
+    'metrics_target': '' # port number of a local HTTP server, or path of a file, for live progress metrics in the Prometheus text format; empty for none
+    }
 credentials_path_string = 'home' # value is "home", "working", "gdrive", or a relative or absolute path with trailing "/"
 credentials_filename = 'wikibase_credentials.txt' # name of the API credentials file
 commons_prefix = 'http://commons.wikimedia.org/wiki/Special:FilePath/' # prepended to URL-encoded Commons media filenames
-terse_string = 'false' # True suppresses display of progress output. False dispays information about the current line being processed
-duplicate_check_string = 'true' # True allows checking for duplicate labels and descriptions when creating new items. False suppresses checking
-calendar_model = 'Q1985727' # Default to Wikidata gregorian calendar
-globe_value = 'Q2' # the Earth; globe to be used for globe-coordinate datatypes
+
+# There are options to require values for every mapped reference column or every mapped qualifier column.
+# By default, these are turned off, but they can be turned on by changing these flags:
+require_references = False
+require_qualifiers = False
 
 # This is the format of the API credentials file. Username and password are for a bot that you've created
 # (the example below is not real).  Save file in the directory specified by the credentials_path_string.
@@ -180,131 +284,165 @@ username=User@bot
 password=465jli90dslhgoiuhsaoi9s0sj5ki3lo
 '''
 
-arg_vals = sys.argv[1:]
-# see https://www.gnu.org/prep/standards/html_node/_002d_002dversion.html
-if '--version' in arg_vals or '-V' in arg_vals: # provide version information according to GNU standards 
-    # Remove version argument to avoid disrupting pairing of other arguments
-    # Not really necessary here, since the script terminates, but use in the future for other no-value arguments
-    if '--version' in arg_vals:
-        arg_vals.remove('--version')
-    if '-V' in arg_vals:
-        arg_vals.remove('-V')
-    print('VanderBot', version)
-    print('Copyright ©', created[:4], 'Vanderbilt University')
-    print('License GNU GPL version 3.0 <http://www.gnu.org/licenses/gpl-3.0>')
-    print('This is free software: you are free to change and redistribute it.')
-    print('There is NO WARRANTY, to the extent permitted by law.')
-    print('Author: Steve Baskauf')
-    print('Revision date:', created)
-    sys.exit()
-
-if '--help' in arg_vals or '-H' in arg_vals: # provide help information according to GNU standards
-    # needs to be expanded to include brief info on invoking the program
-    print('For help, see the VanderBot landing page at https://github.com/HeardLibrary/linked-data/blob/master/vanderbot/README.md')
-    print('Report bugs to: steve.baskauf@vanderbilt.edu')
-    sys.exit()
-
-# Code from https://realpython.com/python-command-line-arguments/#a-few-methods-for-parsing-python-command-line-arguments
-opts = [opt for opt in arg_vals if opt.startswith('-')]
-args = [arg for arg in arg_vals if not arg.startswith('-')]
-
-if '--log' in opts: # set output to specified log file or path including file name
-    log_path = args[opts.index('--log')]
-    log_object = open(log_path, 'wt', encoding='utf-8') # direct output sent to log_object to log file instead of sys.stdout
-if '-L' in opts: # set output to specified log file or path including file name
-    log_path = args[opts.index('-L')]
-    log_object = open(log_path, 'wt', encoding='utf-8') # direct output sent to log_object to log file instead of sys.stdout
-
-if '--update' in opts: # allow labels and descriptions that differ locally from existing Wikidata items to be updated 
-    if args[opts.index('--update')] == 'allow':
-        allow_label_description_changes = True
-if '-U' in opts: # allow labels and descriptions that differ locally from existing Wikidata items to be updated 
-    if args[opts.index('-U')] == 'allow':
-        allow_label_description_changes = True
-
-if '--endpoint' in opts: # specifies a Wikibase SPARQL endpoint different from the Wikidata Query Service
-    endpoint = args[opts.index('--endpoint')]
-if '-E' in opts: # specifies a Wikibase SPARQL endpoint different from the Wikidata Query Service
-    endpoint = args[opts.index('-E')]
-
-if '--sleep' in opts: # specifies a delay value (in seconds) between requests to the Query Service that is different from the default
-    sparqlSleep = args[opts.index('--sleep')]
-if '-S' in opts: # specifies a delay value (in seconds) between requests to the Query Service that is different from the default
-    sparqlSleep = args[opts.index('-S')]
-
-# Specifies a different file path for the metadata description file that maps the columns in the CSV
-# May be a different filename in the same directory as the script or a full or relative path.
-if '--json' in opts: 
-    json_metadata_description_file = args[opts.index('--json')]
-if '-J' in opts: 
-    json_metadata_description_file = args[opts.index('-J')]
-
-if '--path' in opts: # specifies the location of the credentials file.
-    credentials_path_string = args[opts.index('--path')] # include trailing slash if relative or absolute path
-if '-P' in opts: # specifies the location of the credentials file.
-    credentials_path_string = args[opts.index('-P')] # include trailing slash if relative or absolute path
-
-if '--credentials' in opts: # specifies the name of the credentials file.
-    credentials_filename = args[opts.index('--credentials')]
-if '-C' in opts: # specifies the name of the credentials file.
-    credentials_filename = args[opts.index('-C')]
-
-if '--terse' in opts: # terse output boolean.
-    terse_string = args[opts.index('--terse')]
-if '-T' in opts: # terse output boolean.
-    terse_string = args[opts.index('-T')]
-if terse_string == 'true':
-    terse = True
-else:
-    terse = False
-
-if '--dupcheck' in opts: # specifies whether to check the Query Service for duplicate label/description combinations.
-    duplicate_check_string = args[opts.index('--dupcheck')]
-if '-D' in opts: # specifies whether to check the Query Service for duplicate label/description combinations
-    duplicate_check_string = args[opts.index('-D')]
-if duplicate_check_string == 'false':
-    duplicate_check = False
-else:
-    duplicate_check = True
-
-# NOTE: As of 2023-02-06 wikibase.cloud APIs will throw an error for any calendar model that is not in the Wikidata 
-# namespace, regardless of the namespace of the Wikibase instance. 
-# Thus, the option is not given to specify the full URL, just the Q ID.
-# The API does not check whether the Q ID is a valid calendar model.
-if '--calmodel' in opts: # specifies the calendar model to be used in time data types.
-    calendar_model = args[opts.index('--calmodel')]
-if '-M' in opts: # specifies the calendar model to be used in time data types.
-    calendar_model = args[opts.index('-M')]
-
-# NOTE: As with the calendar model, the API validator requires a value that is in the Wikidata namespace, 
-# regardless of the namespace of the Wikibase instance.
-if '--globe' in opts: # specifies the globe to be used in globe-coordinate data types.
-    globe_value = args[opts.index('--globe')]
-if '-G' in opts: # specifies the globe to be used in globe-coordinate data types.
-    globe_value = args[opts.index('-G')]
-
-google_drive_root = '/content/drive/My Drive/'
-if credentials_path_string == 'home': # credential file is in home directory
-    home = str(Path.home()) # gets path to home directory; works for both Win and Mac
-    credentials_path = home + '/' + credentials_filename
-elif credentials_path_string == 'working': # credential file is in current working directory
-    credentials_path = credentials_filename
-# Note: as of 2021 script will not run from Google Colab due to IP blocking. So this option isn't useful
-elif credentials_path_string == 'gdrive': # credential file is in the root of the Google Drive
-    credentials_path = google_drive_root + credentials_filename
-else:  # credential file is in a directory whose path was specified by the credential_path_string
-    credentials_path = credentials_path_string + credentials_filename
-
-# The limit for bots without a bot flag seems to be 50 writes per minute. That's 1.2 s between writes.
-# To be safe and avoid getting blocked, leave the api_sleep value at its default: 1.25 s.
-# The option to increase the delay is offered if the user is a "newbie", defined as having an
-# account less than four days old and with fewer than 50 edits. The newbie limit is 8 edits per minute.
-# Therefore, newbies should set the API sleep value to 8 to avoid getting blocked.
-api_sleep = 1.25
-if '--apisleep' in opts: # delay between API POSTs. Used by newbies to slow writes to within limits. 
-    api_sleep = int(args[opts.index('--apisleep')]) # Number of seconds between API calls. Numeric only, do not include "s"
-if '-A' in opts:
-    api_sleep = int(args[opts.index('-A')])
+# Return the path of the credentials file from the --path value ("home", "working", "gdrive", or a directory) and file name
+def credentials_file_path(path_string, filename):
+    google_drive_root = '/content/drive/My Drive/'
+    if path_string == 'home': # credential file is in home directory
+        home = str(Path.home()) # gets path to home directory; works for both Win and Mac
+        return home + '/' + filename
+    elif path_string == 'working': # credential file is in current working directory
+        return filename
+    # Note: as of 2021 script will not run from Google Colab due to IP blocking. So this option isn't useful
+    elif path_string == 'gdrive': # credential file is in the root of the Google Drive
+        return google_drive_root + filename
+    else:  # credential file is in a directory whose path was specified by the credential_path_string
+        return path_string + filename
+
+# Convert the --logresponses value ("true", "false", or a number of characters) into the log_response_length setting
+def response_length_setting(value):
+    if value == 'true':
+        return -1
+    elif value == 'false':
+        return 0
+    return int(value)
+
+# Convert the command line arguments into the settings for run()
+def parse_arguments(arg_vals: List[str]) -> Dict[str, Any]:
+    config = dict(DEFAULT_CONFIG)
+    path_string = credentials_path_string
+    filename = credentials_filename
+
+    # Code from https://realpython.com/python-command-line-arguments/#a-few-methods-for-parsing-python-command-line-arguments
+    opts = [opt for opt in arg_vals if opt.startswith('-')]
+    args = [arg for arg in arg_vals if not arg.startswith('-')]
+
+    if '--log' in opts: # set output to specified log file or path including file name
+        config['log_path'] = args[opts.index('--log')]
+    if '-L' in opts: # set output to specified log file or path including file name
+        config['log_path'] = args[opts.index('-L')]
+
+    if '--logformat' in opts: # format of the log file: "text" or "json" (one JSON line per event)
+        config['log_format'] = args[opts.index('--logformat')]
+    if '-F' in opts: # format of the log file: "text" or "json" (one JSON line per event)
+        config['log_format'] = args[opts.index('-F')]
+
+    if '--logresponses' in opts: # how much of each API response to log: "true" (all), "false" (none), or a number of characters
+        config['log_response_length'] = response_length_setting(args[opts.index('--logresponses')])
+    if '-R' in opts: # how much of each API response to log: "true" (all), "false" (none), or a number of characters
+        config['log_response_length'] = response_length_setting(args[opts.index('-R')])
+
+    if '--update' in opts: # allow labels and descriptions that differ locally from existing Wikidata items to be updated 
+        if args[opts.index('--update')] == 'allow':
+            config['allow_label_description_changes'] = True
+    if '-U' in opts: # allow labels and descriptions that differ locally from existing Wikidata items to be updated 
+        if args[opts.index('-U')] == 'allow':
+            config['allow_label_description_changes'] = True
+
+    if '--endpoint' in opts: # specifies a Wikibase SPARQL endpoint different from the Wikidata Query Service
+        config['endpoint'] = args[opts.index('--endpoint')]
+    if '-E' in opts: # specifies a Wikibase SPARQL endpoint different from the Wikidata Query Service
+        config['endpoint'] = args[opts.index('-E')]
+
+    if '--sleep' in opts: # specifies a delay value (in seconds) between requests to the Query Service that is different from the default
+        config['sparql_sleep'] = float(args[opts.index('--sleep')])
+    if '-S' in opts: # specifies a delay value (in seconds) between requests to the Query Service that is different from the default
+        config['sparql_sleep'] = float(args[opts.index('-S')])
+
+    if '--chunk' in opts: # maximum number of Q IDs in the VALUES clause of queries for existing labels, descriptions, and aliases
+        config['values_chunk_size'] = int(args[opts.index('--chunk')])
+    if '-K' in opts: # maximum number of Q IDs in the VALUES clause of queries for existing labels, descriptions, and aliases
+        config['values_chunk_size'] = int(args[opts.index('-K')])
+
+    if '--workers' in opts: # maximum number of simultaneous queries for existing labels, descriptions, and aliases
+        config['sparql_workers'] = int(args[opts.index('--workers')])
+    if '-W' in opts: # maximum number of simultaneous queries for existing labels, descriptions, and aliases
+        config['sparql_workers'] = int(args[opts.index('-W')])
+
+    if '--tables' in opts: # maximum number of tables in the metadata description file that are written at the same time
+        config['table_workers'] = int(args[opts.index('--tables')])
+    if '-N' in opts: # maximum number of tables in the metadata description file that are written at the same time
+        config['table_workers'] = int(args[opts.index('-N')])
+
+    # Specifies a different file path for the metadata description file that maps the columns in the CSV
+    # May be a different filename in the same directory as the script or a full or relative path.
+    if '--json' in opts: 
+        config['json_metadata_description_file'] = args[opts.index('--json')]
+    if '-J' in opts: 
+        config['json_metadata_description_file'] = args[opts.index('-J')]
+
+    if '--path' in opts: # specifies the location of the credentials file.
+        path_string = args[opts.index('--path')] # include trailing slash if relative or absolute path
+    if '-P' in opts: # specifies the location of the credentials file.
+        path_string = args[opts.index('-P')] # include trailing slash if relative or absolute path
+
+    if '--credentials' in opts: # specifies the name of the credentials file.
+        filename = args[opts.index('--credentials')]
+    if '-C' in opts: # specifies the name of the credentials file.
+        filename = args[opts.index('-C')]
+    config['credentials_path'] = credentials_file_path(path_string, filename)
+
+    if '--terse' in opts: # terse output boolean.
+        config['terse'] = args[opts.index('--terse')] == 'true'
+    if '-T' in opts: # terse output boolean.
+        config['terse'] = args[opts.index('-T')] == 'true'
+
+    if '--dupcheck' in opts: # specifies whether to check the Query Service for duplicate label/description combinations.
+        config['duplicate_check'] = args[opts.index('--dupcheck')] != 'false'
+    if '-D' in opts: # specifies whether to check the Query Service for duplicate label/description combinations
+        config['duplicate_check'] = args[opts.index('-D')] != 'false'
+
+    if '--batchrefs' in opts: # specifies whether to write new references for existing statements as part of the main edit for each item.
+        config['batch_references'] = args[opts.index('--batchrefs')] == 'true'
+    if '-B' in opts: # specifies whether to write new references for existing statements as part of the main edit for each item.
+        config['batch_references'] = args[opts.index('-B')] == 'true'
+
+    if '--live' in opts: # specifies whether to compare the table with the current state of existing items retrieved from the API.
+        config['live_mode'] = args[opts.index('--live')] == 'true'
+    if '-I' in opts: # specifies whether to compare the table with the current state of existing items retrieved from the API.
+        config['live_mode'] = args[opts.index('-I')] == 'true'
+
+    # NOTE: As of 2023-02-06 wikibase.cloud APIs will throw an error for any calendar model that is not in the Wikidata 
+    # namespace, regardless of the namespace of the Wikibase instance. 
+    # Thus, the option is not given to specify the full URL, just the Q ID.
+    # The API does not check whether the Q ID is a valid calendar model.
+    if '--calmodel' in opts: # specifies the calendar model to be used in time data types.
+        config['calendar_model'] = args[opts.index('--calmodel')]
+    if '-M' in opts: # specifies the calendar model to be used in time data types.
+        config['calendar_model'] = args[opts.index('-M')]
+
+    # NOTE: As with the calendar model, the API validator requires a value that is in the Wikidata namespace, 
+    # regardless of the namespace of the Wikibase instance.
+    if '--globe' in opts: # specifies the globe to be used in globe-coordinate data types.
+        config['globe_value'] = args[opts.index('--globe')]
+    if '-G' in opts: # specifies the globe to be used in globe-coordinate data types.
+        config['globe_value'] = args[opts.index('-G')]
+
+    # The limit for bots without a bot flag seems to be 50 writes per minute. That's 1.2 s between writes.
+    # To be safe and avoid getting blocked, leave the api_sleep value at its default: 1.25 s.
+    # The option to increase the delay is offered if the user is a "newbie", defined as having an
+    # account less than four days old and with fewer than 50 edits. The newbie limit is 8 edits per minute.
+    # Therefore, newbies should set the API sleep value to 8 to avoid getting blocked.
+    # For other Wikibase instances, the delay is adjusted automatically (see vb_session.make_rate_controller()).
+    if '--apisleep' in opts: # delay between API POSTs. Used by newbies to slow writes to within limits. 
+        config['api_sleep'] = float(args[opts.index('--apisleep')]) # Number of seconds between API calls. Numeric only, do not include "s"
+    if '-A' in opts:
+        config['api_sleep'] = float(args[opts.index('-A')])
+
+    if '--profile' in opts: # time the phases of the upload and save the timings in the specified JSON file
+        config['profile_path'] = args[opts.index('--profile')]
+    if '-O' in opts: # time the phases of the upload and save the timings in the specified JSON file
+        config['profile_path'] = args[opts.index('-O')]
+
+    if '--cprofile' in opts: # specifies whether to run cProfile for the phases limited by the CPU (requires --profile)
+        config['cpu_profile'] = args[opts.index('--cprofile')] == 'true'
+    if '-X' in opts: # specifies whether to run cProfile for the phases limited by the CPU (requires --profile)
+        config['cpu_profile'] = args[opts.index('-X')] == 'true'
+
+    if '--metrics' in opts: # port number for a local HTTP server, or file name, for live progress metrics
+        config['metrics_target'] = args[opts.index('--metrics')]
+    if '-Q' in opts: # port number for a local HTTP server, or file name, for live progress metrics
+        config['metrics_target'] = args[opts.index('-Q')]
+    return config
 
 # See https://meta.wikimedia.org/wiki/User-Agent_policy
 user_agent_header = 'VanderBot/' + version + ' (https://github.com/HeardLibrary/linked-data/tree/master/vanderbot; mailto:steve.baskauf@vanderbilt.edu)'
@@ -337,80 +475,12 @@ request_header = generate_header_dictionary(accept_media_type,user_agent_header)
 # -----------------------------------------------------------------
 # function definitions
 
-def retrieveCredentials(path):
-    with open(path, 'rt') as fileObject:
-        lineList = fileObject.read().split('\n')
-    domain_name = lineList[0].split('=')[1]
-    username = lineList[1].split('=')[1]
-    password = lineList[2].split('=')[1]
-    #userAgent = lineList[3].split('=')[1]
-    return domain_name, username, password
-
-def getLoginToken(apiUrl):    
-    parameters = {
-        'action':'query',
-        'meta':'tokens',
-        'type':'login',
-        'format':'json'
-    }
-    r = session.get(url=apiUrl, params=parameters)
-    data = r.json()
-    return data['query']['tokens']['logintoken']
-
-def logIn(apiUrl, token, username, password):
-    parameters = {
-        'action':'login',
-        'lgname':username,
-        'lgpassword':password,
-        'lgtoken':token,
-        'format':'json'
-    }
-    r = session.post(apiUrl, data=parameters)
-    data = r.json()
-    return data
-
-def getCsrfToken(apiUrl):
-    parameters = {
-        "action": "query",
-        "meta": "tokens",
-        "format": "json"
-    }
-    r = session.get(url=apiUrl, params=parameters)
-    data = r.json()
-    return data["query"]["tokens"]["csrftoken"]
-
-# read a CSV into a list of dictionaries
-def readDict(filename):
-    fileObject = open(filename, 'r', newline='', encoding='utf-8')
-    dictObject = csv.DictReader(fileObject)
-    array = []
-    for row in dictObject:
-        array.append(row)
-    fileObject.close()
-    return array
-
-# write the data to a file
-def writeToFile(tableFileName, fieldnames, tableData):
-    with open(tableFileName, 'w', newline='', encoding='utf-8') as csvfile:
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-        writer.writeheader()
-        for writeRowNumber in range(0, len(tableData)):
-            writer.writerow(tableData[writeRowNumber])
-
 # function to get local name from an IRI
 def extractFromIri(iri, numberPieces):
     # with pattern like http://www.wikidata.org/entity/Q6386232 there are 5 pieces with qId as number 4
     pieces = iri.split('/')
     return pieces[numberPieces]
 
-def remove_leading_trailing_whitespace(string: str) -> Tuple[str, bool]:
-    """Removes leading and trailing whitespace from a string and prints a warning if the string is changed."""
-    error = False
-    if string != string.strip():
-        error = True
-        print('WARNING: leading or trailing whitespace removed from "' + string + '"')
-    return string.strip(), error
-
 def safe_quotes(label: str) -> str:
     """Encloses a string in appropriate triple quotes to prevent malformed SPARQL query.
     
@@ -435,82 +505,64 @@ def commons_url_to_filename(url):
     filename = urllib.parse.unquote(string) # reverse URL-encode the string
     return filename
 
-# convert an unencoded filename string to a URL-encoded Commons URL; inverse of previous function
-def filename_to_commons_url(filename):
-    # form of filename is 'Castle De Haar (1892-1913) - 360° Panorama of Castle & Castle Grounds.jpg'
-    encoded_filename = urllib.parse.quote(filename)
-    url = commons_prefix + encoded_filename
-    return url
-
-# SPARQL ASK query used to determine whether labels and descriptions already exist in Wikidata
-def ask_query(graph_pattern):
-    query_string = '''ask where {
-'''+ graph_pattern + '''
-      }'''
-    #print(query_string)
-    #response = requests.post(endpoint, data=query_string.encode('utf-8'), headers=request_header)
-    response = requests.post(endpoint, data=dict(query=query_string), headers=request_header)
-    #print(response.text) # uncomment to view the raw response, e.g. if you are getting an error
-    data = response.json() # NOTE: the conversion from JSON to Python data structure turns JSON true into Python True
-    #print(json.dumps(data, indent=2))
-    results = data['boolean']
-    #print(results) 
-    return results
-    
-# The following two functions use the ASK function above for cases where only a label or only a description is present
-def check_for_only_label(label_string, language):
-    # Label must exist
-    graph_pattern = '  ?entity rdfs:label ' + safe_quotes(label_string) + '@' + language + '.'
-    #print('Checking ' + language + ' label: "' + label_string)
-    #print(graph_pattern)
-    label_exists = ask_query(graph_pattern)
-    sleep(sparqlSleep)
-    #print(label_exists)
-    #print()
-    
-    # Also label must exist with NO description
-    graph_pattern = '  ?entity rdfs:label ' + safe_quotes(label_string) + '@' + language + '''.
+# SELECT query used to determine which of a list of labels and descriptions already exist in Wikidata.
+# Each item in value_tuples contains one string for each variable, followed by the language tag of the strings.
+# Returns a set of the tuples that were found (with the language tag lower-cased).
+def find_existing_strings(value_tuples, variables, graph_pattern):
+    def build_query(chunk):
+        values = ''
+        for value_tuple in chunk:
+            values += '    ('
+            for string in value_tuple[:-1]:
+                values += ' ' + safe_quotes(string) + '@' + value_tuple[-1]
+            values += ' )\n'
+        query_string = 'select distinct ?' + ' ?'.join(variables) + ''' where {
+  VALUES (?''' + ' ?'.join(variables) + ''')
+  {
+''' + values + '''  }
+''' + graph_pattern + '''
+  }'''
+        #print(query_string)
+        return query_string
+
+    def send_query(query_string):
+        return vb_labels.send_select_query(query_string, endpoint, request_header)
+
+    results = vb_sparql.run_values_query(list(value_tuples), build_query, send_query, chunk_size=values_chunk_size, max_workers=sparql_workers, sleep_time=sparqlSleep, template='vanderbot duplicates ' + ' '.join(variables) + ' ' + endpoint)
+    found = set()
+    for result in results:
+        found_tuple = tuple([result[variable]['value'] for variable in variables])
+        found.add(found_tuple + (result[variables[0]]['xml:lang'].lower(),))
+    return found
+
+# Screen the labels and descriptions of all new items at once before any writing.
+# label_descriptions is a set of (label, description, language) tuples, labels_only is a set of (label, language) tuples
+# for labels with no description, and descriptions_only is a set of (description, language) tuples for descriptions with no label.
+# Returns three sets containing the tuples (with lower-cased language tags) that would be duplicates.
+def screen_for_duplicates(label_descriptions, labels_only, descriptions_only):
+    # The label/description combination must exist
+    duplicate_label_descriptions = find_existing_strings(label_descriptions, ['label', 'description'], '''  ?entity rdfs:label ?label.
+  ?entity schema:description ?description.''')
+
+    # Label must exist and also must not exist with a description in that language. 
+    # A label that exists with no description for that language is a duplicate.
+    label_exists = find_existing_strings(labels_only, ['label'], '  ?entity rdfs:label ?label.')
+    label_with_description = find_existing_strings(labels_only, ['label'], '''  ?entity rdfs:label ?label.
   ?entity schema:description ?desc.
-  filter(lang(?desc)="''' + language + '")'
-    #print('Checking ' + language + ' label: "' + label_string + '" with description')
-    #print(graph_pattern)
-    label_with_description = ask_query(graph_pattern)
-    sleep(sparqlSleep)
-    #print(label_with_description)
-    #print()
-    # A True indicates that there is a label with no description for that language
-    return label_exists and not(label_with_description)
-
-def check_for_only_description(description_string, language):
-    # Description must exist
-    graph_pattern = '  ?entity schema:description ' + safe_quotes(description_string) + '@' + language + '.'
-    #print('Checking ' + language + ' description: "' + description_string + '"')
-    #print(graph_pattern)
-    description_exists = ask_query(graph_pattern)
-    sleep(sparqlSleep)
-    #print(description_exists)
-    #print()
-    
-    # Also description must exist with NO label
-    graph_pattern = '  ?entity schema:description ' + safe_quotes(description_string) + '@' + language + '''.
+  filter(lang(?desc)=lang(?label))''')
+    duplicate_labels = label_exists - label_with_description
+
+    # Description must exist and also must not exist with a label in that language
+    description_exists = find_existing_strings(descriptions_only, ['description'], '  ?entity schema:description ?description.')
+    description_with_label = find_existing_strings(descriptions_only, ['description'], '''  ?entity schema:description ?description.
   ?entity rdfs:label ?label.
-  filter(lang(?label)="''' + language + '")'
-    #print('Checking ' + language + ' description: "' + description_string + '" with label')
-    #print(graph_pattern)
-    description_with_record = ask_query(graph_pattern)
-    sleep(sparqlSleep)
-    #print(description_with_record)
-    #print()
-    # A True indicates that there is a label with no description for that language
-    return description_exists and not(description_with_record)
+  filter(lang(?label)=lang(?description))''')
+    duplicate_descriptions = description_exists - description_with_label
+
+    return duplicate_label_descriptions, duplicate_labels, duplicate_descriptions
 
 # search for any of the "label" types: label, alias, description
 def searchLabelsDescriptionsAtWikidata(qIds, labelType, language):
-    # create a string for all of the Wikidata item IDs to be used as subjects in the query
-    alternatives = ''
-    for qId in qIds:
-        alternatives += 'wd:' + qId + '\n'
-        
     if labelType == 'label':
         predicate = 'rdfs:label'
     elif labelType == 'alias':
@@ -520,27 +572,38 @@ def searchLabelsDescriptionsAtWikidata(qIds, labelType, language):
     else:
         predicate = 'rdfs:label'        
         
-    # create a string for the query
-    query = ''
-    # SPARQL queries to wikibases other than Wikidata won't necessarily have wd: defined 
-    # automatically. In those cases, the prefix must be defined in a preamble to the query.
-    if DOMAIN_NAME != 'http://www.wikidata.org':
-        query += 'PREFIX wd: <' + DOMAIN_NAME + '/entity/>\n'
-    query += 'select distinct ?id ?string '
-    query += '''where {
+    # create the query for one chunk of the Q IDs
+    def build_query(qId_chunk):
+        # create a string for all of the Wikidata item IDs to be used as subjects in the query
+        alternatives = ''
+        for qId in qId_chunk:
+            alternatives += 'wd:' + qId + '\n'
+
+        query = ''
+        # SPARQL queries to wikibases other than Wikidata won't necessarily have wd: defined 
+        # automatically. In those cases, the prefix must be defined in a preamble to the query.
+        if DOMAIN_NAME != 'http://www.wikidata.org':
+            query += 'PREFIX wd: <' + DOMAIN_NAME + '/entity/>\n'
+        query += 'select distinct ?id ?string '
+        query += '''where {
   VALUES ?id
 {
 ''' + alternatives + '''}
   ?id '''+ predicate + ''' ?string.
   filter(lang(?string)="''' + language + '''")
   }'''
-    #print(query)
+        #print(query)
+        return query
+
+    def send_query(query):
+        return vb_labels.send_select_query(query, endpoint, request_header)
+
+    # A single query with thousands of Q IDs in the VALUES clause will time out, so the Q IDs are sent in chunks.
+    # The chunk queries are delayed by sparqlSleep to avoid hitting the SPARQL endpoint too rapidly.
+    # The chunk size that worked is remembered for the next run (see vb_sparql.run_values_query()).
+    results = vb_sparql.run_values_query(qIds, build_query, send_query, chunk_size=values_chunk_size, max_workers=sparql_workers, sleep_time=sparqlSleep, template='vanderbot ' + labelType + ' ' + endpoint)
 
     returnValue = []
-    #r = requests.post(endpoint, data=query.encode('utf-8'), headers=request_header)
-    r = requests.post(endpoint, data=dict(query=query), headers=request_header)
-    data = r.json()
-    results = data['results']['bindings']
     for result in results:
         # remove wd: 'http://www.wikidata.org/entity/'
         qNumber = extractFromIri(result['id']['value'], 4)
@@ -548,323 +611,28 @@ def searchLabelsDescriptionsAtWikidata(qIds, labelType, language):
         resultsDict = {'qId': qNumber, 'string': string}
         returnValue.append(resultsDict)
 
-    # delay to avoid hitting the SPARQL endpoint too rapidly
-    sleep(sparqlSleep)
-    
     return returnValue
 
-# Generate a UUID for the value node identifier when there isn't already one
-def generateNodeId(rowData, columnNameRoot):
-    changed = False
-    # Only do something in the case where there is a value. Missing values and blank nodes should be skipped.
-    if rowData[columnNameRoot + '_val'] != '' and rowData[columnNameRoot + '_val'][:2] != '_:':
-        # If there is no UUID in the _nodeId column, generate one
-        if rowData[columnNameRoot + '_nodeId'] == '':
-            rowData[columnNameRoot + '_nodeId'] = str(uuid.uuid4())
-            changed = True
-    return rowData, changed
-
-def generate_uuid_bnode(string):
-    """If string is bnode abbreviation, add UUID and return as string."""
-    if string == '_:':
-        return True, '_:' + str(uuid.uuid4())
-    else:
-        return False, string
-
-# Function to check for the particular form of xsd:dateTime required for full dates in Wikidata
-# See https://stackoverflow.com/questions/41129921/validate-an-iso-8601-datetime-string-in-python
-regex = r'^(-?(?:[1-9][0-9]*)?[0-9]{4})-(1[0-2]|0[0-9])-(3[01]|0[0-9]|[12][0-9])T([0][0]):([0][0]):([0][0])(Z)$'
-match_iso8601 = re.compile(regex).match
-def validate_iso8601(str_val):
-    try:            
-        if match_iso8601( str_val ) is not None:
-            return True
-    except:
-        pass
-    return False
-
-# Function to check for valid abbreviated dates
-def validate_time(date_text):
-    try:
-        if date_text != datetime.strptime(date_text, "%Y-%m-%d").strftime("%Y-%m-%d"):
-            raise ValueError
-        form = 'day'
-    except ValueError:
-        try:
-            if date_text != datetime.strptime(date_text, "%Y-%m").strftime('%Y-%m'):
-                raise ValueError
-            form = 'month'
-        except ValueError:
-            try:
-                if date_text != datetime.strptime(date_text, "%Y").strftime('%Y'):
-                    raise ValueError
-                form = 'year'
-            except ValueError:
-                form ='none'
-    return form
-
-# Function to convert times to the format required by Wikidata
-def convertDates(rowData, dateColumnNameRoot):
-    error = False
-    changed = False
-    # Only do something in the case where there is a date. Missing values and bland nodes should be skipped.
-    if rowData[dateColumnNameRoot + '_val'] != '' and rowData[dateColumnNameRoot + '_val'][:2] != '_:':
-        # Assume that if the precision column is empty that the dates need to be converted
-        if rowData[dateColumnNameRoot + '_prec'] == '':
-            changed = True
-            #print(dateColumnNameRoot, rowData[dateColumnNameRoot + '_val'])
-
-            # set these two to default to the existing values
-            # precisionNumber = int(rowData[dateColumnNameRoot + '_prec']) # not necessary since conditional on value of ''
-            timeString = rowData[dateColumnNameRoot + '_val']
-
-            value = rowData[dateColumnNameRoot + '_val']
-            date_type = validate_time(value)
-            # date is YYYY-MM-DD
-            if date_type == 'day':
-                timeString = value + 'T00:00:00Z'
-                precisionNumber = 11 # precision to days
-            # date is YYYY-MM
-            elif date_type == 'month':
-                timeString = value + '-00T00:00:00Z'
-                precisionNumber = 10 # precision to months
-            # date is YYYY
-            elif date_type == 'year':
-                timeString = value + '-00-00T00:00:00Z'
-                precisionNumber = 9 # precision to years
-            # date does not conform to any of the tested options
-            else:
-                # date is xsd:dateTime and doesn't need adjustment
-                if validate_iso8601(value):
-                    timeString = value
-                    precisionNumber = 11 # assume precision to days since Wikibase doesn't support greater resolution than that
-                # date form unknown, don't adjust
-                else:
-                    #print('Warning: date for ' + dateColumnNameRoot + '_val:', rowData[dateColumnNameRoot + '_val'], 'does not conform to any standard format! Check manually.')
-                    error = True
-                    precisionNumber = '' # must have a value to prevent an error, will be ignored since the write and save will be killed
-            # assign the changed values back to the dict
-            rowData[dateColumnNameRoot + '_val'] = timeString
-            rowData[dateColumnNameRoot + '_prec'] = precisionNumber
-        else:
-            # Check that a pre-existing value for the date string conforms to the Wikidata format requirements
-            if validate_iso8601(rowData[dateColumnNameRoot + '_val']):
-                # a pre-existing precisionNumber must be an integer when written to the API
-                try:
-                    rowData[dateColumnNameRoot + '_prec'] = int(rowData[dateColumnNameRoot + '_prec'])
-                except: # throw an error if characters can't be converted to an integer
-                    error = True
-            else:
-                error = True
-
-    return rowData, error, changed
-
-# Find the column with the UUID for the statement
-def findPropertyUuid(propertyId, columns):
-    statementUuidColumn = '' # start value as empty string in case no UUID column
-    nUuidColumns = 0
-    for column in columns:
-        if not('suppressOutput' in column):
-            # find the valueUrl in the column for which the value of the statement has the prop version of the property as its propertyUrl
-            valueString = column['propertyUrl'].partition('prop/')[2] # This will pick up all kinds of properties, but only p: properties will have PID directly after 'prop/'
-            if propertyId == valueString:
-                nUuidColumns += 1
-                temp = column['valueUrl'].partition('-{')[2]
-                statementUuidColumn = temp.partition('}')[0] # in the event of two columns with the same property ID, the last one is used
-                #print(statementUuidColumn)
-    
-    # Give a warning if there isn't any UUID column for the property
-    if statementUuidColumn == '':
-        print('Warning: No UUID column for property ' + propertyId)
-    if nUuidColumns > 1:
-        print('Warning: there are', nUuidColumns,'for property',propertyId)
-    return statementUuidColumn
-
-# Each property can have zero to many references. This function searches the column headers to find all of
-# the columns that are references for a particulary property used in statements
-def findReferencesForProperty(statementUuidColumn, columns):
-    # build up a list of dictionaries about references to associate with the property
-    referenceList = []
-
-    # Step through the columns looking for references associated with the property
-    for column in columns:
-        if not('suppressOutput' in column):
-            # check if the aboutUrl for the column has the statement subject UUID column as the about value and that the propertyUrl value is wasDerivedFrom
-            if ('prov:wasDerivedFrom' in column['propertyUrl']) and (statementUuidColumn in column['aboutUrl']):
-                temp = column['valueUrl'].partition('{')[2]
-                refHashColumn = temp.partition('}')[0]
-                #print(refHashColumn)
-
-                # These are the lists that will accumulate data about each property of the reference
-                refPropList = [] # P ID for the property
-                refValueColumnList = [] # column header string for the reference property's value
-                refEntityOrLiteral = [] # values: entity or literal, determined by presence of a valueUrl key for the column
-                refTypeList = [] # the datatype of the property's value: url, time, or string
-                refValueTypeList = [] # the specific type of a string: time or string
-                refLangList = [] # the language of monolingualtext
-                # The kind of value in the column (dateTime, string) can be retrieved directly from the column 'datatype' value
-                
-                # Now step throught the columns looking for each of the properties that are associated with the reference
-                for propColumn in columns:
-                    if not('suppressOutput' in propColumn):
-                        # Find the columns that have the refHash column name in the aboutUrl
-                        if refHashColumn in propColumn['aboutUrl']:
-                            
-                            # Determine whether the value of the reference is a value node (e.g. dates) or a direct value
-                            valueString = propColumn['propertyUrl'].partition('prop/reference/')[2]
-                            if "value" in valueString: # e.g. value/P813
-                                # The property IRI namespace for references with value nodes is http://www.wikidata.org/prop/reference/value/
-                                refPropList.append(valueString.partition('value/')[2])
-                                # The column title will be something like employer_ref1_retrieved_nodeId, 
-                                # so get the root of the string to the left of "_nodeId"
-                                refValueColumnList.append(propColumn['titles'].partition('_nodeId')[0])
-                                refLangList.append('')
-
-                                # Find out what kind of value node it is. Currently supported is date; future: globe coordinate value and quantities
-                                for testColumn in columns:
-                                    try:
-                                        if propColumn['titles'] in testColumn['aboutUrl']:
-                                            if 'timeValue' in testColumn['propertyUrl']: # value is a date
-                                                refEntityOrLiteral.append('value')
-                                                refTypeList.append('time')
-                                                refValueTypeList.append('time')
-                                            elif 'geoLatitude' in testColumn['propertyUrl']: # value is a globe coordinate value
-                                                refEntityOrLiteral.append('value')
-                                                refTypeList.append('globe-coordinate')
-                                                refValueTypeList.append('globecoordinate')
-                                            elif 'quantityAmount' in testColumn['propertyUrl']: # value is a quantity
-                                                refEntityOrLiteral.append('value')
-                                                refTypeList.append('quantity')
-                                                refValueTypeList.append('quantity')
-                                            else:
-                                                continue
-                                    except:
-                                        pass
-                            else: # e.g. P854
-                                # The property IRI namespace for references with direct values is http://www.wikidata.org/prop/reference/
-                                refPropList.append(valueString)
-                                # Just use the whole column title
-                                refValueColumnList.append(propColumn['titles'])
-
-                                if 'valueUrl' in propColumn:
-                                    refLangList.append('')
-                                    # URIs are detected when there is a valueUrl whose value has a first character of "{"
-                                    if propColumn['valueUrl'][0] == '{':
-                                        refEntityOrLiteral.append('literal')
-                                        refTypeList.append('url')
-                                        refValueTypeList.append('string')
-                                    else:
-                                        refEntityOrLiteral.append('entity')
-                                        refTypeList.append('wikibase-item')
-                                        refValueTypeList.append('wikibase-entityid')
-                                else:
-                                    # monolingualtext detected by language tag
-                                    if 'lang' in propColumn:
-                                        refEntityOrLiteral.append('monolingualtext')
-                                        refTypeList.append('monolingualtext')
-                                        refValueTypeList.append('monolingualtext')
-                                        refLangList.append(propColumn['lang'])
-                                    # plain text string
-                                    else:
-                                        refEntityOrLiteral.append('literal')
-                                        refTypeList.append('string')
-                                        refValueTypeList.append('string')
-                                        refLangList.append('')
-
-                # After all of the properties have been found and their data have been added to the lists, 
-                # insert the lists into the reference list as values in a dictionary
-                referenceList.append({'refHashColumn': refHashColumn, 'refPropList': refPropList, 'refValueColumnList': refValueColumnList, 'refEntityOrLiteral': refEntityOrLiteral, 'refTypeList': refTypeList, 'refValueTypeList': refValueTypeList, 'refLangList': refLangList})
-        
-    # After every column has been searched for references associated with the property, return the reference list
-    #print('References: ', json.dumps(referenceList, indent=2))
-    return referenceList
-
-
-# Each property can have zero to many qualifiers. This function searches the column headers to find all of
-# the columns that are qualifiers for a particulary property
-def findQualifiersForProperty(statementUuidColumn, columns):
-
-    # These are the lists that will accumulate data about each qualifier
-    qualPropList = [] # P ID for the property
-    qualValueColumnList = [] # column header string for the reference property's value
-    qualEntityOrLiteral = [] # values: entity or literal, determined by presence of a valueUrl key for the column
-    qualTypeList = [] # the datatype of the qualifier's value: url, time, or string
-    qualValueTypeList = [] # the specific type of a string: time or string
-    qualLangList = [] # the language of monolingualtext
-    # The kind of value in the column (dateTime, string) can be retrieved directly from the column 'datatype' value
-
-    for column in columns:
-        if not('suppressOutput' in column):
-            # find the column that has the statement UUID in the about
-            # and the property is a qualifier property
-            if (statementUuidColumn in column['aboutUrl']) and ('qualifier' in column['propertyUrl']):
-                # Determine whether the value of the qualifier is a value node (e.g. dates) or a direct value
-                valueString = column['propertyUrl'].partition('prop/qualifier/')[2]
-                if "value" in valueString: # e.g. value/P580
-                    qualLangList.append('')
-                    # The property IRI namespace for qualifiers with value nodes is http://www.wikidata.org/prop/qualifier/value/
-                    qualPropList.append(valueString.partition('value/')[2])
-                    # The column title will be something like employer_startDate_nodeId, 
-                    # so get the root of the string to the left of "_nodeId"
-                    qualValueColumnList.append(column['titles'].partition('_nodeId')[0])
-
-                    # Find out what kind of value node it is.
-                    for testColumn in columns:
-                        try:
-                            if column['titles'] in testColumn['aboutUrl']:
-                                if 'timeValue' in testColumn['propertyUrl']: # value is a date
-                                    qualEntityOrLiteral.append('value')
-                                    qualTypeList.append('time')
-                                    qualValueTypeList.append('time')
-                                elif 'geoLatitude' in testColumn['propertyUrl']: # value is a globe coordinate value
-                                    qualEntityOrLiteral.append('value')
-                                    qualTypeList.append('globe-coordinate')
-                                    qualValueTypeList.append('globecoordinate')
-                                    pass
-                                elif 'quantityAmount' in testColumn['propertyUrl']: # value is a quantity
-                                    qualEntityOrLiteral.append('value')
-                                    qualTypeList.append('quantity')
-                                    qualValueTypeList.append('quantity')
-                                else:
-                                    continue 
-                        except:
-                            pass
-                else: # e.g. P1545
-                    # The property IRI namespace for qualifiers with direct values is http://www.wikidata.org/prop/qualifier/
-                    qualPropList.append(valueString)
-                    # Just use the whole column title
-                    qualValueColumnList.append(column['titles'])
-
-                    # determine whether the qualifier is an entity/URI or string
-                    if 'valueUrl' in column:
-                        qualLangList.append('')
-                        # URIs are detected when there is a valueUrl whose value has a first character of "{"
-                        if column['valueUrl'][0] == '{':
-                            qualEntityOrLiteral.append('literal')
-                            qualTypeList.append('url')
-                            qualValueTypeList.append('string')
-                        else:
-                            qualEntityOrLiteral.append('entity')
-                            qualTypeList.append('wikibase-item')
-                            qualValueTypeList.append('wikibase-entityid')
-                    else:
-                        # monolingualtext detected by language tag
-                        if 'lang' in column:
-                            qualEntityOrLiteral.append('monolingualtext')
-                            qualTypeList.append('monolingualtext')
-                            qualValueTypeList.append('monolingualtext')
-                            qualLangList.append(column['lang'])
-                        # plain text string
-                        else:
-                            qualEntityOrLiteral.append('literal')
-                            qualTypeList.append('string')
-                            qualValueTypeList.append('string')
-                            qualLangList.append('')
-
-    # After all of the qualifier columns are found for the property, create a dictionary to pass back
-    qualifierDictionary = {'qualPropList': qualPropList, 'qualValueColumnList': qualValueColumnList, "qualEntityOrLiteral": qualEntityOrLiteral, 'qualTypeList': qualTypeList, 'qualValueTypeList': qualValueTypeList, 'qualLangList': qualLangList}
-    #print('Qualifiers: ', json.dumps(qualifierDictionary, indent=2))
-    return(qualifierDictionary)
+# Returns a message for each reference in the table that didn't match any reference of the statement. The hash cells of
+# those references are left empty.
+def find_reference_hashes(statement, referencesForStatement, rowData, statement_index):
+    mismatches = []
+    if 'references' in statement: # skip reference checking if the item doesn't have any references
+        # Search for each reference type (set of reference properties) that's being tracked for a particular property's statements
+        for tableReference in referencesForStatement: # loop will not be executed when length of referenceForStatement = 0 (no references tracked for this property)
+            # The property/value pairs of the reference in the table are looked up in the index of the statement's references.
+            # Reference properties that don't have a value in this row are not considered.
+            signature = vb_claims.table_reference_signature(tableReference, rowData)
+            if len(signature) == 0: # none of the reference properties have values, so no reference was written
+                continue
+            reference_hash = statement_index.find_reference(statement, signature)
+            if reference_hash is None:
+                # Since this check only happens for references that were just written, there should always be a match. If the
+                # API changed a value so that it doesn't match, the hash of some other reference must not be recorded.
+                mismatches.append('No reference in the response JSON matched the values in the table for reference ' + tableReference['refHashColumn'] + ' of statement ' + statement['id'])
+                continue
+            rowData[tableReference['refHashColumn']] = reference_hash
+    return mismatches
 
 # The form of snaks is the same for references and qualifiers, so they can be generated systematically
 # Although the variable names include "ref", they apply the same to the analagous "qual" variables.
@@ -903,7 +671,7 @@ def generateSnaks(snakDictionary, require_references, refValue, refPropNumber, r
                 snakDictionary[refPropList[refPropNumber]] = [
                     {
                     'snaktype': 'value',
-                    'property': propertiesIdList[propertyNumber],
+                    'property': refPropList[refPropNumber],
                     'datavalue':{
                         'value':{
                             'amount': refValue['amount'], # a string for a decimal number; must have leading + or -
@@ -920,7 +688,7 @@ def generateSnaks(snakDictionary, require_references, refValue, refPropNumber, r
                 snakDictionary[refPropList[refPropNumber]] = [
                     {
                     'snaktype': 'value',
-                    'property': propertiesIdList[propertyNumber],
+                    'property': refPropList[refPropNumber],
                     'datavalue': {
                         'value': {
                             'latitude': float(refValue['latitude']), # latitude; decimal number
@@ -1081,9 +849,9 @@ def createQualifiers(qualifierDictionaryForProperty, rowData):
             else:
                 if qualTypeList[qualPropNumber] == 'time':
                     qualValue = {'timeValue': rowData[qualValueColumnList[qualPropNumber] + '_val'], 'timePrecision': rowData[qualValueColumnList[qualPropNumber] + '_prec']}
-                elif qualTypeList[refPropNumber] == 'quantity':
+                elif qualTypeList[qualPropNumber] == 'quantity':
                     qualValue = {'amount': rowData[qualValueColumnList[qualPropNumber] + '_val'], 'unit': rowData[qualValueColumnList[qualPropNumber] + '_unit']}
-                elif qualTypeList[refPropNumber] == 'globe-coordinate':
+                elif qualTypeList[qualPropNumber] == 'globe-coordinate':
                     qualValue = {'latitude': rowData[qualValueColumnList[qualPropNumber] + '_val'], 'longitude': rowData[qualValueColumnList[qualPropNumber] + '_long'], 'precision': rowData[qualValueColumnList[qualPropNumber] + '_prec']}
                 else:
                     pass
@@ -1099,388 +867,244 @@ def createQualifiers(qualifierDictionaryForProperty, rowData):
     return snakDictionary
 
 
-# This function attempts to post and handles maxlag errors
-def attemptPost(apiUrl, parameters):
-    maxRetries = 10
-    # Wikidata recommends a retry delay of at least 5 seconds.
-    # This differs from api_sleep, which is the delay when there is no lag. The baseDelay is a starting point; the
-    # actual delay is increased with each retry after the server reports being lagged.
-    baseDelay = 5
-    delayLimit = 300
-    retry = 0
-    # maximum number of times to retry lagged server = maxRetries
-    while retry <= maxRetries:
-        if retry > 0:
-            print('retry:', retry)
-        # This first try block is to check for cases where the server is not responding at all.
-        response = 0
-        while response < 5:
-            try:
-                r = session.post(apiUrl, data = parameters)
-                data = r.json()
-                response = 5
-            except:
-                print('Bad response from server.')
-                print('Response was:', r.text)
-                print('Waiting 1 second to retry. Retry', response + 1, 'of 5)')
-                print()
-                sleep(1)
-                response += 1
-        #r = session.post(apiUrl, data = parameters)
-        #data = r.json()
-
-        # This second try block is to check for cases where the server is responding, but is lagged.
-        try:
-            # check if response is a maxlag error
-            # see https://www.mediawiki.org/wiki/Manual:Maxlag_parameter
-            if data['error']['code'] == 'maxlag':
-                print('Lag of ', data['error']['lag'], ' seconds.')
-                # recommended delay is basically useless
-                # recommendedDelay = int(r.headers['Retry-After'])
-                #if recommendedDelay < 5:
-                    # recommendation is to wait at least 5 seconds if server is lagged
-                #    recommendedDelay = 5
-                recommendedDelay = baseDelay*2**retry # double the delay with each retry 
-                if recommendedDelay > delayLimit:
-                    recommendedDelay = delayLimit
-                if retry != maxRetries:
-                    print('Waiting ', recommendedDelay , ' seconds.')
-                    print()
-                    sleep(recommendedDelay)
-                retry += 1
-
-                # after this, go out of if and try code blocks
-            else:
-                # an error code is returned, but it's not maxlag
-                return data
-        except:
-            # if the response doesn't have an error key, it was successful, so return
-            return data
-        # here's where execution goes after the delay
-    # here's where execution goes after maxRetries tries
-    print('Failed after ' + str(maxRetries) + ' retries.')
-    exit() # just abort the script
+# Retrieve the current statements of an entity from the API, indexed by lower case GUID.
+# If they can't be retrieved, an empty dictionary is returned and the caller writes the references separately.
+def get_statements_by_guid(apiUrl, entity_id):
+    import requests # imported here like in vb_session.py, so that importing this script stays quick
 
-# ----------------------------------------------------------------
-start_time = time.time()
-# authentication
-
-if terse:
-    print('authenticating and loading data')
-
-# default API resource URL when a Wikibase/Wikidata instance is installed.
-resourceUrl = '/w/api.php'
-
-base_url, user, pwd = retrieveCredentials(credentials_path)
-endpointUrl = base_url + resourceUrl
-if base_url == 'https://www.wikidata.org':
-    DOMAIN_NAME = 'http://www.wikidata.org'
-    CLAIM_KEY = 'claims'
-elif base_url == 'https://commons.wikimedia.org':
-    DOMAIN_NAME = 'http://commons.wikimedia.org'
-    # For whatever reason, the Commons API uses a different key for the claims than other wikibases in the response JSON
-    CLAIM_KEY = 'statements'
-else:
-    DOMAIN_NAME = base_url
-    CLAIM_KEY = 'claims'
-
-# DO NOT decrease this limit unless you have obtained a bot flag! If you have a bot flag, then you have created your own
-# User-Agent and are not using VanderBot any more. In that case, you must change the user_agent_header below to reflect
-# your own information. DO NOT get me in trouble by saying you are using my User-Agent if you are going to violate 
-# Wikimedia guidelines !!!
-if 'wikidata.org' in DOMAIN_NAME or 'wikimedia.org' in DOMAIN_NAME:
-    if api_sleep < 1.25:
-        api_sleep = 1.25
-
-# Instantiate session outside of any function so that it's globally accessible.
-session = requests.Session()
-# Set default User-Agent header so you don't have to send it with every request
-session.headers.update({'User-Agent': user_agent_header})
-
-loginToken = getLoginToken(endpointUrl)
-data = logIn(endpointUrl, loginToken, user, pwd)
-csrfToken = getCsrfToken(endpointUrl)
-
-# -------------------------------------------
-# Beginning of script to process the tables
-
-full_error_log = '' # start the full error log for all tables
-
-# There are options to require values for every mapped reference column or every mapped qualifier column.
-# By default, these are turned off, but they can be turned on by changing these flags:
-require_references = False
-require_qualifiers = False
+    parameters = {
+        'action': 'wbgetclaims',
+        'entity': entity_id,
+        'format': 'json'
+        }
+    try:
+        r = session.get(apiUrl, params=parameters)
+        data = r.json()
+    except (requests.exceptions.RequestException, ValueError) as error:
+        print('Error retrieving the statements of ' + entity_id + ' from the API: ' + str(error), file=log_object)
+        return {}
+    if not isinstance(data, dict):
+        return {}
+    if 'error' in data:
+        print('Error retrieving the statements of ' + entity_id + ' from the API: ' + str(data['error'].get('info', '')), file=log_object)
+        return {}
+    statements_by_guid = {}
+    if 'claims' in data:
+        for property_statements in data['claims'].values():
+            for statement in property_statements:
+                statements_by_guid[statement['id'].lower()] = statement
+    return statements_by_guid
+
+# Retrieve the current JSON of a list of entities from the API with wbgetentities, 50 IDs per request and a few requests
+# at a time. Returns a dictionary of entity JSON keyed by the requested ID and a set of the IDs that couldn't be retrieved.
+# Entities that don't exist are left out of both.
+def get_live_entities(apiUrl, entity_ids):
+    import requests # imported here like in vb_session.py, so that importing this script stays quick
+
+    def build_request(id_chunk):
+        return '|'.join(id_chunk)
+
+    # A request that fails or gets an error response raises ServerError, so that run_values_query() splits the chunk and
+    # retries the halves (a single bad ID makes wbgetentities reject the whole request). A single ID that still fails is
+    # returned as a failure rather than stopping the table.
+    def send_request(ids_string):
+        parameters = {
+            'action': 'wbgetentities',
+            'ids': ids_string,
+            'props': 'info|labels|descriptions|aliases|claims',
+            'format': 'json'
+            }
+        try:
+            try:
+                r = session.get(apiUrl, params=parameters)
+                data = r.json() # an HTML error page from a 5xx response isn't JSON
+            except (requests.exceptions.RequestException, ValueError) as error:
+                raise vb_sparql.ServerError('No usable response from the API: ' + str(error))
+            if 'error' in data:
+                raise vb_sparql.ServerError(data['error'].get('info', data['error'].get('code', '')))
+            return list(data['entities'].items())
+        except vb_sparql.ServerError as error:
+            if '|' in ids_string:
+                raise
+            print('Error retrieving item ' + ids_string + ' from the API: ' + str(error), file=log_object)
+            return [(ids_string, {'failed': str(error)})]
+
+    # The same ID can be in more than one row, but only needs to be retrieved once
+    results = vb_sparql.run_values_query(sorted(set(entity_ids)), build_request, send_request, chunk_size=50, max_workers=entity_workers, sleep_time=0)
+    live_entities = {}
+    failed_ids = set()
+    for entity_id, entity in results:
+        if 'failed' in entity:
+            failed_ids.add(entity_id)
+            continue
+        if 'missing' in entity:
+            print('Item ' + entity_id + ' does not exist', file=log_object)
+            continue
+        if 'redirects' in entity: # the entity is returned under the ID of the redirect target
+            entity_id = entity['redirects']['from']
+        live_entities[entity_id] = entity
+    return live_entities, failed_ids
 
-# This is the schema that maps the CSV column to Wikidata properties
-with open(json_metadata_description_file, 'rt', encoding='utf-8') as fileObject:
-    text = fileObject.read()
-metadata = json.loads(text)
+# This function attempts to post and handles maxlag errors
+def attemptPost(apiUrl, parameters, stats=None):
+    # The rate controller waits until a write is allowed, then retries with increasing delays if the server is lagged.
+    # If the write still can't be made, vb_rate.PostFailed is raised. If the CSRF token is rejected, the session gets a
+    # new one (logging in again if necessary) and sends the write again with it.
+    # The latency and number of retries are put in the stats dictionary, if one is given.
+    # The time spent waiting for the rate controller is timed as the sleep phase rather than as part of the POST.
+    if stats is None:
+        stats = {}
+    with profiler.phase('post'):
+        data = api_session.post(parameters, stats)
+        profiler.add('sleep', stats.get('waited', 0.0))
+    metrics.write(data, stats)
+    return data
 
-tables = metadata['tables']
-for table in tables:  # The script can handle multiple tables
-    error_log = '' # start the error log for this table
-    tableFileName = table['url']
+# Several tables can be written at the same time to Wikibase instances other than Wikidata and Commons (--tables option).
+# Each table is read, normalized, and checked against the Query Service by its own thread, but must wait for its turn
+# before it starts writing. Turns are given in the order of the tables, to at most table_workers tables at a time. There
+# is one more thread than that, so the queries for the next table are made while the previous one is being written. All
+# of the tables share the session, CSRF token, and rate controller, so the total rate of writes is controlled as before.
+# Each table has its own journal and error log.
+# NOTE: tables that are written at the same time should not describe the same items.
+write_condition = threading.Condition()
+write_state = {'next_table': 0, 'writing': 0} # number of the next table to get a turn; number of tables writing now
+
+# Wait until it is this table's turn to write. turn is a dictionary with the number of the table and whether it has its turn.
+def wait_for_turn(turn):
+    if turn['held']:
+        return
+    with write_condition:
+        write_condition.wait_for(lambda: write_state['next_table'] == turn['table_number'] and write_state['writing'] < table_workers)
+        write_state['next_table'] += 1
+        write_state['writing'] += 1
+        write_condition.notify_all() # the next table may also be able to start
+    turn['held'] = True
+
+# Process one table and return its error log
+def process_table(table_plan, turn, cleanup):
+    tableFileName = table_plan.url
+
+    # Errors are recorded in the run log, which builds the error log of the table from them (see vb_log.py)
+    def log_error(message, rowNumber=None, code=None):
+        run_log.error(tableFileName, message, rowNumber, code)
+
+    # Record a write and the response from the API. Text logs get the response (by default all of it) and structured logs
+    # get one line with the row, Q ID, statement GUIDs, latency, number of retries, and error code (see vb_log.py).
+    def log_write(rowNumber, action, responseData, post_stats, guids=None):
+        if run_log.structured:
+            qid = tableData[rowNumber][subjectWikidataIdColumnHeader]
+            run_log.write(tableFileName, rowNumber, action, responseData, post_stats, qid if qid != '' else None, guids)
+        else:
+            print('Write confirmation: ', vb_log.response_text(responseData, run_log.response_length), file=log_object)
+            print('', file=log_object)
     if not terse:
         print('\nFile name: ', tableFileName)
     if log_path != '':
         print('\nFile name: ' + tableFileName + '\n', file=log_object)
-    tableData = readDict(tableFileName)
-    
-    # we are opening the file as a csv.reader object as the easy way to get the header row as a list
-    fileObject = open(tableFileName, 'r', newline='', encoding='utf-8')
-    readerObject = csv.reader(fileObject)
-    for row in readerObject:
-        fieldnames = row
-        break # we only nead the header row, so break after the first loop
-    fileObject.close()
-    
-    columns = table['tableSchema']['columns']
-
-    subjectWikidataIdName = ''
-    # assume each row is primarily about an entity
-    # step through the columns until there is an aboutUrl for an entity
-    for column in columns:
-        # check only columns that have an aboutUrl key
-        if 'aboutUrl' in column:
-            # the value ouf the aboutUrl must be an entity
-            if 'entity/{' in column['aboutUrl']:
-                # extract the column name of the subject resource from the URI template
-                temp = column['aboutUrl'].partition('{')[2]
-                subjectWikidataIdName = temp.partition('}')[0]
-                # don't worry about repeatedly replacing subjectWikidataIdName as long as the row is only about one entity            
-    #print(subjectWikidataIdName)
-
-    # make lists of the columns for each kind of property
-    labelColumnList = []
-    labelLanguageList = []
-    aliasColumnList = []
-    aliasLanguageList = []
-    descriptionColumnList = []
-    descriptionLanguageList = []
-    propertiesColumnList = []
-    propertiesUuidColumnList = []
-    propertiesEntityOrLiteral = [] # determines whether value of property is an "entity" (i.e. item), value nodes, monolingualtext, or "literal" (which includes strings, dates, and URLs that aren't actually literals)
-    propertiesIdList = []
-    propertiesTypeList = [] # the 'datatype' given to a mainsnak. Currently supported types are: "wikibase-item", "url", "time", "quantity", "globe-coordinate", or "string"
-    propertiesValueTypeList = [] # the 'type' given to values of 'datavalue' in the mainsnak. Can be "wikibase-entityid", "string", "globecoordiante", "quantity", or "time" 
-    propertiesLangList = [] # the language of monolingualtext
-    propertiesReferencesList = []
-    propertiesQualifiersList = []
-
-    # step through all of the columns and sort their headers into the appropriate list
-
-    # find the column whose name matches the URI template for the aboutUrl (only one)
-    for column in columns:
-        if column['name'] == subjectWikidataIdName:
-            subjectWikidataIdColumnHeader = column['titles']
-            if not terse:
-                print('Subject column: ', subjectWikidataIdColumnHeader)
-
-    # create a list of the entities that have Wikidata qIDs
-    qIds = []
-    for entity in tableData:
-        if entity[subjectWikidataIdColumnHeader] != '':
-            qIds.append(entity[subjectWikidataIdColumnHeader])
+    # If the previous run crashed, merge the changes it saved in the journal into the CSV before reading it
+    replayed, pending_guids = vb_journal.replay_journal(tableFileName)
+    if replayed > 0:
+        print('Recovered ' + str(replayed) + ' saved changes from an incomplete previous run', file=log_object)
+    tableData = vb_table.read_table(tableFileName) # columns of shared strings; rows behave like the DictReader dictionaries
+    fieldnames = tableData.fieldnames
+    metrics.add_rows(len(tableData))
 
-    existingLabels = [] # a list to hold lists of labels in various languages
-    existingDescriptions = [] # a list to hold lists of descriptions in various languages
-    existingAliases = [] # a list to hold lists of lists of aliases in various languages
-    for column in columns:
-
-        # special handling for alias column
-        # In order to allow for multiple aliases to be listed as a JSON string, the alias column is handled idiosyncratically and
-        # not as with the labels and description columns. It must be named exactly "alias" and have output suppressed.
-        # This hack allows aliases to be processed by the script, but also to allow a csv2rdf to serialize the CSV data as valid RDF.
-        # However, it limits aliases to a single language.
-        if 'suppressOutput' in column:
-            # find columns that contain aliases and ignore any others with suppressOutput
-            # GUI calls it "Also known as"; RDF as skos:altLabel
-            if column['name'] == 'alias':
-                altLabelColumnHeader = column['titles']
-                altLabelLanguage = column['lang']
-                if not terse:
-                    print('Alternate label column: ', altLabelColumnHeader, ', language: ', altLabelLanguage)
-                aliasColumnList.append(altLabelColumnHeader)
-                aliasLanguageList.append(altLabelLanguage)
-
-                # retrieve the aliases in that language that already exist in Wikidata and match them with table rows
-                languageAliases = []
-                aliasesAtWikidata = searchLabelsDescriptionsAtWikidata(qIds, 'alias', altLabelLanguage)
-                for entityIndex in range(0, len(tableData)):
-                    personAliasList = []
-                    if tableData[entityIndex][subjectWikidataIdColumnHeader] != '':  # don't look for the label at Wikidata if the item doesn't yet exist
-                        for wikiLabel in aliasesAtWikidata:
-                            if tableData[entityIndex][subjectWikidataIdColumnHeader] == wikiLabel['qId']:
-                                personAliasList.append(wikiLabel['string'])
-                    # if not found, the personAliasList list will remain empty
-                    languageAliases.append(personAliasList)
-
-                # add all of the found aliases for that language to the list of aliases in various languages
-                existingAliases.append(languageAliases)
-        # handle all other non-suppressed columns.
-        else:
-
-            # find the columns (if any) that provide labels
-            if column['propertyUrl'] == 'rdfs:label':
-                labelColumnHeader = column['titles']
-                labelLanguage = column['lang']
-                if not terse:
-                    print('Label column: ', labelColumnHeader, ', language: ', labelLanguage)
-                labelColumnList.append(labelColumnHeader)
-                labelLanguageList.append(labelLanguage)
-
-                if allow_label_description_changes:
-                    # The retrieved labels are only used in the case where changes to labels is allowed.
-                    # If changes are not allowed don't take the time to run the query and leave the list empty.
-                    # retrieve the labels in that language that already exist in Wikidata and match them with table rows
-                    tempLabels = []
-                    labelsAtWikidata = searchLabelsDescriptionsAtWikidata(qIds, 'label', labelLanguage)
-                    for entityIndex in range(0, len(tableData)):
-                        found = False
-                        if tableData[entityIndex][subjectWikidataIdColumnHeader] != '':  # don't look for the label at Wikidata if the item doesn't yet exist
-                            for wikiLabel in labelsAtWikidata:
-                                if tableData[entityIndex][subjectWikidataIdColumnHeader] == wikiLabel['qId']:
-                                    found = True
-                                    tempLabels.append(wikiLabel['string'])
-                                    break # stop looking if there is a match
-                        if not found:
-                            tempLabels.append('')
-
-                    # add all of the found labels for that language to the list of labels in various languages
-                    existingLabels.append(tempLabels)
-
-            # find columns that contain descriptions
-            # Note: if descriptions exist for a language, they will be overwritten
-            elif column['propertyUrl'] == 'schema:description':
-                descriptionColumnHeader = column['titles']
-                descriptionLanguage = column['lang']
-                if not terse:
-                    print('Description column: ', descriptionColumnHeader, ', language: ', descriptionLanguage)
-                descriptionColumnList.append(descriptionColumnHeader)
-                descriptionLanguageList.append(descriptionLanguage)
-
-                if allow_label_description_changes:
-                    # The retrieved descriptions are only used in the case where changes to descriptions is allowed.
-                    # If changes are not allowed don't take the time to run the query and leave the list empty.
-                    # Retrieve the descriptions in that language that already exist in Wikidata and match them with table rows
-                    tempLabels = []
-                    descriptionsAtWikidata = searchLabelsDescriptionsAtWikidata(qIds, 'description', descriptionLanguage)
-                    for entityIndex in range(0, len(tableData)):
-                        found = False
-                        if tableData[entityIndex][subjectWikidataIdColumnHeader] != '':  # don't look for the label at Wikidata if the item doesn't yet exist
-                            for wikiDescription in descriptionsAtWikidata:
-                                if tableData[entityIndex][subjectWikidataIdColumnHeader] == wikiDescription['qId']:
-                                    found = True
-                                    tempLabels.append(wikiDescription['string'])
-                                    break # stop looking if there is a match
-                        if not found:
-                            tempLabels.append('')
-
-                    # add all of the found labels for that language to the list of labels in various languages
-                    existingDescriptions.append(tempLabels)
-
-            # find columns that contain properties with entity values, literal values that are URLs, or value node values
-            elif 'valueUrl' in column:
-                # only add columns that have "statement" properties
-                if 'prop/statement/' in column['propertyUrl']:
-                    propertiesLangList.append('')
-                    if 'prop/statement/value/' in column['propertyUrl']: # value is a value node (e.g. date or geo coordinates)
-                        found = True
-                        propColumnHeader = column['titles'].partition('_nodeId')[0] # save only the root of the column name for value nodes
-                        propertyId = column['propertyUrl'].partition('prop/statement/value/')[2]
-                        propertiesColumnList.append(propColumnHeader)
-                        propertiesIdList.append(propertyId)
-                        propertiesEntityOrLiteral.append('value')
-                        # Find out what kind of value node it is.
-                        for testColumn in columns:
-                            try:
-                                if column['titles'] in testColumn['aboutUrl']:
-                                    if 'timeValue' in testColumn['propertyUrl']: # value is a date
-                                        propKind = 'time'
-                                        propertiesTypeList.append('time')
-                                        propertiesValueTypeList.append('time')
-                                    elif 'geoLatitude' in testColumn['propertyUrl']: # value is a globe coordinate value
-                                        propKind = 'geocoordinates'
-                                        propertiesTypeList.append('globe-coordinate')
-                                        propertiesValueTypeList.append('globecoordinate')
-                                    elif 'quantityAmount' in testColumn['propertyUrl']: # value is a quantity
-                                        propKind = 'quantity'
-                                        propertiesTypeList.append('quantity')
-                                        propertiesValueTypeList.append('quantity')
-                                    else:
-                                        continue
-                                    if not terse:
-                                        print('Property column: ', propColumnHeader, ', Property ID: ', propertyId, ' Value type: ', propKind)
-                            except:
-                                pass
+    for warning in table_plan.warnings:
+        print(warning)
 
-                    else:
-                        propColumnHeader = column['titles']
-                        propertyId = column['propertyUrl'].partition('prop/statement/')[2]
-                        propertiesColumnList.append(propColumnHeader)
-                        propertiesIdList.append(propertyId)
-
-                        # Special case only for Wikidata and only for P18 (image), which links to a Commons media item
-                        if endpointUrl == 'https://www.wikidata.org/w/api.php' and propertyId == 'P18':
-                            propertiesEntityOrLiteral.append('literal')
-                            propertiesTypeList.append('commonsMedia')
-                            propertiesValueTypeList.append('string')
-                            if not terse:
-                                print('Property column: ', propColumnHeader, ', Property ID: ', propertyId, ' Value type: commonsMedia')
-                        # URLs are detected when there is a valueUrl whose value has a first character of "{"
-                        elif column['valueUrl'][0] == '{':
-                            propertiesEntityOrLiteral.append('literal')
-                            propertiesTypeList.append('url')
-                            propertiesValueTypeList.append('string')
-                            if not terse:
-                                print('Property column: ', propColumnHeader, ', Property ID: ', propertyId, ' Value type: url')
-                        # Otherwise having a valueUrl indicates that it's an item
-                        else:
-                            propertiesEntityOrLiteral.append('entity')
-                            propertiesTypeList.append('wikibase-item')
-                            propertiesValueTypeList.append('wikibase-entityid')
-                            if not terse:
-                                print('Property column: ', propColumnHeader, ', Property ID: ', propertyId, ' Value type: item')
-
-                    propertyUuidColumn = findPropertyUuid(propertyId, columns)
-                    propertiesUuidColumnList.append(propertyUuidColumn)
-                    propertiesReferencesList.append(findReferencesForProperty(propertyUuidColumn, columns))
-                    propertiesQualifiersList.append(findQualifiersForProperty(propertyUuidColumn, columns))
-                    if not terse:
-                        print()
-
-            # remaining columns should have properties with literal values
-            else:
-                # only add columns that have "statement" properties
-                if 'prop/statement/' in column['propertyUrl']:
-                    propColumnHeader = column['titles']
-                    propertyId = column['propertyUrl'].partition('prop/statement/')[2]
-                    propertiesColumnList.append(propColumnHeader)
-                    propertiesIdList.append(propertyId)
-                    propertyUuidColumn = findPropertyUuid(propertyId, columns)
-                    propertiesUuidColumnList.append(propertyUuidColumn)
-                    propertiesReferencesList.append(findReferencesForProperty(propertyUuidColumn, columns))
-                    propertiesQualifiersList.append(findQualifiersForProperty(propertyUuidColumn, columns))
-
-                    # differentiate between plain literals and language-tagged literals (monolingualtext)
-                    if 'lang' in column:
-                        if not terse:
-                            print('Property column: ', propColumnHeader, ', Property ID: ', propertyId, ' Value type: monolingualtext  Language: ', column['lang'])
-                        propertiesEntityOrLiteral.append('monolingualtext')
-                        propertiesTypeList.append('monolingualtext')
-                        propertiesValueTypeList.append('monolingualtext')
-                        propertiesLangList.append(column['lang'])
-                    else:
-                        if not terse:
-                            print('Property column: ', propColumnHeader, ', Property ID: ', propertyId, ' Value type: string')
-                        propertiesEntityOrLiteral.append('literal')
-                        propertiesTypeList.append('string')
-                        propertiesValueTypeList.append('string')
-                        propertiesLangList.append('')
-                    if not terse:
-                        print()
+    # make lists of the columns for each kind of property
+    labelColumnList = [label_column[0] for label_column in table_plan.label_columns]
+    labelLanguageList = [label_column[1] for label_column in table_plan.label_columns]
+    aliasColumnList = [alias_column[0] for alias_column in table_plan.alias_columns]
+    aliasLanguageList = [alias_column[1] for alias_column in table_plan.alias_columns]
+    descriptionColumnList = [description_column[0] for description_column in table_plan.description_columns]
+    descriptionLanguageList = [description_column[1] for description_column in table_plan.description_columns]
+
+    # The property descriptors are also made available as parallel lists, one item per property
+    propertiesColumnList = [property_plan.column for property_plan in table_plan.properties]
+    propertiesUuidColumnList = [property_plan.uuid_column for property_plan in table_plan.properties]
+    propertiesEntityOrLiteral = [property_plan.entity_or_literal for property_plan in table_plan.properties] # determines whether value of property is an "entity" (i.e. item), value nodes, monolingualtext, or "literal" (which includes strings, dates, and URLs that aren't actually literals)
+    propertiesIdList = [property_plan.property_id for property_plan in table_plan.properties]
+    propertiesTypeList = [property_plan.type for property_plan in table_plan.properties] # the 'datatype' given to a mainsnak. Currently supported types are: "wikibase-item", "url", "time", "quantity", "globe-coordinate", or "string"
+    propertiesValueTypeList = [property_plan.value_type for property_plan in table_plan.properties] # the 'type' given to values of 'datavalue' in the mainsnak. Can be "wikibase-entityid", "string", "globecoordiante", "quantity", or "time" 
+    propertiesLangList = [property_plan.lang for property_plan in table_plan.properties] # the language of monolingualtext
+    propertiesReferencesList = [property_plan.references for property_plan in table_plan.properties]
+    propertiesQualifiersList = [property_plan.qualifiers for property_plan in table_plan.properties]
+
+    subjectWikidataIdColumnHeader = table_plan.subject_column
     if not terse:
-        print()
+        print('Subject column: ', subjectWikidataIdColumnHeader)
+
+    # Compare the statements in a row of the table with the current statements of an existing item (live mode).
+    # A statement that already exists with the value in a cell whose UUID is empty is adopted: its UUID (and the hashes of
+    # any of its references that match the row) are put in the table instead of writing the statement again. For statements
+    # in the table that exist in the item, the hashes of matching references are filled in, and qualifiers and references
+    # that are missing from the item are added to a copy of the current statement.
+    # Returns a dictionary keyed by property number of (statement, references) tuples, where statement is the changed copy to
+    # be sent with its GUID and references is a list of (reference, referencesDict) tuples for the references that were added.
+    def diff_live_statements(rowData, statement_index):
+        changed_statements = {}
+        for propertyNumber in range(0, len(propertiesColumnList)):
+            if propertiesEntityOrLiteral[propertyNumber] == 'value':
+                cell_value = rowData[propertiesColumnList[propertyNumber] + '_val']
+            else:
+                cell_value = rowData[propertiesColumnList[propertyNumber]]
+            if cell_value == '':
+                continue
+            statementUuidColumn = propertiesUuidColumnList[propertyNumber]
+            if rowData[statementUuidColumn] == '':
+                # Blank nodes aren't adopted, since there is no way to tell which somevalue statement they correspond to
+                if cell_value[:2] == '_:':
+                    continue
+                if propertiesTypeList[propertyNumber] == 'commonsMedia':
+                    cell_value = commons_url_to_filename(cell_value)
+                value_key = vb_claims.cell_key(propertiesEntityOrLiteral[propertyNumber], propertiesTypeList[propertyNumber], cell_value, propertiesLangList[propertyNumber])
+                matching_statements = statement_index.find(propertiesIdList[propertyNumber], value_key)
+                if len(matching_statements) == 0:
+                    continue # the statement will be written as a new one
+                statement = matching_statements[0]
+                rowData[statementUuidColumn] = statement['id'].split('$')[1]
+                print('Found existing statement ' + statement['id'] + ' for ' + propertiesIdList[propertyNumber] + ' ' + cell_value, file=log_object)
+            else:
+                statement = statement_index.get(rowData[subjectWikidataIdColumnHeader] + '$' + rowData[statementUuidColumn])
+                if statement is None:
+                    print('Statement ' + rowData[subjectWikidataIdColumnHeader] + '$' + rowData[statementUuidColumn] + ' is no longer in the item and was not changed', file=log_object)
+                    continue
+
+            added_references = []
+            for reference in propertiesReferencesList[propertyNumber]:
+                if rowData[reference['refHashColumn']] != '':
+                    continue
+                signature = vb_claims.table_reference_signature(reference, rowData)
+                if len(signature) == 0: # no reference values in this row
+                    continue
+                reference_hash = statement_index.find_reference(statement, signature)
+                if reference_hash is not None:
+                    rowData[reference['refHashColumn']] = reference_hash
+                    continue
+                referencesDict = createReferenceSnak(reference, rowData)
+                if referencesDict != {}:
+                    added_references.append((reference, referencesDict))
+
+            added_qualifiers = {}
+            if len(propertiesQualifiersList[propertyNumber]['qualPropList']) != 0:
+                added_qualifiers, differing_qualifiers = vb_claims.missing_qualifiers(statement, createQualifiers(propertiesQualifiersList[propertyNumber], rowData))
+                for qualifier_property in differing_qualifiers:
+                    print('Qualifier ' + qualifier_property + ' of statement ' + statement['id'] + ' has a different value in the item and was not changed', file=log_object)
+
+            if len(added_references) == 0 and len(added_qualifiers) == 0:
+                continue
+            # The statement replaces the existing one, so it must include everything that is already there
+            statement = json.loads(json.dumps(statement))
+            if len(added_qualifiers) > 0:
+                statement.setdefault('qualifiers', {}).update(added_qualifiers)
+                if 'qualifiers-order' in statement:
+                    statement['qualifiers-order'] += list(added_qualifiers.keys())
+            for reference, referencesDict in added_references:
+                statement.setdefault('references', []).append({'snaks': referencesDict})
+            changed_statements[propertyNumber] = (statement, added_references)
+        return changed_statements
 
     # Figure out the column name roots for column sets that are dates and value nodes
     dateColumnNameList = []
@@ -1511,6 +1135,146 @@ for table in tables:  # The script can handle multiple tables
                             valueColumnNameList.append(propertiesReferencesList[propertyNumber][referenceNumber]['refValueColumnList'][refPropNumber])
     #print(dateColumnNameList)
 
+    # Put all of the values in the table into the form required by the API before doing anything else (see vb_normalize.py).
+    # Rows with dates that can't be converted are reported now and skipped when writing.
+    strip_columns = []
+    for propertyNumber in range(len(propertiesColumnList)):
+        if propertiesEntityOrLiteral[propertyNumber] == 'value':
+            strip_columns.append(propertiesColumnList[propertyNumber] + '_val')
+        else:
+            strip_columns.append(propertiesColumnList[propertyNumber])
+    commons_columns = [propertiesColumnList[propertyNumber] for propertyNumber in range(len(propertiesColumnList)) if propertiesTypeList[propertyNumber] == 'commonsMedia']
+    with profiler.phase('normalize'):
+        rows_normalized, date_errors = vb_normalize.normalize_table(tableData, strip_columns, strip_columns, dateColumnNameList, valueColumnNameList, commons_columns, commons_prefix)
+    for rowNumber in sorted(date_errors):
+        for dateColumnName in date_errors[rowNumber]:
+            log_error('Incorrect date format. Row: ' + str(rowNumber) + ', column: "' + dateColumnName + '"', rowNumber)
+    if len(date_errors) > 0:
+        print(len(date_errors), 'rows have incorrect date formats and will not be written. See the error log for details.')
+    # Save the converted dates, node IDs, and commons URLs once, in case the script crashes
+    if rows_normalized > 0:
+        with profiler.phase('checkpoint'):
+            vb_journal.write_table(tableFileName, fieldnames, tableData)
+        print('Normalized values in ' + str(rows_normalized) + ' rows', file=log_object)
+
+    # Changes to rows are appended to a journal rather than rewriting the whole CSV after every change.
+    # The journal is merged into the CSV every journal_compact_interval changes and when the table is finished.
+    journal = vb_journal.TableJournal(tableFileName, fieldnames, tableData, journal_compact_interval, pending_guids)
+    atexit.register(journal.close) # also merge the journal if the script exits early
+
+    # Merge the journal when the table is finished or fails, and remove the exit handler so that handlers don't pile up
+    # when run() is called again
+    def close_journal():
+        with profiler.phase('checkpoint'):
+            journal.close()
+        atexit.unregister(journal.close)
+    cleanup.callback(close_journal)
+
+    # Save the changes to a row in the journal
+    def checkpoint(rowNumber):
+        with profiler.phase('checkpoint'):
+            journal.checkpoint(rowNumber)
+
+    # create a list of the entities that have Wikidata qIDs
+    qIds = []
+    for entity in tableData:
+        if entity[subjectWikidataIdColumnHeader] != '':
+            qIds.append(entity[subjectWikidataIdColumnHeader])
+
+    # In live mode, the current JSON of all of the existing items is retrieved from the API, so that the table is compared
+    # with the items as they are now rather than with data from the Query Service, which may lag behind.
+    live_entities = {}
+    unfetched_ids = set() # existing items whose current JSON couldn't be retrieved in live mode
+    if live_mode:
+        # The items are retrieved when it is this table's turn to write, so that they include edits made by other tables
+        wait_for_turn(turn)
+        with profiler.phase('prefetch'):
+            live_entities, unfetched_ids = get_live_entities(endpointUrl, qIds)
+        print('Retrieved ' + str(len(live_entities)) + ' existing items from the API', file=log_object)
+        if len(unfetched_ids) > 0:
+            print(len(unfetched_ids), 'existing items could not be retrieved from the API and their rows will not be written. See the error log for details.')
+
+    existingLabels = [] # a list to hold lists of labels in various languages
+    existingDescriptions = [] # a list to hold lists of descriptions in various languages
+    existingAliases = [] # a list to hold lists of lists of aliases in various languages
+
+    # special handling for alias column
+    # In order to allow for multiple aliases to be listed as a JSON string, the alias column is handled idiosyncratically and
+    # not as with the labels and description columns. It must be named exactly "alias" and have output suppressed.
+    # This hack allows aliases to be processed by the script, but also to allow a csv2rdf to serialize the CSV data as valid RDF.
+    # However, it limits aliases to a single language.
+    # GUI calls it "Also known as"; RDF as skos:altLabel
+    for altLabelColumnHeader, altLabelLanguage in table_plan.alias_columns:
+        if not terse:
+            print('Alternate label column: ', altLabelColumnHeader, ', language: ', altLabelLanguage)
+
+        # retrieve the aliases in that language that already exist in Wikidata and match them with table rows
+        if live_mode:
+            alias_index = vb_labels.index_entity_strings(live_entities, 'aliases', altLabelLanguage)
+        else:
+            with profiler.phase('prefetch'):
+                aliasesAtWikidata = searchLabelsDescriptionsAtWikidata(qIds, 'alias', altLabelLanguage)
+            alias_index = vb_labels.index_by_qid(aliasesAtWikidata)
+        # Index the results by Q ID once, then collect all of the aliases for each row's item.
+        # If not found, the row's alias list will be empty
+        languageAliases = vb_labels.align_with_rows(tableData, subjectWikidataIdColumnHeader, alias_index, False)
+
+        # add all of the found aliases for that language to the list of aliases in various languages
+        existingAliases.append(languageAliases)
+
+    # find the columns (if any) that provide labels
+    for labelColumnHeader, labelLanguage in table_plan.label_columns:
+        if not terse:
+            print('Label column: ', labelColumnHeader, ', language: ', labelLanguage)
+
+        if allow_label_description_changes:
+            # The retrieved labels are only used in the case where changes to labels is allowed.
+            # If changes are not allowed don't take the time to run the query and leave the list empty.
+            # retrieve the labels in that language that already exist in Wikidata and match them with table rows
+            if live_mode:
+                label_index = vb_labels.index_entity_strings(live_entities, 'labels', labelLanguage)
+            else:
+                with profiler.phase('prefetch'):
+                    labelsAtWikidata = searchLabelsDescriptionsAtWikidata(qIds, 'label', labelLanguage)
+                label_index = vb_labels.index_by_qid(labelsAtWikidata)
+            # Index the results by Q ID once, then keep the first label found for each row's item (empty string if none).
+            tempLabels = vb_labels.align_with_rows(tableData, subjectWikidataIdColumnHeader, label_index, True)
+
+            # add all of the found labels for that language to the list of labels in various languages
+            existingLabels.append(tempLabels)
+
+    # find columns that contain descriptions
+    # Note: if descriptions exist for a language, they will be overwritten
+    for descriptionColumnHeader, descriptionLanguage in table_plan.description_columns:
+        if not terse:
+            print('Description column: ', descriptionColumnHeader, ', language: ', descriptionLanguage)
+
+        if allow_label_description_changes:
+            # The retrieved descriptions are only used in the case where changes to descriptions is allowed.
+            # If changes are not allowed don't take the time to run the query and leave the list empty.
+            # Retrieve the descriptions in that language that already exist in Wikidata and match them with table rows
+            if live_mode:
+                description_index = vb_labels.index_entity_strings(live_entities, 'descriptions', descriptionLanguage)
+            else:
+                with profiler.phase('prefetch'):
+                    descriptionsAtWikidata = searchLabelsDescriptionsAtWikidata(qIds, 'description', descriptionLanguage)
+                description_index = vb_labels.index_by_qid(descriptionsAtWikidata)
+            # Index the results by Q ID once, then keep the first description found for each row's item (empty string if none).
+            tempLabels = vb_labels.align_with_rows(tableData, subjectWikidataIdColumnHeader, description_index, True)
+
+            # add all of the found labels for that language to the list of labels in various languages
+            existingDescriptions.append(tempLabels)
+
+    if not terse:
+        for property_plan in table_plan.properties:
+            if property_plan.type == 'monolingualtext':
+                print('Property column: ', property_plan.column, ', Property ID: ', property_plan.property_id, ' Value type: monolingualtext  Language: ', property_plan.lang)
+            else:
+                print('Property column: ', property_plan.column, ', Property ID: ', property_plan.property_id, ' Value type: ', property_plan.type)
+            print()
+        print()
+
+
     # Find out what languages are represented in the labels and descriptions
     languages_list = labelLanguageList + descriptionLanguageList
     languages_list = list(set(languages_list))
@@ -1541,8 +1305,37 @@ for table in tables:  # The script can handle multiple tables
         language_structure.append(dictionary)
     #print(language_structure)
 
+    # Check the label/description combinations for all new items with a few queries before starting to write, 
+    # rather than with separate queries for every new row.
+    if duplicate_check:
+        label_description_tuples = set()
+        label_only_tuples = set()
+        description_only_tuples = set()
+        for row in tableData:
+            if row[subjectWikidataIdColumnHeader] != '': # only new items are checked
+                continue
+            for language in language_structure:
+                # Whitespace is stripped in the same way when the row is processed below
+                label = ''
+                if language['label_column'] != '':
+                    label = row[language['label_column']].strip()
+                description = ''
+                if language['description_column'] != '':
+                    description = row[language['description_column']].strip()
+                if label != '' and description != '':
+                    label_description_tuples.add((label, description, language['language']))
+                elif label != '':
+                    label_only_tuples.add((label, language['language']))
+                elif description != '':
+                    description_only_tuples.add((description, language['language']))
+        if len(label_description_tuples) + len(label_only_tuples) + len(description_only_tuples) > 0:
+            print('Checking for existing label/description combinations')
+        with profiler.phase('duplicate_check'):
+            duplicate_label_descriptions, duplicate_labels, duplicate_descriptions = screen_for_duplicates(label_description_tuples, label_only_tuples, description_only_tuples)
+
     # process each row of the table for item writing
-    print('Writing items')
+    wait_for_turn(turn)
+    print('Writing items from ' + tableFileName)
     if not terse:
         print('--------------------------')
         print()
@@ -1595,9 +1388,9 @@ for table in tables:  # The script can handle multiple tables
                 if tableData[rowNumber][language['description_column']].strip() != tableData[rowNumber][language['description_column']]:
                     tableData[rowNumber][language['description_column']] = tableData[rowNumber][language['description_column']].strip()
                     stripped = True
-                # If either or both were changed, rewrite the file to make sure the changes stick if the script crashes.
+                # If either or both were changed, save the changes to make sure they stick if the script crashes.
                 if stripped:
-                    writeToFile(tableFileName, fieldnames, tableData)
+                    checkpoint(rowNumber)
 
                 # The first screen is that both types of columns must exist for a language
                 if language['label_column'] != '' and language['description_column'] != '':
@@ -1605,32 +1398,28 @@ for table in tables:  # The script can handle multiple tables
                     if tableData[rowNumber][language['label_column']] != '' and tableData[rowNumber][language['description_column']] != '':
                         has_some_value = True
                         if duplicate_check:
-                            graph_pattern = '  ?entity rdfs:label ' + safe_quotes(tableData[rowNumber][language['label_column']]) + '@' + language['language'] + '''.
-        ?entity schema:description ''' + safe_quotes(tableData[rowNumber][language['description_column']]) + '@' + language['language'] + '.'
-                            #print('Checking ' + language['language'] + ' label: "' + tableData[rowNumber][language['label_column']] + '", description: "' + tableData[rowNumber][language['description_column']] + '"')
-                            #print(graph_pattern)
-                            exists = ask_query(graph_pattern)
+                            exists = (tableData[rowNumber][language['label_column']], tableData[rowNumber][language['description_column']], language['language'].lower()) in duplicate_label_descriptions
                             if exists:
                                 combination_exists = True
-                                error_log += 'Duplicate label/description. Row: ' + str(rowNumber) + ', language: "' + language['language'] + '", label: "' + tableData[rowNumber][language['label_column']] + '", description: "' + tableData[rowNumber][language['description_column']] + '"\n'
+                                log_error('Duplicate label/description. Row: ' + str(rowNumber) + ', language: "' + language['language'] + '", label: "' + tableData[rowNumber][language['label_column']] + '", description: "' + tableData[rowNumber][language['description_column']] + '"', rowNumber)
 
                     # Case where the label has a value but description does not
                     elif tableData[rowNumber][language['label_column']] != '' and tableData[rowNumber][language['description_column']] == '':
                         has_some_value = True
                         if duplicate_check:
-                            exists = check_for_only_label(tableData[rowNumber][language['label_column']], language['language'])
+                            exists = (tableData[rowNumber][language['label_column']], language['language'].lower()) in duplicate_labels
                             if exists:
                                 combination_exists = True
-                                error_log += 'Duplicate label only. Row: ' + str(rowNumber) + ', language: "' + language['language'] + '", label: "' + tableData[rowNumber][language['label_column']] + '"\n'
+                                log_error('Duplicate label only. Row: ' + str(rowNumber) + ', language: "' + language['language'] + '", label: "' + tableData[rowNumber][language['label_column']] + '"', rowNumber)
 
                     # Case where the description has a value but label does not
                     elif tableData[rowNumber][language['label_column']] == '' and tableData[rowNumber][language['description_column']] != '':
                         has_some_value = True
                         if duplicate_check:
-                            exists = check_for_only_description(tableData[rowNumber][language['description_column']], language['language'])
+                            exists = (tableData[rowNumber][language['description_column']], language['language'].lower()) in duplicate_descriptions
                             if exists:
                                 combination_exists = True
-                                error_log += 'Duplicate description only. Row: ' + str(rowNumber) + ', language: "' + language['language'] + '", label: "' + tableData[rowNumber][language['description_column']] + '"\n'
+                                log_error('Duplicate description only. Row: ' + str(rowNumber) + ', language: "' + language['language'] + '", label: "' + tableData[rowNumber][language['description_column']] + '"', rowNumber)
 
                 # Need to check for the special cases where a label or a description column doesn't exist for the language.
 
@@ -1641,10 +1430,10 @@ for table in tables:  # The script can handle multiple tables
                     if tableData[rowNumber][language['label_column']] != '':
                         has_some_value = True
                         if duplicate_check:
-                            exists = check_for_only_label(tableData[rowNumber][language['label_column']], language['language'])
+                            exists = (tableData[rowNumber][language['label_column']], language['language'].lower()) in duplicate_labels
                             if exists:
                                 combination_exists = True
-                                error_log += 'Duplicate label only. Row: ' + str(rowNumber) + ', language: "' + language['language'] + '", label: "' + tableData[rowNumber][language['label_column']] + '"\n'
+                                log_error('Duplicate label only. Row: ' + str(rowNumber) + ', language: "' + language['language'] + '", label: "' + tableData[rowNumber][language['label_column']] + '"', rowNumber)
 
                 # Case where there is no label column
                 elif language['label_column'] == '' and language['description_column'] != '':
@@ -1653,13 +1442,13 @@ for table in tables:  # The script can handle multiple tables
                     if tableData[rowNumber][language['description_column']] != '':
                         has_some_value = True
                         if duplicate_check:
-                            exists = check_for_only_description(tableData[rowNumber][language['description_column']], language['language'])
+                            exists = (tableData[rowNumber][language['description_column']], language['language'].lower()) in duplicate_descriptions
                             if exists:
                                 combination_exists = True
-                                error_log += 'Duplicate description only. Row: ' + str(rowNumber) + ', language: "' + language['language'] + '", label: "' + tableData[rowNumber][language['description_column']] + '"\n'
+                                log_error('Duplicate description only. Row: ' + str(rowNumber) + ', language: "' + language['language'] + '", label: "' + tableData[rowNumber][language['description_column']] + '"', rowNumber)
 
             if not has_some_value:
-                error_log += 'Row: ' + str(rowNumber) + ' does not have any labels or descriptions\n'
+                log_error('Row: ' + str(rowNumber) + ' does not have any labels or descriptions', rowNumber)
                 abort_writing = True
 
             if combination_exists:
@@ -1669,64 +1458,27 @@ for table in tables:  # The script can handle multiple tables
             if abort_writing:
                 print('failed write due to pre-existing label/description combination', file=log_object)
                 print('', file=log_object)
+                metrics.row(skipped=True)
                 continue
 
-        cells_converted = False
-        # Convert any dates in the row that aren't in the standard format from the shorthand format to standard
-        for dateColumnName in dateColumnNameList:
-            tableData[rowNumber], error, changed_date = convertDates(tableData[rowNumber], dateColumnName)
-            if error:
-                error_log += 'Incorrect date format. Row: ' + str(rowNumber) + ', column: "' + dateColumnName + '"\n'
-                abort_writing = True
-                break # Quit working on dates in this row
-            if changed_date:
-                cells_converted = True
-        if abort_writing: # set to True by a malformed date
+        # Rows with dates that couldn't be converted were reported before writing started
+        if rowNumber in date_errors:
             print('failed write due to date error', file=log_object)
             print('', file=log_object)
+            metrics.row(skipped=True)
             continue # quit working on this row, return to start of main loop with next row
-        for valueColumnName in valueColumnNameList:
-            tableData[rowNumber], changed_date = generateNodeId(tableData[rowNumber], valueColumnName)
-            if changed_date:
-                cells_converted = True
-        
-        # Convert any commons media item values from unencoded filename strings to URLs if they aren't already URLs
-        for propertyNumber in range(len(propertiesColumnList)):
-            if propertiesTypeList[propertyNumber] == 'commonsMedia':
-                valueString = tableData[rowNumber][propertiesColumnList[propertyNumber]]
-                if valueString != '' and valueString[:2] != '_:':
-                    if not commons_prefix in valueString: # convert from unencoded filename if the URL prefix isn't there
-                        tableData[rowNumber][propertiesColumnList[propertyNumber]] = filename_to_commons_url(valueString) # replace the tabled value
-                        cells_converted = True
-
-        # Convert any blank node abbreviations into Turtle bnode strings with UUID identifiers
-        for propertyNumber in range(len(propertiesColumnList)):
-            if propertiesEntityOrLiteral[propertyNumber] == 'value':
-                changed, tableData[rowNumber][propertiesColumnList[propertyNumber] + '_val'] = generate_uuid_bnode(tableData[rowNumber][propertiesColumnList[propertyNumber] + '_val'])
-            else:
-                changed, tableData[rowNumber][propertiesColumnList[propertyNumber]] = generate_uuid_bnode(tableData[rowNumber][propertiesColumnList[propertyNumber]])
 
-            if changed:
-                cells_converted = True
-
-        # Check the cell values for leading or trailing whitespace, which will cause an error from the API
-        for propertyNumber in range(len(propertiesColumnList)):
-            if propertiesEntityOrLiteral[propertyNumber] == 'value':
-                string_value, error = remove_leading_trailing_whitespace(tableData[rowNumber][propertiesColumnList[propertyNumber] + '_val'])
-                if error:
-                    tableData[rowNumber][propertiesColumnList[propertyNumber] + '_val'] = string_value
-                    cells_converted = True
-            else:
-                string_value, error = remove_leading_trailing_whitespace(tableData[rowNumber][propertiesColumnList[propertyNumber]])
-                if error:
-                    tableData[rowNumber][propertiesColumnList[propertyNumber]] = string_value
-                    cells_converted = True
-
-        # Write the file with the converted dates and commons URLs in case the script crashes
-        if cells_converted:
-            writeToFile(tableFileName, fieldnames, tableData)
+        # In live mode, a row for an item that couldn't be retrieved isn't written, since the table can't be compared with
+        # the item as it is now and statements that are already there would be written again
+        if tableData[rowNumber][subjectWikidataIdColumnHeader] in unfetched_ids:
+            log_error('Item ' + tableData[rowNumber][subjectWikidataIdColumnHeader] + ' could not be retrieved from the API. Row: ' + str(rowNumber), rowNumber)
+            print('failed write because the item could not be retrieved from the API', file=log_object)
+            print('', file=log_object)
+            metrics.row(skipped=True)
+            continue
 
         # build the parameter string to be posted to the API
+        build_timer = profiler.start('json_build')
         parameterDictionary = {
             'action': 'wbeditentity',
             'format':'json',
@@ -1831,9 +1583,18 @@ for table in tables:  # The script can handle multiple tables
                 dataStructure['descriptions'] = descriptionDict
 
         # handle claims
+        assigned_guids = {} # statement GUIDs generated for this row, keyed by property number
+        folded_references = {}
         if len(propertiesColumnList) > 0:
             claimsList = []
 
+            # In live mode, the statements of an existing item are compared with its current JSON first, so that statements
+            # that are already there are adopted rather than written again (see diff_live_statements()).
+            live_changes = {}
+            if live_mode and not newItem and tableData[rowNumber][subjectWikidataIdColumnHeader] in live_entities:
+                live_index = vb_claims.StatementIndex(live_entities[tableData[rowNumber][subjectWikidataIdColumnHeader]].get(CLAIM_KEY, {}))
+                live_changes = diff_live_statements(tableData[rowNumber], live_index)
+
             # here's what we need to construct for literal valued properties:
             # data={"claims":[{"mainsnak":{"snaktype":"value","property":"P56","datavalue":{"value":"ExampleString","type":"string"}},"type":"statement","rank":"normal"}]}
             for propertyNumber in range(0, len(propertiesColumnList)):
@@ -2008,37 +1769,97 @@ for table in tables:  # The script can handle multiple tables
                     if qualifiers != {}: # check for situation where no qualifier statements were made for that record
                         snakDict['qualifiers'] = qualifiers
 
+                # For existing items, the statement GUID is generated here rather than by the API, so that the new statement 
+                # can be found in the response by its GUID. If a GUID was reserved for this cell by a run that crashed before
+                # its UUID was saved, the same GUID is sent again so that the statement is replaced rather than duplicated.
+                # The GUID can't be generated for new items because their Q ID isn't known until after the write.
+                if not newItem:
+                    statement_guid = journal.pending.get((rowNumber, statementUuidColumn), '')
+                    if statement_guid.split('$')[0] != tableData[rowNumber][subjectWikidataIdColumnHeader]: # discard a GUID for a different item
+                        statement_guid = tableData[rowNumber][subjectWikidataIdColumnHeader] + '$' + str(uuid.uuid4()).upper()
+                    snakDict['id'] = statement_guid
+                    assigned_guids[propertyNumber] = statement_guid
+
                 claimsList.append(snakDict)
 
+            # Optionally add new references for statements that were already written to this edit, rather than writing each
+            # reference separately with wbsetreference after all of the rows have been processed.
+            # A statement sent with its GUID replaces the existing statement, so the statement must be sent with all of its
+            # current qualifiers and references, plus the new ones. The current statements are retrieved from the API.
+            folded_references = {} # references added to existing statements, keyed by property number
+            if batch_references and not newItem and not live_mode:
+                for propertyNumber in range(0, len(propertiesColumnList)):
+                    if tableData[rowNumber][propertiesUuidColumnList[propertyNumber]] == '':
+                        continue # statements without a UUID were handled above
+                    for reference in propertiesReferencesList[propertyNumber]:
+                        if tableData[rowNumber][reference['refHashColumn']] == '': # process only new references
+                            referencesDict = createReferenceSnak(reference, tableData[rowNumber])
+                            if referencesDict != {}:
+                                folded_references.setdefault(propertyNumber, []).append((reference, referencesDict))
+            if len(folded_references) > 0:
+                with profiler.phase('prefetch'):
+                    current_statements = get_statements_by_guid(endpointUrl, tableData[rowNumber][subjectWikidataIdColumnHeader])
+                for propertyNumber in list(folded_references.keys()):
+                    statement_guid = tableData[rowNumber][subjectWikidataIdColumnHeader] + '$' + tableData[rowNumber][propertiesUuidColumnList[propertyNumber]]
+                    if statement_guid.lower() not in current_statements:
+                        # leave these references to be written separately later
+                        print('Statement ' + statement_guid + ' not found, references will be written separately', file=log_object)
+                        del folded_references[propertyNumber]
+                        continue
+                    statement = current_statements[statement_guid.lower()]
+                    if 'references' not in statement:
+                        statement['references'] = []
+                    for reference, referencesDict in folded_references[propertyNumber]:
+                        statement['references'].append({'snaks': referencesDict})
+                    claimsList.append(statement)
+            # In live mode, the current statements were already compared with the row and the changed ones are sent
+            for propertyNumber, (statement, references) in live_changes.items():
+                claimsList.append(statement)
+                if len(references) > 0:
+                    folded_references[propertyNumber] = references
+
             if claimsList != []:
                 dataStructure['claims'] = claimsList
 
         # The data value has to be turned into a JSON string
         parameterDictionary['data'] = json.dumps(dataStructure)
+        profiler.stop(build_timer)
         #print(json.dumps(dataStructure, indent = 2))
         #print(parameterDictionary)
         
         # don't try to write if there aren't any data to send
         if parameterDictionary['data'] == '{}':
-            pass
+            checkpoint(rowNumber) # save any statement UUIDs or reference hashes that were found in live mode
+            metrics.row(skipped=True)
             #print('no data to write', file=log_object)
             #print('', file=log_object)
         else:
             if maxlag > 0:
                 parameterDictionary['maxlag'] = maxlag
-            responseData = attemptPost(endpointUrl, parameterDictionary)
-            print('Write confirmation: ', json.dumps(responseData), file=log_object)
-            print('', file=log_object)
+            # Save the statement GUIDs in the journal before writing, in case the script crashes before the response is processed
+            journal.reserve(rowNumber, {propertiesUuidColumnList[propertyNumber]: statement_guid for propertyNumber, statement_guid in assigned_guids.items()})
+            empty_uuid_columns = [column for column in propertiesUuidColumnList if tableData[rowNumber][column] == '']
+            post_stats = {}
+            responseData = attemptPost(endpointUrl, parameterDictionary, post_stats)
 
             if 'error' in responseData:
-                error_log += 'Error message from API in row ' + str(rowNumber) + ': ' + responseData['error']['info'] + '\n'
+                journal.release(rowNumber) # nothing was written, so the GUIDs aren't needed
+                log_write(rowNumber, 'wbeditentity', responseData, post_stats)
+                log_error('Error message from API in row ' + str(rowNumber) + ': ' + responseData['error']['info'], rowNumber, code=responseData['error']['code'])
                 print('failed write due to error from API', file=log_object)
                 print('', file=log_object)
+                metrics.row()
                 continue # Do not try to extract data from the response JSON. Go on with the next row and leave CSV unchanged.
 
+            reconcile_timer = profiler.start('reconcile')
             if newItem:
                 # extract the entity Q number from the response JSON
                 tableData[rowNumber][subjectWikidataIdColumnHeader] = responseData['entity']['id']
+            if live_mode: # later rows for the same item must be compared with the item as it is after this edit
+                live_entities[tableData[rowNumber][subjectWikidataIdColumnHeader]] = responseData['entity']
+
+            # Index the statements in the response once by GUID and by property and value (see vb_claims.py)
+            statement_index = vb_claims.StatementIndex(responseData['entity'].get(CLAIM_KEY, {}))
 
             # fill into the table the values of newly created claims and references
             for statementIndex in range(0, len(propertiesIdList)):
@@ -2062,64 +1883,35 @@ for table in tables:  # The script can handle multiple tables
                         value = True
                 # Only add the claim if the UUID cell for that row is empty AND there is a value for the property
                 if tableData[rowNumber][propertiesUuidColumnList[statementIndex]] =='' and value:
-                    count = 0
-                    statementFound = False
-                    # If there are multiple values for a property, this will loop through more than one statement
-                    for statement in responseData['entity'][CLAIM_KEY][propertiesIdList[statementIndex]]:
-                        #print(statement)
-
-                        # Before checking the value in the returned JSON, need to check first if the snaktype is novalue or somevalue.
-                        # Oterwise, an error will be thrown when the script looks for the datavalue
-                        if statement['mainsnak']['snaktype'] == 'novalue':
-                            pass # Script currently does not support novalue
-                        elif statement['mainsnak']['snaktype'] == 'somevalue':
-                            # If the value in the table is a blank node, then consider this to be a match.
-                            # NOTE: there is no way to properly handle the case where there are multiple somevalue claims for a property. 
-                            # This is not impossible, but should be rare. It will generate the duplicate values error below.
-                            value_value_bnode = propertiesEntityOrLiteral[statementIndex] =='value' and len(tableData[rowNumber][propertiesColumnList[statementIndex] + '_val']) >= 2 and tableData[rowNumber][propertiesColumnList[statementIndex] + '_val'][:2] =='_:'
-                            plain_value_bnode = propertiesEntityOrLiteral[statementIndex] !='value' and len(tableData[rowNumber][propertiesColumnList[statementIndex]]) >= 2 and tableData[rowNumber][propertiesColumnList[statementIndex]][:2] =='_:'
-                            if value_value_bnode or plain_value_bnode:
-                                statementFound = True
-                        elif statement['mainsnak']['snaktype'] == 'value':
-                            # does the value in the cell equal the mainsnak value of the claim?
-                            # it's necessary to check this because there could be other previous claims for that property (i.e. multiple values)
-                            if propertiesEntityOrLiteral[statementIndex] == 'literal':
-                                # Handle special case of commons images where the raw filename is written to the API, but the value must be stored as an encoded URL
-                                if propertiesTypeList[statementIndex] == 'commonsMedia':
-                                    statementFound = commons_url_to_filename(tableData[rowNumber][propertiesColumnList[statementIndex]]) == statement['mainsnak']['datavalue']['value']
-                                else:
-                                    statementFound = tableData[rowNumber][propertiesColumnList[statementIndex]] == statement['mainsnak']['datavalue']['value']
-                            elif propertiesEntityOrLiteral[statementIndex] == 'entity':
-                                statementFound = tableData[rowNumber][propertiesColumnList[statementIndex]] == statement['mainsnak']['datavalue']['value']['id']
-                            elif propertiesEntityOrLiteral[statementIndex] == 'monolingualtext':
-                                statementFound = tableData[rowNumber][propertiesColumnList[statementIndex]] == statement['mainsnak']['datavalue']['value']['text'] and propertiesLangList[statementIndex] == statement['mainsnak']['datavalue']['value']['language']
-                            elif propertiesEntityOrLiteral[statementIndex] == 'value':
-                                if propertiesTypeList[statementIndex] == 'time':
-                                    # need to handle negative dates (BCE)
-                                    if tableData[rowNumber][propertiesColumnList[statementIndex] + '_val'][0] == '-':
-                                        # make comparison with the leading minus present
-                                        statementFound = tableData[rowNumber][propertiesColumnList[statementIndex] + '_val'] == statement['mainsnak']['datavalue']['value']['time']
-                                    else:
-                                        # must add leading plus (not stored in the table) to match the non-standard plus included by Wikibase
-                                        statementFound = ('+' + tableData[rowNumber][propertiesColumnList[statementIndex] + '_val']) == statement['mainsnak']['datavalue']['value']['time']
-                                elif propertiesTypeList[statementIndex] == 'quantity':
-                                    # need to handle negative quantities
-                                    if tableData[rowNumber][propertiesColumnList[statementIndex] + '_val'][0] == '-':
-                                        # make comparison with the leading minus present
-                                        statementFound = tableData[rowNumber][propertiesColumnList[statementIndex] + '_val'] == statement['mainsnak']['datavalue']['value']['amount']
-                                    else:
-                                        # must add leading plus (not stored in the table) to match the plus required by Wikibase
-                                        statementFound = ('+' + tableData[rowNumber][propertiesColumnList[statementIndex] + '_val']) == statement['mainsnak']['datavalue']['value']['amount']
-                                elif propertiesTypeList[statementIndex] == 'globe-coordinate':
-                                    statementFound = float(tableData[rowNumber][propertiesColumnList[statementIndex] + '_val']) == statement['mainsnak']['datavalue']['value']['latitude']
-
-                                else: # non-supported types of value nodes
-                                    pass
-                            else: # non-supported types of values
-                                pass
-                        else: # currently there are no other snaktypes other than novalue, somevalue, or value, but who knows.
-                            pass
-                        if statementFound:
+                    # Statements written to existing items had their GUIDs assigned before writing, so they can be looked up directly
+                    if statementIndex in assigned_guids:
+                        count = 0
+                        statement = statement_index.get(assigned_guids[statementIndex])
+                        if statement is not None:
+                            count = 1
+                            tableData[rowNumber][propertiesUuidColumnList[statementIndex]] = statement['id'].split('$')[1]  # just keep the UUID part after the dollar sign
+                            for message in find_reference_hashes(statement, referencesForStatement, tableData[rowNumber], statement_index):
+                                print(message, file=log_object)
+                                log_error(message, rowNumber)
+                    # Statements written to new items must be found by matching their values
+                    else:
+                        count = 0
+                        # Convert the value in the table once into the form used in the index of the response
+                        if propertiesEntityOrLiteral[statementIndex] == 'value':
+                            cell_value = tableData[rowNumber][propertiesColumnList[statementIndex] + '_val']
+                        else:
+                            cell_value = tableData[rowNumber][propertiesColumnList[statementIndex]]
+                            # Handle special case of commons images where the raw filename is written to the API, but the value must be stored as an encoded URL
+                            if propertiesTypeList[statementIndex] == 'commonsMedia' and cell_value[:2] != '_:':
+                                cell_value = commons_url_to_filename(cell_value)
+                        # If the value in the table is a blank node, then any somevalue statement for the property is considered to be a match.
+                        # NOTE: there is no way to properly handle the case where there are multiple somevalue claims for a property. 
+                        # This is not impossible, but should be rare. It will generate the duplicate values error below.
+                        value_key = vb_claims.cell_key(propertiesEntityOrLiteral[statementIndex], propertiesTypeList[statementIndex], cell_value, propertiesLangList[statementIndex])
+
+                        # If there are multiple values for a property, there may be more than one statement. Only the ones whose value
+                        # equals the value in the cell are returned, since there could be other previous claims for that property.
+                        for statement in statement_index.find(propertiesIdList[statementIndex], value_key):
                             count += 1
                             if count > 1:
                                 # I don't think this should actually happen, since if there were already at least one statement with this value,
@@ -2133,115 +1925,35 @@ for table in tables:  # The script can handle multiple tables
                                     dup_message += tableData[rowNumber][propertiesColumnList[statementIndex]]
                                 dup_message += '\n'
                                 print(dup_message)
-                                error_log += dup_message + '\n'
+                                log_error(dup_message.strip(), rowNumber)
                             tableData[rowNumber][propertiesUuidColumnList[statementIndex]] = statement['id'].split('$')[1]  # just keep the UUID part after the dollar sign
 
-                            if 'references' in statement: # skip reference checking if the item doesn't have any references
-                                # Search for each reference type (set of reference properties) that's being tracked for a particular property's statements
-                                for tableReference in referencesForStatement: # loop will not be executed when length of referenceForStatement = 0 (no references tracked for this property)
-                                    # Check for an exact match of reference properties and their values (since we're looking for reference for a statement that was written)
-                                    # Step through each reference that came back for the statement we are interested in
-                                    for responseReference in statement['references']: # "outer loop"
-                                        # Perform a screening process on each returned reference by stepping through each property associated with a refernce type
-                                        # and trying to match it. If the path to the value doesn't exist, there will be an exception and that reference 
-                                        # can be ignored. Only if the values for all of the reference properties match will the hash be recorded.
-                                        referenceMatch = True
-                                        refWithValues = False
-                                        for referencePropertyIndex in range(0, len(tableReference['refPropList'])): # "inner loop" to check each property in the reference
-                                            try:
-                                                # First try to see if the values in the response JSON for the property match
-                                                if tableReference['refEntityOrLiteral'][referencePropertyIndex] == 'value':
-                                                    # Skip checking the property if it doesn't have a value
-                                                    if tableData[rowNumber][tableReference['refValueColumnList'][referencePropertyIndex] + '_val'] != '':
-                                                        refWithValues = True # at least one reference had a value
-                                                        # The values for value nodes are buried a layer deeper in the JSON than other types.
-                                                        if tableReference['refTypeList'][referencePropertyIndex] == 'time':
-                                                            # need to handle negative dates (BCE)
-                                                            if tableData[rowNumber][tableReference['refValueColumnList'][referencePropertyIndex] + '_val'][0] == '-':
-                                                                # make comparison with the leading minus present
-                                                                if responseReference['snaks'][tableReference['refPropList'][referencePropertyIndex]][0]['datavalue']['value']['time'] != tableData[rowNumber][tableReference['refValueColumnList'][referencePropertyIndex] + '_val']:
-                                                                    referenceMatch = False
-                                                                    break # kill the inner loop because this value doesn't match
-                                                            else:
-                                                                # must add leading plus (not stored in the table) to match the non-standard plus included by Wikibase
-                                                                # Note that this assumes the first value for a particular reference property. It appears to be unusual for there to be more than one.
-                                                                if responseReference['snaks'][tableReference['refPropList'][referencePropertyIndex]][0]['datavalue']['value']['time'] != '+' + tableData[rowNumber][tableReference['refValueColumnList'][referencePropertyIndex] + '_val']:
-                                                                    referenceMatch = False
-                                                                    break # kill the inner loop because this value doesn't match
-                                                        elif tableReference['refTypeList'][referencePropertyIndex] == 'quantity':
-                                                            # need to handle negative quantities
-                                                            if tableData[rowNumber][tableReference['refValueColumnList'][referencePropertyIndex] + '_val'][0] == '-':
-                                                                # make comparison with the leading minus present
-                                                                if responseReference['snaks'][tableReference['refPropList'][referencePropertyIndex]][0]['datavalue']['value']['amount'] != tableData[rowNumber][tableReference['refValueColumnList'][referencePropertyIndex] + '_val']:
-                                                                    referenceMatch = False
-                                                                    break # kill the inner loop because this value doesn't match
-                                                            else:
-                                                                # must add leading plus (not stored in the table) to match the non-standard plus included by Wikibase
-                                                                # Note that this assumes the first value for a particular reference property. It appears to be unusual for there to be more than one.
-                                                                if responseReference['snaks'][tableReference['refPropList'][referencePropertyIndex]][0]['datavalue']['value']['amount'] != '+' + tableData[rowNumber][tableReference['refValueColumnList'][referencePropertyIndex] + '_val']:
-                                                                    referenceMatch = False
-                                                                    break # kill the inner loop because this value doesn't match
-                                                        elif tableReference['refTypeList'][referencePropertyIndex] == 'globe-coordinate':
-                                                            if responseReference['snaks'][tableReference['refPropList'][referencePropertyIndex]][0]['datavalue']['value']['latitude'] != float(tableData[rowNumber][tableReference['refValueColumnList'][referencePropertyIndex] + '_val']):
-                                                                referenceMatch = False
-                                                                break # kill the inner loop because this value doesn't match
-
-                                                        else: # unsupported value types
-                                                            pass
-                                                else:
-                                                    # Skip checking the property if it doesn't have a value
-                                                    if tableData[rowNumber][tableReference['refValueColumnList'][referencePropertyIndex]] != '':
-                                                        refWithValues = True # at least one reference had a value
-                                                        if tableReference['refEntityOrLiteral'][referencePropertyIndex] == 'monolingualtext':
-                                                            # The monolingual text (language-tagged literals) have an additional layer "text" within the value
-                                                            if responseReference['snaks'][tableReference['refPropList'][referencePropertyIndex]][0]['datavalue']['value']['text'] != tableData[rowNumber][tableReference['refValueColumnList'][referencePropertyIndex]] and responseReference['snaks'][tableReference['refPropList'][referencePropertyIndex]][0]['datavalue']['value']['language'] != tableReference['refLangList'][referencePropertyIndex]:
-                                                                referenceMatch = False
-                                                                break # kill the inner loop because this value doesn't match
-                                                        else: # Values for types other than node-valued have direct literal values of 'value'
-                                                            if responseReference['snaks'][tableReference['refPropList'][referencePropertyIndex]][0]['datavalue']['value'] != tableData[rowNumber][tableReference['refValueColumnList'][referencePropertyIndex]]:
-                                                                referenceMatch = False
-                                                                break # kill the inner loop because this value doesn't match
-                                                        # So far, so good -- the value for this property matches
-                                            except:
-                                                # An exception occured because the JSON "path" to the value didn't match. So this isn't the right property
-                                                referenceMatch = False
-                                                break # kill the inner loop because the property doesn't match
-
-                                            # OK, we got all the way through on this property with it and its value matching, so referenceMatch will still be True
-                                            # The inner loop can continue on to the next property to see if it and its value match.
-
-                                        # If we got to this point, the inner loop completed withoug being killed. referenceMatch should still be True
-                                        # So this is a match to the reference that we wrote and we need to grab the reference hash, unless none of the properties had values.
-                                        if refWithValues:
-                                            tableData[rowNumber][tableReference['refHashColumn']] = responseReference['hash']
-                                            # It is not necessary to continue on with the next iteration of the outer loop since we found the reference we wanted.
-                                            # So we can kill the outer loop with the value of referenceMatch being True
-                                            break
-
-                                    # At this point, the outer loop is finished. Either a response reference has matched or all response references have been checked.
-                                    # Since this check only happens for newly written statements, referenceMatch should always be True since the exact reference was written.
-                                    # But better give an error message if for some reason no reference matched.
-                                    # Note 2021-03-01: This test does not actually seem to work since suggests the reference ID can't be found, when actually it is found just fine. I'm commenting it out
-                                    # but leaving it for the historical record in case it needs to be re-enabled for debugging in the future.
-                                    #if referenceMatch == False:
-                                    #    error_log += 'The script thinks there might be a problem with a retrieved reference identifier, so check that all reveferences in CSV row ' +  str(rowNumber + 2) + 'have identifiers.\n'
-                                    #    print('No reference in the response JSON matched with the reference for statement:', tableData[rowNumber][subjectWikidataIdColumnHeader], ' ', propertiesIdList[statementIndex], file=log_object)
-                                    #    print('Reference  ', tableReference, file=log_object)
-
-                                    # The script will now move on to checking the next reference in the table.
+                            for message in find_reference_hashes(statement, referencesForStatement, tableData[rowNumber], statement_index):
+                                print(message, file=log_object)
+                                log_error(message, rowNumber)
 
                     # Print this error message only if there is not match to any of the values after looping through all of the matching properties
                     # This should never happen because this code is only executed when the statement doesn't have a UUID (i.e. not previously written)
                     if count == 0:
                         print('Did not find in API response:', tableData[rowNumber][propertiesColumnList[statementIndex]], file=log_object)
-                        error_log += 'Did not find in API response: ' + tableData[rowNumber][propertiesColumnList[statementIndex]]  + '\n'
+                        log_error('Did not find in API response: ' + tableData[rowNumber][propertiesColumnList[statementIndex]], rowNumber)
         
-            # Replace the table with a new one containing any new IDs
-            # Note: I'm writing after every line so that if the script crashes, no data will be lost
-            writeToFile(tableFileName, fieldnames, tableData)
-            
-            # Do not change this value, see top of script for an explanation
-            sleep(api_sleep)
+            # Find the hashes of any new references that were added to existing statements in this edit
+            for propertyNumber, references in folded_references.items():
+                statement_guid = tableData[rowNumber][subjectWikidataIdColumnHeader] + '$' + tableData[rowNumber][propertiesUuidColumnList[propertyNumber]]
+                statement = statement_index.get(statement_guid)
+                if statement is not None:
+                    for message in find_reference_hashes(statement, [reference for reference, referencesDict in references], tableData[rowNumber], statement_index):
+                        print(message, file=log_object)
+                        log_error(message, rowNumber)
+            qid = tableData[rowNumber][subjectWikidataIdColumnHeader]
+            log_write(rowNumber, 'wbeditentity', responseData, post_stats, [qid + '$' + tableData[rowNumber][column] for column in empty_uuid_columns if tableData[rowNumber][column] != ''])
+            profiler.stop(reconcile_timer)
+
+            # Save any new IDs to the journal
+            # Note: I'm saving after every line so that if the script crashes, no data will be lost
+            checkpoint(rowNumber)
+            metrics.row()
     print('', file=log_object)
     print('', file=log_object)
 
@@ -2258,6 +1970,8 @@ for table in tables:  # The script can handle multiple tables
             if log_path != '':
                 print(log_text) # print something if output is going to a log file
         print(log_text, file=log_object)        
+        if tableData[rowNumber][subjectWikidataIdColumnHeader] in unfetched_ids: # not written in live mode (see above)
+            continue
         for propertyNumber in range(0, len(propertiesColumnList)):
             propertyId = propertiesIdList[propertyNumber]
             statementUuidColumn = propertiesUuidColumnList[propertyNumber]     
@@ -2288,39 +2002,234 @@ for table in tables:  # The script can handle multiple tables
                                 # print(json.dumps(parameterDictionary, indent = 2))
                                 
                                 # print('ref:', reference['refValueColumnList'])
-                                responseData = attemptPost(endpointUrl, parameterDictionary)
-                                print('Write confirmation: ', responseData, file=log_object)
-                                print('', file=log_object)
+                                post_stats = {}
+                                responseData = attemptPost(endpointUrl, parameterDictionary, post_stats)
+                                log_write(rowNumber, 'wbsetreference', responseData, post_stats, [parameterDictionary['statement']])
+                                if 'error' in responseData: # e.g. the statement was removed from the item
+                                    log_error('Error message from API in row ' + str(rowNumber) + ': ' + responseData['error']['info'], rowNumber, code=responseData['error']['code'])
+                                    continue
             
                                 tableData[rowNumber][reference['refHashColumn']] = responseData['reference']['hash']
                             
-                                # Replace the table with a new one containing any new IDs
-                                # Note: I'm writing after every line so that if the script crashes, no data will be lost
-                                writeToFile(tableFileName, fieldnames, tableData)
-
-                                # Do not change this value. See top of script for explanation
-                                sleep(api_sleep)
+                                # Save the new reference hash to the journal
+                                # Note: I'm saving after every reference so that if the script crashes, no data will be lost
+                                checkpoint(rowNumber)
     print('', file=log_object)
-    if error_log != '':
-        full_error_log += '\nError log for CSV file: ' + tableFileName + '\n' + error_log + '\n'
-
-if allow_label_description_changes:
-    print('\n\nAutomatic label and description changes for existing items were ENABLED.', file=log_object)
-else:
-    print('\n\nAutomatic label and description changes for existing items were DISABLED.', file=log_object)
-
-if full_error_log != '': # If there were errors display them
-    print(full_error_log)
-    if log_path != '': # if there is logging to a file, write the error log to the file
-        print('\n\n' + full_error_log, file=log_object)
-else:
-    print('\nNo errors occurred.')
-    if log_path != '': # if there is logging to a file, write the error log to the file
-        print('\n\nNo errors occurred.', file=log_object)
-
-if log_path != '': # only close the log_object if it's a file (otherwise it's std.out)
-    log_object.close()
-print('elapsed time:', time.time() - start_time, 'seconds')
-print('done')
-print()
-    
\ No newline at end of file
+    close_journal()
+    return run_log.error_summary([tableFileName])
+
+# Process a table and end its turn when it is finished, even if it fails. A table that fails before its turn passes the
+# turn on to the next table. The callbacks that process_table() adds to cleanup (e.g. merging the journal) are run first.
+def run_table(table_number, table_plan):
+    turn = {'table_number': table_number, 'held': False}
+    try:
+        with contextlib.ExitStack() as cleanup:
+            return process_table(table_plan, turn, cleanup)
+    finally:
+        with write_condition:
+            if turn['held']:
+                write_state['writing'] -= 1
+            else:
+                write_condition.wait_for(lambda: write_state['next_table'] == table_number)
+                write_state['next_table'] += 1
+            write_condition.notify_all()
+
+# ----------------------------------------------------------------
+# Upload
+
+# The settings of the upload in progress are kept in module variables that are used by the functions above, so only
+# one upload can run at a time. A second call to run() from another thread waits until the first one is finished.
+run_lock = threading.Lock()
+
+# With the --profile option, the time spent in each phase of the upload is added up by a Profiler (see vb_profile.py).
+# The time spent waiting between writes to stay under the rate limit is the sleep phase; the delays between queries to
+# the Query Service are part of the prefetch and duplicate_check phases. cProfile is run only for the phases that are
+# limited by the CPU, since the profiles of the other phases would only show time spent waiting for the network.
+CPU_PHASES = ['schema', 'normalize', 'json_build', 'reconcile']
+profiler = vb_profile.Profiler(enabled=False)
+
+# The progress of the upload is counted by a Metrics object (see vb_metrics.py). With the --metrics option, the counts
+# are made available by a MetricsExporter while the upload is running. Rows are counted in the loop that writes items;
+# writes and API errors are counted in attemptPost(), so they include the references written afterwards.
+metrics = vb_metrics.Metrics()
+
+def run(config: Optional[Dict[str, Any]] = None, wikibase_session: Optional[vb_session.WikibaseSession] = None) -> str:
+    """Write the tables listed in a metadata description file to a Wikibase and return the error log.
+
+    Parameters
+    ----------
+    config : dict, optional
+        Settings for the upload, with the keys of DEFAULT_CONFIG. Settings that are left out have the default values.
+    wikibase_session : vb_session.WikibaseSession, optional
+        Logged-in session to use, e.g. from vb_session.connect(). Pass the same session to several uploads to log in only
+        once; they also share its write rate limit. If none is given, the script logs in with the credentials file in the
+        settings and closes the session at the end.
+
+    Returns
+    -------
+    The errors for all tables, or an empty string if there were none.
+    """
+    global log_path, log_object, allow_label_description_changes, endpoint, sparqlSleep, values_chunk_size, sparql_workers
+    global journal_compact_interval, terse, duplicate_check, batch_references, live_mode, entity_workers, table_workers
+    global calendar_model, globe_value, session, csrfToken, api_session, endpointUrl, DOMAIN_NAME, CLAIM_KEY, run_log, profiler
+    global metrics
+    settings = dict(DEFAULT_CONFIG)
+    if config is not None:
+        for key in config:
+            if key not in DEFAULT_CONFIG:
+                raise ValueError('Unknown VanderBot setting: ' + key)
+        settings.update(config)
+    if settings['log_format'] not in ['text', 'json']:
+        raise ValueError('Unknown log format: ' + str(settings['log_format']))
+
+    with run_lock:
+        start_time = time.time()
+        log_path = settings['log_path']
+        allow_label_description_changes = settings['allow_label_description_changes']
+        endpoint = settings['endpoint']
+        sparqlSleep = settings['sparql_sleep']
+        values_chunk_size = settings['values_chunk_size']
+        sparql_workers = settings['sparql_workers']
+        journal_compact_interval = settings['journal_compact_interval']
+        terse = settings['terse']
+        duplicate_check = settings['duplicate_check']
+        batch_references = settings['batch_references']
+        live_mode = settings['live_mode']
+        entity_workers = settings['entity_workers']
+        table_workers = settings['table_workers']
+        calendar_model = settings['calendar_model']
+        globe_value = settings['globe_value']
+        profile_path = settings['profile_path']
+        profiler = vb_profile.Profiler(profile_path != '', CPU_PHASES if settings['cpu_profile'] else [])
+        response_length = settings['log_response_length']
+        if log_path != '' and settings['log_format'] == 'json':
+            if response_length is None:
+                response_length = 0
+            run_log = vb_log.RunLog(log_path, response_length)
+            log_object = run_log.messages() # other output to the log becomes message events
+        else:
+            run_log = vb_log.RunLog('', response_length) # keeps the errors for the error log
+            if log_path != '':
+                log_object = open(log_path, 'wt', encoding='utf-8') # direct output sent to log_object to log file instead of sys.stdout
+            else:
+                log_object = sys.stdout
+
+        own_session = wikibase_session is None
+        metrics_exporter = None
+        try:
+            # authentication
+            if own_session:
+                if terse:
+                    print('authenticating and loading data')
+                credentials_path = settings['credentials_path']
+                if credentials_path == '':
+                    credentials_path = credentials_file_path(credentials_path_string, credentials_filename)
+                wikibase_session = vb_session.connect(credentials_path, user_agent_header, settings['api_sleep'])
+            if not wikibase_session.logged_in: # writes without a login would be made under the IP address or rejected
+                raise vb_session.LoginFailed('The session for ' + wikibase_session.api_url + ' is not logged in.')
+            session = wikibase_session.session
+            csrfToken = wikibase_session.csrf_token
+            api_session = wikibase_session
+            endpointUrl = wikibase_session.api_url
+            metrics = vb_metrics.Metrics('vanderbot', wikibase_session.rate_controller)
+            if settings['metrics_target'] != '':
+                metrics_exporter = vb_metrics.MetricsExporter(metrics, settings['metrics_target'])
+                print('Progress metrics at', metrics_exporter.url())
+
+            base_url = wikibase_session.base_url
+            if base_url == 'https://www.wikidata.org':
+                DOMAIN_NAME = 'http://www.wikidata.org'
+                CLAIM_KEY = 'claims'
+            elif base_url == 'https://commons.wikimedia.org':
+                DOMAIN_NAME = 'http://commons.wikimedia.org'
+                # For whatever reason, the Commons API uses a different key for the claims than other wikibases in the response JSON
+                CLAIM_KEY = 'statements'
+            else:
+                DOMAIN_NAME = base_url
+                CLAIM_KEY = 'claims'
+
+            # DO NOT decrease the write rate limit for Wikidata and Commons (see vb_session.make_rate_controller()) unless
+            # you have obtained a bot flag! If you have a bot flag, then you have created your own User-Agent and are not
+            # using VanderBot any more. In that case, you must change the user_agent_header above to reflect your own
+            # information. DO NOT get me in trouble by saying you are using my User-Agent if you are going to violate 
+            # Wikimedia guidelines !!!
+
+            # Tables are written one at a time to Wikidata and Commons, since the writes are limited by the policy rate anyway
+            if vb_session.is_wikimedia(DOMAIN_NAME) and table_workers > 1:
+                print('Tables are written one at a time to ' + DOMAIN_NAME + '. The --tables option was ignored.')
+                table_workers = 1
+            if table_workers < 1:
+                table_workers = 1
+
+            # -------------------------------------------
+            # Beginning of script to process the tables
+
+            full_error_log = '' # start the full error log for all tables
+
+            # This is the schema that maps the CSV column to Wikidata properties. It is compiled into a plan for each table
+            # (cached on disk until the schema file changes). See vb_schema.py for details.
+            # The P18 (image) property has Commons media values only at Wikidata.
+            with profiler.phase('schema'):
+                table_plans = vb_schema.load_plans(settings['json_metadata_description_file'], endpointUrl == 'https://www.wikidata.org/w/api.php')
+
+            # The error logs are added to the full error log in the order of the tables
+            write_state['next_table'] = 0
+            write_state['writing'] = 0
+            with ThreadPoolExecutor(max_workers=table_workers + 1) as executor:
+                for table_error_log in executor.map(run_table, range(len(table_plans)), table_plans):
+                    full_error_log += table_error_log
+
+            if allow_label_description_changes:
+                print('\n\nAutomatic label and description changes for existing items were ENABLED.', file=log_object)
+            else:
+                print('\n\nAutomatic label and description changes for existing items were DISABLED.', file=log_object)
+
+            if full_error_log != '': # If there were errors display them
+                print(full_error_log)
+                if log_path != '': # if there is logging to a file, write the error log to the file
+                    print('\n\n' + full_error_log, file=log_object)
+            else:
+                print('\nNo errors occurred.')
+                if log_path != '': # if there is logging to a file, write the error log to the file
+                    print('\n\nNo errors occurred.', file=log_object)
+        finally:
+            if log_path != '' and not run_log.structured: # only close the log_object if it's a file (otherwise it's std.out)
+                log_object.close()
+            log_object = sys.stdout
+            run_log.close() # writes the JSON lines that are still waiting
+            if metrics_exporter is not None:
+                metrics_exporter.close() # a metrics file is left with the final values
+            if own_session:
+                wikibase_session.close()
+        print('elapsed time:', time.time() - start_time, 'seconds')
+        if profile_path != '':
+            print()
+            print(profiler.summary())
+            print('Phase timings saved in', ', '.join(profiler.save(profile_path)))
+        print('done')
+        print()
+    return full_error_log
+
+# Run the script from the command line
+def main(arg_vals: List[str]) -> None:
+    # see https://www.gnu.org/prep/standards/html_node/_002d_002dversion.html
+    if '--version' in arg_vals or '-V' in arg_vals: # provide version information according to GNU standards 
+        print('VanderBot', version)
+        print('Copyright ©', created[:4], 'Vanderbilt University')
+        print('License GNU GPL version 3.0 <http://www.gnu.org/licenses/gpl-3.0>')
+        print('This is free software: you are free to change and redistribute it.')
+        print('There is NO WARRANTY, to the extent permitted by law.')
+        print('Author: Steve Baskauf')
+        print('Revision date:', created)
+        return
+
+    if '--help' in arg_vals or '-H' in arg_vals: # provide help information according to GNU standards
+        # needs to be expanded to include brief info on invoking the program
+        print('For help, see the VanderBot landing page at https://github.com/HeardLibrary/linked-data/blob/master/vanderbot/README.md')
+        print('Report bugs to: steve.baskauf@vanderbilt.edu')
+        return
+
+    run(parse_arguments(arg_vals))
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -1,6 +1,6 @@
 # VanderDeleteBot, a script for deleting Wikibase claims.  vanderdeletebot.py
-version = '0.2'
-created = '2023-02-08'
+version = '0.3'
+created = '2026-10-18'
 
 # (c) 2022-2023 Vanderbilt University. This program is released under a GNU General Public License v3.0 http://www.gnu.org/licenses/gpl-3.0
 # Author: Steve Baskauf
@@ -17,15 +17,20 @@ created = '2023-02-08'
 # -----------------------------------------
 # Version 0.2 change notes (2023-02-08):
 # - Moved from a Jupyter notebook to a stand-alone script
+# -----------------------------------------
+# Version 0.3 change notes (2026-10-18):
+# - Writes are spaced by the adaptive rate controller in vb_rate.py that is shared with vanderbot.py. It honors Retry-After,
+#   never goes faster than api_sleep for Wikidata and Commons, and raises an exception instead of calling exit().
+# - Logs in with vb_session.py, which saves the session cookies between runs so that the next run doesn't need to log in
+#   again, and gets a new CSRF token when a write is rejected with a badtoken error.
 
 import json
-import requests
 from pathlib import Path
-from time import sleep
 import sys
 import uuid
 import pandas as pd
 from typing import List, Dict, Tuple, Optional, Any
+import vb_session # logs in to the API and controls the rate of writes; must be in the same directory as this script
 
 # Set global variable values. Assign default values, then override if passed in as command line arguments.
 claims_to_delete_filename = 'deletions.csv'
@@ -111,11 +116,15 @@ else:  # credential file is in a directory whose path was specified by the crede
 # The option to increase the delay is offered if the user is a "newbie", defined as having an
 # account less than four days old and with fewer than 50 edits. The newbie limit is 8 edits per minute.
 # Therefore, newbies should set the API sleep value to 8 to avoid getting blocked.
+# For other Wikibase instances, the delay is adjusted automatically (see vb_session.make_rate_controller()).
 api_sleep = 1.25
+api_sleep_set = False # True if the delay was set as a command line option
 if '--apisleep' in opts: # delay between API POSTs. Used by newbies to slow writes to within limits. 
-    api_sleep = int(args[opts.index('--apisleep')]) # Number of seconds between API calls. Numeric only, do not include "s"
+    api_sleep = float(args[opts.index('--apisleep')]) # Number of seconds between API calls. Numeric only, do not include "s"
+    api_sleep_set = True
 if '-A' in opts:
-    api_sleep = int(args[opts.index('-A')])
+    api_sleep = float(args[opts.index('-A')])
+    api_sleep_set = True
 
 # See https://meta.wikimedia.org/wiki/User-Agent_policy
 user_agent_header = 'VanderDeleteBot/' + version + ' (https://github.com/HeardLibrary/linked-data/blob/master/vanderbot/vanderdeletebot.md; mailto:steve.baskauf@vanderbilt.edu)'
@@ -139,49 +148,6 @@ request_header = generate_header_dictionary(accept_media_type,user_agent_header)
 # -----------------------------------------------------------------
 # function definitions
 
-def retrieve_credentials(path):
-    with open(path, 'rt') as fileObject:
-        lineList = fileObject.read().split('\n')
-    endpoint_url = lineList[0].split('=')[1]
-    username = lineList[1].split('=')[1]
-    password = lineList[2].split('=')[1]
-    #userAgent = lineList[3].split('=')[1]
-    credentials = [endpoint_url, username, password]
-    return credentials
-
-def getLoginToken(api_url):    
-    parameters = {
-        'action':'query',
-        'meta':'tokens',
-        'type':'login',
-        'format':'json'
-    }
-    r = session.get(url=api_url, params=parameters)
-    data = r.json()
-    return data['query']['tokens']['logintoken']
-
-def logIn(apiUrl, token, username, password):
-    parameters = {
-        'action':'login',
-        'lgname':username,
-        'lgpassword':password,
-        'lgtoken':token,
-        'format':'json'
-    }
-    r = session.post(apiUrl, data=parameters)
-    data = r.json()
-    return data
-
-def get_csrf_token(apiUrl):
-    parameters = {
-        "action": "query",
-        "meta": "tokens",
-        "format": "json"
-    }
-    r = session.get(url=apiUrl, params=parameters)
-    data = r.json()
-    return data["query"]["tokens"]["csrftoken"]
-
 def parse_column_name(column_name: str) -> Tuple[str, str]:
     """Parses the column name to determine the type of identifier and base name."""
     if '_uuid' in column_name:
@@ -201,98 +167,32 @@ def parse_column_name(column_name: str) -> Tuple[str, str]:
 
 # This function attempts to post and handles maxlag errors
 def attempt_post(apiUrl, parameters):
-    maxRetries = 10
-    # Wikidata recommends a retry delay of at least 5 seconds.
-    # This differs from api_sleep, which is the delay when there is no lag. The baseDelay is a starting point; the
-    # actual delay is increased with each retry after the server reports being lagged.
-    baseDelay = 5
-    delayLimit = 300
-    retry = 0
-    # maximum number of times to retry lagged server = maxRetries
-    while retry <= maxRetries:
-        if retry > 0:
-            print('retry:', retry)
-            
-        # This first try block is to check for cases where the server is not responding at all.
-        response = 0
-        while response < 5:
-            try:
-                r = session.post(apiUrl, data = parameters)
-                data = r.json()
-                response = 5
-            except:
-                print('Bad response from server.')
-                print('Response was:', r.text)
-                print('Waiting 1 second to retry. Retry', response + 1, 'of 5)')
-                print()
-                sleep(1)
-                response += 1
-        #r = session.post(apiUrl, data = parameters)
-        #data = r.json()
-        
-        # This second try block is to check for cases where the server is responding, but is lagged.
-        try:
-            # check if response is a maxlag error
-            # see https://www.mediawiki.org/wiki/Manual:Maxlag_parameter
-            if data['error']['code'] == 'maxlag':
-                print('Lag of ', data['error']['lag'], ' seconds.')
-                # recommended delay is basically useless
-                # recommendedDelay = int(r.headers['Retry-After'])
-                #if recommendedDelay < 5:
-                    # recommendation is to wait at least 5 seconds if server is lagged
-                #    recommendedDelay = 5
-                recommendedDelay = baseDelay*2**retry # double the delay with each retry 
-                if recommendedDelay > delayLimit:
-                    recommendedDelay = delayLimit
-                if retry != maxRetries:
-                    print('Waiting ', recommendedDelay , ' seconds.')
-                    print()
-                    sleep(recommendedDelay)
-                retry += 1
-
-                # after this, go out of if and try code blocks
-            else:
-                # an error code is returned, but it's not maxlag
-                return data
-        except:
-            # if the response doesn't have an error key, it was successful, so return
-            return data
-        # here's where execution goes after the delay
-    # here's where execution goes after maxRetries tries
-    print('Failed after ' + str(maxRetries) + ' retries.')
-    exit() # just abort the script
+    # The rate controller waits until a write is allowed, then retries with increasing delays if the server is lagged.
+    # If the write still can't be made, vb_rate.PostFailed is raised. If the CSRF token is rejected, the session gets a
+    # new one (logging in again if necessary) and sends the write again with it.
+    return wikibase_session.post(parameters)
 
 # ----------------------------------------------------------------
 # authentication
 
-# default API resource URL when a Wikibase/Wikidata instance is installed.
-resource_url = '/w/api.php'
-
-base_url, user, pwd = retrieve_credentials(credentials_path)
-endpoint_url = base_url + resource_url
+# Logs in, or reuses the cookies saved by an earlier run if they are still logged in (see vb_session.py).
+# DO NOT decrease the write rate limit for Wikidata and Commons (see vb_session.make_rate_controller())! If you have a
+# bot flag, then you have created your own User-Agent and are not using VanderBot any more. In that case, you must change
+# the user_agent_header above to reflect your own information. DO NOT get me in trouble by saying you are using my
+# User-Agent if you are going to violate Wikimedia guidelines !!!
+if api_sleep_set:
+    wikibase_session = vb_session.connect(credentials_path, user_agent_header, api_sleep)
+else:
+    wikibase_session = vb_session.connect(credentials_path, user_agent_header)
+base_url = wikibase_session.base_url
+endpoint_url = wikibase_session.api_url
 if base_url == 'https://www.wikidata.org':
     DOMAIN_NAME = 'http://www.wikidata.org'
 elif base_url == 'https://commons.wikimedia.org':
     DOMAIN_NAME = 'http://commons.wikimedia.org'
 else:
     DOMAIN_NAME = base_url
-
-# DO NOT decrease this limit unless you have obtained a bot flag! If you have a bot flag, then you have created your own
-# User-Agent and are not using VanderBot any more. In that case, you must change the user_agent_header below to reflect
-# your own information. DO NOT get me in trouble by saying you are using my User-Agent if you are going to violate 
-# Wikimedia guidelines !!!
-if 'wikidata.org' in DOMAIN_NAME or 'wikimedia.org' in DOMAIN_NAME:
-    if api_sleep < 1.25:
-        api_sleep = 1.25
-
-# Instantiate session outside of any function so that it's globally accessible.
-session = requests.Session()
-# Set default User-Agent header so you don't have to send it with every request
-session.headers.update({'User-Agent': user_agent_header})
-
-login_token = getLoginToken(endpoint_url)
-data = logIn(endpoint_url, login_token, user, pwd)
-csrf_token = get_csrf_token(endpoint_url)
+csrf_token = wikibase_session.csrf_token
 
 # -------------------------------------------
 # Beginning of script to process the table
@@ -403,9 +303,6 @@ for index, claim_row in claims_to_delete_frame.iterrows():
         print('', file=log_object)
         continue # Do not try to extract data from the response JSON. Go on with the next row and leave CSV unchanged.
 
-    # Do not change this value, see top of script for an explanation
-    sleep(api_sleep)
-
 
 if error_log != '': # If there were errors display them
     print(error_log)
@@ -416,6 +313,8 @@ else:
     if log_path != '': # if there is logging to a file, write the error log to the file
         print('\n\nNo errors occurred.', file=log_object)
 
+wikibase_session.close() # saves the session cookies for the next run
+
 if log_path != '': # only close the log_object if it's a file (otherwise it's std.out)
     log_object.close()
 
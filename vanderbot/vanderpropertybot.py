@@ -1,6 +1,6 @@
 # VanderPropertyBot, a script for creating Wikibase properties.  vanderpropertybot.py
-version = '0.1'
-created = '2023-02-09'
+version = '0.2'
+created = '2026-10-18'
 
 # (c) 2023 Vanderbilt University. This program is released under a GNU General Public License v3.0 http://www.gnu.org/licenses/gpl-3.0
 # Author: Steve Baskauf
@@ -14,16 +14,20 @@ created = '2023-02-09'
 # -----------------------------------------
 # Version 0.1 change notes (2023-02-09):
 # - Initial version
+# -----------------------------------------
+# Version 0.2 change notes (2026-10-18):
+# - Logs in with vb_session.py, which saves the session cookies between runs so that the next run doesn't need to log in
+#   again. When a write is rejected with a badtoken error, a new CSRF token is got and the write is sent again.
 
 
 import json
-import requests
 from pathlib import Path
 from time import sleep
 import sys
 import uuid
 import pandas as pd
 from typing import List, Dict, Tuple, Optional, Any
+import vb_session # logs in to the API; must be in the same directory as this script
 
 # Set global variable values. Assign default values, then override if passed in as command line arguments.
 property_data_filename = 'properties_to_add.csv'
@@ -129,49 +133,6 @@ request_header = generate_header_dictionary(accept_media_type,user_agent_header)
 # -----------------------------------------------------------------
 # function definitions
 
-def retrieve_credentials(path):
-    with open(path, 'rt') as fileObject:
-        lineList = fileObject.read().split('\n')
-    endpoint_url = lineList[0].split('=')[1]
-    username = lineList[1].split('=')[1]
-    password = lineList[2].split('=')[1]
-    #userAgent = lineList[3].split('=')[1]
-    credentials = [endpoint_url, username, password]
-    return credentials
-
-def getLoginToken(api_url):    
-    parameters = {
-        'action':'query',
-        'meta':'tokens',
-        'type':'login',
-        'format':'json'
-    }
-    r = session.get(url=api_url, params=parameters)
-    data = r.json()
-    return data['query']['tokens']['logintoken']
-
-def logIn(apiUrl, token, username, password):
-    parameters = {
-        'action':'login',
-        'lgname':username,
-        'lgpassword':password,
-        'lgtoken':token,
-        'format':'json'
-    }
-    r = session.post(apiUrl, data=parameters)
-    data = r.json()
-    return data
-
-def get_csrf_token(apiUrl):
-    parameters = {
-        "action": "query",
-        "meta": "tokens",
-        "format": "json"
-    }
-    r = session.get(url=apiUrl, params=parameters)
-    data = r.json()
-    return data["query"]["tokens"]["csrftoken"]
-
 # This function attempts to post and handles maxlag errors
 def attempt_post(apiUrl, parameters):
     maxRetries = 10
@@ -181,6 +142,7 @@ def attempt_post(apiUrl, parameters):
     baseDelay = 5
     delayLimit = 300
     retry = 0
+    token_refreshed = False
     # maximum number of times to retry lagged server = maxRetries
     while retry <= maxRetries:
         if retry > 0:
@@ -203,6 +165,14 @@ def attempt_post(apiUrl, parameters):
         #r = session.post(apiUrl, data = parameters)
         #data = r.json()
         
+        # If the CSRF token was rejected, e.g. because the session expired, get a new one (logging in again if necessary)
+        # and try once more with it.
+        if vb_session.is_bad_token(data) and not token_refreshed:
+            print('CSRF token was rejected. Getting a new one.')
+            parameters['token'] = wikibase_session.refresh_csrf_token(parameters['token'])
+            token_refreshed = True
+            continue
+
         # This second try block is to check for cases where the server is responding, but is lagged.
         try:
             # check if response is a maxlag error
@@ -241,8 +211,7 @@ def attempt_post(apiUrl, parameters):
 # default API resource URL when a Wikibase/Wikidata instance is installed.
 resource_url = '/w/api.php'
 
-base_url, user, pwd = retrieve_credentials(credentials_path)
-endpoint_url = base_url + resource_url
+base_url, user, pwd = vb_session.retrieve_credentials(credentials_path)
 if base_url == 'https://www.wikidata.org':
     print('Properties cannot be created on Wikidata without community consensus.')
     quit()
@@ -252,14 +221,12 @@ elif base_url == 'https://commons.wikimedia.org':
 else:
     DOMAIN_NAME = base_url
 
-# Instantiate session outside of any function so that it's globally accessible.
-session = requests.Session()
-# Set default User-Agent header so you don't have to send it with every request
-session.headers.update({'User-Agent': user_agent_header})
-
-login_token = getLoginToken(endpoint_url)
-data = logIn(endpoint_url, login_token, user, pwd)
-csrf_token = get_csrf_token(endpoint_url)
+# Logs in, or reuses the cookies saved by an earlier run if they are still logged in (see vb_session.py).
+wikibase_session = vb_session.WikibaseSession(base_url, user, pwd, user_agent_header, resource_url=resource_url)
+endpoint_url = wikibase_session.api_url
+# The session of the login is used outside of any function so that it's globally accessible.
+session = wikibase_session.session
+csrf_token = wikibase_session.csrf_token
 
 # -------------------------------------------
 # Beginning of script to process the table
@@ -398,6 +365,8 @@ else:
     if log_path != '': # if there is logging to a file, write the error log to the file
         print('\n\nNo errors occurred.', file=log_object)
 
+wikibase_session.close() # saves the session cookies for the next run
+
 if log_path != '': # only close the log_object if it's a file (otherwise it's std.out)
     log_object.close()
 
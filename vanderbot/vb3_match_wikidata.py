@@ -28,6 +28,11 @@
 # Version 1.6.4 change notes (2021-01-27):
 # - contains a bug fix that explicitly encodes all HTTP POST bodies as UTF-8. This caused problems if strings being sent as 
 # part of a SPARQL query contained non-Latin characters.
+# -----------------------------------------
+# Version 1.6.5 change notes (2026-10-18):
+# - SPARQL queries are sent through the shared connection pool of vb_sparql.py, which keeps connections open between queries.
+# - The classes of all of the possible Wikidata matches for an employee are retrieved together with vb_sparql.run_template()
+#   before they are screened, instead of with a query and a sleep for each one inside the screening loop.
 
 import requests   # best library to manage HTTP transactions
 from bs4 import BeautifulSoup # web-scraping library
@@ -43,6 +48,7 @@ import datetime
 import string
 
 import vb_common_code as vbc
+import vb_sparql # shared connection pool for SPARQL queries; must be in the same directory as this script
 
 # ---------------
 # Configuration data
@@ -67,6 +73,9 @@ requestHeaderDictionary = vbc.generateHeaderDictionary(acceptMediaType)
 wikidataEndpointUrl = 'https://query.wikidata.org/sparql'
 # see https://www.mediawiki.org/wiki/Wikidata_Query_Service/User_Manual#Query_limits for notes on query limits
 sparqlSleep = 0.1 # number of seconds to wait between queries to SPARQL endpoint
+# sends the lookups for all of the possible matches of an employee together; the Wikidata Query Service still gets
+# one query at a time, sparqlSleep seconds apart (see vb_sparql.AsyncSparqler)
+wikidataSparqler = vb_sparql.AsyncSparqler(endpoint=wikidataEndpointUrl, useragent=requestHeaderDictionary['User-Agent'], sleep=sparqlSleep)
 degreeList = [
     {'string': 'Ph.D.', 'value': 'Ph.D.'},
     {'string': 'PhD', 'value': 'Ph.D.'},
@@ -91,7 +100,6 @@ departmentTestRatio = 90 # ratio required when a generic name similarity is cros
 variant_similarity_cutoff = 60
 
 # Instantiate SPARQL queries
-retrieve_class_list_query = vbc.Query(pid='P31', uselabel=False, sleep=sparqlSleep)
 retrieve_birth_date_query = vbc.Query(isitem=False, pid='P569', sleep=sparqlSleep)
 retrieve_death_date_query = vbc.Query(isitem=False, pid='P570', sleep=sparqlSleep)
 retrieve_employer_label_query = vbc.Query(pid='P108', sleep=sparqlSleep)
@@ -232,7 +240,7 @@ FILTER(lang(?label)='en')
     #print('searching for ', name)
     results = []
     # r = requests.get(wikidataEndpointUrl, params={'query' : query}, headers=requestHeaderDictionary)
-    r = requests.post(wikidataEndpointUrl, data=query.encode('utf-8'), headers=requestHeaderDictionary)
+    r = vb_sparql.post(wikidataEndpointUrl, data=query.encode('utf-8'), headers=requestHeaderDictionary)
     try:
         data = r.json()
         statements = data['results']['bindings']
@@ -268,7 +276,7 @@ def searchWikidataDescription(qId):
       }'''
     #print(query)
     # r = requests.get(wikidataEndpointUrl, params={'query' : query}, headers=requestHeaderDictionary)
-    r = requests.post(wikidataEndpointUrl, data=query.encode('utf-8'), headers=requestHeaderDictionary)
+    r = vb_sparql.post(wikidataEndpointUrl, data=query.encode('utf-8'), headers=requestHeaderDictionary)
     try:
         data = r.json()
         statements = data['results']['bindings']
@@ -299,6 +307,21 @@ def searchWikidataDescription(qId):
     sleep(sparqlSleep)
     return resultsDict
 
+# returns a dictionary whose keys are the Wikidata IDs in qIds and whose values are lists of the Q IDs of their classes (P31)
+def searchWikidataClasses(qIds):
+    def build_query(qId):
+        return '''select distinct ?object where {
+      wd:''' + qId + ''' wdt:P31 ?object.
+      }'''
+    results = vb_sparql.run_template(wikidataSparqler, build_query, qIds, return_exceptions=True)
+    classesDict = {}
+    for qId, result in zip(qIds, results):
+        if isinstance(result, Exception) or result is None: # None if the response wasn't JSON
+            classesDict[qId] = [str(result)]
+        else:
+            classesDict[qId] = [vbc.extract_qnumber(statement['object']['value']) for statement in result]
+    return classesDict
+
 # returns a list of results of articles by person with Wikidata ID qId
 def searchWikidataArticle(qId):
     resultsList = []
@@ -314,7 +337,7 @@ def searchWikidataArticle(qId):
       }'''
     #print(query)
     # r = requests.get(wikidataEndpointUrl, params={'query' : query}, headers=requestHeaderDictionary)
-    r = requests.post(wikidataEndpointUrl, data=query.encode('utf-8'), headers=requestHeaderDictionary)
+    r = vb_sparql.post(wikidataEndpointUrl, data=query.encode('utf-8'), headers=requestHeaderDictionary)
     try:
         data = r.json()
         statements = data['results']['bindings']
@@ -702,13 +725,16 @@ def name_search_at_wikidata(employee):
             print('ORCID: ', employee['orcid'])
         print()
         
+        # Retrieve the classes of all of the possible matches at once rather than one at a time in human()
+        wdClasses = searchWikidataClasses(qIds)
+
         # Test each of the possible SPARQL results for a match
         noPossibilities = True
         matched = False
         for qIdIndex in range(0, len(qIds)):
             print(qIdIndex, 'Wikidata ID: ', qIds[qIdIndex], ' Name variant: ', nameVariants[qIdIndex], ' ', 'https://www.wikidata.org/wiki/' + qIds[qIdIndex])
             qId = qIds[qIdIndex]
-            if human(qId):
+            if human(wdClasses[qId]):
                 if not too_old(qId):
                     if not dead(qId):
                         badDescList = bad_description(qId, employee['orcid'])
@@ -810,9 +836,8 @@ def name_search_at_wikidata(employee):
 
 # Screens for Wikidata items that are potential matches
 
-def human(qId):
+def human(wdClassList):
     screen = True
-    wdClassList = retrieve_class_list_query.single_property_values_for_item(qId)
     # if there is a class property, check if it's a human
     if len(wdClassList) != 0:
         # if it's not a human
@@ -1077,7 +1102,7 @@ query = '''select distinct  ?person ?name ?orcid ?startDate ?endDate ?descriptio
 
 # The endpoint defaults to returning XML, so the Accept: header is required
 # r = requests.get(wikidataEndpointUrl, params={'query' : query}, headers={'Accept' : 'application/json'})
-r = requests.post(wikidataEndpointUrl, data=query.encode('utf-8'), headers=requestHeaderDictionary)
+r = vb_sparql.post(wikidataEndpointUrl, data=query.encode('utf-8'), headers=requestHeaderDictionary)
 
 data = r.json()
 #print(json.dumps(data,indent = 2))
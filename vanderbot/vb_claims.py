@@ -0,0 +1,170 @@
+# VanderBot claim index.  vb_claims.py
+# (c) 2026 Vanderbilt University. This program is released under a GNU General Public License v3.0 http://www.gnu.org/licenses/gpl-3.0
+# Author: Steve Baskauf
+# For more information, see https://github.com/HeardLibrary/linked-data/tree/master/vanderbot
+
+# This file contains code used by vanderbot.py to find the statements and references that it just wrote in the entity
+# JSON returned by the API, so that their identifiers (statement UUIDs and reference hashes) can be saved in the table.
+#
+# Previously, for every property in the table the script looped through all of the statements returned for that property,
+# and for every reference property through all of the references of the statement, converting the table value into the
+# form used by the API inside the innermost loop. Instead, the statements in the response are indexed once by GUID and by
+# (property, value), and the references of a statement are indexed by their signature (the set of property/value pairs
+# of their snaks) the first time they are needed. Values from the table are converted once into the same form, so that
+# matching is a dictionary lookup.
+#
+# In live mode, the same index is built from the current JSON of an existing item before writing, so that statements
+# and references that are already there are recognized and only what is missing is sent (see missing_qualifiers()).
+#
+# Values are put in the following form (a tuple) by snak_key() for API snaks and by cell_key() for table values:
+#   ('somevalue',)                          somevalue snak; blank node (_:...) in the table
+#   ('entity', 'Q42')                       wikibase-entityid
+#   ('monolingualtext', text, language)
+#   ('time', '+2020-01-01T00:00:00Z')       time with the leading + that Wikibase adds to CE dates
+#   ('quantity', '+5')                      amount with the leading + that Wikibase adds to positive numbers
+#   ('globecoordinate', 36.1)               latitude only, as in previous versions
+#   ('string', value)                       all other literals (string, url, external-id, commonsMedia file name, etc.)
+
+from typing import List, Dict, Tuple, Optional, FrozenSet
+
+def snak_key(snak: Dict) -> Optional[Tuple]:
+    """Return the value of a snak from the API in comparable form, or None if it doesn't have a supported value."""
+    if snak.get('snaktype') == 'somevalue':
+        return ('somevalue',)
+    if snak.get('snaktype') != 'value':
+        return None # novalue snaks aren't supported
+    value = snak['datavalue']['value']
+    value_type = snak['datavalue']['type']
+    if value_type == 'wikibase-entityid':
+        return ('entity', value['id'])
+    elif value_type == 'monolingualtext':
+        return ('monolingualtext', value['text'], value['language'])
+    elif value_type == 'time':
+        return ('time', value['time'])
+    elif value_type == 'quantity':
+        return ('quantity', value['amount'])
+    elif value_type == 'globecoordinate':
+        return ('globecoordinate', value['latitude'])
+    elif value_type == 'string':
+        return ('string', value)
+    return None
+
+def cell_key(entity_or_literal: str, datatype: str, value: str, lang: str = '') -> Optional[Tuple]:
+    """Return a table value in the same form as snak_key(), or None if it is empty or of an unsupported type.
+
+    For value nodes, pass the value from the _val column. Commons media URLs must be converted to file names first.
+    """
+    if value == '':
+        return None
+    if value[:2] == '_:':
+        return ('somevalue',)
+    if entity_or_literal == 'entity':
+        return ('entity', value)
+    elif entity_or_literal == 'monolingualtext':
+        return ('monolingualtext', value, lang)
+    elif entity_or_literal == 'value':
+        if datatype == 'time':
+            # must add leading plus (not stored in the table) to match the non-standard plus included by Wikibase
+            if value[0] != '-':
+                value = '+' + value
+            return ('time', value)
+        elif datatype == 'quantity':
+            if value[0] != '-':
+                value = '+' + value
+            return ('quantity', value)
+        elif datatype == 'globe-coordinate':
+            return ('globecoordinate', float(value))
+        return None
+    return ('string', value)
+
+def reference_signature(reference: Dict) -> FrozenSet[Tuple[str, Tuple]]:
+    """Return the set of (property, value) pairs of a reference from the API. Only the first value of each property is used."""
+    pairs = []
+    for property_id, snaks in reference['snaks'].items():
+        key = snak_key(snaks[0])
+        if key is not None:
+            pairs.append((property_id, key))
+    return frozenset(pairs)
+
+def table_reference_signature(table_reference: Dict, row_data: Dict[str, str]) -> FrozenSet[Tuple[str, Tuple]]:
+    """Return the set of (property, value) pairs of a reference described in the plan, using the values in a table row.
+
+    Properties without a value in the row are left out. table_reference is one of the reference dictionaries of a
+    property in the plan (see vb_schema.py).
+    """
+    pairs = []
+    for index in range(len(table_reference['refPropList'])):
+        column = table_reference['refValueColumnList'][index]
+        if table_reference['refEntityOrLiteral'][index] == 'value':
+            value = row_data[column + '_val']
+        else:
+            value = row_data[column]
+        key = cell_key(table_reference['refEntityOrLiteral'][index], table_reference['refTypeList'][index], value, table_reference['refLangList'][index])
+        if key is not None:
+            pairs.append((table_reference['refPropList'][index], key))
+    return frozenset(pairs)
+
+def missing_qualifiers(statement: Dict, qualifier_snaks: Dict[str, List[Dict]]) -> Tuple[Dict[str, List[Dict]], List[str]]:
+    """Compare the qualifiers built from a table row with the qualifiers of a statement from the API.
+
+    Returns the qualifier snaks whose properties the statement doesn't have at all, keyed by property, and a list of the
+    properties that the statement has, but with none of the values in the row. Those are not returned with the missing
+    qualifiers, since adding them would give the property a second value.
+    """
+    existing = statement.get('qualifiers', {})
+    missing = {}
+    differing = []
+    for property_id, snaks in qualifier_snaks.items():
+        if property_id not in existing:
+            missing[property_id] = snaks
+            continue
+        existing_keys = set(snak_key(snak) for snak in existing[property_id])
+        if not any(snak_key(snak) in existing_keys for snak in snaks):
+            differing.append(property_id)
+    return missing, differing
+
+class StatementIndex:
+    """Index of the statements of an entity in an API response.
+
+    Parameters
+    ----------
+    claims : dict
+        The claims of the entity ('claims' or 'statements' key of the entity JSON), lists of statements keyed by property.
+    """
+    def __init__(self, claims: Dict[str, List[Dict]]):
+        self.by_guid = {} # statements keyed by lower case GUID, in case the API changes the case
+        self.by_value = {} # lists of statements keyed by (property, value key)
+        self.references = {} # reference hashes keyed by signature, for each statement GUID whose references were indexed
+        for property_id, statements in claims.items():
+            for statement in statements:
+                self.by_guid[statement['id'].lower()] = statement
+                key = snak_key(statement['mainsnak'])
+                if key is not None:
+                    self.by_value.setdefault((property_id, key), []).append(statement)
+
+    def get(self, guid: str) -> Optional[Dict]:
+        """Return the statement with a GUID, or None."""
+        return self.by_guid.get(guid.lower())
+
+    def find(self, property_id: str, key: Optional[Tuple]) -> List[Dict]:
+        """Return the statements for a property whose value matches a key from cell_key(), in the order of the response."""
+        return self.by_value.get((property_id, key), [])
+
+    def find_reference(self, statement: Dict, signature: FrozenSet[Tuple[str, Tuple]]) -> Optional[str]:
+        """Return the hash of the reference of a statement that has all of the property/value pairs in signature, or None.
+
+        A reference with exactly those pairs is found by lookup. Otherwise, a reference that has them along with other
+        properties is accepted.
+        """
+        guid = statement['id'].lower()
+        if guid not in self.references:
+            self.references[guid] = {}
+            for reference in statement.get('references', []):
+                self.references[guid].setdefault(reference_signature(reference), reference['hash'])
+        references = self.references[guid]
+        if signature in references:
+            return references[signature]
+        for reference_signature_set, reference_hash in references.items():
+            if signature <= reference_signature_set:
+                return reference_hash
+        return None
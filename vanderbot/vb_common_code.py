@@ -26,6 +26,13 @@
 # Version 1.6.4 change notes (2021-01-27):
 # - contains a bug fix that explicitly encodes all HTTP POST bodies as UTF-8. This caused problems if strings being sent as 
 # part of a SPARQL query contained non-Latin characters.
+# -----------------------------------------
+# Version 1.6.5 change notes (2026-10-18):
+# - The labels_descriptions() method of the Query() class sends long lists of Q IDs in chunks (chunksize argument, default 500)
+#   using a small pool of workers (workers argument, default 2). A chunk whose query times out is split in half and retried.
+# - SPARQL queries are sent through the shared connection pool of vb_sparql.py, which keeps connections open between queries.
+# - A chunk of labels_descriptions() is also split when the endpoint answers with a 5xx status, and the chunk size that
+#   worked is remembered for the next run (see vb_sparql.run_values_query()).
 
 
 import requests   # best library to manage HTTP transactions
@@ -38,6 +45,8 @@ from fuzzywuzzy import fuzz # fuzzy logic matching
 from fuzzywuzzy import process
 import xml.etree.ElementTree as et # library to traverse XML tree
 import urllib
+import vb_labels # sends the queries for labels, descriptions, and aliases; must be in the same directory as this script
+import vb_sparql # shared connection pool for SPARQL queries; must be in the same directory as this script
 import datetime
 import string
 
@@ -242,7 +251,7 @@ select distinct ?item where {
     results = []
     acceptMediaType = 'application/json'
     # r = requests.get(wikidataEndpointUrl, params={'query' : query}, headers = generateHeaderDictionary(acceptMediaType))
-    r = requests.post(wikidataEndpointUrl, data=query.encode('utf-8'), headers = generateHeaderDictionary(acceptMediaType))
+    r = vb_sparql.post(wikidataEndpointUrl, data=query.encode('utf-8'), headers = generateHeaderDictionary(acceptMediaType))
     try:
         data = r.json()
         statements = data['results']['bindings']
@@ -312,6 +321,14 @@ class Query:
             self.labelscreen = kwargs['labelscreen']
         except:
             self.labelscreen = '' # instead of using a list of subject items, add this line to screen for items
+        try:
+            self.chunksize = kwargs['chunksize']
+        except:
+            self.chunksize = 500 # default to a maximum of 500 Q IDs in the VALUES clause of a single query
+        try:
+            self.workers = kwargs['workers']
+        except:
+            self.workers = 2 # default to a maximum of two queries in progress at the same time
             
         # attributes for search_statement method
         try:
@@ -322,7 +339,7 @@ class Query:
     # send a generic query and return a list of Q IDs
     def generic_query(self, query):
         # r = requests.get(self.endpoint, params={'query' : query}, headers=self.requestheader)
-        r = requests.post(self.endpoint, data=query.encode('utf-8'), headers=self.requestheader)
+        r = vb_sparql.post(self.endpoint, data=query.encode('utf-8'), headers=self.requestheader)
         results_list = []
         try:
         #if 1==1: # replace try: to let errors occur, also comment out the except: clause
@@ -362,7 +379,7 @@ select distinct ?object where {
     }'''
         #print(query)
         # r = requests.get(self.endpoint, params={'query' : query}, headers=self.requestheader)
-        r = requests.post(self.endpoint, data=query.encode('utf-8'), headers=self.requestheader)
+        r = vb_sparql.post(self.endpoint, data=query.encode('utf-8'), headers=self.requestheader)
         results_list = []
         try:
         #if 1==1: # replace try: to let errors occur, also comment out the except: clause
@@ -388,13 +405,6 @@ select distinct ?object where {
     
     # search for any of the "label" types: label, alias, description. qids is a list of Q IDs without namespaces
     def labels_descriptions(self, qids):
-        # option to explicitly list subject Q IDs
-        if self.labelscreen == '':
-            # create a string for all of the Wikidata item IDs to be used as subjects in the query
-            alternatives = ''
-            for qid in qids:
-                alternatives += 'wd:' + qid + '\n'
-
         if self.labeltype == 'label':
             predicate = 'rdfs:label'
         elif self.labeltype == 'alias':
@@ -404,41 +414,51 @@ select distinct ?object where {
         else:
             predicate = 'rdfs:label'        
 
-        # create a string for the query
-        query = '''
+        # create the query for a list of Q IDs (ignored if screening by triple pattern)
+        def build_query(qid_chunk):
+            query = '''
 select distinct ?id ?string where {'''
-        
-        # option to explicitly list subject Q IDs
-        if self.labelscreen == '':
-            query += '''
+            
+            # option to explicitly list subject Q IDs
+            if self.labelscreen == '':
+                # create a string for all of the Wikidata item IDs to be used as subjects in the query
+                alternatives = ''
+                for qid in qid_chunk:
+                    alternatives += 'wd:' + qid + '\n'
+                query += '''
       VALUES ?id
     {
 ''' + alternatives + '''
     }'''
-        # option to screen for Q IDs by triple pattern
-        if self.labelscreen != '':
-            query += '''
+            # option to screen for Q IDs by triple pattern
+            if self.labelscreen != '':
+                query += '''
     ''' + self.labelscreen
-            
-        query += '''
+                
+            query += '''
     ?id '''+ predicate + ''' ?string.
     filter(lang(?string)="''' + self.lang + '''")
     }'''
-        #print(query)
+            #print(query)
+            return query
+
+        def send_query(query):
+            return vb_labels.send_select_query(query, self.endpoint, self.requestheader, form_encoded=False)
+
+        if self.labelscreen == '':
+            # long lists of Q IDs are sent in chunks, delayed by some amount (quarter second default) to avoid 
+            # hitting the SPARQL endpoint too rapidly
+            results = vb_sparql.run_values_query(qids, build_query, send_query, chunk_size=self.chunksize, max_workers=self.workers, sleep_time=self.sleep, template='vb_common_code ' + self.labeltype + ' ' + self.endpoint)
+        else:
+            results = send_query(build_query([]))
+            sleep(self.sleep)
 
         results_list = []
-        # r = requests.get(self.endpoint, params={'query' : query}, headers=self.requestheader)
-        r = requests.post(self.endpoint, data=query.encode('utf-8'), headers=self.requestheader)
-        data = r.json()
-        results = data['results']['bindings']
         for result in results:
             # remove wd: 'http://www.wikidata.org/entity/'
             qnumber = extract_qnumber(result['id']['value'])
             string = result['string']['value']
             results_list.append({'qid': qnumber, 'string': string})
-
-        # delay by some amount (quarter second default) to avoid hitting the SPARQL endpoint too rapidly
-        sleep(self.sleep)
         return results_list
 
     # Searches for statements using a particular property. If no value is set, the value will be returned.
@@ -487,7 +507,7 @@ select distinct ?id ?statement '''
 
         results_list = []
         # r = requests.get(self.endpoint, params={'query' : query}, headers=self.requestheader)
-        r = requests.post(self.endpoint, data=query.encode('utf-8'), headers=self.requestheader)
+        r = vb_sparql.post(self.endpoint, data=query.encode('utf-8'), headers=self.requestheader)
         data = r.json()
         results = data['results']['bindings']
         # NOTE: There may be more than one reference per statement.
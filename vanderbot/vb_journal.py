@@ -0,0 +1,183 @@
+# VanderBot table journal.  vb_journal.py
+# (c) 2026 Vanderbilt University. This program is released under a GNU General Public License v3.0 http://www.gnu.org/licenses/gpl-3.0
+# Author: Steve Baskauf
+# For more information, see https://github.com/HeardLibrary/linked-data/tree/master/vanderbot
+
+# This file contains code used by vanderbot.py to save changes to the CSV table as they are made, so that no data are lost
+# if the script crashes. Previously the entire table was rewritten after every change, which means that the amount of
+# disk output grows with the square of the number of rows. Instead, the cells that changed in a row are appended to a
+# journal file next to the CSV (same name with .journal added) and flushed to disk. The journal is periodically merged
+# into the CSV (compacted) and deleted when the table is finished. If a journal is found when the script starts, the
+# previous run didn't finish and the journal is replayed into the CSV before the CSV is read.
+#
+# The journal can also hold values that have been reserved for cells but not yet confirmed (e.g. statement UUIDs that
+# were generated before a write to the API). Reserved values are never merged into the CSV. They are kept in the journal
+# until the cell is saved (or the reservation is released), so that a rerun after a crash can reuse them.
+
+import json
+import os
+from typing import List, Dict, Tuple, Optional
+import vb_table # columnar table with dictionary-like rows; must be in the same directory as this script
+
+def journal_path(table_file_name: str) -> str:
+    """Return the path of the journal file for a CSV table."""
+    return table_file_name + '.journal'
+
+def read_table(table_file_name: str) -> Tuple[List[str], vb_table.Table]:
+    """Read a table (CSV, Parquet, or Arrow) and return the list of column headers and the table."""
+    table_data = vb_table.read_table(table_file_name)
+    return table_data.fieldnames, table_data
+
+def write_table(table_file_name: str, fieldnames: List[str], table_data: vb_table.Table) -> None:
+    """Write the whole table to a temporary file and then replace the table file with it, so it is never left half-written."""
+    temp_file_name = table_file_name + '.tmp'
+    vb_table.write_table(temp_file_name, table_data, fieldnames, vb_table.table_format(table_file_name))
+    with open(temp_file_name, 'rb+') as temp_file:
+        os.fsync(temp_file.fileno())
+    os.replace(temp_file_name, table_file_name)
+
+def apply_records(journal_file_name: str, table_data: vb_table.Table, pending: Dict[Tuple[int, str], str]) -> int:
+    """Apply the records in a journal file to the table rows and return the number of cell records applied.
+
+    Reserved values that were not confirmed are added to the pending dictionary, keyed by (row number, column).
+
+    Note
+    ----
+    A crash can leave the last line of the journal incomplete. That record was never confirmed as saved, so lines
+    that can't be parsed are skipped.
+    """
+    count = 0
+    with open(journal_file_name, 'r', encoding='utf-8') as journal_file:
+        for line in journal_file:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if 'reserve' in record:
+                for column, value in record['reserve'].items():
+                    pending[(record['row'], column)] = value
+            elif 'release' in record:
+                for column in record['release']:
+                    pending.pop((record['row'], column), None)
+            else:
+                for column, value in record['cells'].items():
+                    table_data[record['row']][column] = value
+                    pending.pop((record['row'], column), None)
+                count += 1
+    return count
+
+def replay_journal(table_file_name: str) -> Tuple[int, Dict[Tuple[int, str], str]]:
+    """If a journal was left by a run that didn't finish, merge it into the CSV and delete it.
+
+    Returns the number of journal records that were replayed (0 if there was no journal) and a dictionary of reserved
+    values that were never confirmed, keyed by (row number, column). Pass the dictionary to TableJournal so that they
+    can be reused.
+    """
+    pending = {}
+    journal_file_name = journal_path(table_file_name)
+    if not os.path.exists(journal_file_name):
+        return 0, pending
+    fieldnames, table_data = read_table(table_file_name)
+    count = apply_records(journal_file_name, table_data, pending)
+    write_table(table_file_name, fieldnames, table_data)
+    os.remove(journal_file_name)
+    return count, pending
+
+class TableJournal:
+    """Records changes to the rows of a CSV table in an append-only journal file.
+
+    Parameters
+    ----------
+    table_file_name : str
+        Path to the CSV file.
+    fieldnames : list of str
+        Column headers of the CSV file in order.
+    table_data : vb_table.Table
+        The rows of the table. The same table is modified by the calling script; the journal turns on its change tracking
+        (see vb_table.Table.track_changes()) so that it knows which cells changed without keeping a copy of the table.
+    compact_interval : int
+        Number of journal records after which the journal is merged into the CSV. Set to 0 to merge only when closed.
+    pending : dict
+        Reserved values left by a previous run, as returned by replay_journal().
+    """
+    def __init__(self, table_file_name: str, fieldnames: List[str], table_data: vb_table.Table, compact_interval: int = 1000, pending: Optional[Dict[Tuple[int, str], str]] = None):
+        self.table_file_name = table_file_name
+        self.journal_file_name = journal_path(table_file_name)
+        self.fieldnames = fieldnames
+        self.table_data = table_data
+        self.compact_interval = compact_interval
+        table_data.track_changes()
+        self.records = 0
+        self.pending = {} # reserved values keyed by (row number, column)
+        self.journal_file = open(self.journal_file_name, 'a', encoding='utf-8')
+        if pending is not None:
+            self.write_pending(pending)
+
+    def write_record(self, record: Dict) -> None:
+        """Append a record to the journal and make sure it is on the disk before returning."""
+        self.journal_file.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self.journal_file.flush()
+        os.fsync(self.journal_file.fileno())
+
+    def write_pending(self, pending: Dict[Tuple[int, str], str]) -> None:
+        """Reserve each of a dictionary of values keyed by (row number, column)."""
+        rows = {}
+        for (row_number, column), value in pending.items():
+            rows.setdefault(row_number, {})[column] = value
+        for row_number, cells in rows.items():
+            self.reserve(row_number, cells)
+
+    def reserve(self, row_number: int, cells: Dict[str, str]) -> None:
+        """Record values for cells that will be saved once they are confirmed, without changing the table."""
+        if len(cells) == 0:
+            return
+        self.write_record({'row': row_number, 'reserve': cells})
+        for column, value in cells.items():
+            self.pending[(row_number, column)] = value
+
+    def release(self, row_number: int) -> None:
+        """Discard any values reserved for cells in the row."""
+        columns = [column for (pending_row, column) in self.pending if pending_row == row_number]
+        if len(columns) == 0:
+            return
+        self.write_record({'row': row_number, 'release': columns})
+        for column in columns:
+            del self.pending[(row_number, column)]
+
+    def checkpoint(self, row_number: int) -> None:
+        """Append any cells in the row that changed since the last checkpoint to the journal and flush it to disk."""
+        columns = self.table_data.take_changes(row_number).get(row_number)
+        if not columns:
+            return
+        row = self.table_data[row_number]
+        changed = {column: row[column] for column in self.table_data.fieldnames if column in columns} # in the order of the columns
+        self.write_record({'row': row_number, 'cells': changed})
+        for column in changed:
+            self.pending.pop((row_number, column), None) # a saved value replaces a reserved one
+        self.records += 1
+        if self.compact_interval > 0 and self.records >= self.compact_interval:
+            self.compact()
+
+    def compact(self) -> None:
+        """Write the table to the CSV and empty the journal. Changes that weren't checkpointed yet are saved as well."""
+        write_table(self.table_file_name, self.fieldnames, self.table_data)
+        for row_number, columns in self.table_data.take_changes().items():
+            for column in columns:
+                self.pending.pop((row_number, column), None) # a saved value replaces a reserved one
+        self.journal_file.truncate(0)
+        self.journal_file.seek(0)
+        self.records = 0
+        # reserved values that haven't been confirmed must survive the compaction
+        pending = self.pending
+        self.pending = {}
+        self.write_pending(pending)
+
+    def close(self) -> None:
+        """Save any remaining changes to the CSV and delete the journal."""
+        if self.journal_file.closed:
+            return
+        self.compact()
+        self.journal_file.close()
+        if len(self.pending) == 0:
+            os.remove(self.journal_file_name)
+        # otherwise the journal is kept so that the reserved values can be reused the next time the table is processed
@@ -0,0 +1,122 @@
+# VanderBot helper functions for existing labels, descriptions, and aliases.  vb_labels.py
+# (c) 2026 Vanderbilt University. This program is released under a GNU General Public License v3.0 http://www.gnu.org/licenses/gpl-3.0
+# Author: Steve Baskauf
+# For more information, see https://github.com/HeardLibrary/linked-data/tree/master/vanderbot
+
+# This file contains code used by vanderbot.py to match the labels, descriptions, and aliases that already exist in a
+# Wikibase (as retrieved from its Query Service) with the rows of the table being uploaded.
+# The query results are indexed by Q ID once per language so that matching the table rows is a single dictionary
+# lookup per row rather than a scan of all of the query results for every row.
+# In live mode, the strings are taken from the entity JSON retrieved from the API instead (see index_entity_strings()).
+# It also contains send_select_query(), which vanderbot.py and vb_common_code.py give to vb_sparql.run_values_query() to
+# retrieve the labels, descriptions, or aliases for a long list of Q IDs. The IDs are split into chunks that each go into
+# the VALUES clause of a separate query. Chunks are sent by a small pool of workers and a chunk whose query times out is
+# split in half and retried. The queries are sent through the shared connection pool of vb_sparql.py.
+
+from typing import List, Dict, Any
+import vb_sparql # must be in the same directory as this script
+
+def index_by_qid(query_results: List[Dict[str, str]]) -> Dict[str, List[str]]:
+    """Build a dictionary whose keys are Q IDs and whose values are lists of the strings found for that Q ID.
+
+    Parameters
+    ----------
+    query_results : list of dict
+        Results in the form returned by searchLabelsDescriptionsAtWikidata(), i.e. {'qId': 'Q42', 'string': 'Douglas Adams'}
+
+    Note
+    ----
+    The strings for each Q ID are kept in the order in which they were returned by the query, so the first string
+    in each list is the same one that would be found by stepping through the results from the beginning.
+    """
+    index = {}
+    for result in query_results:
+        if result['qId'] in index:
+            index[result['qId']].append(result['string'])
+        else:
+            index[result['qId']] = [result['string']]
+    return index
+
+def index_entity_strings(entities: Dict[str, Dict], key: str, language: str) -> Dict[str, List[str]]:
+    """Build a dictionary like the one from index_by_qid() from entity JSON retrieved from the API instead of query results.
+
+    Parameters
+    ----------
+    entities : dict
+        Entity JSON keyed by Q ID, as returned by wbgetentities.
+    key : str
+        'labels', 'descriptions', or 'aliases'.
+    language : str
+        Language code of the strings.
+    """
+    index = {}
+    for qid, entity in entities.items():
+        values = entity.get(key, {}).get(language)
+        if values is None:
+            continue
+        if key == 'aliases': # a list of aliases for each language
+            index[qid] = [value['value'] for value in values]
+        else:
+            index[qid] = [values['value']]
+    return index
+
+def align_with_rows(table_data: List[Dict[str, str]], subject_column: str, index: Dict[str, List[str]], first_only: bool) -> List[Any]:
+    """Return a list with one item for each row of the table containing the existing strings for that row's item.
+
+    Parameters
+    ----------
+    table_data : list of dict
+        The rows of the CSV table.
+    subject_column : str
+        Header of the column containing the Q IDs of the subject items.
+    index : dict
+        Dictionary generated by the index_by_qid() function.
+    first_only : bool
+        If True (labels and descriptions), each item is the first matching string or the empty string if there isn't one.
+        If False (aliases), each item is a list of all matching strings, which is empty if there aren't any.
+    """
+    aligned = []
+    for row in table_data:
+        strings = index.get(row[subject_column], []) # rows for items that don't yet exist have an empty Q ID and won't be found
+        if first_only:
+            if len(strings) > 0:
+                aligned.append(strings[0]) # first match wins
+            else:
+                aligned.append('')
+        else:
+            aligned.append(list(strings)) # collect all matches
+    return aligned
+
+# Raised when the Query Service did not finish a query within its time limit
+QueryTimeout = vb_sparql.QueryTimeout
+
+# Raised when the Query Service answered with a 5xx status other than a timeout
+ServerError = vb_sparql.ServerError
+
+def send_select_query(query: str, endpoint: str, request_header: Dict[str, str], form_encoded: bool = True, timeout: float = 70) -> List[Dict[str, Any]]:
+    """Send a SPARQL SELECT query by POST and return the list of result bindings.
+
+    Parameters
+    ----------
+    form_encoded : bool
+        True if the request header Content-Type is application/x-www-form-urlencoded, False if it is
+        application/sparql-query and the query is the body of the request.
+    timeout : float
+        Seconds to wait for a response. The Wikidata Query Service stops queries after 60 seconds.
+
+    Note
+    ----
+    Raises QueryTimeout if the request times out or the server reports a timeout (WDQS returns a 500 error whose body
+    contains java.util.concurrent.TimeoutException; a gateway may return 504), and ServerError for other 5xx statuses.
+    """
+    if form_encoded:
+        data = dict(query=query)
+    else:
+        data = query.encode('utf-8')
+    r = vb_sparql.post(endpoint, data=data, headers=request_header, timeout=timeout) # raises QueryTimeout if no response
+    if r.status_code == 504 or (r.status_code == 500 and 'TimeoutException' in r.text):
+        raise QueryTimeout('Query timed out at ' + endpoint)
+    if r.status_code >= 500:
+        raise ServerError('HTTP status ' + str(r.status_code) + ' from ' + endpoint)
+    data = r.json()
+    return data['results']['bindings']
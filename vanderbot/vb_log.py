@@ -0,0 +1,162 @@
+# VanderBot run log.  vb_log.py
+# (c) 2026 Vanderbilt University. This program is released under a GNU General Public License v3.0 http://www.gnu.org/licenses/gpl-3.0
+# Author: Steve Baskauf
+# For more information, see https://github.com/HeardLibrary/linked-data/tree/master/vanderbot
+
+# This file contains the code used by vanderbot.py to record what happened during an upload. Previously every write
+# printed the complete entity JSON returned by the API to the log, which for well-populated items is often hundreds of
+# KB per row, and errors were collected in a separate string for the summary at the end.
+#
+# A RunLog records events as dictionaries. With the structured log format (--logformat json), the log file has one
+# compact JSON object per line for each event, e.g.
+#   {"time":1792300000.123,"event":"write","table":"works.csv","row":5,"qid":"Q42","action":"wbeditentity",
+#    "guids":["Q42$..."],"latency":0.182,"retries":0}
+# Errors are "error" events with a message, and anything else the script prints to the log becomes a "message" event.
+# The lines are written by a background thread in batches, so the threads that write to the API don't wait for the
+# disk. The responses from the API are left out of write events unless they are requested, either in full or cut to a
+# number of characters (--logresponses).
+#
+# Error events are also kept in memory for the error summary at the end of the run, whichever log format is used.
+
+import json
+import queue
+import threading
+import time
+from typing import List, Dict, Optional, Any
+
+def response_text(data: Any, response_length: Optional[int]) -> str:
+    """Return a response from the API as JSON text, cut to response_length characters.
+
+    With a response_length of None or less than zero, all of the text is returned. With zero, only the error code or
+    'success' is returned.
+    """
+    if response_length == 0:
+        if isinstance(data, dict) and 'error' in data:
+            return 'error: ' + str(data['error'].get('code', ''))
+        return 'success'
+    text = json.dumps(data)
+    if response_length is not None and response_length > 0 and len(text) > response_length:
+        return text[:response_length] + '...'
+    return text
+
+class MessageWriter:
+    """File-like object that turns text printed to it into message events of a RunLog, one per line.
+
+    Each thread has its own partial line, so that lines printed by several tables at once aren't mixed up.
+    """
+    def __init__(self, run_log: 'RunLog'):
+        self.run_log = run_log
+        self.partial = threading.local()
+
+    def write(self, text: str) -> int:
+        lines = (getattr(self.partial, 'text', '') + text).split('\n')
+        self.partial.text = lines.pop()
+        for line in lines:
+            if line.strip() != '':
+                self.run_log.record('message', text=line)
+        return len(text)
+
+    def flush(self) -> None:
+        pass
+
+class RunLog:
+    """Event log of an upload.
+
+    Parameters
+    ----------
+    path : str
+        File for the JSON lines. With an empty string, no file is written and only the error events are kept.
+    response_length : int, optional
+        Number of characters of each API response to include in write events. None or a negative number includes the
+        whole response and 0 (the default) leaves it out.
+
+    Note
+    ----
+    Call close() at the end of the run to write the lines that are still waiting and close the file.
+    """
+    def __init__(self, path: str = '', response_length: Optional[int] = 0):
+        self.path = path
+        self.response_length = response_length
+        self.structured = path != ''
+        self.errors = [] # error events in the order they happened
+        self.lock = threading.Lock()
+        self.queue = queue.Queue()
+        self.thread = None
+        if self.structured:
+            self.file_object = open(path, 'wt', encoding='utf-8')
+            self.thread = threading.Thread(target=self.write_lines, daemon=True)
+            self.thread.start()
+
+    def write_lines(self) -> None:
+        """Write the waiting events to the file, as many at a time as there are, until close() is called."""
+        done = False
+        while not done:
+            entries = [self.queue.get()]
+            while True:
+                try:
+                    entries.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            if entries[-1] is None: # added by close()
+                entries.pop()
+                done = True
+            self.file_object.write(''.join(json.dumps(entry, separators=(',', ':')) + '\n' for entry in entries))
+            self.file_object.flush()
+
+    def record(self, event: str, **fields: Any) -> Dict[str, Any]:
+        """Record an event. Fields whose value is None are left out. Returns the event."""
+        entry = {'time': round(time.time(), 3), 'event': event}
+        for name, value in fields.items():
+            if value is not None:
+                entry[name] = value
+        if event == 'error':
+            with self.lock:
+                self.errors.append(entry)
+        if self.structured:
+            self.queue.put(entry)
+        return entry
+
+    def error(self, table: str, message: str, row: Optional[int] = None, code: Optional[str] = None) -> None:
+        """Record an error that is reported in the error summary."""
+        self.record('error', table=table, row=row, code=code, message=message)
+
+    def write(self, table: str, row: int, action: str, data: Dict, stats: Optional[Dict] = None, qid: Optional[str] = None, guids: Optional[List[str]] = None) -> None:
+        """Record a write to the API and its response.
+
+        stats is the dictionary filled in by vb_rate.RateController.post(), with the latency and number of retries.
+        """
+        if stats is None:
+            stats = {}
+        error_code = None
+        if isinstance(data, dict) and 'error' in data:
+            error_code = data['error'].get('code', '')
+        response = None
+        if self.response_length != 0:
+            response = response_text(data, self.response_length)
+        latency = stats.get('latency')
+        if latency is not None:
+            latency = round(latency, 3)
+        self.record('write', table=table, row=row, qid=qid, action=action, guids=guids, latency=latency, retries=stats.get('retries'), error=error_code, response=response)
+
+    def messages(self) -> MessageWriter:
+        """Return a file-like object that records the text printed to it as message events."""
+        return MessageWriter(self)
+
+    def error_summary(self, tables: List[str]) -> str:
+        """Return the error log of the run, with the errors of each table under its file name, in the order of tables."""
+        summary = ''
+        with self.lock:
+            errors = list(self.errors)
+        for table in tables:
+            messages = [entry['message'] for entry in errors if entry.get('table') == table]
+            if len(messages) > 0:
+                summary += '\nError log for CSV file: ' + table + '\n' + '\n'.join(messages) + '\n\n'
+        return summary
+
+    def close(self) -> None:
+        """Write the events that are still waiting and close the file."""
+        if self.thread is not None:
+            self.queue.put(None)
+            self.thread.join()
+            self.thread = None
+            self.file_object.close()
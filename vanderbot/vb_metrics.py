@@ -0,0 +1,232 @@
+# VanderBot live metrics.  vb_metrics.py
+# (c) 2026 Vanderbilt University. This program is released under a GNU General Public License v3.0 http://www.gnu.org/licenses/gpl-3.0
+# Author: Steve Baskauf
+# For more information, see https://github.com/HeardLibrary/linked-data/tree/master/vanderbot
+
+# This file contains the code used by vanderbot.py and commonstool.py to show the progress of a long upload while it is
+# running (--metrics option of vanderbot.py, metrics setting of commonstool.py). commonstool.py imports it from this
+# directory, so it is the only copy. Previously a run that took several hours could only be followed by reading its log.
+#
+# A Metrics object counts the rows processed and skipped, the writes, the errors returned by the API (by error code), and
+# the retries after lag responses. From these and the rate controller of the session it calculates the rows per second
+# over the last minute, the current maxlag backoff, and the estimated time remaining. The metrics are written in the
+# Prometheus text format (https://prometheus.io/docs/instrumenting/exposition_formats/) by a MetricsExporter, either
+#  - to a file that is replaced every few seconds, for the textfile collector of the Prometheus node exporter or for
+#    reading with cat or watch, or
+#  - to a small HTTP server on the local computer (http://127.0.0.1:PORT/metrics) that makes them when they are requested.
+# The server only listens on the loopback interface, so the metrics can't be read from other computers.
+
+import http.server
+import math
+import os
+import threading
+import time
+from collections import deque
+from typing import List, Dict, Optional, Any
+
+# Number of seconds over which the rows per second are calculated
+RATE_WINDOW = 60.0
+
+def escape_label(value: str) -> str:
+    """Escape a label value for the Prometheus text format."""
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def format_value(value: float) -> str:
+    """Format a sample value for the Prometheus text format."""
+    if math.isnan(value):
+        return 'NaN'
+    if value == int(value):
+        return str(int(value))
+    return repr(round(value, 6))
+
+class Metrics:
+    """Counters for the progress of an upload.
+
+    Parameters
+    ----------
+    namespace : str
+        Prefix of the metric names, e.g. "vanderbot".
+    rate_controller : vb_rate.RateController, optional
+        Controller of the writes, used for the current maxlag backoff and interval between writes.
+    """
+    def __init__(self, namespace: str = 'vanderbot', rate_controller: Optional[Any] = None):
+        self.namespace = namespace
+        self.rate_controller = rate_controller
+        self.lock = threading.Lock()
+        self.start_time = time.time()
+        self.total_rows = 0 # rows known so far to be in the tables of the run
+        self.rows = 0 # rows processed, including the skipped ones
+        self.skips = 0
+        self.writes = 0 # writes that the API accepted
+        self.retries = 0
+        self.errors = {} # number of error responses from the API, keyed by error code
+        self.recent_rows = deque() # monotonic times at which rows in the last RATE_WINDOW seconds were finished
+        self.first_row_time = None
+
+    def add_rows(self, count: int) -> None:
+        """Add the rows of a table to the total number of rows to be processed."""
+        with self.lock:
+            self.total_rows += count
+
+    def row(self, skipped: bool = False) -> None:
+        """Count a row that is finished. A skipped row is one for which nothing was written."""
+        now = time.monotonic()
+        with self.lock:
+            self.rows += 1
+            if skipped:
+                self.skips += 1
+            if self.first_row_time is None:
+                self.first_row_time = now
+            self.recent_rows.append(now)
+            while self.recent_rows[0] < now - RATE_WINDOW:
+                self.recent_rows.popleft()
+
+    def write(self, data: Any, stats: Optional[Dict] = None) -> None:
+        """Count a response from the API to a write, with the stats dictionary filled in by vb_rate.RateController.post()."""
+        with self.lock:
+            if stats is not None:
+                self.retries += stats.get('retries', 0)
+            if isinstance(data, dict) and 'error' in data:
+                code = str(data['error'].get('code', 'unknown'))
+                self.errors[code] = self.errors.get(code, 0) + 1
+            elif data is None or data == {}:
+                self.errors['no-response'] = self.errors.get('no-response', 0) + 1
+            else:
+                self.writes += 1
+
+    def rows_per_second(self) -> float:
+        """Rows finished per second over the last RATE_WINDOW seconds (or since the first row, if that is less)."""
+        now = time.monotonic()
+        with self.lock:
+            if self.first_row_time is None:
+                return 0.0
+            count = len([row_time for row_time in self.recent_rows if row_time >= now - RATE_WINDOW])
+            window = min(RATE_WINDOW, max(now - self.first_row_time, 1.0)) # at least a second, so the first rows don't give a huge rate
+        return count / window
+
+    def samples(self) -> List[Dict[str, Any]]:
+        """Return the current value of each metric as a dictionary with name, type, help, value, and labels."""
+        rate = self.rows_per_second()
+        backoff = 0.0
+        interval = float('nan')
+        if self.rate_controller is not None:
+            backoff = self.rate_controller.backoff_remaining()
+            interval = self.rate_controller.interval()
+        with self.lock:
+            remaining = max(self.total_rows - self.rows, 0)
+            if remaining == 0:
+                eta = 0.0
+            elif rate > 0:
+                eta = remaining / rate + backoff
+            else:
+                eta = float('nan')
+            samples = [
+                {'name': 'rows_processed_total', 'type': 'counter', 'help': 'Rows processed, including skipped rows.', 'value': self.rows},
+                {'name': 'rows', 'type': 'gauge', 'help': 'Rows in the tables that have been read so far.', 'value': self.total_rows},
+                {'name': 'rows_per_second', 'type': 'gauge', 'help': 'Rows processed per second over the last minute.', 'value': rate},
+                {'name': 'writes_total', 'type': 'counter', 'help': 'Writes accepted by the API.', 'value': self.writes},
+                {'name': 'skips_total', 'type': 'counter', 'help': 'Rows for which nothing was written.', 'value': self.skips},
+                {'name': 'retries_total', 'type': 'counter', 'help': 'Writes sent again after lag or too-many-requests responses.', 'value': self.retries},
+                {'name': 'maxlag_backoff_seconds', 'type': 'gauge', 'help': 'Seconds until writing resumes after the server reported lag.', 'value': backoff},
+                {'name': 'write_interval_seconds', 'type': 'gauge', 'help': 'Current interval between writes set by the rate controller.', 'value': interval},
+                {'name': 'eta_seconds', 'type': 'gauge', 'help': 'Estimated seconds until all rows are processed.', 'value': eta},
+                {'name': 'start_time_seconds', 'type': 'gauge', 'help': 'Unix time at which the run started.', 'value': self.start_time}
+                ]
+            for code in sorted(self.errors):
+                samples.append({'name': 'errors_total', 'type': 'counter', 'help': 'Error responses from the API by error code.', 'value': self.errors[code], 'labels': {'code': code}})
+        return samples
+
+    def render(self) -> str:
+        """Return the metrics in the Prometheus text format."""
+        lines = []
+        described = set()
+        for sample in self.samples():
+            name = self.namespace + '_' + sample['name']
+            if name not in described: # HELP and TYPE are given once for each metric, before its first sample
+                described.add(name)
+                lines.append('# HELP ' + name + ' ' + sample['help'])
+                lines.append('# TYPE ' + name + ' ' + sample['type'])
+            labels = ''
+            if 'labels' in sample:
+                labels = '{' + ','.join(key + '="' + escape_label(value) + '"' for key, value in sample['labels'].items()) + '}'
+            lines.append(name + labels + ' ' + format_value(float(sample['value'])))
+        return '\n'.join(lines) + '\n'
+
+class MetricsExporter:
+    """Makes the metrics of a run available while it is in progress.
+
+    Parameters
+    ----------
+    metrics : Metrics
+        Metrics to export.
+    target : str
+        A port number to serve the metrics at http://127.0.0.1:PORT/metrics, or the path of a file to write them to.
+    interval : float
+        Seconds between updates of the file. Not used for the HTTP server, which makes the metrics for each request.
+
+    Note
+    ----
+    Call close() at the end of the run to write the final values and stop the server or the thread that writes the file.
+    """
+    def __init__(self, metrics: Metrics, target: str, interval: float = 5.0):
+        self.metrics = metrics
+        self.target = target
+        self.interval = interval
+        self.server = None
+        self.stopped = threading.Event()
+        if target.isdigit():
+            self.server = http.server.ThreadingHTTPServer(('127.0.0.1', int(target)), self.request_handler())
+            self.server.daemon_threads = True
+            self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        else:
+            self.thread = threading.Thread(target=self.write_file_periodically, daemon=True)
+        self.thread.start()
+
+    def request_handler(self) -> type:
+        """Return a request handler class that serves the metrics of this exporter."""
+        metrics = self.metrics
+        class MetricsHandler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                if self.path.split('?')[0] not in ['/', '/metrics']:
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format: str, *args: Any) -> None:
+                pass # don't print a line for every request
+        return MetricsHandler
+
+    def url(self) -> str:
+        """Return where the metrics can be read."""
+        if self.server is not None:
+            return 'http://127.0.0.1:' + str(self.server.server_address[1]) + '/metrics'
+        return self.target
+
+    def write_file(self) -> None:
+        """Replace the metrics file. The file is written under another name and renamed, so readers never see part of it."""
+        temporary_path = self.target + '.tmp'
+        with open(temporary_path, 'wt', encoding='utf-8') as file_object:
+            file_object.write(self.metrics.render())
+        os.replace(temporary_path, self.target)
+
+    def write_file_periodically(self) -> None:
+        self.write_file()
+        while not self.stopped.wait(self.interval):
+            self.write_file()
+
+    def close(self) -> None:
+        """Stop exporting. The metrics file, if any, is left with the final values."""
+        if self.stopped.is_set():
+            return
+        self.stopped.set()
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+        else:
+            self.thread.join()
+            self.write_file()
@@ -0,0 +1,139 @@
+# VanderBot table normalization.  vb_normalize.py
+# (c) 2026 Vanderbilt University. This program is released under a GNU General Public License v3.0 http://www.gnu.org/licenses/gpl-3.0
+# Author: Steve Baskauf
+# For more information, see https://github.com/HeardLibrary/linked-data/tree/master/vanderbot
+
+# This file contains the code used by vanderbot.py to put the values in a table into the form required by the API before
+# anything is written. Previously each row was converted just before it was written: abbreviated dates were checked with
+# up to three strptime() calls, node IDs, Commons URLs, and blank node IDs were generated, whitespace was removed, and the
+# row was saved if anything changed. Now the whole table is normalized one column at a time before any network requests
+# are made. Dates are classified with precompiled regular expressions, all bad dates are reported together, and the
+# normalized table is saved once.
+
+import calendar
+import re
+import urllib.parse
+import uuid
+from typing import List, Dict, Tuple, Optional
+
+# Abbreviated dates. The year must have four digits and can't start with zero, which are the forms that passed the
+# strptime()/strftime() round trip used by previous versions.
+DAY_PATTERN = re.compile(r'([1-9][0-9]{3})-(0[1-9]|1[0-2])-(0[1-9]|[12][0-9]|3[01])')
+MONTH_PATTERN = re.compile(r'[1-9][0-9]{3}-(?:0[1-9]|1[0-2])')
+YEAR_PATTERN = re.compile(r'[1-9][0-9]{3}')
+
+# The particular form of xsd:dateTime required for full dates in Wikidata
+# See https://stackoverflow.com/questions/41129921/validate-an-iso-8601-datetime-string-in-python
+ISO8601_PATTERN = re.compile(r'-?(?:[1-9][0-9]*)?[0-9]{4}-(?:1[0-2]|0[0-9])-(?:3[01]|0[0-9]|[12][0-9])T00:00:00Z')
+
+def convert_date(value: str) -> Tuple[Optional[str], Optional[int]]:
+    """Convert a date to the form required by Wikibase.
+
+    Returns the time string and the precision number (11 for day, 10 for month, 9 for year), or (None, None) if the
+    date isn't in any of the recognized forms.
+    """
+    match = DAY_PATTERN.fullmatch(value)
+    if match is not None:
+        if int(match.group(3)) > calendar.monthrange(int(match.group(1)), int(match.group(2)))[1]:
+            return None, None # e.g. February 30
+        return value + 'T00:00:00Z', 11
+    if MONTH_PATTERN.fullmatch(value) is not None:
+        return value + '-00T00:00:00Z', 10
+    if YEAR_PATTERN.fullmatch(value) is not None:
+        return value + '-00-00T00:00:00Z', 9
+    if ISO8601_PATTERN.fullmatch(value) is not None:
+        return value, 11 # assume precision to days since Wikibase doesn't support greater resolution than that
+    return None, None
+
+def normalize_table(table_data: List[Dict[str, str]], strip_columns: List[str], bnode_columns: List[str], date_columns: List[str], node_columns: List[str], commons_columns: List[str], commons_prefix: str) -> Tuple[int, Dict[int, List[str]]]:
+    """Normalize the values in the table in place, one column at a time.
+
+    Parameters
+    ----------
+    strip_columns : list of str
+        Columns whose values have leading and trailing whitespace removed.
+    bnode_columns : list of str
+        Columns in which the blank node abbreviation "_:" is replaced by a blank node with a UUID identifier.
+    date_columns : list of str
+        Column name roots of time value nodes. Dates in the _val column are converted to the form required by Wikibase
+        and the precision is put in the _prec column, unless the precision is already there. Precisions are made integers.
+    node_columns : list of str
+        Column name roots of value nodes. A UUID is put in the _nodeId column if there is a value without a node ID.
+    commons_columns : list of str
+        Columns with Commons media values. Unencoded file names are converted to URLs.
+    commons_prefix : str
+        Beginning of a Commons media URL, before the URL-encoded file name.
+
+    Returns
+    -------
+    The number of rows in which values were changed and a dictionary of lists of date column name roots whose values
+    aren't in a recognized form, keyed by row number.
+    """
+    changed_rows = set()
+    date_errors = {}
+
+    # Check the cell values for leading or trailing whitespace, which will cause an error from the API
+    for column in strip_columns:
+        for row_number, row in enumerate(table_data):
+            value = row[column]
+            if value != value.strip():
+                print('WARNING: leading or trailing whitespace removed from "' + value + '"')
+                row[column] = value.strip()
+                changed_rows.add(row_number)
+
+    # Convert any blank node abbreviations into Turtle bnode strings with UUID identifiers
+    for column in bnode_columns:
+        for row_number, row in enumerate(table_data):
+            if row[column] == '_:':
+                row[column] = '_:' + str(uuid.uuid4())
+                changed_rows.add(row_number)
+
+    # Convert any dates that aren't in the standard format from the shorthand format to standard
+    for column in date_columns:
+        value_column = column + '_val'
+        precision_column = column + '_prec'
+        for row_number, row in enumerate(table_data):
+            value = row[value_column]
+            # Missing values and blank nodes are skipped
+            if value == '' or value[:2] == '_:':
+                continue
+            # Assume that if the precision column is empty that the date needs to be converted
+            if row[precision_column] == '':
+                time_string, precision = convert_date(value)
+                if time_string is None:
+                    date_errors.setdefault(row_number, []).append(column)
+                    continue
+                row[value_column] = time_string
+                row[precision_column] = precision
+                changed_rows.add(row_number)
+            else:
+                # A pre-existing value must already conform to the Wikidata format, and its precision must be an integer
+                # when written to the API
+                if ISO8601_PATTERN.fullmatch(value) is None:
+                    date_errors.setdefault(row_number, []).append(column)
+                    continue
+                try:
+                    row[precision_column] = int(row[precision_column])
+                except ValueError:
+                    date_errors.setdefault(row_number, []).append(column)
+
+    # Generate a UUID for the value node identifier when there isn't already one. Rows with bad dates won't be written, so
+    # they are left alone.
+    for column in node_columns:
+        for row_number, row in enumerate(table_data):
+            if row_number in date_errors:
+                continue
+            value = row[column + '_val']
+            if value != '' and value[:2] != '_:' and row[column + '_nodeId'] == '':
+                row[column + '_nodeId'] = str(uuid.uuid4())
+                changed_rows.add(row_number)
+
+    # Convert any commons media item values from unencoded filename strings to URLs if they aren't already URLs
+    for column in commons_columns:
+        for row_number, row in enumerate(table_data):
+            value = row[column]
+            if value != '' and value[:2] != '_:' and commons_prefix not in value:
+                row[column] = commons_prefix + urllib.parse.quote(value)
+                changed_rows.add(row_number)
+
+    return len(changed_rows), date_errors
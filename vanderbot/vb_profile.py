@@ -0,0 +1,163 @@
+# VanderBot phase timing.  vb_profile.py
+# (c) 2026 Vanderbilt University. This program is released under a GNU General Public License v3.0 http://www.gnu.org/licenses/gpl-3.0
+# Author: Steve Baskauf
+# For more information, see https://github.com/HeardLibrary/linked-data/tree/master/vanderbot
+
+# This file contains the code used by vanderbot.py to time the phases of an upload (--profile option). Previously the
+# only timing was the elapsed time printed at the end, so it wasn't possible to tell whether a slow run was caused by
+# the Query Service, the API, the disk, or waiting to stay under the rate limit.
+#
+# A Profiler adds up the time spent in each phase and counts the calls. Phases may be nested, e.g. the waits of the rate
+# controller happen inside a POST. The time of an inner phase is subtracted from the phase around it, so each second is
+# counted in only one phase and the totals add up to no more than the elapsed time of each thread. When several tables
+# are written at the same time, the totals are summed over the threads and may add up to more than the elapsed time.
+#
+# For phases that are limited by the CPU rather than by the network or the disk, the Python profiler (cProfile) can be
+# run while they are in progress, and its statistics saved in one file per phase for use with pstats or a viewer such as
+# snakeviz. Only one thread is profiled at a time, since newer versions of Python allow only one active profiler.
+
+import json
+import threading
+import time
+from contextlib import contextmanager
+from typing import List, Dict, Optional, Any, Iterator
+
+class PhaseTimer:
+    """A phase in progress in one thread. Made by Profiler.start()."""
+    def __init__(self, name: str, start_time: float):
+        self.name = name
+        self.start_time = start_time
+        self.inner_time = 0.0 # time spent in phases inside this one
+        self.cpu_profile = None
+
+class Profiler:
+    """Cumulative and per-call timing of the phases of an upload.
+
+    Parameters
+    ----------
+    enabled : bool
+        With False, start(), stop(), phase(), and add() do nothing, so they can be left in code that isn't being profiled.
+    cpu_phases : list of str, optional
+        Phases to run cProfile for.
+    """
+    def __init__(self, enabled: bool = True, cpu_phases: Optional[List[str]] = None):
+        self.enabled = enabled
+        self.cpu_phases = cpu_phases if cpu_phases is not None else []
+        self.phases = {} # calls, total, min, and max seconds of each phase, keyed by name, in the order first seen
+        self.cpu_profiles = {} # cProfile.Profile of each phase in cpu_phases that was run
+        self.cpu_active = False # True while cProfile is running in some thread
+        self.lock = threading.Lock()
+        self.stacks = threading.local() # phases in progress in each thread
+        self.start_time = time.perf_counter()
+
+    def start(self, name: str) -> Optional[PhaseTimer]:
+        """Start timing a phase in this thread. Pass the result to stop() when the phase is finished."""
+        if not self.enabled:
+            return None
+        timer = PhaseTimer(name, time.perf_counter())
+        if name in self.cpu_phases:
+            with self.lock:
+                if not self.cpu_active:
+                    import cProfile # imported here so that runs without profiling don't load it
+                    self.cpu_active = True
+                    timer.cpu_profile = self.cpu_profiles.setdefault(name, cProfile.Profile())
+            if timer.cpu_profile is not None:
+                try:
+                    timer.cpu_profile.enable()
+                except ValueError: # another profiler (e.g. a debugger) is active
+                    timer.cpu_profile = None
+                    with self.lock:
+                        self.cpu_active = False
+        if not hasattr(self.stacks, 'timers'):
+            self.stacks.timers = []
+        self.stacks.timers.append(timer)
+        return timer
+
+    def stop(self, timer: Optional[PhaseTimer]) -> None:
+        """Finish a phase started with start() and add its time, less the time of any phases inside it."""
+        if timer is None:
+            return
+        if timer.cpu_profile is not None:
+            timer.cpu_profile.disable()
+            with self.lock:
+                self.cpu_active = False
+        elapsed = time.perf_counter() - timer.start_time
+        timers = self.stacks.timers
+        # Phases started inside this one that weren't stopped (e.g. because of an exception) are dropped
+        while len(timers) > 0 and timers.pop() is not timer:
+            pass
+        if len(timers) > 0:
+            timers[-1].inner_time += elapsed
+        self.record(timer.name, max(elapsed - timer.inner_time, 0.0))
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """Time the code in a with block as a phase."""
+        timer = self.start(name)
+        try:
+            yield
+        finally:
+            self.stop(timer)
+
+    def add(self, name: str, seconds: float) -> None:
+        """Add time measured elsewhere (e.g. a sleep) to a phase. It is subtracted from the phase in progress in this thread."""
+        if not self.enabled or seconds <= 0:
+            return
+        timers = getattr(self.stacks, 'timers', [])
+        if len(timers) > 0:
+            timers[-1].inner_time += seconds
+        self.record(name, seconds)
+
+    def record(self, name: str, seconds: float) -> None:
+        """Add one call of a phase."""
+        with self.lock:
+            phase = self.phases.get(name)
+            if phase is None:
+                self.phases[name] = {'calls': 1, 'total': seconds, 'min': seconds, 'max': seconds}
+            else:
+                phase['calls'] += 1
+                phase['total'] += seconds
+                phase['min'] = min(phase['min'], seconds)
+                phase['max'] = max(phase['max'], seconds)
+
+    def results(self) -> Dict[str, Any]:
+        """Return the timings as a dictionary that can be saved as JSON. Times are in seconds."""
+        elapsed = time.perf_counter() - self.start_time
+        phases = {}
+        with self.lock:
+            for name, phase in self.phases.items():
+                phases[name] = {
+                    'calls': phase['calls'],
+                    'total': round(phase['total'], 6),
+                    'mean': round(phase['total'] / phase['calls'], 6),
+                    'min': round(phase['min'], 6),
+                    'max': round(phase['max'], 6)
+                    }
+        timed = sum(phase['total'] for phase in phases.values())
+        return {'elapsed': round(elapsed, 6), 'phases': phases, 'other': round(max(elapsed - timed, 0.0), 6)}
+
+    def summary(self) -> str:
+        """Return the timings as a table of text."""
+        results = self.results()
+        lines = ['{:<16} {:>8} {:>11} {:>7} {:>10} {:>10} {:>10}'.format('phase', 'calls', 'total (s)', '%', 'mean (ms)', 'min (ms)', 'max (ms)')]
+        for name, phase in results['phases'].items():
+            percent = 100 * phase['total'] / results['elapsed'] if results['elapsed'] > 0 else 0.0
+            lines.append('{:<16} {:>8} {:>11.3f} {:>7.1f} {:>10.3f} {:>10.3f} {:>10.3f}'.format(name, phase['calls'], phase['total'], percent, phase['mean'] * 1000, phase['min'] * 1000, phase['max'] * 1000))
+        lines.append('{:<16} {:>8} {:>11.3f}'.format('other', '', results['other']))
+        lines.append('{:<16} {:>8} {:>11.3f}'.format('elapsed', '', results['elapsed']))
+        return '\n'.join(lines)
+
+    def save(self, path: str) -> List[str]:
+        """Save the timings as JSON and the cProfile statistics of each CPU phase. Returns the names of the files written.
+
+        The statistics of a phase are saved next to the JSON file, with .phase.prof in place of its extension.
+        """
+        with open(path, 'wt', encoding='utf-8') as file_object:
+            json.dump(self.results(), file_object, indent=2)
+        paths = [path]
+        stem = path[:path.rfind('.')] if '.' in path.split('/')[-1] else path
+        for name, cpu_profile in self.cpu_profiles.items():
+            cpu_path = stem + '.' + name + '.prof'
+            cpu_profile.dump_stats(cpu_path)
+            paths.append(cpu_path)
+        return paths
@@ -0,0 +1,191 @@
+# VanderBot API write rate controller.  vb_rate.py
+# (c) 2026 Vanderbilt University. This program is released under a GNU General Public License v3.0 http://www.gnu.org/licenses/gpl-3.0
+# Author: Steve Baskauf
+# For more information, see https://github.com/HeardLibrary/linked-data/tree/master/vanderbot
+
+# This file contains the code shared by vanderbot.py, vanderdeletebot.py, commonstool.py, and the publications scripts
+# (through vb_session.py) to control how fast they write to a Wikibase API. The scripts in the commonsbot and
+# publications directories import it from this directory, so it is the only copy.
+#
+# The controller is a token bucket that holds at most one token, so writes are spaced by the current interval. The rate
+# is increased after each write that succeeds without complaint, by a fraction of the current rate (or a small fixed
+# amount if that is more), and is cut in half when the server reports that it is lagged (maxlag error) or that there
+# are too many requests (HTTP 429). Further complaints about the same write don't cut the rate again, so that a slow
+# rate can come back to where it was after a few dozen writes. Writing is also paused for the time given in the
+# Retry-After header. If the server keeps complaining, or doesn't say how long to wait, the pause is an exponentially
+# increasing delay if that is longer. The rate is never allowed to go faster than a floor interval. For Wikidata and Commons, the bot
+# policy limit is used as the floor (see the notes on api_sleep in vanderbot.py). For other Wikibase instances, there
+# is no policy floor, so the rate can increase up to max_rate.
+
+import threading
+import time
+from typing import Dict, Optional
+
+# Writes to Wikimedia sites (Wikidata, Commons) must never be closer together than this (seconds).
+WIKIMEDIA_MIN_INTERVAL = 1.25
+# Upper limit of writes per second when a rate limit of zero is given explicitly for another Wikibase (e.g. a local test
+# server). It only keeps the arithmetic finite; the server's responses are what slow the writes down.
+UNTHROTTLED_MAX_RATE = 1000.0
+
+class PostFailed(Exception):
+    """Raised when a POST to the API can't be completed after all retries."""
+    pass
+
+def policy_min_interval(api_url: str) -> float:
+    """Return the smallest interval between writes allowed by policy for an API URL."""
+    if 'wikidata.org' in api_url or 'wikimedia.org' in api_url:
+        return WIKIMEDIA_MIN_INTERVAL
+    return 0.0
+
+class RateController:
+    """Token bucket with additive increase and multiplicative decrease of the write rate.
+
+    Parameters
+    ----------
+    min_interval : float
+        Writes are never closer together than this many seconds.
+    start_interval : float
+        Interval between writes at the start. Set equal to min_interval to start at the fastest allowed rate.
+    max_rate : float
+        Upper limit of writes per second, used when min_interval is 0.
+    increase : float
+        Smallest number of writes per second added to the rate after each clean response.
+    growth : float
+        Fraction of the current rate added to the rate after each clean response, if that is more than increase.
+    base_delay : float
+        Pause in seconds after a lag or 429 response without a Retry-After header, or after the second consecutive one.
+        The pause doubles with each further consecutive one.
+    delay_limit : float
+        Longest pause in seconds.
+
+    Note
+    ----
+    A single controller can be shared by several threads or scripts writing to the same API so that together they
+    stay within the rate.
+    """
+    def __init__(self, min_interval: float = WIKIMEDIA_MIN_INTERVAL, start_interval: float = WIKIMEDIA_MIN_INTERVAL, max_rate: float = 10.0, increase: float = 0.1, growth: float = 0.05, base_delay: float = 5.0, delay_limit: float = 300.0):
+        self.max_rate = max_rate
+        if min_interval > 0:
+            self.max_rate = min(max_rate, 1.0 / min_interval)
+        self.min_rate = 1.0 / delay_limit
+        self.rate = min(self.max_rate, 1.0 / max(start_interval, min_interval, 1.0 / self.max_rate))
+        self.increase = increase
+        self.growth = growth
+        self.base_delay = base_delay
+        self.delay_limit = delay_limit
+        self.lock = threading.Lock()
+        self.next_time = 0.0 # monotonic time at which the next token is available
+        self.consecutive_backoffs = 0
+
+    def interval(self) -> float:
+        """Current number of seconds between writes."""
+        return 1.0 / self.rate
+
+    def backoff_remaining(self) -> float:
+        """Seconds until writing resumes after a lag or too-many-requests response; 0 if writing isn't paused."""
+        with self.lock:
+            if self.consecutive_backoffs == 0:
+                return 0.0
+            return max(0.0, self.next_time - time.monotonic())
+
+    def wait(self) -> None:
+        """Block until a write is allowed, then use up the token."""
+        with self.lock: # holding the lock while sleeping makes other threads queue up behind this one
+            now = time.monotonic()
+            if now < self.next_time:
+                time.sleep(self.next_time - now)
+                now = self.next_time
+            self.next_time = now + 1.0 / self.rate
+
+    def success(self) -> None:
+        """Increase in proportion to the rate after a write that went through without any complaint from the server."""
+        with self.lock:
+            self.consecutive_backoffs = 0
+            self.rate = min(self.max_rate, self.rate + max(self.increase, self.rate * self.growth))
+
+    def backoff(self, retry_after: Optional[float] = None) -> float:
+        """Multiplicative decrease after a lag or too-many-requests response. Returns the pause in seconds."""
+        with self.lock:
+            if self.consecutive_backoffs == 0: # the rate is only cut once for the complaints between two clean writes
+                self.rate = max(self.min_rate, self.rate / 2)
+            if retry_after is not None and self.consecutive_backoffs == 0:
+                pause = retry_after
+            else:
+                pause = min(self.delay_limit, self.base_delay * 2 ** max(0, self.consecutive_backoffs - 1))
+                if retry_after is not None:
+                    pause = max(pause, retry_after) # never retry sooner than the server asked
+            self.consecutive_backoffs += 1
+            self.next_time = max(self.next_time, time.monotonic() + pause)
+        return pause
+
+    def post(self, session: 'requests.Session', api_url: str, parameters: Dict, max_retries: int = 10, stats: Optional[Dict] = None) -> Dict:
+        """Post to the API at the controlled rate, retrying after lag and too-many-requests responses.
+
+        Returns the response data as a dictionary. Error responses other than maxlag are returned for the caller to handle.
+        Raises PostFailed if the server is still lagged after max_retries retries or does not respond. If a stats
+        dictionary is given, the seconds taken by the server to answer the last try (latency), the number of times the
+        post was sent again (retries), the seconds spent waiting before sending (waited), and the total seconds (elapsed)
+        are put in it.
+        """
+        import requests # imported here so that scripts that import this module start quickly
+        start_time = time.monotonic()
+        waited = 0.0
+        tries = 0
+        retry = 0
+        while retry <= max_retries:
+            if retry > 0:
+                print('retry:', retry)
+
+            # Check for cases where the server is not responding at all.
+            data = None
+            for attempt in range(5):
+                wait_time = time.monotonic()
+                self.wait()
+                tries += 1
+                sent_time = time.monotonic()
+                waited += sent_time - wait_time
+                try:
+                    r = session.post(api_url, data=parameters)
+                except requests.exceptions.RequestException as error:
+                    print('No response from server:', error)
+                else:
+                    latency = time.monotonic() - sent_time
+                    if r.status_code == 429:
+                        break
+                    try:
+                        data = r.json()
+                        break
+                    except ValueError:
+                        print('Bad response from server.')
+                        print('Response was:', r.text)
+                print('Waiting 1 second to retry. Retry', attempt + 1, 'of 5)')
+                print()
+                time.sleep(1)
+                waited += 1
+            else:
+                raise PostFailed('No usable response from ' + api_url + ' after 5 tries.')
+
+            # Check for cases where the server is responding, but is lagged or has had too many requests.
+            if r.status_code == 429 or (isinstance(data, dict) and 'error' in data and data['error'].get('code') == 'maxlag'):
+                if data is not None and 'error' in data:
+                    print('Lag of ', data['error'].get('lag'), ' seconds.')
+                else:
+                    print('Too many requests.')
+                retry_after = None
+                try:
+                    retry_after = float(r.headers['Retry-After'])
+                except (KeyError, ValueError):
+                    pass
+                pause = self.backoff(retry_after)
+                if retry != max_retries:
+                    print('Waiting ', pause, ' seconds.')
+                    print()
+                retry += 1
+                continue
+
+            if not (isinstance(data, dict) and 'error' in data):
+                self.success()
+            if stats is not None:
+                stats.update(latency=latency, retries=tries - 1, waited=waited, elapsed=time.monotonic() - start_time)
+            return data
+        raise PostFailed('Failed after ' + str(max_retries) + ' retries.')
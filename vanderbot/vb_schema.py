@@ -0,0 +1,314 @@
+# VanderBot schema plan.  vb_schema.py
+# (c) 2026 Vanderbilt University. This program is released under a GNU General Public License v3.0 http://www.gnu.org/licenses/gpl-3.0
+# Author: Steve Baskauf
+# For more information, see https://github.com/HeardLibrary/linked-data/tree/master/vanderbot
+
+# This file contains code to compile the column descriptions of a csv-metadata.json file (the "Generating RDF from Tabular
+# Data on the Web" metadata description file that maps the CSV columns to the Wikibase graph model) into a plan that
+# describes each table: its subject column; its label, description, and alias columns; and one descriptor for each
+# property that holds the property's UUID column, value type, qualifiers, and references.
+#
+# The column descriptions are indexed by the template variable in their aboutUrl in a single pass, so finding the UUID,
+# qualifier, reference, and value node columns for a property is a dictionary lookup rather than a scan of all columns.
+# The compiled plan is saved as JSON next to the metadata description file (same name with .plan added) together with
+# a hash of the metadata description file, and is reused until the file changes.
+#
+# The qualifier and reference descriptions have the same form as the dictionaries that vanderbot.py has always used
+# (qualPropList, refPropList, etc.) so that they can be passed directly to the functions that generate snaks.
+
+import hashlib
+import json
+from typing import List, Dict, Any
+
+# Increment when the structure of the plan changes so that old cached plans are not used.
+PLAN_FORMAT = 1
+
+class PropertyPlan:
+    """Descriptor for one statement property column.
+
+    Attributes
+    ----------
+    column : str
+        Column header for the value (the root of the header, without _nodeId, for value nodes).
+    property_id : str
+        P ID of the property.
+    uuid_column : str
+        Column header for the statement UUID. Empty string if there isn't one.
+    entity_or_literal : str
+        "entity", "literal", "value" (value node), or "monolingualtext"
+    type : str
+        The datatype given to the mainsnak, e.g. "wikibase-item", "url", "time", "quantity", "globe-coordinate", "commonsMedia", or "string"
+    value_type : str
+        The type given to the datavalue of the mainsnak, e.g. "wikibase-entityid", "string", "globecoordinate", "quantity", or "time"
+    lang : str
+        Language of monolingualtext values, otherwise empty string.
+    references : list of dict
+        One dictionary for each reference, in the form returned by the original findReferencesForProperty() function.
+    qualifiers : dict
+        Dictionary in the form returned by the original findQualifiersForProperty() function.
+    """
+    __slots__ = ('column', 'property_id', 'uuid_column', 'entity_or_literal', 'type', 'value_type', 'lang', 'references', 'qualifiers')
+
+    def __init__(self, column='', property_id='', uuid_column='', entity_or_literal='', type='', value_type='', lang='', references=None, qualifiers=None):
+        self.column = column
+        self.property_id = property_id
+        self.uuid_column = uuid_column
+        self.entity_or_literal = entity_or_literal
+        self.type = type
+        self.value_type = value_type
+        self.lang = lang
+        self.references = references if references is not None else []
+        self.qualifiers = qualifiers if qualifiers is not None else {}
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {slot: getattr(self, slot) for slot in self.__slots__}
+
+class TablePlan:
+    """Plan for one table in the metadata description file.
+
+    Attributes
+    ----------
+    url : str
+        File name or path of the CSV table.
+    subject_column : str
+        Column header for the Q IDs of the subject items.
+    label_columns, description_columns, alias_columns : list of [str, str]
+        Column header and language for each label, description, and alias column, in column order.
+    properties : list of PropertyPlan
+        One descriptor for each statement property, in column order.
+    warnings : list of str
+        Problems found while compiling the plan, to be displayed each time the plan is used.
+    """
+    __slots__ = ('url', 'subject_column', 'label_columns', 'description_columns', 'alias_columns', 'properties', 'warnings')
+
+    def __init__(self, url='', subject_column='', label_columns=None, description_columns=None, alias_columns=None, properties=None, warnings=None):
+        self.url = url
+        self.subject_column = subject_column
+        self.label_columns = label_columns if label_columns is not None else []
+        self.description_columns = description_columns if description_columns is not None else []
+        self.alias_columns = alias_columns if alias_columns is not None else []
+        self.properties = properties if properties is not None else []
+        self.warnings = warnings if warnings is not None else []
+
+    def to_dict(self) -> Dict[str, Any]:
+        dictionary = {slot: getattr(self, slot) for slot in self.__slots__}
+        dictionary['properties'] = [property_plan.to_dict() for property_plan in self.properties]
+        return dictionary
+
+    @classmethod
+    def from_dict(cls, dictionary: Dict[str, Any]) -> 'TablePlan':
+        plan = cls(**{key: value for key, value in dictionary.items() if key != 'properties'})
+        plan.properties = [PropertyPlan(**property_dict) for property_dict in dictionary['properties']]
+        return plan
+
+def template_variable(uri_template: str) -> str:
+    """Return the last variable in a URI template, e.g. employerStatementUuid for
+    http://www.wikidata.org/entity/statement/{wikidataId}-{employerStatementUuid}"""
+    return uri_template.rpartition('{')[2].partition('}')[0]
+
+def value_node_kind(property_url: str) -> List[str]:
+    """Return [entity_or_literal, type, value_type] for a value node column whose propertyUrl is given, or [] if the
+    column doesn't determine the kind of value node (e.g. timePrecision)."""
+    if 'timeValue' in property_url: # value is a date
+        return ['value', 'time', 'time']
+    elif 'geoLatitude' in property_url: # value is a globe coordinate value
+        return ['value', 'globe-coordinate', 'globecoordinate']
+    elif 'quantityAmount' in property_url: # value is a quantity
+        return ['value', 'quantity', 'quantity']
+    else:
+        return []
+
+def direct_value_kind(column: Dict[str, Any]) -> List[str]:
+    """Return [entity_or_literal, type, value_type, lang] for a qualifier or reference column with a direct value."""
+    if 'valueUrl' in column:
+        # URIs are detected when there is a valueUrl whose value has a first character of "{"
+        if column['valueUrl'][0] == '{':
+            return ['literal', 'url', 'string', '']
+        else:
+            return ['entity', 'wikibase-item', 'wikibase-entityid', '']
+    # monolingualtext detected by language tag
+    elif 'lang' in column:
+        return ['monolingualtext', 'monolingualtext', 'monolingualtext', column['lang']]
+    # plain text string
+    else:
+        return ['literal', 'string', 'string', '']
+
+class ColumnIndex:
+    """Dictionaries of the columns of one table, built in a single pass through the columns."""
+    def __init__(self, columns: List[Dict[str, Any]]):
+        self.by_about = {} # active columns, keyed by the last template variable in their aboutUrl
+        self.by_prop = {} # active columns, keyed by the part of their propertyUrl after "prop/" (e.g. P108 for p: properties)
+        self.node_kinds = {} # value node kinds keyed by node ID column title; includes suppressed columns
+        for column in columns:
+            if 'aboutUrl' in column:
+                kind = value_node_kind(column.get('propertyUrl', ''))
+                if kind != []:
+                    self.node_kinds[template_variable(column['aboutUrl'])] = kind
+            if 'suppressOutput' in column:
+                continue
+            self.by_about.setdefault(template_variable(column.get('aboutUrl', '')), []).append(column)
+            self.by_prop.setdefault(column['propertyUrl'].partition('prop/')[2], []).append(column)
+
+    def uuid_column(self, property_id: str, warnings: List[str]) -> str:
+        statement_uuid_column = '' # start value as empty string in case no UUID column
+        uuid_columns = self.by_prop.get(property_id, [])
+        for column in uuid_columns:
+            # in the event of two columns with the same property ID, the last one is used
+            statement_uuid_column = column['valueUrl'].partition('-{')[2].partition('}')[0]
+        # Give a warning if there isn't any UUID column for the property
+        if statement_uuid_column == '':
+            warnings.append('Warning: No UUID column for property ' + property_id)
+        if len(uuid_columns) > 1:
+            warnings.append('Warning: there are ' + str(len(uuid_columns)) + ' for property ' + property_id)
+        return statement_uuid_column
+
+    def references(self, statement_uuid_column: str) -> List[Dict[str, List[str]]]:
+        reference_list = []
+        for column in self.by_about.get(statement_uuid_column, []):
+            if 'prov:wasDerivedFrom' not in column['propertyUrl']:
+                continue
+            ref_hash_column = column['valueUrl'].partition('{')[2].partition('}')[0]
+            reference = {'refHashColumn': ref_hash_column, 'refPropList': [], 'refValueColumnList': [], 'refEntityOrLiteral': [], 'refTypeList': [], 'refValueTypeList': [], 'refLangList': []}
+            for prop_column in self.by_about.get(ref_hash_column, []):
+                value_string = prop_column['propertyUrl'].partition('prop/reference/')[2]
+                if 'value' in value_string: # e.g. value/P813
+                    # The column title will be something like employer_ref1_retrieved_nodeId, so use the root of the string
+                    kind = self.node_kinds.get(prop_column['titles'], [])
+                    self.append_values(reference, 'ref', value_string.partition('value/')[2], prop_column['titles'].partition('_nodeId')[0], kind, '')
+                else: # e.g. P854
+                    kind = direct_value_kind(prop_column)
+                    self.append_values(reference, 'ref', value_string, prop_column['titles'], kind[:3], kind[3])
+            reference_list.append(reference)
+        return reference_list
+
+    def qualifiers(self, statement_uuid_column: str) -> Dict[str, List[str]]:
+        qualifier_dictionary = {'qualPropList': [], 'qualValueColumnList': [], 'qualEntityOrLiteral': [], 'qualTypeList': [], 'qualValueTypeList': [], 'qualLangList': []}
+        for column in self.by_about.get(statement_uuid_column, []):
+            if 'qualifier' not in column['propertyUrl']:
+                continue
+            value_string = column['propertyUrl'].partition('prop/qualifier/')[2]
+            if 'value' in value_string: # e.g. value/P580
+                kind = self.node_kinds.get(column['titles'], [])
+                self.append_values(qualifier_dictionary, 'qual', value_string.partition('value/')[2], column['titles'].partition('_nodeId')[0], kind, '')
+            else: # e.g. P1545
+                kind = direct_value_kind(column)
+                self.append_values(qualifier_dictionary, 'qual', value_string, column['titles'], kind[:3], kind[3])
+        return qualifier_dictionary
+
+    @staticmethod
+    def append_values(dictionary, prefix, property_id, value_column, kind, lang):
+        dictionary[prefix + 'PropList'].append(property_id)
+        dictionary[prefix + 'ValueColumnList'].append(value_column)
+        dictionary[prefix + 'LangList'].append(lang)
+        if kind != []: # an unrecognized value node type is left out, as it always has been
+            dictionary[prefix + 'EntityOrLiteral'].append(kind[0])
+            dictionary[prefix + 'TypeList'].append(kind[1])
+            dictionary[prefix + 'ValueTypeList'].append(kind[2])
+
+def compile_table(table: Dict[str, Any], commons_media_p18: bool) -> TablePlan:
+    """Compile the plan for one table in the metadata description file.
+
+    Parameters
+    ----------
+    table : dict
+        One item from the tables list of the metadata description.
+    commons_media_p18 : bool
+        True if values of P18 (image) are Commons media file names. This is only the case for Wikidata.
+    """
+    columns = table['tableSchema']['columns']
+    index = ColumnIndex(columns)
+    plan = TablePlan(url=table['url'])
+
+    # assume each row is primarily about an entity. The column whose name matches the URI template of an entity aboutUrl
+    # is the subject column.
+    subject_name = ''
+    for column in columns:
+        if 'aboutUrl' in column and 'entity/{' in column['aboutUrl']:
+            subject_name = column['aboutUrl'].partition('{')[2].partition('}')[0]
+    for column in columns:
+        if column['name'] == subject_name:
+            plan.subject_column = column['titles']
+
+    for column in columns:
+        if 'suppressOutput' in column:
+            # The alias column must be named exactly "alias" and have output suppressed. Other suppressed columns are ignored.
+            if column['name'] == 'alias':
+                plan.alias_columns.append([column['titles'], column['lang']])
+            continue
+        if column['propertyUrl'] == 'rdfs:label':
+            plan.label_columns.append([column['titles'], column['lang']])
+            continue
+        if column['propertyUrl'] == 'schema:description':
+            plan.description_columns.append([column['titles'], column['lang']])
+            continue
+        # only columns that have "statement" properties are main property values
+        if 'prop/statement/' not in column['propertyUrl']:
+            continue
+
+        property_plan = PropertyPlan()
+        if 'valueUrl' in column:
+            if 'prop/statement/value/' in column['propertyUrl']: # value is a value node (e.g. date or geo coordinates)
+                property_plan.column = column['titles'].partition('_nodeId')[0] # save only the root of the column name for value nodes
+                property_plan.property_id = column['propertyUrl'].partition('prop/statement/value/')[2]
+                kind = index.node_kinds.get(column['titles'], ['value', '', ''])
+                property_plan.entity_or_literal, property_plan.type, property_plan.value_type = kind
+            else:
+                property_plan.column = column['titles']
+                property_plan.property_id = column['propertyUrl'].partition('prop/statement/')[2]
+                # Special case only for Wikidata and only for P18 (image), which links to a Commons media item
+                if commons_media_p18 and property_plan.property_id == 'P18':
+                    property_plan.entity_or_literal, property_plan.type, property_plan.value_type = 'literal', 'commonsMedia', 'string'
+                # URLs are detected when there is a valueUrl whose value has a first character of "{"
+                elif column['valueUrl'][0] == '{':
+                    property_plan.entity_or_literal, property_plan.type, property_plan.value_type = 'literal', 'url', 'string'
+                # Otherwise having a valueUrl indicates that it's an item
+                else:
+                    property_plan.entity_or_literal, property_plan.type, property_plan.value_type = 'entity', 'wikibase-item', 'wikibase-entityid'
+        else:
+            # remaining columns have literal values
+            property_plan.column = column['titles']
+            property_plan.property_id = column['propertyUrl'].partition('prop/statement/')[2]
+            # differentiate between plain literals and language-tagged literals (monolingualtext)
+            if 'lang' in column:
+                property_plan.entity_or_literal, property_plan.type, property_plan.value_type = 'monolingualtext', 'monolingualtext', 'monolingualtext'
+                property_plan.lang = column['lang']
+            else:
+                property_plan.entity_or_literal, property_plan.type, property_plan.value_type = 'literal', 'string', 'string'
+
+        property_plan.uuid_column = index.uuid_column(property_plan.property_id, plan.warnings)
+        property_plan.references = index.references(property_plan.uuid_column)
+        property_plan.qualifiers = index.qualifiers(property_plan.uuid_column)
+        plan.properties.append(property_plan)
+
+    return plan
+
+def load_plans(metadata_file_name: str, commons_media_p18: bool) -> List[TablePlan]:
+    """Return the plans for all of the tables in a metadata description file, using the cached plans if the file hasn't changed.
+
+    Note
+    ----
+    The cache is written to the metadata description file name with .plan added. If it can't be written (e.g. the
+    directory is read-only), the plans are compiled each time.
+    """
+    with open(metadata_file_name, 'rb') as file_object:
+        schema_bytes = file_object.read()
+    schema_hash = hashlib.sha256(schema_bytes).hexdigest()
+    cache_file_name = metadata_file_name + '.plan'
+
+    try:
+        with open(cache_file_name, 'rt', encoding='utf-8') as file_object:
+            cache = json.load(file_object)
+        if cache['format'] == PLAN_FORMAT and cache['schema_hash'] == schema_hash and cache['commons_media_p18'] == commons_media_p18:
+            return [TablePlan.from_dict(table) for table in cache['tables']]
+    except (OSError, ValueError, KeyError, TypeError):
+        pass # no usable cache, so compile
+
+    metadata = json.loads(schema_bytes.decode('utf-8'))
+    plans = [compile_table(table, commons_media_p18) for table in metadata['tables']]
+    cache = {'format': PLAN_FORMAT, 'schema_hash': schema_hash, 'commons_media_p18': commons_media_p18, 'tables': [plan.to_dict() for plan in plans]}
+    try:
+        with open(cache_file_name, 'wt', encoding='utf-8') as file_object:
+            json.dump(cache, file_object, indent=2)
+    except OSError:
+        pass
+    return plans
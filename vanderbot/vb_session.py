@@ -0,0 +1,288 @@
+# VanderBot authenticated API session.  vb_session.py
+# (c) 2026 Vanderbilt University. This program is released under a GNU General Public License v3.0 http://www.gnu.org/licenses/gpl-3.0
+# Author: Steve Baskauf
+# For more information, see https://github.com/HeardLibrary/linked-data/tree/master/vanderbot
+
+# This file contains the code used by vanderbot.py, vanderdeletebot.py, vanderpropertybot.py, commonstool.py, and the
+# publications scripts to log in to a Wikibase API. The scripts in the commonsbot and publications directories import it
+# from this directory, so it is the only copy. Previously the scripts logged in when they were started, so every upload paid for starting Python,
+# importing requests, logging in, and getting a CSRF token. A WikibaseSession holds the logged-in requests session, the
+# CSRF token, and the rate controller for writes, so that a program that imports vanderbot.py can log in once and use
+# the same session for any number of uploads with run(). Uploads that share a session also share its write rate limit.
+#
+# The session cookies are saved in a file in the user's home directory (~/.vanderbot/sessions/, one file per API URL
+# and username) that only the user can read. A script that is started again soon afterwards loads the cookies and
+# checks them with a single request for the user name and a CSRF token, so it doesn't need to log in again. If the
+# cookies have expired or belong to another user, the script logs in as before. If the API rejects a write with a
+# badtoken error (e.g. because the session expired during a long upload), a new token is got, logging in again if
+# necessary, and the write is sent once more.
+#
+# The requests package is imported when the first session is made rather than when this module is imported.
+
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Dict, Tuple, Optional
+import vb_rate # controls the rate of writes to the API; must be in the same directory as this script
+
+# Directory where the session cookies are saved between runs
+SESSION_CACHE_DIRECTORY = str(Path.home()) + '/.vanderbot/sessions'
+
+class LoginFailed(Exception):
+    """Raised when the API doesn't accept the username and password."""
+    pass
+
+def retrieve_credentials(path: str) -> Tuple[str, str, str]:
+    """Read the API URL, username, and password from a credentials file.
+
+    Note
+    ----
+    The file has the form:
+    endpointUrl=https://test.wikidata.org
+    username=User@bot
+    password=465jli90dslhgoiuhsaoi9s0sj5ki3lo
+    """
+    with open(path, 'rt') as fileObject:
+        lineList = fileObject.read().split('\n')
+    domain_name = lineList[0].split('=')[1]
+    username = lineList[1].split('=')[1]
+    password = lineList[2].split('=')[1]
+    return domain_name, username, password
+
+def is_wikimedia(base_url: str) -> bool:
+    """Return True for Wikidata and Commons, where the bot policy limits the rate of writes."""
+    return 'wikidata.org' in base_url or 'wikimedia.org' in base_url
+
+def make_rate_controller(base_url: str, api_sleep: Optional[float] = None) -> vb_rate.RateController:
+    """Make the rate controller for writes to a Wikibase.
+
+    Writes are spaced by a rate controller that speeds up while the server responds normally and slows down when it
+    reports lag or too many requests. It never goes faster than one write every api_sleep seconds (at least 1.25 s) for
+    Wikidata and Commons. For other Wikibase instances there is no such floor unless api_sleep is given, so writes start
+    at one every 1.25 s and get faster. An api_sleep of 0 for another Wikibase removes the limit of 10 writes per second,
+    e.g. for mock_wikibase.py.
+    """
+    if is_wikimedia(base_url):
+        if api_sleep is None or api_sleep < vb_rate.WIKIMEDIA_MIN_INTERVAL:
+            api_sleep = vb_rate.WIKIMEDIA_MIN_INTERVAL
+        return vb_rate.RateController(min_interval=api_sleep, start_interval=api_sleep)
+    if api_sleep is None:
+        return vb_rate.RateController(min_interval=0.0, start_interval=vb_rate.WIKIMEDIA_MIN_INTERVAL)
+    if api_sleep > 0:
+        return vb_rate.RateController(min_interval=api_sleep, start_interval=api_sleep)
+    return vb_rate.RateController(min_interval=0.0, start_interval=0.0, max_rate=vb_rate.UNTHROTTLED_MAX_RATE)
+
+def normalize_username(username: str) -> str:
+    """Return a username in the form the API uses in userinfo, e.g. User for User@bot or some_user for Some user."""
+    name = username.split('@')[0].replace('_', ' ').strip()
+    return name[:1].upper() + name[1:]
+
+def is_bad_token(data: Dict) -> bool:
+    """Return True if a response from the API says that the CSRF token was bad."""
+    return isinstance(data, dict) and 'error' in data and data['error'].get('code') == 'badtoken'
+
+class WikibaseSession:
+    """A logged-in session with a Wikibase API that can be used for several uploads.
+
+    Parameters
+    ----------
+    base_url : str
+        The URL of the Wikibase without the API path, e.g. https://www.wikidata.org
+    username : str
+        Bot username, e.g. User@bot
+    password : str
+        Bot password
+    user_agent : str
+        User-Agent header sent with every request. See https://meta.wikimedia.org/wiki/User-Agent_policy
+    api_sleep : float, optional
+        Minimum number of seconds between writes. See make_rate_controller().
+    resource_url : str
+        Path of the API, default /w/api.php
+    rate_controller : vb_rate.RateController, optional
+        Rate controller to use instead of the one made from api_sleep, e.g. one shared with other sessions.
+    cache_directory : str, optional
+        Directory where the session cookies are saved between runs. An empty string or None turns off saving.
+
+    Note
+    ----
+    The session logs in when it is made, unless cookies saved by an earlier session are still logged in. LoginFailed is
+    raised if the login is rejected. The requests
+    session, CSRF token, and rate controller are the session, csrf_token, and rate_controller attributes. The resumed
+    attribute is True if the saved cookies were used.
+    """
+    def __init__(self, base_url: str, username: str, password: str, user_agent: str, api_sleep: Optional[float] = None, resource_url: str = '/w/api.php', rate_controller: Optional[vb_rate.RateController] = None, cache_directory: Optional[str] = SESSION_CACHE_DIRECTORY):
+        import requests # imported here so that programs that import this module start quickly
+        self.base_url = base_url
+        self.api_url = base_url + resource_url
+        self.username = username
+        self.password = password
+        if rate_controller is None:
+            rate_controller = make_rate_controller(base_url, api_sleep)
+        self.rate_controller = rate_controller
+        self.session = requests.Session()
+        # Set default User-Agent header so you don't have to send it with every request
+        self.session.headers.update({'User-Agent': user_agent})
+        self.csrf_token = ''
+        self.logged_in = False
+        self.token_lock = threading.Lock() # keeps threads that get a badtoken error at the same time from all logging in
+        self.cache_path = None
+        if cache_directory:
+            # The file name is a hash, so the API URL and username aren't readable from the directory listing
+            key = hashlib.sha256((self.api_url + '\n' + username).encode('utf-8')).hexdigest()
+            self.cache_path = os.path.join(cache_directory, key + '.json')
+        self.resumed = self.load_cookies() and self.check_login()
+        if not self.resumed:
+            self.log_in()
+
+    def log_in(self, username: Optional[str] = None, password: Optional[str] = None) -> Dict:
+        """Log in with the bot username and password and get a CSRF token. Returns the response to the login request.
+
+        The username and password given when the session was made are used unless others are given. Raises LoginFailed,
+        without getting a token, if the login result isn't Success (e.g. a wrong bot password), since writes with the token
+        of an anonymous session would be made under the IP address or rejected.
+        """
+        if username is not None:
+            self.username = username
+        if password is not None:
+            self.password = password
+        self.session.cookies.clear()
+        parameters = {
+            'action':'query',
+            'meta':'tokens',
+            'type':'login',
+            'format':'json'
+        }
+        r = self.session.get(url=self.api_url, params=parameters)
+        login_token = r.json()['query']['tokens']['logintoken']
+
+        parameters = {
+            'action':'login',
+            'lgname':self.username,
+            'lgpassword':self.password,
+            'lgtoken':login_token,
+            'format':'json'
+        }
+        r = self.session.post(self.api_url, data=parameters)
+        data = r.json()
+        login = data.get('login', {})
+        if login.get('result') != 'Success':
+            self.logged_in = False
+            raise LoginFailed('Login to ' + self.api_url + ' as ' + self.username + ' failed: ' + str(login.get('reason', login.get('result', data))))
+
+        parameters = {
+            "action": "query",
+            "meta": "tokens",
+            "format": "json"
+        }
+        r = self.session.get(url=self.api_url, params=parameters)
+        self.csrf_token = r.json()["query"]["tokens"]["csrftoken"]
+        self.logged_in = True
+        self.save_cookies()
+        return data
+
+    def check_login(self) -> bool:
+        """Check with one request that the session is logged in as the user and get a new CSRF token.
+
+        Returns False, leaving the token unchanged, if the session isn't logged in or the request fails.
+        """
+        import requests
+        parameters = {
+            'action':'query',
+            'meta':'userinfo|tokens',
+            'format':'json'
+        }
+        try:
+            r = self.session.get(url=self.api_url, params=parameters)
+            data = r.json()
+            userinfo = data['query']['userinfo']
+            csrf_token = data['query']['tokens']['csrftoken']
+        except (requests.exceptions.RequestException, ValueError, KeyError, TypeError):
+            return False
+        if 'anon' in userinfo or normalize_username(userinfo.get('name', '')) != normalize_username(self.username):
+            return False
+        self.csrf_token = csrf_token
+        self.logged_in = True
+        return True
+
+    def refresh_csrf_token(self, rejected_token: Optional[str] = None) -> str:
+        """Get a new CSRF token, logging in again if the session is no longer logged in. Returns the token.
+
+        If rejected_token is given and another thread already replaced it, the current token is returned without a request.
+        """
+        with self.token_lock:
+            if rejected_token is None or rejected_token == self.csrf_token:
+                if not self.check_login():
+                    self.log_in()
+            return self.csrf_token
+
+    def load_cookies(self) -> bool:
+        """Load the cookies saved by an earlier session. Returns False if there are none that can be used."""
+        if self.cache_path is None or not os.path.exists(self.cache_path):
+            return False
+        if os.name == 'posix':
+            status = os.stat(self.cache_path)
+            # Don't use a file that belongs to someone else or that others can read or change
+            if status.st_uid != os.getuid() or status.st_mode & 0o077:
+                return False
+        try:
+            with open(self.cache_path, 'rt', encoding='utf-8') as file_object:
+                cookies = json.load(file_object)
+            for cookie in cookies:
+                self.session.cookies.set(cookie['name'], cookie['value'], domain=cookie['domain'], path=cookie['path'], secure=cookie['secure'], expires=cookie['expires'])
+        except (OSError, ValueError, KeyError, TypeError):
+            self.session.cookies.clear()
+            return False
+        return len(cookies) > 0
+
+    def save_cookies(self) -> None:
+        """Save the session cookies in a file that only the user can read, replacing the file of an earlier session."""
+        if self.cache_path is None:
+            return
+        cookies = [{'name': cookie.name, 'value': cookie.value, 'domain': cookie.domain, 'path': cookie.path, 'secure': cookie.secure, 'expires': cookie.expires} for cookie in self.session.cookies]
+        temporary_path = self.cache_path + '.' + str(os.getpid()) + '.tmp'
+        try:
+            os.makedirs(os.path.dirname(self.cache_path), mode=0o700, exist_ok=True)
+            file_descriptor = os.open(temporary_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(file_descriptor, 'wt', encoding='utf-8') as file_object:
+                json.dump(cookies, file_object)
+            os.replace(temporary_path, self.cache_path)
+        except OSError as error: # saving the cookies only saves a login next time, so it isn't worth stopping for
+            print('Could not save the session cookies:', error)
+
+    def forget(self) -> None:
+        """Delete the saved cookies, e.g. after the bot password was changed."""
+        if self.cache_path is not None and os.path.exists(self.cache_path):
+            os.remove(self.cache_path)
+
+    def post(self, parameters: Dict, stats: Optional[Dict] = None) -> Dict:
+        """Post to the API at the rate allowed by the rate controller. See vb_rate.RateController.post().
+
+        The current CSRF token is sent as the token parameter. If the API rejects it, a new token is got (see
+        refresh_csrf_token()) and the post is tried once more. The stats dictionary, if given, is filled in as by
+        vb_rate.RateController.post(), counting the post with the rejected token as a retry.
+        """
+        token = self.csrf_token
+        data = self.rate_controller.post(self.session, self.api_url, dict(parameters, token=token), stats=stats)
+        if is_bad_token(data):
+            print('CSRF token was rejected. Getting a new one.')
+            first_stats = dict(stats) if stats is not None else {}
+            token = self.refresh_csrf_token(token)
+            data = self.rate_controller.post(self.session, self.api_url, dict(parameters, token=token), stats=stats)
+            if stats is not None:
+                stats['retries'] += first_stats['retries'] + 1
+                stats['waited'] += first_stats['waited']
+                stats['elapsed'] += first_stats['elapsed']
+        return data
+
+    def close(self) -> None:
+        """Save the cookies for the next session and close the connections of the requests session."""
+        if self.logged_in:
+            self.save_cookies()
+        self.session.close()
+
+def connect(credentials_path: str, user_agent: str, api_sleep: Optional[float] = None, cache_directory: Optional[str] = SESSION_CACHE_DIRECTORY) -> WikibaseSession:
+    """Log in to the Wikibase whose URL and bot credentials are in a credentials file and return the session."""
+    base_url, username, password = retrieve_credentials(credentials_path)
+    return WikibaseSession(base_url, username, password, user_agent, api_sleep, cache_directory=cache_directory)
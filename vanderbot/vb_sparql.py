@@ -0,0 +1,1267 @@
+# Shared SPARQL client.  vb_sparql.py
+# (c) 2026 Vanderbilt University, except Sparqler class: (c) 2022-2023 Steven J. Baskauf (same license)
+# This program is released under a GNU General Public License v3.0 http://www.gnu.org/licenses/gpl-3.0
+# Author: Steve Baskauf
+# For more information, see https://github.com/HeardLibrary/linked-data/tree/master/vanderbot
+
+# This file contains the code used by the scripts in this repository to send SPARQL queries and updates. It is the
+# only copy: the scripts in the commonsbot, commonsbot/wcqs, gallery, sparql, and swj directories add this directory
+# to sys.path to import it. (load_neptune.py keeps its own small urllib3 client so that the lambda is a single file.)
+# Previously there were several copies of the Sparqler class (commonstool.py, wcqs_query.py, sparql_gui.py, load_neptune.py), the Query class
+# of vb_common_code.py, and calls to requests.post() in many scripts. None of them reused connections, so every query
+# paid for a new TCP connection and TLS handshake, and load_neptune.py made a new connection pool for every request.
+#
+# All requests go through one urllib3 PoolManager, which keeps a pool of open (keep-alive) connections to each host.
+# urllib3 is used rather than requests because it is the only HTTP library available in AWS Lambda (load_neptune.py),
+# and it is installed wherever requests is. It is imported when the first request is made.
+#
+# Each endpoint has its own settings (see configure_endpoint()):
+#  - interval: minimum number of seconds between the starts of consecutive requests to the endpoint, from any thread
+#  - timeout: seconds to wait for a response; None to wait as long as it takes (e.g. for Neptune LOAD and DROP updates)
+#  - retries: number of times a request is sent again if there is no connection or the server answers 429 (too many
+#    requests), 502, or 503. The pause before each retry doubles, and is never shorter than the Retry-After header.
+#  - concurrency: number of requests from asyncio code (see AsyncSparqler) that may be in progress at the same time.
+#    Defaults to 1 for the public Wikidata and Commons Query Services and to DEFAULT_CONCURRENCY for other endpoints.
+# A request that times out while waiting for the response raises QueryTimeout and is not retried, since sending the
+# same query again would most likely time out again (see run_values_query(), which splits it instead).
+#
+# The Sparqler class has the interface of the previous copies. Its query() method converts the response with a parser
+# that depends on the media type, e.g. a SELECT query with JSON results returns the list of bindings. Other parsers can
+# be passed to query() or registered for a media type with register_parser().
+#
+# Large SELECT results can be streamed instead (Sparqler.query_stream() and iter_results()). The rows are read from the
+# connection and yielded one at a time as they arrive, so the whole response never has to be in memory: JSON results
+# are parsed one binding at a time with the decoder of the json module, and CSV and TSV results one line at a time.
+# Previously the text of a response, the dictionary from json(), and the list of bindings copied from it were all in
+# memory at the same time.
+#
+# Query results can be kept in a QueryCache, a SQLite database (by default ~/.vanderbot/sparql_cache.sqlite) that is
+# shared by all runs of all scripts. A Sparqler with a cache returns the saved response of a query that was made before
+# instead of sending it again, as long as the result is younger than its time to live (TTL). Queries are looked up by the
+# endpoint, the media type, the graphs, and the text of the query with its comments removed and runs of white space
+# outside of strings and IRIs replaced by one space, so differences in indentation don't matter. When the database is
+# larger than its size limit, the results that were used least recently are deleted. An update sent by a Sparqler deletes
+# the saved results of its endpoint.
+#
+# Many queries screen their results with a VALUES list of Q IDs. run_values_query() sends such a query in chunks of ids
+# and combines the results. If the query for a chunk times out or fails with a 5xx status, the chunk is split in half
+# and both halves are sent, down to a minimum chunk size. The chunk size that worked is saved for each query template
+# (by default in ~/.vanderbot/values_chunk_sizes.json), so the next run of the same query starts with it instead of
+# timing out again on the first chunks. Previously only vanderbot.py split queries (with a copy of this code in
+# vb_labels.py), while count_entities.py reported an empty result and acquire_wikidata_metadata.py crashed.
+#
+# AsyncSparqler sends queries and updates from asyncio code, and gather_queries(), gather_template(), and gather_updates()
+# send many of them at once (run_queries(), run_template(), and run_updates() do the same from synchronous code). The
+# requests to each endpoint are limited by a semaphore to the concurrency of the endpoint, and a query that is identical
+# to one already in progress waits for its result instead of being sent again. The public Wikidata and Commons Query
+# Services keep a concurrency of 1, so they still get one query at a time with a pause between them. Our own endpoints
+# (e.g. the Neptune reader at sparql.vanderbilt.edu or a local Fuseki) get several queries at a time without pauses,
+# instead of waiting for each query and then sleeping before sending the next one.
+
+import codecs
+import csv
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import urllib.parse
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List, Dict, Optional, Any, Callable, Iterator
+
+DEFAULT_ENDPOINT = 'https://query.wikidata.org/sparql'
+CONNECT_TIMEOUT = 10.0 # seconds to wait for a connection to be made
+POOL_SIZE = 10 # open connections kept for each host
+CHUNK_SIZE = 65536 # bytes read at a time from a streamed response
+RETRY_STATUSES = [429, 502, 503]
+BASE_DELAY = 1.0 # seconds before the first retry
+PUBLIC_HOSTS = ['query.wikidata.org', 'commons-query.wikimedia.org'] # endpoints that are sent one query at a time
+DEFAULT_CONCURRENCY = 4 # requests in progress at the same time from asyncio code to other endpoints
+
+class SparqlError(Exception):
+    """Raised when no response can be got from an endpoint after all retries."""
+    pass
+
+class QueryTimeout(SparqlError):
+    """Raised when an endpoint did not answer within the timeout."""
+    pass
+
+class ServerError(SparqlError):
+    """Raised when an endpoint answered with a 5xx status other than a timeout."""
+    pass
+
+class Response:
+    """Status, headers, and body of a response, with the text and json() of a requests response.
+
+    The headers are the case-insensitive HTTPHeaderDict of urllib3, since servers may send e.g. content-type instead of
+    Content-Type. A plain dictionary may be passed if its keys are in the canonical form (as QueryCache.get() does).
+    """
+    def __init__(self, status_code: int, headers: Dict[str, str], content: bytes):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+
+    @property
+    def text(self) -> str:
+        charset = 'utf-8'
+        content_type = self.headers.get('Content-Type', '')
+        if 'charset=' in content_type:
+            charset = content_type.split('charset=')[1].split(';')[0].strip()
+        return self.content.decode(charset, errors='replace')
+
+    def json(self) -> Any:
+        return json.loads(self.text)
+
+class StreamingResponse:
+    """Status and headers of a response whose body is read from the connection as it is used."""
+    def __init__(self, raw: Any, url: str):
+        self.raw = raw # urllib3.HTTPResponse
+        self.url = url
+        self.status_code = raw.status
+        self.headers = raw.headers # case-insensitive urllib3.HTTPHeaderDict
+        self.finished = False # True when the whole body has been read
+
+    def iter_content(self, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+        """Yield the body in chunks of bytes. The connection is returned to the pool when the body has been read."""
+        import urllib3
+        try:
+            while True:
+                try:
+                    chunk = self.raw.read(chunk_size)
+                except urllib3.exceptions.ReadTimeoutError:
+                    raise QueryTimeout('Results from ' + endpoint_key(self.url) + ' stopped arriving')
+                if not chunk:
+                    self.finished = True
+                    break
+                yield chunk
+        finally:
+            self.close()
+
+    def read(self) -> Response:
+        """Read the rest of the body and return the complete Response."""
+        return Response(self.status_code, self.headers, b''.join(self.iter_content()))
+
+    def close(self) -> None:
+        """Stop reading. A connection whose body wasn't read to the end is closed rather than reused."""
+        if not self.finished:
+            self.raw.close()
+        self.raw.release_conn()
+
+class RequestSpacer:
+    """Keeps the starts of requests made by any number of threads at least interval seconds apart."""
+    def __init__(self, interval: float = 0.0):
+        self.interval = float(interval)
+        self.lock = threading.Lock()
+        self.next_start = 0.0
+
+    def wait(self) -> None:
+        """Block until interval seconds have passed since the start of the previous request."""
+        with self.lock: # holding the lock while sleeping makes the other threads queue up behind this one
+            now = time.monotonic()
+            if now < self.next_start:
+                time.sleep(self.next_start - now)
+                now = self.next_start
+            self.next_start = now + self.interval
+
+class EndpointSettings(RequestSpacer):
+    """Throttling, timeout, retries, and asyncio concurrency for the requests to one endpoint."""
+    def __init__(self, interval: float = 0.0, timeout: Optional[float] = None, retries: int = 2, concurrency: int = DEFAULT_CONCURRENCY):
+        RequestSpacer.__init__(self, interval)
+        self.timeout = timeout
+        self.retries = retries
+        self.concurrency = concurrency
+
+settings_lock = threading.Lock()
+endpoint_settings = {} # EndpointSettings keyed by endpoint URL
+pool = None # urllib3.PoolManager shared by all requests
+
+def endpoint_key(url: str) -> str:
+    """Return the endpoint URL without any query string."""
+    return url.split('?')[0]
+
+def is_public(url: str) -> bool:
+    """Return True if the URL is of a public Query Service (PUBLIC_HOSTS) that must be sent one query at a time."""
+    return urllib.parse.urlsplit(url).hostname in PUBLIC_HOSTS
+
+def get_settings(url: str) -> EndpointSettings:
+    """Return the settings of the endpoint of a URL, made with the defaults if it hasn't been configured."""
+    with settings_lock:
+        key = endpoint_key(url)
+        if key not in endpoint_settings:
+            endpoint_settings[key] = EndpointSettings(concurrency=1 if is_public(key) else DEFAULT_CONCURRENCY)
+        return endpoint_settings[key]
+
+def configure_endpoint(endpoint: str, interval: Optional[float] = None, timeout: Optional[float] = None, retries: Optional[int] = None, concurrency: Optional[int] = None) -> EndpointSettings:
+    """Change the settings of an endpoint. Settings that are None are left as they are. Returns the settings."""
+    settings = get_settings(endpoint)
+    if concurrency is not None:
+        settings.concurrency = max(1, int(concurrency))
+    if interval is not None:
+        settings.interval = float(interval)
+    if timeout is not None:
+        settings.timeout = timeout
+    if retries is not None:
+        settings.retries = int(retries)
+    return settings
+
+def pool_manager() -> 'urllib3.PoolManager':
+    """Return the shared connection pool, making it the first time."""
+    global pool
+    with settings_lock:
+        if pool is None:
+            import urllib3 # imported here so that scripts that import this module start quickly
+            pool = urllib3.PoolManager(num_pools=20, maxsize=POOL_SIZE)
+        return pool
+
+def request(method: str, url: str, body: Optional[bytes] = None, params: Optional[Dict[str, Any]] = None, headers: Optional[Dict[str, str]] = None, timeout: Optional[float] = None, stream: bool = False) -> Any:
+    """Send an HTTP request through the shared connection pool, using the settings of the endpoint.
+
+    Parameters
+    ----------
+    params : dict, optional
+        Fields to be URL-encoded into the query string. Values may be lists for repeated fields.
+    timeout : float, optional
+        Seconds to wait for the response, if different from the timeout of the endpoint.
+    stream : bool
+        If True, a StreamingResponse is returned as soon as the headers have arrived, instead of a Response.
+
+    Note
+    ----
+    Raises QueryTimeout if the response takes longer than the timeout, ServerError if the endpoint still answers with 502 or
+    503 after all retries, and SparqlError if it can't be reached or still answers with 429. Other error statuses are
+    returned for the caller to handle.
+    """
+    import urllib3 # already imported by pool_manager(); this makes the name available here
+    http = pool_manager()
+    settings = get_settings(url)
+    if timeout is None:
+        timeout = settings.timeout
+    if params:
+        url += ('&' if '?' in url else '?') + urllib.parse.urlencode(params, doseq=True)
+    failure = ''
+    error_class = SparqlError
+    for attempt in range(settings.retries + 1):
+        if attempt > 0:
+            time.sleep(pause)
+        settings.wait()
+        pause = BASE_DELAY * 2 ** attempt
+        try:
+            r = http.request(method, url, body=body, headers=headers, retries=False, preload_content=not stream, timeout=urllib3.Timeout(connect=CONNECT_TIMEOUT, read=timeout))
+        except urllib3.exceptions.ReadTimeoutError:
+            raise QueryTimeout('No response from ' + endpoint_key(url) + ' after ' + str(timeout) + ' s')
+        except urllib3.exceptions.HTTPError as error: # no connection, connection closed, etc.
+            failure = str(error)
+            error_class = SparqlError
+            continue
+        if r.status in RETRY_STATUSES:
+            if stream:
+                r.drain_conn() # so that the connection can be reused
+                r.release_conn()
+            failure = 'HTTP status ' + str(r.status)
+            error_class = ServerError if r.status >= 500 else SparqlError
+            try:
+                pause = max(pause, float(r.headers['Retry-After'])) # never retry sooner than the server asked
+            except (KeyError, ValueError):
+                pass
+            continue
+        if stream:
+            return StreamingResponse(r, url)
+        return Response(r.status, r.headers, r.data)
+    raise error_class('No usable response from ' + endpoint_key(url) + ' after ' + str(settings.retries + 1) + ' tries: ' + failure)
+
+def get(url: str, params: Optional[Dict[str, Any]] = None, headers: Optional[Dict[str, str]] = None, timeout: Optional[float] = None, stream: bool = False) -> Any:
+    """Send a GET request through the shared connection pool. See request()."""
+    return request('GET', url, params=params, headers=headers, timeout=timeout, stream=stream)
+
+def post(url: str, data: Any, headers: Optional[Dict[str, str]] = None, timeout: Optional[float] = None, stream: bool = False) -> Any:
+    """Send a POST request through the shared connection pool. See request().
+
+    data may be bytes or a string (sent as they are, e.g. a query with Content-Type application/sparql-query) or a
+    dictionary of fields (URL-encoded, with Content-Type application/x-www-form-urlencoded if no Content-Type is given).
+    """
+    headers = dict(headers) if headers is not None else {}
+    if isinstance(data, dict):
+        body = urllib.parse.urlencode(data, doseq=True).encode('utf-8')
+        if not any(name.lower() == 'content-type' for name in headers):
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+    elif isinstance(data, str):
+        body = data.encode('utf-8')
+    else:
+        body = data
+    return request('POST', url, body=body, headers=headers, timeout=timeout, stream=stream)
+
+# ------------------------
+# Result parsers
+# ------------------------
+
+# A parser takes a Response and the query form ("select", "ask", "construct", or "describe") and returns the results.
+
+def parse_json_results(response: Response, form: str) -> Any:
+    """SPARQL JSON results: the list of bindings for SELECT, True or False for ASK, or None if there is an error."""
+    try:
+        data = response.json()
+    except ValueError:
+        return None # Returns no value if an error.
+    try:
+        if form == 'select':
+            return data['results']['bindings'] # Extract the values from the response JSON
+        return data['boolean'] # True or False result from ASK query
+    except (KeyError, TypeError):
+        return None
+
+def parse_json(response: Response, form: str) -> Any:
+    """Any JSON response (e.g. after an update), or None if it isn't JSON."""
+    try:
+        return response.json()
+    except ValueError:
+        return None
+
+def parse_text(response: Response, form: str) -> str:
+    """The body of the response as text, e.g. Turtle from a CONSTRUCT query."""
+    return response.text
+
+def parse_csv(response: Response, form: str) -> List[Dict[str, str]]:
+    """SPARQL CSV results as a list of dictionaries keyed by variable name."""
+    return list(csv.DictReader(response.text.splitlines()))
+
+def parse_tsv(response: Response, form: str) -> List[Dict[str, str]]:
+    """SPARQL TSV results as a list of dictionaries keyed by variable name (without the leading "?"). Values keep their
+    RDF term syntax, e.g. <http://www.wikidata.org/entity/Q42> or "Douglas Adams"@en."""
+    lines = response.text.splitlines()
+    if len(lines) == 0:
+        return []
+    variables = [variable.lstrip('?') for variable in lines[0].split('\t')]
+    return [dict(zip(variables, line.split('\t'))) for line in lines[1:]]
+
+# Parsers for the response media types. Media types that aren't listed are returned as text.
+PARSERS = {
+    'application/sparql-results+json': parse_json_results,
+    'application/json': parse_json,
+    'text/csv': parse_csv,
+    'text/tab-separated-values': parse_tsv
+    }
+
+def register_parser(media_type: str, parser: Callable[[Response, str], Any]) -> None:
+    """Use a parser for all query results of a media type."""
+    PARSERS[media_type] = parser
+
+# ------------------------
+# Streaming result parsers
+# ------------------------
+
+# A streaming parser takes an iterator of chunks of bytes (StreamingResponse.iter_content()) and yields the rows one at a time.
+
+WHITE_SPACE_PATTERN = re.compile(r'[ \t\r\n]*')
+
+class JsonReader:
+    """Reads JSON values one at a time from text that arrives in chunks."""
+    def __init__(self, chunks: Iterator[bytes]):
+        self.chunks = iter(chunks)
+        self.decoder = codecs.getincrementaldecoder('utf-8')()
+        self.json_decoder = json.JSONDecoder()
+        self.buffer = ''
+        self.position = 0
+        self.finished = False
+
+    def more(self) -> bool:
+        """Add the next chunk to the buffer. Returns False if there are no more chunks."""
+        if self.finished:
+            return False
+        chunk = next(self.chunks, None)
+        if chunk is None:
+            self.finished = True
+            self.buffer += self.decoder.decode(b'', final=True)
+            return False
+        self.buffer = self.buffer[self.position:] + self.decoder.decode(chunk) # drop the text that has been read
+        self.position = 0
+        return True
+
+    def error(self, expected: str) -> SparqlError:
+        """Return the exception for text that isn't SPARQL JSON results, e.g. the message of a query that timed out after
+        the first results were sent (WDQS adds the Java exception to the end of the partial results)."""
+        while self.more(): # read the rest of the response to look for a timeout message
+            pass
+        rest = self.buffer[self.position:]
+        if 'TimeoutException' in rest:
+            return QueryTimeout('The query timed out after some of the results were sent')
+        return SparqlError('Expected ' + expected + ' in SPARQL JSON results but found: ' + rest[:200])
+
+    def peek(self) -> str:
+        """Skip white space and return the next character without reading it, or the empty string at the end."""
+        while True:
+            self.position = WHITE_SPACE_PATTERN.match(self.buffer, self.position).end()
+            if self.position < len(self.buffer) or not self.more():
+                return self.buffer[self.position:self.position + 1]
+
+    def expect(self, characters: str) -> str:
+        """Read the next character, which must be one of characters."""
+        character = self.peek()
+        if character == '' or character not in characters:
+            raise self.error('"' + '" or "'.join(characters) + '"')
+        self.position += 1
+        return character
+
+    def value(self) -> Any:
+        """Read the next complete JSON value."""
+        self.peek()
+        while True:
+            try:
+                value, end = self.json_decoder.raw_decode(self.buffer, self.position)
+                # A number at the end of the buffer may continue in the next chunk
+                if end < len(self.buffer) or self.finished:
+                    self.position = end
+                    return value
+            except json.JSONDecodeError:
+                if self.finished:
+                    raise self.error('a value') from None
+            if not self.more() and self.buffer[self.position:].strip() == '':
+                raise self.error('a value')
+
+    def members(self) -> Iterator[str]:
+        """Read an object and yield its keys. The value of each key must be read before the next key is requested."""
+        self.expect('{')
+        if self.peek() == '}':
+            self.position += 1
+            return
+        while True:
+            key = self.value()
+            self.expect(':')
+            yield key
+            if self.expect(',}') == '}':
+                return
+
+    def items(self) -> Iterator[Any]:
+        """Read an array and yield its values."""
+        self.expect('[')
+        if self.peek() == ']':
+            self.position += 1
+            return
+        while True:
+            yield self.value()
+            if self.expect(',]') == ']':
+                return
+
+def iter_json_bindings(chunks: Iterator[bytes]) -> Iterator[Dict[str, Dict[str, str]]]:
+    """Yield the bindings of SPARQL JSON results (application/sparql-results+json) one at a time."""
+    reader = JsonReader(chunks)
+    for key in reader.members():
+        if key != 'results':
+            reader.value() # head, or boolean for ASK
+            continue
+        for results_key in reader.members():
+            if results_key == 'bindings':
+                for binding in reader.items():
+                    yield binding
+            else:
+                reader.value()
+
+def iter_lines(chunks: Iterator[bytes]) -> Iterator[str]:
+    """Yield the lines of UTF-8 text that arrives in chunks, with their line endings."""
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    rest = ''
+    for chunk in chunks:
+        lines = (rest + decoder.decode(chunk)).split('\n')
+        rest = lines.pop()
+        for line in lines:
+            yield line + '\n'
+    rest += decoder.decode(b'', final=True)
+    if rest:
+        yield rest
+
+def iter_csv_rows(chunks: Iterator[bytes]) -> Iterator[Dict[str, str]]:
+    """Yield the rows of SPARQL CSV results as dictionaries keyed by variable name. Values may contain line breaks."""
+    for row in csv.DictReader(iter_lines(chunks)):
+        yield row
+
+def iter_tsv_rows(chunks: Iterator[bytes]) -> Iterator[Dict[str, str]]:
+    """Yield the rows of SPARQL TSV results like parse_tsv(). Line breaks in TSV values are always escaped, so each line is a row."""
+    lines = iter_lines(chunks)
+    header = next(lines, None)
+    if header is None:
+        return
+    variables = [variable.lstrip('?') for variable in header.rstrip('\r\n').split('\t')]
+    for line in lines:
+        yield dict(zip(variables, line.rstrip('\r\n').split('\t')))
+
+# Streaming parsers for the response media types
+STREAM_PARSERS = {
+    'application/sparql-results+json': iter_json_bindings,
+    'application/json': iter_json_bindings,
+    'text/csv': iter_csv_rows,
+    'text/tab-separated-values': iter_tsv_rows
+    }
+
+def iter_response(response: StreamingResponse, media_type: str = '') -> Iterator[Dict[str, Any]]:
+    """Yield the rows of a streamed SELECT response, parsed according to the requested media_type or its Content-Type.
+
+    Note
+    ----
+    Raises QueryTimeout if the endpoint reports a timeout (status 504, or 500 with java.util.concurrent.TimeoutException
+    in the body, as returned by WDQS), ServerError for other 5xx statuses, and SparqlError for any other status than 200
+    or a media type without a streaming parser.
+    """
+    if response.status_code != 200:
+        text = response.read().text
+        if response.status_code == 504 or 'TimeoutException' in text:
+            raise QueryTimeout('Query timed out at ' + endpoint_key(response.url))
+        error_class = ServerError if response.status_code >= 500 else SparqlError
+        raise error_class('HTTP status ' + str(response.status_code) + ' from ' + endpoint_key(response.url) + ': ' + text[:500])
+    content_type = media_type
+    if content_type not in STREAM_PARSERS: # e.g. several types in the Accept header
+        content_type = response.headers.get('Content-Type', '').split(';')[0].strip()
+    if content_type not in STREAM_PARSERS:
+        response.close()
+        raise SparqlError('No streaming parser for results of type ' + content_type)
+    try:
+        for row in STREAM_PARSERS[content_type](response.iter_content()):
+            yield row
+    finally:
+        response.close() # if the caller stopped before the end
+
+def iter_results(url: str, data: Any, headers: Optional[Dict[str, str]] = None, timeout: Optional[float] = None) -> Iterator[Dict[str, Any]]:
+    """Send a SELECT query by POST (see post() for the forms of data) and yield the rows of the results as they arrive.
+
+    The request is sent when the first row is requested. See iter_response() for the exceptions.
+    """
+    media_type = headers.get('Accept', '') if headers is not None else ''
+    for row in iter_response(post(url, data, headers=headers, timeout=timeout, stream=True), media_type):
+        yield row
+
+# ------------------------
+# VALUES queries
+# ------------------------
+
+CHUNK_SIZE_PATH = str(Path.home()) + '/.vanderbot/values_chunk_sizes.json'
+
+class ChunkSizeMemory:
+    """Largest number of VALUES ids that worked for each query template, saved in a JSON file for later runs.
+
+    Parameters
+    ----------
+    path : str
+        Path of the JSON file. It is made the first time a size is saved.
+    """
+    def __init__(self, path: str = CHUNK_SIZE_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        self.sizes = None
+
+    def load(self) -> Dict[str, int]:
+        """Return the saved sizes, reading the file the first time. Call with the lock held."""
+        if self.sizes is None:
+            try:
+                with open(self.path, 'rt', encoding='utf-8') as file_object:
+                    self.sizes = json.load(file_object)
+            except (OSError, ValueError): # no file yet, or a damaged one that will be replaced
+                self.sizes = {}
+        return self.sizes
+
+    def get(self, template: str) -> Optional[int]:
+        """Return the saved size for a template, or None if there isn't one."""
+        with self.lock:
+            return self.load().get(template)
+
+    def put(self, template: str, size: int) -> None:
+        """Save the size for a template. The file is replaced in one step, so other runs never read a partial file."""
+        with self.lock:
+            sizes = self.load()
+            if sizes.get(template) == size:
+                return
+            sizes[template] = size
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                with open(self.path + '.tmp', 'wt', encoding='utf-8') as file_object:
+                    json.dump(sizes, file_object, indent=2, sort_keys=True)
+                os.replace(self.path + '.tmp', self.path)
+            except OSError: # the size is only a starting point for later runs, so not being able to save it isn't an error
+                pass
+
+chunk_size_memory = None # ChunkSizeMemory used when none is passed to run_values_query()
+
+def run_values_query(ids: List[Any], build_query: Callable[[List[Any]], str], send_query: Callable[[str], List[Any]], chunk_size: int = 500, min_chunk_size: int = 1, max_workers: int = 1, sleep_time: float = 0.0, template: str = '', memory: Optional[ChunkSizeMemory] = None) -> List[Any]:
+    """Run a query whose VALUES clause lists the ids in chunks and return all of the results in chunk order.
+
+    Parameters
+    ----------
+    ids : list
+        Identifiers (or tuples of values) to be put into the VALUES clause.
+    build_query : function
+        Takes a list of ids and returns the text of the query.
+    send_query : function
+        Takes the text of a query and returns a list of results. Must raise QueryTimeout if the query times out and
+        ServerError if the endpoint answers with another 5xx status (iter_results() and Sparqler.query_stream() do).
+    chunk_size : int
+        Maximum number of ids in a single query.
+    min_chunk_size : int
+        A chunk with this many ids or fewer is not split any further. Its QueryTimeout or ServerError is raised.
+    max_workers : int
+        Number of queries that may be in progress at the same time. Keep this at 1 for public endpoints like WDQS.
+    sleep_time : float
+        Minimum number of seconds between the start of one query and the start of the next.
+    template : str
+        Name of the query, e.g. the script and the kind of query. If given, the chunk size that worked is saved under
+        this name and the next run with the same name starts with it instead of chunk_size.
+    memory : ChunkSizeMemory
+        Where the chunk sizes are saved. Defaults to a ChunkSizeMemory at CHUNK_SIZE_PATH.
+
+    Note
+    ----
+    If the query for a chunk times out or fails with a 5xx status, the chunk is split in half and each half is retried.
+    The results for each chunk are kept in the order of the ids in the chunk, so the combined list is the same as it
+    would be if all of the ids had been sent in one query that returned its results in that order.
+
+    The size saved for a template is the largest chunk that succeeded and was smaller than every chunk that failed.
+    If no chunk failed, it is increased by half (up to chunk_size), so that a size saved when the endpoint was busy
+    doesn't stay small forever.
+    """
+    global chunk_size_memory
+    if len(ids) == 0:
+        return []
+    chunk_size = max(1, int(chunk_size))
+    min_chunk_size = max(1, int(min_chunk_size))
+    if template and memory is None:
+        with settings_lock:
+            if chunk_size_memory is None:
+                chunk_size_memory = ChunkSizeMemory()
+            memory = chunk_size_memory
+    start_size = chunk_size
+    if template:
+        saved_size = memory.get(template)
+        if saved_size is not None:
+            start_size = max(min_chunk_size, min(chunk_size, int(saved_size)))
+    spacer = RequestSpacer(sleep_time)
+    sizes_lock = threading.Lock()
+    succeeded = [] # numbers of ids in the chunks that worked and in those that failed
+    failed = []
+
+    def fetch(chunk):
+        spacer.wait()
+        try:
+            result = send_query(build_query(chunk))
+        except (QueryTimeout, ServerError) as error:
+            with sizes_lock:
+                failed.append(len(chunk))
+            if len(chunk) <= min_chunk_size:
+                raise
+            print('Query of', len(chunk), 'ids failed (' + str(error) + '), splitting it in half')
+            half = len(chunk) // 2
+            return fetch(chunk[:half]) + fetch(chunk[half:])
+        with sizes_lock:
+            succeeded.append(len(chunk))
+        return result
+
+    chunks = [ids[start:start + start_size] for start in range(0, len(ids), start_size)]
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, int(max_workers))) as executor:
+            chunk_results = list(executor.map(fetch, chunks)) # map() returns the results in the order of the chunks
+    finally:
+        if template:
+            if len(failed) > 0:
+                smallest_failure = min(failed)
+                working = [size for size in succeeded if size < smallest_failure]
+                if len(working) > 0:
+                    memory.put(template, max(working))
+                else:
+                    memory.put(template, max(min_chunk_size, smallest_failure // 2))
+            elif len(succeeded) > 0 and max(succeeded) == start_size: # the last chunk may be smaller than the others
+                memory.put(template, min(chunk_size, start_size + (start_size + 1) // 2))
+
+    results = []
+    for chunk_result in chunk_results:
+        results += chunk_result
+    return results
+
+# ------------------------
+# Query result cache
+# ------------------------
+
+QUERY_CACHE_PATH = str(Path.home()) + '/.vanderbot/sparql_cache.sqlite'
+
+# Strings (long and short, with either quote), IRIs, comments, and white space in the text of a query
+QUERY_TOKEN_PATTERN = re.compile(r'''("""[\s\S]*?"""|'{3}[\s\S]*?'{3}|"(?:[^"\\\n]|\\.)*"|'(?:[^'\\\n]|\\.)*'|<[^<>"{}|^`\\\s]*>)|(#[^\n]*|\s+)''')
+
+def normalize_query(query_string: str) -> str:
+    """Remove the comments from the text of a query and replace runs of white space outside of strings and IRIs with a space."""
+    pieces = []
+    position = 0
+    for match in QUERY_TOKEN_PATTERN.finditer(query_string):
+        if match.start() > position:
+            pieces.append(query_string[position:match.start()])
+        if match.group(1) is not None: # strings and IRIs are kept as they are
+            pieces.append(match.group(1))
+        elif len(pieces) > 0 and pieces[-1] != ' ':
+            pieces.append(' ')
+        position = match.end()
+    pieces.append(query_string[position:])
+    return ''.join(pieces).strip()
+
+def query_key(endpoint: str, query_string: str, media_type: str, default: Optional[List[str]] = None, named: Optional[List[str]] = None) -> str:
+    """Return a key that is the same for queries that differ only in comments and white space (see normalize_query())."""
+    parts = [endpoint_key(endpoint), media_type, normalize_query(query_string), default or [], named or []]
+    return hashlib.sha256(json.dumps(parts).encode('utf-8')).hexdigest()
+
+# Number of saves between recounts of the size of a cache, since other runs may add to or delete from the same file
+RECOUNT_PUTS = 100
+
+def is_complete(response: Response) -> bool:
+    """Return True if the body of a response is a whole result. WDQS sends status 200 before it runs a query, so a query
+    that times out ends with the text of a Java exception, and a dropped connection cuts the body short. JSON bodies
+    must parse and SPARQL JSON results must have a results or boolean member."""
+    media_type = response.headers.get('Content-Type', '').split(';')[0].strip().lower()
+    if media_type.endswith('json'):
+        try:
+            data = json.loads(response.content)
+        except ValueError:
+            return False
+        if media_type == 'application/sparql-results+json':
+            return isinstance(data, dict) and ('results' in data or 'boolean' in data)
+        return True
+    return b'TimeoutException' not in response.content
+
+class QueryCache:
+    """Responses to SPARQL queries saved in a SQLite database, so that they can be reused by later queries and runs.
+
+    Parameters
+    ----------
+    path : str
+        Path of the database file. It is made the first time the cache is used. ":memory:" for a cache that isn't saved.
+    ttl : float
+        Default number of seconds that a result is reused. Defaults to one week.
+    max_bytes : int
+        Maximum total size of the saved responses. Defaults to 100 MB.
+
+    Note
+    ----
+    Only responses with status 200 and a complete body are saved. The hits, misses (including expired results), stores, and evictions since
+    the cache was made are counted in the stats() dictionary.
+    """
+    def __init__(self, path: str = QUERY_CACHE_PATH, ttl: float = 7 * 24 * 3600, max_bytes: int = 100 * 2**20):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.connection = None
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self.total_bytes = None # size of the saved results, counted at the first put
+        self.puts_since_count = 0
+
+    def connect(self) -> Any:
+        """Return the connection to the database, opening it and making the table the first time. Call with the lock held."""
+        if self.connection is None:
+            import sqlite3 # imported here so that scripts without a cache don't load it
+            if self.path != ':memory:':
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), mode=0o700, exist_ok=True)
+            self.connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None) # autocommit
+            self.connection.execute('PRAGMA busy_timeout = 10000') # wait for another run that is writing
+            self.connection.execute('''CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, endpoint TEXT, query TEXT,
+                content_type TEXT, content BLOB, size INTEGER, expires REAL, last_used REAL)''')
+            self.connection.execute('CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used)')
+        return self.connection
+
+    def key(self, endpoint: str, query_string: str, media_type: str, default: Optional[List[str]] = None, named: Optional[List[str]] = None) -> str:
+        """Return the key under which the result of a query is saved."""
+        return query_key(endpoint, query_string, media_type, default, named)
+
+    def get(self, key: str) -> Optional[Response]:
+        """Return the saved response for a key, or None if there isn't one or it has expired."""
+        now = time.time()
+        with self.lock:
+            connection = self.connect()
+            row = connection.execute('SELECT content_type, content, expires FROM results WHERE key = ?', (key,)).fetchone()
+            if row is None or row[2] < now:
+                self.misses += 1
+                return None
+            connection.execute('UPDATE results SET last_used = ? WHERE key = ?', (now, key))
+            self.hits += 1
+        return Response(200, {'Content-Type': row[0]}, row[1])
+
+    def put(self, key: str, endpoint: str, query_string: str, response: Response, ttl: Optional[float] = None) -> None:
+        """Save a response with status 200 and a complete body (see is_complete()) under a key for ttl seconds (the
+        default TTL of the cache if None)."""
+        if response.status_code != 200 or not is_complete(response):
+            return
+        if ttl is None:
+            ttl = self.ttl
+        now = time.time()
+        with self.lock:
+            connection = self.connect()
+            if self.total_bytes is None or self.puts_since_count >= RECOUNT_PUTS:
+                self.count(connection)
+            row = connection.execute('SELECT size FROM results WHERE key = ?', (key,)).fetchone()
+            connection.execute('INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?)', (key, endpoint_key(endpoint),
+                query_string, response.headers.get('Content-Type', ''), response.content, len(response.content), now + ttl, now))
+            self.total_bytes += len(response.content) - (row[0] if row is not None else 0)
+            self.puts_since_count += 1
+            self.stores += 1
+            if self.total_bytes > self.max_bytes:
+                self.evict(connection)
+
+    def count(self, connection: Any) -> None:
+        """Delete expired results and recount the total size, which other runs using the same file may have changed."""
+        connection.execute('DELETE FROM results WHERE expires < ?', (time.time(),))
+        self.total_bytes = connection.execute('SELECT COALESCE(SUM(size), 0) FROM results').fetchone()[0]
+        self.puts_since_count = 0
+
+    def evict(self, connection: Any) -> None:
+        """Delete the least recently used results until the total size is a tenth under max_bytes, so that a full cache
+        isn't trimmed at every put."""
+        excess = self.total_bytes - int(0.9 * self.max_bytes)
+        if excess <= 0:
+            return
+        keys = []
+        for key, size in connection.execute('SELECT key, size FROM results ORDER BY last_used'):
+            keys.append(key)
+            excess -= size
+            self.total_bytes -= size
+            if excess <= 0:
+                break
+        connection.executemany('DELETE FROM results WHERE key = ?', [(key,) for key in keys])
+        self.evictions += len(keys)
+
+    def delete(self, key: str) -> None:
+        """Delete the saved result for a key, e.g. one that the parser couldn't read."""
+        with self.lock:
+            self.connect().execute('DELETE FROM results WHERE key = ?', (key,))
+            self.total_bytes = None # recounted at the next put
+
+    def invalidate(self, endpoint: Optional[str] = None) -> int:
+        """Delete the saved results of an endpoint, or all of them if endpoint is None. Returns the number deleted."""
+        with self.lock:
+            connection = self.connect()
+            if endpoint is None:
+                cursor = connection.execute('DELETE FROM results')
+            else:
+                cursor = connection.execute('DELETE FROM results WHERE endpoint = ?', (endpoint_key(endpoint),))
+            self.total_bytes = None # recounted at the next put
+        return cursor.rowcount
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the counts of hits, misses, stores, and evictions, the hit rate, and the number and size of saved results."""
+        with self.lock:
+            entries, size = self.connect().execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results').fetchone()
+            lookups = self.hits + self.misses
+            return {'hits': self.hits, 'misses': self.misses, 'hit_rate': self.hits / lookups if lookups > 0 else 0.0,
+                'stores': self.stores, 'evictions': self.evictions, 'entries': entries, 'bytes': size}
+
+    def close(self) -> None:
+        with self.lock:
+            if self.connection is not None:
+                self.connection.close()
+                self.connection = None
+
+# ------------------------
+# SPARQL query class
+# ------------------------
+
+# This is a version of the more full-featured script at
+# https://github.com/HeardLibrary/digital-scholarship/blob/master/code/wikidata/sparqler.py
+# that sends its requests through the shared connection pool.
+
+class Sparqler:
+    """Build SPARQL queries of various sorts
+
+    Parameters
+    -----------
+    useragent : str
+        Required if using the Wikidata Query Service, otherwise optional.
+        Use the form: appname/v.v (URL; mailto:email@domain.com)
+        See https://meta.wikimedia.org/wiki/User-Agent_policy
+    endpoint: URL
+        Defaults to Wikidata Query Service if not provided.
+    method: str
+        Possible values are "post" (default) or "get". Use "get" if read-only query endpoint.
+        Must be "post" for update endpoint.
+    session: requests.Session
+        If provided, its cookies are sent with every request. Note: required for the Commons Query Service.
+    cookies: dict
+        Cookies to be sent with every request, as an alternative to a session.
+    sleep: float
+        Minimum number of seconds between the starts of queries to the endpoint. Defaults to 0.1
+        The interval of the endpoint is only raised to this value, never lowered, since it is shared with the other
+        clients of the endpoint. Use configure_endpoint() to lower it.
+    timeout: float
+        Number of seconds to wait for a response. Defaults to no limit.
+    cache: QueryCache
+        If provided, query results are saved in it and reused. Defaults to no cache.
+    """
+    def __init__(self, method: str = 'post', endpoint: str = DEFAULT_ENDPOINT, useragent: Optional[str] = None, session: Optional[Any] = None, sleep: float = 0.1, cookies: Optional[Dict[str, str]] = None, timeout: Optional[float] = None, cache: Optional[QueryCache] = None):
+        # attributes for all methods
+        self.http_method = method
+        self.endpoint = endpoint
+        if useragent is None:
+            if self.endpoint == DEFAULT_ENDPOINT:
+                print('You must provide a value for the useragent argument when using the Wikidata Query Service.')
+                print()
+                raise KeyboardInterrupt # Use keyboard interrupt instead of sys.exit() because it works in Jupyter notebooks
+        self.sleep = sleep
+        self.timeout = timeout
+        self.cache = cache
+        self.response = ''
+        settings = get_settings(endpoint) # throttle shared by all requests to the endpoint
+        with settings.lock: # a client can make the throttle slower but never faster than other clients made it
+            settings.interval = max(settings.interval, float(sleep))
+
+        self.requestheader = {}
+        if useragent:
+            self.requestheader['User-Agent'] = useragent
+        if cookies is None:
+            cookies = {}
+        if session is not None:
+            cookies = dict({cookie.name: cookie.value for cookie in session.cookies}, **cookies)
+        if len(cookies) > 0:
+            self.requestheader['Cookie'] = '; '.join(name + '=' + value for name, value in cookies.items())
+
+    def send(self, payload: Dict[str, Any], media_type: str, method: Optional[str] = None, stream: bool = False) -> Any:
+        """Send the payload (query or update and graph IRIs) to the endpoint and return the Response (or StreamingResponse)."""
+        header = dict(self.requestheader, Accept=media_type)
+        if method is None:
+            method = self.http_method
+        if method == 'post':
+            response = post(self.endpoint, data=payload, headers=header, timeout=self.timeout, stream=stream)
+        else:
+            response = get(self.endpoint, params=payload, headers=header, timeout=self.timeout, stream=stream)
+        if not stream:
+            self.response = response.text
+        return response
+
+    def query(self, query_string: str, form: str = 'select', verbose: bool = False, **kwargs) -> Any:
+        """Send a SPARQL query to the endpoint.
+
+        Parameters
+        ----------
+        form : str
+            The SPARQL query form.
+            Possible values are: "select" (default), "ask", "construct", and "describe".
+        mediatype: str
+            The response media type (MIME type) of the query results.
+            Some possible values for "select" and "ask" are: "application/sparql-results+json" (default), "text/csv",
+            "text/tab-separated-values", and "application/sparql-results+xml".
+            Some possible values for "construct" and "describe" are: "text/turtle" (default) and "application/rdf+xml".
+            See https://docs.aws.amazon.com/neptune/latest/userguide/sparql-media-type-support.html#sparql-serialization-formats-neptune-output
+            for response serializations supported by Neptune.
+        parser: function
+            Converts the Response and query form into the returned value, instead of the parser for the media type.
+        ttl: float
+            Number of seconds that the result is reused if there is a cache, instead of the default TTL of the cache.
+        bypass: bool
+            If True, the cache is neither read nor written for this query. Defaults to False.
+        verbose: bool
+            Prints status when True. Defaults to False.
+        default: list of str
+            The graphs to be merged to form the default graph. List items must be URIs in string form.
+            If omitted, no graphs will be specified and default graph composition will be controlled by FROM clauses
+            in the query itself.
+            See https://www.w3.org/TR/sparql11-query/#namedGraphs and https://www.w3.org/TR/sparql11-protocol/#dataset
+            for details.
+        named: list of str
+            Graphs that may be specified by IRI in a query. List items must be URIs in string form.
+            If omitted, named graphs will be specified by FROM NAMED clauses in the query itself.
+
+        Returns
+        -------
+        If the form is "select" and mediatype is "application/sparql-results+json", a list of dictionaries containing the data.
+        If the form is "ask" and mediatype is "application/sparql-results+json", a boolean is returned.
+        If the mediatype is "application/sparql-results+json" and an error occurs, None is returned.
+        If the mediatype is "text/csv" or "text/tab-separated-values", a list of dictionaries of strings.
+        For other forms and mediatypes, the raw output is returned.
+
+        Notes
+        -----
+        To get UTF-8 text in the SPARQL queries to work properly, send URL-encoded text rather than raw text.
+        That is done automatically for both GET and POST.
+        See SPARQL 1.1 protocol notes at https://www.w3.org/TR/sparql11-protocol/#query-operation
+        """
+        if 'mediatype' in kwargs:
+            media_type = kwargs['mediatype']
+        elif form == 'construct' or form == 'describe':
+            media_type = 'text/turtle'
+        else:
+            media_type = 'application/sparql-results+json' # default for SELECT and ASK query forms
+
+        # Build the payload dictionary (query and graph data) to be sent to the endpoint
+        payload = {'query': query_string}
+        if 'default' in kwargs:
+            payload['default-graph-uri'] = kwargs['default']
+        if 'named' in kwargs:
+            payload['named-graph-uri'] = kwargs['named']
+
+        cache_key = None
+        response = None
+        if self.cache is not None and not kwargs.get('bypass', False):
+            cache_key = self.cache.key(self.endpoint, query_string, media_type, kwargs.get('default'), kwargs.get('named'))
+            response = self.cache.get(cache_key)
+            if response is not None:
+                self.response = response.text
+                if verbose:
+                    print('using saved result of the query')
+
+        saved = response is not None
+        if not saved:
+            if verbose:
+                print('querying SPARQL endpoint')
+            start_time = time.monotonic()
+            response = self.send(payload, media_type)
+            if verbose:
+                print('done retrieving data in', int(time.monotonic() - start_time), 's')
+
+        parser = kwargs.get('parser')
+        if parser is None:
+            parser = PARSERS.get(media_type, parse_text)
+        if form == 'construct' or form == 'describe':
+            parser = kwargs.get('parser', parse_text)
+        try:
+            result = parser(response, form)
+        except Exception:
+            if saved:
+                self.cache.delete(cache_key)
+            raise
+        # Only results that the parser could read are saved, and a saved result that it can't read is deleted.
+        if cache_key is not None:
+            if result is None and saved:
+                self.cache.delete(cache_key)
+            elif result is not None and not saved:
+                self.cache.put(cache_key, self.endpoint, query_string, response, kwargs.get('ttl'))
+        return result
+
+    def query_stream(self, query_string: str, mediatype: str = 'application/sparql-results+json', **kwargs) -> Iterator[Dict[str, Any]]:
+        """Send a SPARQL SELECT query and yield the rows of the results one at a time as they arrive.
+
+        Parameters
+        ----------
+        mediatype: str
+            "application/sparql-results+json" (default), "text/csv", or "text/tab-separated-values".
+        default: list of str
+            The graphs to be merged to form the default graph, as for query().
+        named: list of str
+            Graphs that may be specified by IRI in a query, as for query().
+
+        Returns
+        -------
+        For JSON results, an iterator of the bindings (dictionaries of dictionaries with type and value, as in the list
+        returned by query()). For CSV and TSV results, an iterator of dictionaries of strings keyed by variable name.
+
+        Notes
+        -----
+        The query is sent when the first row is requested. The results aren't saved in the cache. Raises QueryTimeout
+        if the endpoint reports a timeout, even after some rows have been yielded, and SparqlError for other errors.
+        """
+        payload = {'query': query_string}
+        if 'default' in kwargs:
+            payload['default-graph-uri'] = kwargs['default']
+        if 'named' in kwargs:
+            payload['named-graph-uri'] = kwargs['named']
+        for row in iter_response(self.send(payload, mediatype, stream=True), mediatype):
+            yield row
+
+    def update(self, request_string: str, mediatype: str = 'application/json', verbose: bool = False, **kwargs) -> Any:
+        """Send a SPARQL update to the endpoint.
+
+        Parameters
+        ----------
+        mediatype : str
+            The response media type (MIME type) from the endpoint after the update.
+            Default is "application/json"; probably no need to use anything different.
+        verbose: bool
+            Prints status when True. Defaults to False.
+        default: list of str
+            The graphs to be merged to form the default graph. List items must be URIs in string form.
+            If omitted, no graphs will be specified and default graph composition will be controlled by USING
+            clauses in the query itself.
+            See https://www.w3.org/TR/sparql11-update/#deleteInsert
+            and https://www.w3.org/TR/sparql11-protocol/#update-operation for details.
+        named: list of str
+            Graphs that may be specified by IRI in the graph pattern. List items must be URIs in string form.
+            If omitted, named graphs will be specified by USING NAMED clauses in the query itself.
+
+        Returns
+        -------
+        The response JSON if the mediatype is "application/json" (None if it isn't JSON), otherwise the response text.
+        """
+        # Build the payload dictionary (update request and graph data) to be sent to the endpoint
+        payload = {'update': request_string}
+        if 'default' in kwargs:
+            payload['using-graph-uri'] = kwargs['default']
+        if 'named' in kwargs:
+            payload['using-named-graph-uri'] = kwargs['named']
+
+        if verbose:
+            print('  beginning update')
+        start_time = time.monotonic()
+        response = self.send(payload, mediatype, method='post') # updates are always sent by POST
+        if self.cache is not None:
+            self.cache.invalidate(self.endpoint) # saved results from before the update may no longer be correct
+        if verbose:
+            print('  done updating data in', int(time.monotonic() - start_time), 's')
+
+        if mediatype != 'application/json':
+            return response.text
+        return parse_json(response, 'update')
+
+    def load(self, file_location: str, graph_uri: str, s3: str = '', verbose: bool = False, **kwargs) -> Any:
+        """Loads an RDF document into a specified graph.
+
+        Parameters
+        ----------
+        s3 : str
+            Name of an AWS S3 bucket containing the file. Omit load a generic URL.
+        verbose: bool
+            Prints status when True. Defaults to False.
+
+        Notes
+        -----
+        The triplestore may or may not rely on receiving a correct Content-Type header with the file to
+        determine the type of serialization. Blazegraph requires it, AWS Neptune does not and apparently
+        interprets serialization based on the file extension.
+        """
+        if s3:
+            request_string = 'LOAD <https://' + s3 + '.s3.amazonaws.com/' + file_location + '> INTO GRAPH <' + graph_uri + '>'
+        else:
+            request_string = 'LOAD <' + file_location + '> INTO GRAPH <' + graph_uri + '>'
+
+        if verbose:
+            print('Loading file:', file_location, ' into graph: ', graph_uri)
+        return self.update(request_string, verbose=verbose)
+
+    def drop(self, graph_uri: str, verbose: bool = False, **kwargs) -> Any:
+        """Drop a specified graph.
+
+        Parameters
+        ----------
+        verbose: bool
+            Prints status when True. Defaults to False.
+        """
+        request_string = 'DROP GRAPH <' + graph_uri + '>'
+
+        if verbose:
+            print('Deleting graph:', graph_uri)
+        return self.update(request_string, verbose=verbose)
+
+# ------------------------
+# Asynchronous queries
+# ------------------------
+
+ASYNC_THREADS = 32 # threads that send the requests of AsyncSparqlers, to all endpoints together
+loop_semaphores = weakref.WeakKeyDictionary() # for each asyncio event loop, a semaphore for each endpoint and concurrency
+async_executor = None # ThreadPoolExecutor shared by all AsyncSparqlers
+
+def executor() -> ThreadPoolExecutor:
+    """Return the threads that send the requests of AsyncSparqlers, making them the first time."""
+    global async_executor
+    with settings_lock:
+        if async_executor is None:
+            async_executor = ThreadPoolExecutor(max_workers=ASYNC_THREADS, thread_name_prefix='vb_sparql')
+        return async_executor
+
+def endpoint_semaphore(endpoint: str) -> 'asyncio.Semaphore':
+    """Return the semaphore that limits the requests to an endpoint from the running event loop to its concurrency."""
+    import asyncio
+    key = (endpoint_key(endpoint), get_settings(endpoint).concurrency) # a new semaphore if the concurrency is changed
+    semaphores = loop_semaphores.setdefault(asyncio.get_running_loop(), {}) # only used by the thread of the loop
+    if key not in semaphores:
+        semaphores[key] = asyncio.Semaphore(key[1])
+    return semaphores[key]
+
+class AsyncSparqler:
+    """Send SPARQL queries and updates from asyncio code.
+
+    Parameters
+    ----------
+    concurrency : int
+        Number of requests to the endpoint that may be in progress at the same time, shared with all other AsyncSparqlers
+        for the endpoint. If omitted, the concurrency of the endpoint is left as it is (see configure_endpoint()).
+    sleep : float
+        Minimum number of seconds between the starts of requests to the endpoint. Defaults to 0.1 for the public
+        Wikidata and Commons Query Services and to 0 for other endpoints. As for Sparqler, it never lowers the interval
+        that was already set for the endpoint.
+    Other parameters are the same as for Sparqler.
+
+    Notes
+    -----
+    The requests are sent by a Sparqler (the sparqler attribute) in a pool of ASYNC_THREADS threads, so they share the
+    connection pool, settings, and cache of the synchronous code. While a query is in progress, an
+    identical query (the same text apart from comments and white space, media type, graphs, form, and parser) waits for
+    it and gets the same result object instead of sending another request. Those results shouldn't be changed in place.
+    """
+    def __init__(self, method: str = 'post', endpoint: str = DEFAULT_ENDPOINT, useragent: Optional[str] = None, session: Optional[Any] = None, sleep: Optional[float] = None, cookies: Optional[Dict[str, str]] = None, timeout: Optional[float] = None, cache: Optional[QueryCache] = None, concurrency: Optional[int] = None):
+        if sleep is None:
+            sleep = 0.1 if is_public(endpoint) else 0.0
+        self.sparqler = Sparqler(method=method, endpoint=endpoint, useragent=useragent, session=session, sleep=sleep, cookies=cookies, timeout=timeout, cache=cache)
+        self.endpoint = endpoint
+        if concurrency is not None:
+            configure_endpoint(endpoint, concurrency=concurrency)
+        self.pending = {} # futures of the queries in progress, keyed by query
+        self.coalesced = 0 # number of queries that waited for an identical query instead of being sent
+
+    async def run(self, function: Callable[..., Any], *args, **kwargs) -> Any:
+        """Call a blocking function in one of the request threads once the semaphore of the endpoint allows it."""
+        import asyncio
+        import functools
+        async with endpoint_semaphore(self.endpoint):
+            return await asyncio.get_running_loop().run_in_executor(executor(), functools.partial(function, *args, **kwargs))
+
+    async def query(self, query_string: str, form: str = 'select', **kwargs) -> Any:
+        """Send a SPARQL query to the endpoint. The arguments and the returned value are the same as for Sparqler.query()."""
+        import asyncio
+        loop = asyncio.get_running_loop()
+        if 'mediatype' in kwargs:
+            media_type = kwargs['mediatype']
+        else:
+            media_type = 'text/turtle' if form == 'construct' or form == 'describe' else 'application/sparql-results+json'
+        key = (query_key(self.endpoint, query_string, media_type, kwargs.get('default'), kwargs.get('named')), form, kwargs.get('parser'))
+        future = self.pending.get(key)
+        if future is not None and future.get_loop() is loop:
+            self.coalesced += 1
+        else:
+            future = asyncio.ensure_future(self.run(self.sparqler.query, query_string, form=form, **kwargs))
+            self.pending[key] = future
+            future.add_done_callback(lambda done: self.pending.pop(key, None) if self.pending.get(key) is done else None)
+        return await asyncio.shield(future) # a caller that is cancelled doesn't cancel the request for the others
+
+    async def update(self, request_string: str, **kwargs) -> Any:
+        """Send a SPARQL update to the endpoint. Updates are never combined. See Sparqler.update()."""
+        return await self.run(self.sparqler.update, request_string, **kwargs)
+
+async def gather_queries(sparqler: AsyncSparqler, query_strings: List[str], return_exceptions: bool = False, **kwargs) -> List[Any]:
+    """Send queries as fast as the concurrency of the endpoint allows and return their results in the same order.
+
+    Parameters
+    ----------
+    return_exceptions : bool
+        If True, the exception raised by a query is put in the list in place of its result instead of being raised.
+    Other keyword arguments are passed to AsyncSparqler.query().
+    """
+    import asyncio
+    return await asyncio.gather(*[sparqler.query(query_string, **kwargs) for query_string in query_strings], return_exceptions=return_exceptions)
+
+async def gather_template(sparqler: AsyncSparqler, build_query: Callable[[Any], str], values: List[Any], return_exceptions: bool = False, **kwargs) -> List[Any]:
+    """Send the query built by build_query() for each value, e.g. a lookup for each Q ID, and return the results in the order of the values."""
+    return await gather_queries(sparqler, [build_query(value) for value in values], return_exceptions=return_exceptions, **kwargs)
+
+async def gather_updates(sparqler: AsyncSparqler, request_strings: List[str], return_exceptions: bool = False, **kwargs) -> List[Any]:
+    """Send updates that don't depend on each other as fast as the concurrency of the endpoint allows. See gather_queries()."""
+    import asyncio
+    return await asyncio.gather(*[sparqler.update(request_string, **kwargs) for request_string in request_strings], return_exceptions=return_exceptions)
+
+# The following functions run the gather functions from synchronous code. They can't be used where an event loop is
+# already running (e.g. in a Jupyter notebook); await the gather functions there instead.
+
+def run_queries(sparqler: AsyncSparqler, query_strings: List[str], return_exceptions: bool = False, **kwargs) -> List[Any]:
+    """Run gather_queries() in a new event loop and return its results."""
+    import asyncio
+    return asyncio.run(gather_queries(sparqler, query_strings, return_exceptions=return_exceptions, **kwargs))
+
+def run_template(sparqler: AsyncSparqler, build_query: Callable[[Any], str], values: List[Any], return_exceptions: bool = False, **kwargs) -> List[Any]:
+    """Run gather_template() in a new event loop and return its results."""
+    import asyncio
+    return asyncio.run(gather_template(sparqler, build_query, values, return_exceptions=return_exceptions, **kwargs))
+
+def run_updates(sparqler: AsyncSparqler, request_strings: List[str], return_exceptions: bool = False, **kwargs) -> List[Any]:
+    """Run gather_updates() in a new event loop and return its results."""
+    import asyncio
+    return asyncio.run(gather_updates(sparqler, request_strings, return_exceptions=return_exceptions, **kwargs))
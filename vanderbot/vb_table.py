@@ -0,0 +1,325 @@
+# VanderBot columnar table.  vb_table.py
+# (c) 2026 Vanderbilt University. This program is released under a GNU General Public License v3.0 http://www.gnu.org/licenses/gpl-3.0
+# Author: Steve Baskauf
+# For more information, see https://github.com/HeardLibrary/linked-data/tree/master/vanderbot
+
+# This file contains code used by vanderbot.py and acquire_wikidata_metadata.py to hold a CSV table in memory. Previously
+# tables were read with csv.DictReader into a list of dictionaries, one per row. With large tables (e.g. 200 000 rows of
+# 120 columns) the dictionaries and the separate string object for every cell take several gigabytes. Instead, a Table
+# keeps one list of values for each column. Repeated values (Q IDs of common items, languages, dates, empty cells) are
+# stored once and shared by all of the cells that contain them, and all empty cells share the same empty string. Rows
+# are accessed through light-weight Row views that support row[column], so code that was written for dictionaries
+# doesn't need to change.
+#
+# Reading a CSV and writing it back produces exactly the same bytes as DictReader followed by DictWriter did: blank lines
+# are skipped, rows with missing values at the end are filled with empty strings, and the excel dialect is used.
+#
+# Tables can also be stored as Parquet or Arrow IPC (Feather version 2) files, which are much faster to load than CSV and
+# can be read with only some of their columns. The format is chosen by the file name extension (see FORMAT_EXTENSIONS);
+# all other file names are treated as CSV. These formats require the pyarrow package, which is imported only when such a
+# file is used. All values are stored as strings. Use convert_table.py to export a table to CSV for editing by hand and to
+# convert it back.
+
+import csv
+import os
+from typing import List, Dict, Iterator, Optional, Any, Tuple, Set
+
+EMPTY = '' # the value of all empty cells
+READ_CHUNK_SIZE = 10000 # number of rows that are read before they are split into columns
+
+CSV_FORMAT = 'csv'
+PARQUET_FORMAT = 'parquet'
+ARROW_FORMAT = 'arrow'
+FORMAT_EXTENSIONS = {
+    '.parquet': PARQUET_FORMAT,
+    '.pq': PARQUET_FORMAT,
+    '.arrow': ARROW_FORMAT,
+    '.feather': ARROW_FORMAT,
+    '.ipc': ARROW_FORMAT
+}
+
+class Row:
+    """View of one row of a Table that behaves like the dictionary produced by csv.DictReader.
+
+    Values can be changed, but columns can't be added or removed. Assigning to a column that isn't in the table raises
+    a KeyError.
+    """
+    __slots__ = ('table', 'index')
+
+    def __init__(self, table: 'Table', index: int):
+        self.table = table
+        self.index = index
+
+    def __getitem__(self, column: str) -> Any:
+        return self.table.columns[self.table.column_index[column]][self.index]
+
+    def __setitem__(self, column: str, value: Any) -> None:
+        if value == '':
+            value = EMPTY
+        column_values = self.table.columns[self.table.column_index[column]]
+        if self.table.changed is not None and column_values[self.index] != value:
+            self.table.changed.setdefault(self.index, set()).add(column)
+        column_values[self.index] = value
+
+    def __contains__(self, column: object) -> bool:
+        return column in self.table.column_index
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.table.fieldnames)
+
+    def __len__(self) -> int:
+        return len(self.table.fieldnames)
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, (Row, dict)):
+            return dict(self.items()) == dict(other.items())
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return 'Row(' + repr(dict(self.items())) + ')'
+
+    def get(self, column: str, default: Any = None) -> Any:
+        if column in self.table.column_index:
+            return self[column]
+        return default
+
+    def keys(self) -> List[str]:
+        return list(self.table.fieldnames)
+
+    def values(self) -> List[Any]:
+        return [self[column] for column in self.table.fieldnames]
+
+    def items(self) -> List[Tuple[str, Any]]:
+        return [(column, self[column]) for column in self.table.fieldnames]
+
+    def update(self, values: Dict[str, Any]) -> None:
+        for column, value in values.items():
+            self[column] = value
+
+class Table:
+    """A CSV table stored as one list of values per column.
+
+    Parameters
+    ----------
+    fieldnames : list of str
+        Column headers in order. If a header is repeated, the values of the last column with that header are used, as
+        with csv.DictReader.
+
+    Note
+    ----
+    table[row_number] and iterating over the table give Row views. len(table) is the number of rows. After
+    track_changes(), the columns of each row whose values were changed through a Row are kept in the changed dictionary,
+    keyed by row number, until they are taken with take_changes().
+    """
+    def __init__(self, fieldnames: List[str]):
+        self.fieldnames = list(fieldnames)
+        self.column_index = {column: index for index, column in enumerate(self.fieldnames)}
+        self.columns = [[] for column in self.fieldnames]
+        self.row_count = 0
+        self.changed = None # sets of changed columns keyed by row number, or None if changes aren't tracked
+
+    def __len__(self) -> int:
+        return self.row_count
+
+    def __getitem__(self, row_number: int) -> Row:
+        if row_number < 0:
+            row_number += self.row_count
+        if row_number < 0 or row_number >= self.row_count:
+            raise IndexError('table row number out of range')
+        return Row(self, row_number)
+
+    def __iter__(self) -> Iterator[Row]:
+        for row_number in range(self.row_count):
+            yield Row(self, row_number)
+
+    def track_changes(self) -> None:
+        """Start keeping the changed cells, so that only they need to be saved rather than comparing every cell."""
+        if self.changed is None:
+            self.changed = {}
+
+    def take_changes(self, row_number: Optional[int] = None) -> Dict[int, Set[str]]:
+        """Return the changed columns of a row (or of all rows if row_number is None), keyed by row number, and forget them."""
+        if self.changed is None:
+            return {}
+        if row_number is None:
+            changed = self.changed
+            self.changed = {}
+            return changed
+        if row_number in self.changed:
+            return {row_number: self.changed.pop(row_number)}
+        return {}
+
+    def column(self, column: str) -> List[Any]:
+        """Return the list of values in a column. Changes to the list change the table."""
+        return self.columns[self.column_index[column]]
+
+    def extend_rows(self, rows: List[List[str]], strings: Dict[str, str]) -> None:
+        """Add rows of values in the order of the columns, sharing repeated strings through the strings dictionary."""
+        width = len(self.fieldnames)
+        for row in rows:
+            if len(row) < width:
+                row.extend([EMPTY] * (width - len(row)))
+        for column_values, values in zip(self.columns, zip(*rows)):
+            column_values.extend([strings.setdefault(value, value) for value in values])
+        self.row_count += len(rows)
+
+    def copy(self) -> 'Table':
+        """Return a copy of the table. The values are shared, but changing one table doesn't change the other."""
+        table = Table(self.fieldnames)
+        table.columns = [list(column_values) for column_values in self.columns]
+        table.row_count = self.row_count
+        return table
+
+    def write(self, file_object, fieldnames: Optional[List[str]] = None) -> None:
+        """Write the header and rows as CSV to an open file, with the columns in the order of fieldnames."""
+        if fieldnames is None:
+            fieldnames = self.fieldnames
+        empty_column = [EMPTY] * self.row_count
+        columns = []
+        for column in fieldnames:
+            if column in self.column_index:
+                columns.append(self.columns[self.column_index[column]])
+            else:
+                columns.append(empty_column)
+        writer = csv.writer(file_object)
+        writer.writerow(fieldnames)
+        if len(columns) == 0:
+            writer.writerows([[]] * self.row_count)
+        else:
+            writer.writerows(zip(*columns))
+
+def read_csv(file_name: str, columns: Optional[List[str]] = None) -> Table:
+    """Read a CSV file with a header row into a Table. If a list of columns is given, only those columns are kept."""
+    strings = {EMPTY: EMPTY} # one copy of each distinct value; discarded after reading
+    with open(file_name, 'r', newline='', encoding='utf-8') as file_object:
+        reader_object = csv.reader(file_object)
+        header = next(reader_object, [])
+        width = len(header)
+        positions = None
+        if columns is None:
+            table = Table(header)
+        else:
+            header_index = {column: index for index, column in enumerate(header)}
+            for column in columns:
+                if column not in header_index:
+                    raise ValueError(file_name + ' has no column ' + column)
+            table = Table(columns)
+            positions = [header_index[column] for column in columns]
+        chunk = []
+        for row in reader_object:
+            if row == []:
+                continue # csv.DictReader skips blank lines
+            if len(row) > width:
+                raise ValueError(file_name + ' row ' + str(table.row_count + len(chunk) + 1) + ' has more values than there are column headers')
+            if positions is not None:
+                row = [row[position] if position < len(row) else EMPTY for position in positions]
+            chunk.append(row)
+            if len(chunk) == READ_CHUNK_SIZE:
+                table.extend_rows(chunk, strings)
+                chunk = []
+        table.extend_rows(chunk, strings)
+    return table
+
+def write_csv(file_name: str, table: Table, fieldnames: Optional[List[str]] = None) -> None:
+    """Write a Table to a CSV file."""
+    with open(file_name, 'w', newline='', encoding='utf-8') as file_object:
+        table.write(file_object, fieldnames)
+
+def table_format(file_name: str) -> str:
+    """Return the storage format of a table file from the extension of its name."""
+    return FORMAT_EXTENSIONS.get(os.path.splitext(file_name)[1].lower(), CSV_FORMAT)
+
+def import_pyarrow():
+    """Import and return pyarrow, which is only needed for Parquet and Arrow files."""
+    try:
+        import pyarrow
+        import pyarrow.compute
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError('The pyarrow package is required to read and write Parquet and Arrow files. Install it with "pip install pyarrow" or use a CSV file.')
+    return pyarrow
+
+def cell_string(value: Any) -> str:
+    """Return a cell value as it is written to a file, in the same way as csv.DictWriter."""
+    if isinstance(value, str):
+        return value
+    if value is None:
+        return EMPTY
+    return str(value)
+
+def from_arrow(arrow_table) -> Table:
+    """Make a Table from a pyarrow Table. Values are converted to strings and nulls become empty strings."""
+    pyarrow = import_pyarrow()
+    table = Table(arrow_table.column_names)
+    strings = {EMPTY: EMPTY}
+    for index in range(arrow_table.num_columns):
+        column = arrow_table.column(index)
+        if not pyarrow.types.is_string(column.type):
+            column = column.cast(pyarrow.string())
+        values = table.columns[index]
+        for chunk in column.chunks:
+            # Encoding the chunk gives its distinct values, which are converted to Python strings only once
+            encoded = chunk.dictionary_encode()
+            distinct = [strings.setdefault(value, value) for value in encoded.dictionary.to_pylist()]
+            distinct.append(EMPTY) # position for nulls
+            indices = pyarrow.compute.fill_null(encoded.indices, len(distinct) - 1)
+            values.extend([distinct[position] for position in indices.to_pylist()])
+    table.row_count = arrow_table.num_rows
+    return table
+
+def to_arrow(table: Table, fieldnames: Optional[List[str]] = None):
+    """Make a pyarrow Table of strings from a Table, with the columns in the order of fieldnames."""
+    pyarrow = import_pyarrow()
+    if fieldnames is None:
+        fieldnames = table.fieldnames
+    arrays = []
+    for column in fieldnames:
+        if column in table.column_index:
+            arrays.append(pyarrow.array([cell_string(value) for value in table.column(column)], type=pyarrow.string()))
+        else:
+            arrays.append(pyarrow.array([EMPTY] * table.row_count, type=pyarrow.string()))
+    return pyarrow.Table.from_arrays(arrays, names=list(fieldnames))
+
+def from_dicts(fieldnames: List[str], rows: List[Dict[str, Any]]) -> Table:
+    """Make a Table from a list of dictionaries, e.g. rows built from query results."""
+    table = Table(fieldnames)
+    table.columns = [[cell_string(row.get(column, EMPTY)) for row in rows] for column in table.fieldnames]
+    table.row_count = len(rows)
+    return table
+
+def read_table(file_name: str, columns: Optional[List[str]] = None) -> Table:
+    """Read a table from a CSV, Parquet, or Arrow IPC file. If a list of columns is given, only those columns are read.
+
+    Parquet and Arrow files are memory-mapped, so columns that aren't requested are never read from the disk.
+    """
+    storage_format = table_format(file_name)
+    if storage_format == CSV_FORMAT:
+        return read_csv(file_name, columns)
+    pyarrow = import_pyarrow()
+    if storage_format == PARQUET_FORMAT:
+        return from_arrow(pyarrow.parquet.read_table(file_name, columns=columns, memory_map=True))
+    with pyarrow.memory_map(file_name, 'r') as source:
+        arrow_table = pyarrow.ipc.open_file(source).read_all()
+        if columns is not None:
+            arrow_table = arrow_table.select(columns)
+        return from_arrow(arrow_table)
+
+def write_table(file_name: str, table: Table, fieldnames: Optional[List[str]] = None, storage_format: Optional[str] = None) -> None:
+    """Write a table to a CSV, Parquet, or Arrow IPC file.
+
+    The format is chosen from the file name unless it is given, e.g. when writing to a temporary file.
+    """
+    if storage_format is None:
+        storage_format = table_format(file_name)
+    if storage_format == CSV_FORMAT:
+        write_csv(file_name, table, fieldnames)
+        return
+    pyarrow = import_pyarrow()
+    arrow_table = to_arrow(table, fieldnames)
+    if storage_format == PARQUET_FORMAT:
+        pyarrow.parquet.write_table(arrow_table, file_name)
+    else:
+        with pyarrow.OSFile(file_name, 'wb') as sink:
+            with pyarrow.ipc.new_file(sink, arrow_table.schema) as writer:
+                writer.write_table(arrow_table)